@@ -0,0 +1,119 @@
+"""
+高刷模式子图拼接基准测试：PIL 画布 + paste（旧逻辑） vs numpy 预分配缓冲区 vs MosaicCache
+
+每组 4 张子图（frame_index 1-4）依次到达，最后取出拼接图。
+- PIL: 子图以 PIL Image 缓存，取出时 stack_images（Image.new + 4 次 paste）
+- numpy: 子图到达时写入预分配复用的 (2h, 2w, 3) uint8 缓冲区，取出时 Image.fromarray
+- mosaic: MosaicCache，子图到达时 paste 到画布，取出时直接交出画布
+分别统计单张子图写入耗时、取拼接图耗时（音频到达后的关键路径）和每组总耗时。
+
+用法：
+    python benchmarks/bench_mosaic.py --groups 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mosaic import MosaicCache  # noqa: E402
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def pil_stack(images):
+    """旧逻辑（与 media_ops.stack_images 相同，复制于此以免引入 librosa 依赖）"""
+    w, h = images[0].size
+    result = Image.new('RGB', (w * 2, h * 2))
+    result.paste(images[0], (0, 0))
+    result.paste(images[1], (w, 0))
+    result.paste(images[2], (0, h))
+    result.paste(images[3], (w, h))
+    return result
+
+
+def make_frames(size, count=4):
+    w, h = size
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 255, (h, w, 3), dtype=np.uint8)) for _ in range(count)]
+
+
+def run_pil(frames, groups):
+    put_ms, stack_ms = [], []
+    for gid in range(groups):
+        cache = {}
+        for idx, img in enumerate(frames, start=1):
+            t0 = time.perf_counter()
+            cache.setdefault(gid, {})[idx] = img
+            put_ms.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        cached = cache.pop(gid)
+        pil_stack([img for _, img in sorted(cached.items())])
+        stack_ms.append((time.perf_counter() - t0) * 1000)
+    return put_ms, stack_ms
+
+
+def run_numpy(frames, groups):
+    put_ms, stack_ms = [], []
+    w, h = frames[0].size
+    buf = np.empty((h * 2, w * 2, 3), dtype=np.uint8)
+    for _ in range(groups):
+        for idx, img in enumerate(frames):
+            t0 = time.perf_counter()
+            y, x = (idx // 2) * h, (idx % 2) * w
+            buf[y:y + h, x:x + w] = np.asarray(img)
+            put_ms.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        Image.fromarray(buf)
+        stack_ms.append((time.perf_counter() - t0) * 1000)
+    return put_ms, stack_ms
+
+
+def run_mosaic(frames, groups):
+    put_ms, stack_ms = [], []
+    cache = MosaicCache()
+    for gid in range(groups):
+        for idx, img in enumerate(frames, start=1):
+            t0 = time.perf_counter()
+            cache.put(gid, idx, img)
+            put_ms.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        cache.pop_stacked(gid)
+        stack_ms.append((time.perf_counter() - t0) * 1000)
+    return put_ms, stack_ms
+
+
+def report(name, put_ms, stack_ms):
+    group_ms = statistics.mean(put_ms) * 4 + statistics.mean(stack_ms)
+    print(f"  {name:<8} put_mean={statistics.mean(put_ms):7.3f}ms  "
+          f"stack_mean={statistics.mean(stack_ms):7.3f}ms  stack_max={max(stack_ms):7.3f}ms  "
+          f"group_total={group_ms:7.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="高刷子图拼接基准测试")
+    parser.add_argument("--groups", type=int, default=50, help="每种分辨率拼接的组数")
+    args = parser.parse_args()
+
+    for label, size in RESOLUTIONS.items():
+        frames = make_frames(size)
+        # 结果一致性检查
+        cache = MosaicCache()
+        for idx, img in enumerate(frames, start=1):
+            cache.put(0, idx, img)
+        stacked, _ = cache.pop_stacked(0)
+        assert np.array_equal(np.asarray(stacked), np.asarray(pil_stack(frames)))
+
+        print(f"{label} ({size[0]}x{size[1]}) groups={args.groups}")
+        report("PIL", *run_pil(frames, args.groups))
+        report("numpy", *run_numpy(frames, args.groups))
+        report("mosaic", *run_mosaic(frames, args.groups))
+
+
+if __name__ == "__main__":
+    main()
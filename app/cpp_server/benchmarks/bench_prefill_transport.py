@@ -0,0 +1,173 @@
+"""
+prefill 传输格式对比：JSON(base64 WAV/JPEG) vs 二进制 pcm16 vs 二进制 opus
+
+模拟后端每秒一次的 prefill（1 秒 16kHz 音频 + 可选一张 JPEG 图片），对每种格式统计：
+- 请求体字节数和每个会话的上行带宽（kbps，按每秒一次 prefill 计）
+- 后端编码耗时（WAV 写入 + base64 + json.dumps / 拼接二进制请求体 / Opus 编码）
+- bridge 解码耗时（json 解析 + media_ops 解码，与 streaming_prefill 相同的函数）
+- 在给定链路带宽下的传输耗时（远程 GPU 节点）
+
+后端侧的编码逻辑与 MiniCpmModel._send_prefill / _send_prefill_binary 一致，复制于此以免引入后端依赖。
+opus 需要 opuslib（未安装时跳过）。
+
+用法：
+    python benchmarks/bench_prefill_transport.py --wav a.wav --image frame.jpg --link-mbps 5,20,100
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import wave
+
+import numpy as np
+import soundfile as sf
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_ops import (decode_audio_base64, decode_audio_opus, decode_audio_pcm16,  # noqa: E402
+                       decode_image_base64, decode_image_bytes, OPUS_FRAME_SAMPLES)
+from prefill_frames import PREFILL_HEADER, parse_prefill_body  # noqa: E402
+
+SAMPLE_RATE = 16000
+
+
+def load_audio(path, seconds: float) -> np.ndarray:
+    """16bit 单声道 16kHz WAV；不指定时生成带噪声的合成语音样信号"""
+    if path:
+        with wave.open(path, "rb") as wf:
+            if wf.getsampwidth() != 2 or wf.getnchannels() != 1 or wf.getframerate() != SAMPLE_RATE:
+                raise ValueError(f"{path}: 只支持 16bit 单声道 16kHz WAV")
+            pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        return pcm[:int(SAMPLE_RATE * seconds)]
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    rng = np.random.default_rng(0)
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) + rng.normal(0, 0.02, len(t))
+    return np.clip(signal * 32767, -32768, 32767).astype(np.int16)
+
+
+def load_image_jpeg(path, size) -> bytes:
+    if path:
+        image = Image.open(path).convert("RGB")
+    else:
+        rng = np.random.default_rng(1)
+        w, h = size
+        gradient = np.linspace(0, 255, w, dtype=np.uint8)[None, :, None].repeat(h, 0).repeat(3, 2)
+        image = Image.fromarray(np.clip(gradient + rng.integers(0, 24, (h, w, 3)), 0, 255).astype(np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def opus_encode(pcm: np.ndarray) -> bytes:
+    """与 opuslib_util.compress_audio_with_opus 相同的格式：帧数 + 每帧长度（2字节大端） + 帧数据"""
+    import opuslib
+
+    encoder = opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+    frames = []
+    for i in range(0, len(pcm), OPUS_FRAME_SAMPLES):
+        frame = pcm[i:i + OPUS_FRAME_SAMPLES]
+        if len(frame) < OPUS_FRAME_SAMPLES:
+            frame = np.pad(frame, (0, OPUS_FRAME_SAMPLES - len(frame)))
+        frames.append(encoder.encode(frame.tobytes(), OPUS_FRAME_SAMPLES))
+    header = len(frames).to_bytes(2, 'big') + b"".join(len(f).to_bytes(2, 'big') for f in frames)
+    return header + b"".join(frames)
+
+
+def binary_body(meta: dict, audio: bytes, image: bytes) -> bytes:
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    return b"".join((PREFILL_HEADER.pack(len(meta_bytes), len(audio), len(image)), meta_bytes, audio, image))
+
+
+def encode_json(pcm, jpeg):
+    wav_buffer = io.BytesIO()
+    sf.write(wav_buffer, pcm, SAMPLE_RATE, format='WAV', subtype='PCM_16')
+    request = {"session_id": "bench", "audio": base64.b64encode(wav_buffer.getvalue()).decode('utf-8'),
+               "image": base64.b64encode(jpeg).decode('utf-8') if jpeg else None,
+               "image_audio_id": 1, "round": 1, "last_chunk": False, "seq": 1}
+    return json.dumps(request).encode('utf-8')
+
+
+def decode_json(body):
+    request = json.loads(body)
+    audio = decode_audio_base64(request["audio"])
+    image = decode_image_base64(request["image"]) if request.get("image") else None
+    return audio, image
+
+
+def encode_binary(codec):
+    def encode(pcm, jpeg):
+        audio = opus_encode(pcm) if codec == "opus" else pcm.astype('<i2', copy=False).tobytes()
+        meta = {"session_id": "bench", "image_audio_id": 1, "round": 1, "last_chunk": False, "seq": 1,
+                "audio_codec": codec, "sample_rate": SAMPLE_RATE, "samples": len(pcm)}
+        return binary_body(meta, audio, jpeg or b"")
+    return encode
+
+
+def decode_binary(body):
+    meta, audio, image = parse_prefill_body(body)
+    if meta["audio_codec"] == "opus":
+        audio_np = decode_audio_opus(bytes(audio), meta["samples"])
+    else:
+        audio_np = decode_audio_pcm16(audio)
+    return audio_np, decode_image_bytes(bytes(image)) if len(image) else None
+
+
+def measure(encode, decode, pcm, jpeg, iterations: int):
+    encode_ms, decode_ms = [], []
+    body = encode(pcm, jpeg)
+    decode(body)  # 预热
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        body = encode(pcm, jpeg)
+        t1 = time.perf_counter()
+        audio, _ = decode(body)
+        t2 = time.perf_counter()
+        encode_ms.append((t1 - t0) * 1000)
+        decode_ms.append((t2 - t1) * 1000)
+    # 与原始音频的最大误差（opus 为有损编码）
+    error = float(np.max(np.abs(audio[:len(pcm)] - pcm[:len(audio)].astype(np.float32) / 32768.0)))
+    return len(body), statistics.median(encode_ms), statistics.median(decode_ms), error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prefill 传输格式的带宽 / CPU 对比")
+    parser.add_argument("--wav", default=None, help="16bit 单声道 16kHz WAV（默认合成信号）")
+    parser.add_argument("--image", default=None, help="图片文件（默认合成 640x480 图片，编码为 JPEG）")
+    parser.add_argument("--no-image", action="store_true", help="只发音频（audio 模式）")
+    parser.add_argument("--seconds", type=float, default=1.0, help="每次 prefill 的音频时长")
+    parser.add_argument("--iterations", type=int, default=50, help="每种格式的重复次数")
+    parser.add_argument("--link-mbps", default="5,20,100,1000", help="逗号分隔的链路带宽（Mbps），估算传输耗时")
+    args = parser.parse_args()
+
+    pcm = load_audio(args.wav, args.seconds)
+    jpeg = None if args.no_image else load_image_jpeg(args.image, (640, 480))
+    links = [float(v) for v in args.link_mbps.split(",") if v.strip()]
+
+    transports = [("json", encode_json, decode_json), ("pcm16", encode_binary("pcm16"), decode_binary)]
+    try:
+        import opuslib
+        # 创建一次编码器，确认系统 libopus 可用（opuslib 导入成功不代表能加载 libopus）
+        opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+        transports.append(("opus", encode_binary("opus"), decode_binary))
+    except Exception:
+        print("未安装 opuslib，跳过 opus", flush=True)
+
+    print(f"每次 prefill: {len(pcm) / SAMPLE_RATE:.2f}s 音频"
+          f"{f' + {len(jpeg)} 字节 JPEG' if jpeg else ''}, 重复 {args.iterations} 次", flush=True)
+    link_cols = "".join(f"{f'{v:g}Mbps':>10}" for v in links)
+    print(f"  {'格式':<7}{'字节':>9}{'kbps':>9}{'编码ms':>9}{'解码ms':>9}{'最大误差':>10}{link_cols}", flush=True)
+    for name, encode, decode in transports:
+        size, enc_ms, dec_ms, error = measure(encode, decode, pcm, jpeg, args.iterations)
+        kbps = size * 8 / 1000 / (len(pcm) / SAMPLE_RATE)
+        transfer = "".join(f"{size * 8 / (v * 1e6) * 1000:10.1f}" for v in links)
+        print(f"  {name:<7}{size:9d}{kbps:9.0f}{enc_ms:9.2f}{dec_ms:9.2f}{error:10.4f}{transfer}", flush=True)
+    print("  （链路列为按带宽估算的传输耗时 ms，不含 RTT）", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+llm_text.txt 解析基准测试：readlines() 全量切片（旧逻辑） vs TailReader 增量读取
+
+模拟双工会话中 C++ 不断向 llm_text.txt 追加 "[chunk_N] 文本" 行，消费端每个 tick 解析一次新增行，
+直到文件增长到 --lines 行。统计每个 tick 的解析耗时（整体、以及文件接近最终大小时的最后 100 个 tick）。
+
+用法：
+    python benchmarks/bench_tail_reader.py --lines 10000 --lines-per-tick 5
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tail_reader import TailReader  # noqa: E402
+
+LINE_RE = re.compile(r'\[chunk_\d+\]\s*(.*)')
+LINE_TEXT = "这是一段用于测试的模型输出文本，大约三十个字左右。"
+
+
+def legacy_parser(path: str):
+    """旧逻辑：每次 readlines() 整个文件，再从已解析行数处切片"""
+    state = {"count": 0}
+
+    def parse():
+        texts = []
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                lines = f.readlines()
+            for line in lines[state["count"]:]:
+                match = LINE_RE.match(line.strip())
+                if match:
+                    texts.append(match.group(1).strip())
+            state["count"] = len(lines)
+        return texts
+    return parse
+
+
+def tail_parser(path: str):
+    reader = TailReader(path)
+
+    def parse():
+        texts = []
+        for line in reader.read_lines():
+            match = LINE_RE.match(line.strip())
+            if match:
+                texts.append(match.group(1).strip())
+        return texts
+    return parse
+
+
+def run_case(name: str, make_parser, total_lines: int, lines_per_tick: int):
+    fd, path = tempfile.mkstemp(prefix="bench_llm_text_", suffix=".txt")
+    os.close(fd)
+    try:
+        parse = make_parser(path)
+        tick_times = []
+        parsed = 0
+        written = 0
+        with open(path, 'a', encoding='utf-8') as writer:
+            while written < total_lines:
+                for _ in range(lines_per_tick):
+                    writer.write(f"[chunk_{written}] {LINE_TEXT}\n")
+                    written += 1
+                writer.flush()
+                t0 = time.perf_counter()
+                parsed += len(parse())
+                tick_times.append((time.perf_counter() - t0) * 1000)
+        assert parsed == written, f"{name}: parsed {parsed} != written {written}"
+    finally:
+        os.remove(path)
+
+    tail = tick_times[-100:]
+    print(f"{name:<22} ticks={len(tick_times):<6} total={sum(tick_times):8.1f}ms  "
+          f"mean={statistics.mean(tick_times):6.3f}ms  last100_mean={statistics.mean(tail):6.3f}ms  "
+          f"max={max(tick_times):6.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="llm_text.txt 增量解析基准测试")
+    parser.add_argument("--lines", type=int, default=10000, help="文件最终行数")
+    parser.add_argument("--lines-per-tick", type=int, default=5, help="每个 tick 追加的行数")
+    args = parser.parse_args()
+
+    print(f"lines={args.lines} lines_per_tick={args.lines_per_tick}")
+    run_case("legacy readlines", legacy_parser, args.lines, args.lines_per_tick)
+    run_case("TailReader", tail_parser, args.lines, args.lines_per_tick)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+TTS WAV 监听基准测试：目录轮询（旧逻辑） vs 事件监听（wav_watcher）
+
+模拟 C++ 端在独立线程中按固定间隔写出 tts_wav/wav_N.wav 和 generation_done.flag，
+消费端在 asyncio 事件循环中发现文件、读取内容并"发送"（记录时间）。
+
+统计指标：
+- 文件写完 (close) 到消费端发送之间的延迟 p50/p95/max
+- 整个过程的进程 CPU 时间
+- 空闲（无文件写出）期间每秒的 CPU 时间
+
+用法：
+    python benchmarks/bench_wav_watcher.py --chunks 50 --interval 0.1
+"""
+import argparse
+import asyncio
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wav_watcher import EVENT_DONE, EVENT_WAV, open_output_watcher  # noqa: E402
+
+WAV_PAYLOAD = b"\0" * 24000 * 2  # 约 1 秒 24kHz int16
+
+
+def writer_thread(tts_dir: str, chunks: int, interval: float, close_times: dict):
+    """模拟 C++ 写出 wav 分片"""
+    os.makedirs(tts_dir, exist_ok=True)
+    for i in range(chunks):
+        time.sleep(interval)
+        path = os.path.join(tts_dir, f"wav_{i}.wav")
+        with open(path, "wb") as f:
+            f.write(WAV_PAYLOAD)
+        close_times[f"wav_{i}.wav"] = time.time()
+    with open(os.path.join(tts_dir, "generation_done.flag"), "w") as f:
+        f.write(str(chunks - 1))
+
+
+async def legacy_consumer(tts_dir: str, check_interval: float, read_delay: float, send_times: dict):
+    """旧逻辑：每个 tick listdir + 正则排序 + 检查 done 标记"""
+    def sort_wav_files(files):
+        def extract_num(f):
+            match = re.search(r'wav_(\d+)\.wav', f)
+            return int(match.group(1)) if match else 0
+        return sorted(files, key=extract_num)
+
+    sent = set()
+    while True:
+        await asyncio.sleep(check_interval)
+        if not os.path.exists(tts_dir):
+            continue
+        wav_files = sort_wav_files([f for f in os.listdir(tts_dir) if f.startswith("wav_") and f.endswith(".wav")])
+        for wav_file in [f for f in wav_files if f not in sent]:
+            await asyncio.sleep(read_delay)
+            with open(os.path.join(tts_dir, wav_file), "rb") as f:
+                f.read()
+            send_times[wav_file] = time.time()
+            sent.add(wav_file)
+        done_flag = os.path.join(tts_dir, "generation_done.flag")
+        if os.path.exists(done_flag):
+            with open(done_flag) as f:
+                last = f"wav_{int(f.read().strip())}.wav"
+            if last in sent:
+                return
+
+
+async def watcher_consumer(tts_dir: str, backend: str, poll_interval: float, send_times: dict):
+    """新逻辑：等待 watcher 推送事件"""
+    watcher = await open_output_watcher(tts_dir, backend=backend, poll_interval=poll_interval)
+    last = None
+    try:
+        while True:
+            event = await watcher.get(timeout=0.02)
+            if event is None:
+                continue
+            if event.kind == EVENT_WAV:
+                with open(event.path, "rb") as f:
+                    f.read()
+                send_times[event.name] = time.time()
+            elif event.kind == EVENT_DONE:
+                with open(event.path) as f:
+                    last = f"wav_{int(f.read().strip())}.wav"
+            if last is not None and last in send_times:
+                return watcher.backend
+    finally:
+        watcher.close()
+
+
+async def run_case(name: str, make_consumer, chunks: int, interval: float, idle_seconds: float):
+    base = tempfile.mkdtemp(prefix="bench_wav_")
+    tts_dir = os.path.join(base, "round_000", "tts_wav")
+    close_times, send_times = {}, {}
+    try:
+        # 空闲阶段：目录存在但没有文件写出
+        os.makedirs(tts_dir)
+        idle_task = asyncio.create_task(make_consumer(tts_dir, {}))
+        cpu0 = time.process_time()
+        await asyncio.sleep(idle_seconds)
+        idle_cpu = (time.process_time() - cpu0) / idle_seconds
+        idle_task.cancel()
+        try:
+            await idle_task
+        except asyncio.CancelledError:
+            pass
+        shutil.rmtree(os.path.join(base, "round_000"))
+
+        # 生成阶段
+        cpu0 = time.process_time()
+        writer = threading.Thread(target=writer_thread, args=(tts_dir, chunks, interval, close_times))
+        consumer = asyncio.create_task(make_consumer(tts_dir, send_times))
+        writer.start()
+        await consumer
+        writer.join()
+        run_cpu = time.process_time() - cpu0
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    latencies = sorted((send_times[k] - close_times[k]) * 1000 for k in close_times if k in send_times)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<28} p50={statistics.median(latencies):7.2f}ms  p95={p95:7.2f}ms  "
+          f"max={latencies[-1]:7.2f}ms  cpu={run_cpu * 1000:7.1f}ms  idle_cpu={idle_cpu * 1000:6.2f}ms/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="TTS WAV 监听延迟/CPU 基准测试")
+    parser.add_argument("--chunks", type=int, default=50, help="写出的 wav 分片数量")
+    parser.add_argument("--interval", type=float, default=0.1, help="分片写出间隔（秒）")
+    parser.add_argument("--idle", type=float, default=2.0, help="空闲 CPU 测量时长（秒）")
+    args = parser.parse_args()
+
+    cases = [
+        ("legacy simplex (10ms poll)", lambda d, st: legacy_consumer(d, 0.01, 0.01, st)),
+        ("legacy duplex (50ms poll)", lambda d, st: legacy_consumer(d, 0.05, 0.02, st)),
+        ("watcher poll (10ms)", lambda d, st: watcher_consumer(d, "poll", 0.01, st)),
+        ("watcher auto", lambda d, st: watcher_consumer(d, "auto", 0.01, st)),
+    ]
+    print(f"chunks={args.chunks} interval={args.interval}s")
+    for name, make_consumer in cases:
+        await run_case(name, make_consumer, args.chunks, args.interval, args.idle)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,7 @@
+"""
+bridge 压测工具（无需 GPU / 真实模型）
+
+- fake_llama_server.py: 模拟 llama-server 的 HTTP 接口，按可配置的节奏写出 tts_wav / llm_text.txt / generation_done.flag
+- driver.py: 以假 llama-server 启动 minicpmo_cpp_http_server.py（或连接已有 bridge），
+  运行 N 个脚本化会话，统计 prefill 延迟、音频首响、分片间隔抖动、每会话 CPU 的 p50/p95/p99
+"""
@@ -0,0 +1,612 @@
+"""
+bridge 压测驱动：对 minicpmo_cpp_http_server.py 运行 N 个脚本化会话并统计延迟分位数
+
+两种用法：
+1. --launch M：在临时目录中搭建假 LLAMACPP_ROOT（llama-server 为调用 fake_llama_server.py 的脚本，
+   模型目录中放一个空的 *Q4_K_M.gguf），启动 M 个 bridge 实例（端口间隔 10），压测结束后全部关闭
+2. --bridge-url URL（可重复）：连接已经在运行的 bridge（真实或假 llama-server 均可）
+
+每个 bridge 同一时间只服务一个会话（新会话会替换旧会话），因此同一 bridge 上的会话串行执行，
+不同 bridge 之间并行。每个会话：
+    init_sys_prompt -> [streaming_prefill x K -> streaming_generate] x T -> stop
+单工每轮发送 K 个 1 秒音频块（最后一块 is_last_chunk=True）后 generate；
+双工每轮发送 1 个音频块后 generate（与前端每秒一次 prefill + generate 的节奏一致）。
+双工 + --persistent：会话开始时打开一次 /omni/duplex_stream，每轮只 prefill，decode 由 bridge 自动触发：
+    init_sys_prompt -> duplex_stream -> [streaming_prefill -> 等待 cycle_end] x T -> stop
+
+统计（p50 / p95 / p99）：
+- prefill: streaming_prefill 请求往返耗时
+- ttfa: streaming_generate 发出（持久流为 prefill 返回）到收到第一个音频分片；
+  持久流只统计 cycle_start 之后的分片，之前到达的是上一次 decode 的尾部音频，计入上一次
+- turn: 每轮 prefill 返回到本次 decode 结束（is_listen / done / cycle_end），两种双工方式可直接对比
+- chunk_gap: 相邻音频分片的到达间隔
+- jitter: 分片到达间隔与该轮间隔中位数之差的绝对值
+- cpu_per_session: 每个会话期间 bridge 进程消耗的 CPU 时间（读取 /proc/<pid>/stat，仅 Linux；
+  --launch 模式自动获取 pid，--bridge-url 模式可通过 --bridge-pid 指定）
+- 双工模式结束时另外读取各 bridge 的 /metrics，输出 decode 建立耗时 minicpmo_generate_setup_ms 的均值
+  （request=每次 streaming_generate，persistent=持久流），以及每秒对话花在建立 decode 上的毫秒数
+
+假 llama-server 的节奏通过 --ttfa-ms / --chunk-ms 等参数设置（转为 FAKE_LLAMA_* 环境变量传给 bridge）。
+
+用法：
+    python benchmarks/loadtest/driver.py --launch 2 --sessions 20 --turns 3
+    python benchmarks/loadtest/driver.py --launch 1 --duplex --frames --sessions 10
+    python benchmarks/loadtest/driver.py --launch 1 --duplex --persistent --sessions 10 --turns 20
+    python benchmarks/loadtest/driver.py --bridge-url http://127.0.0.1:8060 --sessions 5
+"""
+import argparse
+import base64
+import io
+import json
+import math
+import os
+import queue
+import re
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import wave
+from typing import Dict, List, Optional
+
+CPP_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, CPP_SERVER_DIR)
+
+from output_frames import FRAME_AUDIO, FRAME_CONTENT_TYPE, FRAME_HEADER  # noqa: E402
+
+BRIDGE_SCRIPT = os.path.join(CPP_SERVER_DIR, "minicpmo_cpp_http_server.py")
+FAKE_LLAMA_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_llama_server.py")
+FAKE_MODEL_NAME = "fake-Q4_K_M.gguf"
+
+# 每个 bridge 占用 port、port+1（健康检查）、port+10000 / port+10001（llama-server / 热备）
+BRIDGE_PORT_STRIDE = 10
+
+PERCENTILES = (50, 95, 99)
+# 持久双工流：最后一次 decode 结束后等待尾部音频的静默时长（秒）
+DUPLEX_TAIL_QUIET_SECONDS = 1.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """线性插值分位数"""
+    if not values:
+        return float("nan")
+    data = sorted(values)
+    k = (len(data) - 1) * pct / 100.0
+    lo, hi = math.floor(k), math.ceil(k)
+    if lo == hi:
+        return data[lo]
+    return data[lo] + (data[hi] - data[lo]) * (k - lo)
+
+
+def make_audio_b64(seconds: float = 1.0, sample_rate: int = 16000) -> str:
+    """生成一段 16kHz 单声道 int16 WAV 文件并 base64 编码（与前端上传格式一致）"""
+    n = int(seconds * sample_rate)
+    pcm = struct.pack(f"<{n}h", *(int(3000 * math.sin(2 * math.pi * 440 * i / sample_rate)) for i in range(n)))
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def make_image_b64(size: int = 448) -> str:
+    """生成一张 JPEG 并 base64 编码（只有 --image 时需要 PIL）"""
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (size, size), (90, 140, 200)).save(buf, format="JPEG", quality=85)
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def read_cpu_seconds(pid: Optional[int]) -> Optional[float]:
+    """进程累计 CPU 时间（utime + stime，秒），非 Linux 或进程不存在时返回 None"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # rsplit 后 fields[0] 为 state（第 3 列），utime / stime 为第 14 / 15 列
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def post_json(url: str, payload: dict, timeout: float = 60.0) -> dict:
+    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        body = resp.read()
+    return json.loads(body) if body else {}
+
+
+def wait_http_ok(url: str, timeout: float, proc: Optional[subprocess.Popen] = None) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=2.0) as resp:
+                if resp.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+class LoadStats:
+    """所有会话的测量值（多个 worker 线程共享）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values: Dict[str, List[float]] = {
+            "prefill_ms": [], "ttfa_ms": [], "chunk_gap_ms": [], "jitter_ms": [],
+            "generate_ms": [], "turn_ms": [], "cpu_per_session_ms": [], "session_s": [],
+        }
+        self.chunks = 0
+        self.sessions_ok = 0
+        self.sessions_failed = 0
+        self.errors: List[str] = []
+
+    def extend(self, name: str, values: List[float]):
+        with self.lock:
+            self.values[name].extend(values)
+
+    def failed(self, message: str):
+        with self.lock:
+            self.sessions_failed += 1
+            self.errors.append(message)
+
+
+# ====================== 输出流解析 ======================
+def iter_sse_events(resp):
+    """逐个产出 SSE data 事件 (dict, 到达时间)"""
+    for raw in resp:
+        line = raw.decode("utf-8").strip()
+        if line.startswith("data: "):
+            yield json.loads(line[6:]), time.perf_counter()
+
+
+def _read_exact(resp, n: int) -> bytes:
+    data = b""
+    while len(data) < n:
+        chunk = resp.read(n - len(data))
+        if not chunk:
+            raise EOFError("二进制帧流提前结束")
+        data += chunk
+    return data
+
+
+def iter_frame_events(resp):
+    """逐个产出二进制帧事件，音频帧转换为与 SSE 相同的 {"chunk_idx", "chunk_data"} 结构"""
+    while True:
+        header = resp.read(FRAME_HEADER.size)
+        if not header:
+            return
+        if len(header) < FRAME_HEADER.size:
+            header += _read_exact(resp, FRAME_HEADER.size - len(header))
+        frame_type, meta_len, payload_len = FRAME_HEADER.unpack(header)
+        meta = json.loads(_read_exact(resp, meta_len)) if meta_len else {}
+        payload = _read_exact(resp, payload_len) if payload_len else b""
+        now = time.perf_counter()
+        if frame_type == FRAME_AUDIO:
+            yield {"chunk_idx": meta.get("chunk_idx"),
+                   "chunk_data": {"sample_rate": meta.get("sample_rate"), "bytes": len(payload)}}, now
+        else:
+            yield meta, now
+
+
+class DuplexStreamReader:
+    """在后台线程中读取 /omni/duplex_stream，事件 (dict, 到达时间) 放入队列"""
+
+    def __init__(self, bridge_url: str, session_id: str, frames: bool, timeout: float):
+        headers = {"Content-Type": "application/json"}
+        if frames:
+            headers["Accept"] = FRAME_CONTENT_TYPE
+        req = urllib.request.Request(f"{bridge_url}/omni/duplex_stream",
+                                     data=json.dumps({"session_id": session_id}).encode("utf-8"),
+                                     headers=headers, method="POST")
+        self.resp = urllib.request.urlopen(req, timeout=timeout)
+        self.events = iter_frame_events(self.resp) if frames else iter_sse_events(self.resp)
+        self.queue: "queue.Queue" = queue.Queue()
+        # 已结束的 decode 记录，最后一条的 arrivals 会继续追加尾部音频
+        self.cycles: List[dict] = []
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        try:
+            for event, at in self.events:
+                self.queue.put((event, at))
+                if event.get("done"):
+                    break
+        except Exception as e:
+            self.queue.put(({"error": str(e)}, time.perf_counter()))
+        self.queue.put(None)
+
+    def _add_tail(self, at: float):
+        """cycle_start 之前到达的音频是上一次 decode 结束后 TTS 才写完的尾部，计入上一次 decode"""
+        if self.cycles:
+            self.cycles[-1]["arrivals"].append(at)
+
+    def next_cycle(self, since: float, timeout: float) -> dict:
+        """等待下一次 decode 结束，返回本次的记录（since 之后的耗时、cycle_start 之后的音频到达时间）"""
+        cycle = {"since": since, "arrivals": []}
+        started = False
+        deadline = time.perf_counter() + timeout
+        while True:
+            item = self.queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            if item is None:
+                raise RuntimeError("持久双工流提前结束")
+            event, at = item
+            if "error" in event:
+                raise RuntimeError(f"duplex_stream 返回错误: {event['error']}")
+            if "chunk_data" in event:
+                if started:
+                    cycle["arrivals"].append(at)
+                else:
+                    self._add_tail(at)
+            state = event.get("duplex")
+            if state == "cycle_start":
+                started = True
+            elif started and state in ("cycle_end", "cycle_error", "break"):
+                cycle["turn_ms"] = (at - since) * 1000
+                self.cycles.append(cycle)
+                return cycle
+
+    def drain_tail(self, quiet: float):
+        """最后一次 decode 结束后继续接收尾部音频，直到 quiet 秒内没有新事件"""
+        while True:
+            try:
+                item = self.queue.get(timeout=quiet)
+            except queue.Empty:
+                return
+            if item is None:
+                return
+            event, at = item
+            if "chunk_data" in event:
+                self._add_tail(at)
+
+    def close(self):
+        self.resp.close()
+
+
+def scrape_setup_ms(bridge_url: str) -> Dict[str, List[float]]:
+    """从 bridge /metrics 读取 minicpmo_generate_setup_ms 的 sum / count，按 path 返回 [sum, count]"""
+    totals: Dict[str, List[float]] = {}
+    with urllib.request.urlopen(f"{bridge_url}/metrics", timeout=10.0) as resp:
+        text = resp.read().decode("utf-8")
+    for line in text.splitlines():
+        match = re.match(r'minicpmo_generate_setup_ms_(sum|count)\{.*path="(\w+)".*\}\s+(\S+)', line)
+        if match:
+            kind, path, value = match.groups()
+            totals.setdefault(path, [0.0, 0.0])[0 if kind == "sum" else 1] += float(value)
+    return totals
+
+
+# ====================== 会话脚本 ======================
+class SessionRunner:
+    """在一个 bridge 上串行执行分配给它的会话"""
+
+    def __init__(self, bridge_url: str, bridge_pid: Optional[int], args, stats: LoadStats):
+        self.bridge_url = bridge_url.rstrip("/")
+        self.bridge_pid = bridge_pid
+        self.args = args
+        self.stats = stats
+        self.audio_b64 = make_audio_b64(args.chunk_seconds)
+        self.image_b64 = make_image_b64() if args.image else None
+
+    def prefill(self, session_id: str, is_last: bool) -> float:
+        payload = {"session_id": session_id, "audio": self.audio_b64, "is_last_chunk": is_last}
+        if self.image_b64:
+            payload["image"] = self.image_b64
+        t0 = time.perf_counter()
+        post_json(f"{self.bridge_url}/omni/streaming_prefill", payload)
+        return (time.perf_counter() - t0) * 1000
+
+    def generate(self, session_id: str) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.args.frames:
+            headers["Accept"] = FRAME_CONTENT_TYPE
+        req = urllib.request.Request(f"{self.bridge_url}/omni/streaming_generate",
+                                     data=json.dumps({"session_id": session_id}).encode("utf-8"),
+                                     headers=headers, method="POST")
+        t0 = time.perf_counter()
+        arrivals = []
+        with urllib.request.urlopen(req, timeout=self.args.generate_timeout) as resp:
+            events = iter_frame_events(resp) if self.args.frames else iter_sse_events(resp)
+            for event, at in events:
+                if "error" in event:
+                    raise RuntimeError(f"generate 返回错误: {event['error']}")
+                if "chunk_data" in event:
+                    arrivals.append(at)
+                if event.get("done") or event.get("is_listen"):
+                    break
+        result = {"generate_ms": (time.perf_counter() - t0) * 1000, "chunks": len(arrivals)}
+        if arrivals:
+            result["ttfa_ms"] = (arrivals[0] - t0) * 1000
+            result["gaps_ms"] = [(b - a) * 1000 for a, b in zip(arrivals, arrivals[1:])]
+        return result
+
+    def run_session(self, index: int):
+        args = self.args
+        session_id = f"load{index}-{uuid.uuid4().hex[:6]}"
+        prefill_ms: List[float] = []
+        ttfa_ms: List[float] = []
+        gaps_ms: List[float] = []
+        jitter_ms: List[float] = []
+        generate_ms: List[float] = []
+        turn_ms: List[float] = []
+        chunks = 0
+
+        cpu_start = read_cpu_seconds(self.bridge_pid)
+        t_start = time.perf_counter()
+        post_json(f"{self.bridge_url}/omni/init_sys_prompt", {
+            "session_id": session_id,
+            "media_type": "omni" if args.image else "audio",
+            "duplex_mode": args.duplex,
+        })
+        stream = None
+        try:
+            if args.persistent:
+                stream = DuplexStreamReader(self.bridge_url, session_id, args.frames, args.generate_timeout)
+            prefills_per_turn = 1 if args.duplex else args.prefills
+            gens = []
+            for _ in range(args.turns):
+                for i in range(prefills_per_turn):
+                    prefill_ms.append(self.prefill(session_id, i == prefills_per_turn - 1))
+                prefill_done = time.perf_counter()
+                if stream is not None:
+                    stream.next_cycle(prefill_done, args.generate_timeout)
+                else:
+                    gens.append(self.generate(session_id))
+                turn_ms.append((time.perf_counter() - prefill_done) * 1000)
+            if stream is not None:
+                # 尾部音频在下一次 cycle_start 之前才归入上一次 decode，全部结束后再统计
+                stream.drain_tail(DUPLEX_TAIL_QUIET_SECONDS)
+                for cycle in stream.cycles:
+                    arrivals = cycle["arrivals"]
+                    gen = {"generate_ms": cycle["turn_ms"], "chunks": len(arrivals)}
+                    if arrivals:
+                        gen["ttfa_ms"] = (arrivals[0] - cycle["since"]) * 1000
+                        gen["gaps_ms"] = [(b - a) * 1000 for a, b in zip(arrivals, arrivals[1:])]
+                    gens.append(gen)
+            for gen in gens:
+                generate_ms.append(gen["generate_ms"])
+                chunks += gen["chunks"]
+                if "ttfa_ms" in gen:
+                    ttfa_ms.append(gen["ttfa_ms"])
+                if gen.get("gaps_ms"):
+                    gaps_ms.extend(gen["gaps_ms"])
+                    median_gap = statistics.median(gen["gaps_ms"])
+                    jitter_ms.extend(abs(g - median_gap) for g in gen["gaps_ms"])
+        finally:
+            try:
+                post_json(f"{self.bridge_url}/omni/stop?session_id={session_id}", {}, timeout=10.0)
+            except Exception:
+                pass
+            if stream is not None:
+                stream.close()
+        session_s = time.perf_counter() - t_start
+        cpu_end = read_cpu_seconds(self.bridge_pid)
+
+        self.stats.extend("prefill_ms", prefill_ms)
+        self.stats.extend("ttfa_ms", ttfa_ms)
+        self.stats.extend("chunk_gap_ms", gaps_ms)
+        self.stats.extend("jitter_ms", jitter_ms)
+        self.stats.extend("generate_ms", generate_ms)
+        self.stats.extend("turn_ms", turn_ms)
+        self.stats.extend("session_s", [session_s])
+        if cpu_start is not None and cpu_end is not None:
+            self.stats.extend("cpu_per_session_ms", [(cpu_end - cpu_start) * 1000])
+        with self.stats.lock:
+            self.stats.chunks += chunks
+            self.stats.sessions_ok += 1
+        print(f"[session {index}] {self.bridge_url} turns={args.turns} chunks={chunks} "
+              f"ttfa={statistics.mean(ttfa_ms) if ttfa_ms else float('nan'):.1f}ms "
+              f"elapsed={session_s:.2f}s", flush=True)
+
+    def run(self, session_indices: List[int]):
+        for index in session_indices:
+            try:
+                self.run_session(index)
+            except Exception as e:
+                print(f"[session {index}] 失败: {e}", flush=True)
+                self.stats.failed(f"session {index}: {e}")
+
+
+# ====================== 假环境与 bridge 启动 ======================
+class FakeBridgeCluster:
+    """临时目录中的假 LLAMACPP_ROOT + M 个 bridge 子进程"""
+
+    def __init__(self, count: int, base_port: int, args):
+        self.count = count
+        self.base_port = base_port
+        self.args = args
+        self.work_dir = tempfile.mkdtemp(prefix="minicpmo_loadtest_")
+        self.llamacpp_root = os.path.join(self.work_dir, "llama.cpp")
+        self.model_dir = os.path.join(self.work_dir, "models")
+        self.processes: List[subprocess.Popen] = []
+        self.urls: List[str] = []
+
+    def _prepare_root(self):
+        os.makedirs(self.llamacpp_root, exist_ok=True)
+        os.makedirs(self.model_dir, exist_ok=True)
+        open(os.path.join(self.model_dir, FAKE_MODEL_NAME), "wb").close()
+        shim = os.path.join(self.llamacpp_root, "llama-server")
+        with open(shim, "w") as f:
+            f.write(f"#!/bin/sh\nexec \"{sys.executable}\" \"{FAKE_LLAMA_SCRIPT}\" \"$@\"\n")
+        os.chmod(shim, 0o755)
+
+    def _env(self) -> dict:
+        args = self.args
+        env = os.environ.copy()
+        env.update({
+            "REGISTER_URL": "",
+            "PYTHONUNBUFFERED": "1",
+            "FAKE_LLAMA_INIT_MS": str(args.init_ms),
+            "FAKE_LLAMA_PREFILL_MS": str(args.prefill_ms),
+            "FAKE_LLAMA_TTFA_MS": str(args.ttfa_ms),
+            "FAKE_LLAMA_CHUNK_MS": str(args.chunk_ms),
+            "FAKE_LLAMA_CHUNKS": str(args.chunks),
+            "FAKE_LLAMA_CHUNK_SECONDS": str(args.tts_chunk_seconds),
+            "FAKE_LLAMA_SPEAK_EVERY": str(args.speak_every),
+        })
+        return env
+
+    def start(self):
+        self._prepare_root()
+        env = self._env()
+        for i in range(self.count):
+            port = self.base_port + i * BRIDGE_PORT_STRIDE
+            log_path = os.path.join(self.work_dir, f"bridge_{port}.log")
+            cmd = [
+                sys.executable, BRIDGE_SCRIPT,
+                "--host", "127.0.0.1",
+                "--port", str(port),
+                "--llamacpp-root", self.llamacpp_root,
+                "--model-dir", self.model_dir,
+                "--llm-model", FAKE_MODEL_NAME,
+                "--output-dir", os.path.join(self.work_dir, f"output_{port}"),
+                "--duplex" if self.args.duplex else "--simplex",
+            ]
+            log_file = open(log_path, "w")
+            proc = subprocess.Popen(cmd, cwd=CPP_SERVER_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+            self.processes.append(proc)
+            self.urls.append(f"http://127.0.0.1:{port}")
+            print(f"[cluster] 启动 bridge pid={proc.pid} port={port} 日志={log_path}", flush=True)
+
+        for proc, url in zip(self.processes, self.urls):
+            if not wait_http_ok(f"{url}/health", self.args.startup_timeout, proc):
+                raise RuntimeError(f"bridge 未能就绪: {url}（见 {self.work_dir} 下的日志）")
+        print(f"[cluster] {self.count} 个 bridge 已就绪", flush=True)
+
+    def stop(self):
+        for proc in self.processes:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self.processes:
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if self.args.keep_workdir:
+            print(f"[cluster] 保留工作目录: {self.work_dir}", flush=True)
+        else:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+# ====================== 报告 ======================
+def report(stats: LoadStats, wall_s: float):
+    print(f"\n{'=' * 72}", flush=True)
+    print(f"会话: 成功 {stats.sessions_ok}，失败 {stats.sessions_failed}，"
+          f"音频分片 {stats.chunks}，总耗时 {wall_s:.1f}s", flush=True)
+    header = f"  {'metric':<20}{'n':>7}" + "".join(f"{'p' + str(p):>11}" for p in PERCENTILES) + f"{'max':>11}"
+    print(header, flush=True)
+    for name, values in stats.values.items():
+        if not values:
+            print(f"  {name:<20}{0:>7}" + f"{'-':>11}" * (len(PERCENTILES) + 1), flush=True)
+            continue
+        cells = "".join(f"{percentile(values, p):>11.2f}" for p in PERCENTILES)
+        print(f"  {name:<20}{len(values):>7}{cells}{max(values):>11.2f}", flush=True)
+    for error in stats.errors[:10]:
+        print(f"  ❌ {error}", flush=True)
+    print(f"{'=' * 72}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bridge 压测（假 llama-server）")
+    target = parser.add_argument_group("目标")
+    target.add_argument("--launch", type=int, default=0, help="启动 M 个使用假 llama-server 的 bridge")
+    target.add_argument("--base-port", type=int, default=18560, help="--launch 时第一个 bridge 的端口")
+    target.add_argument("--bridge-url", action="append", default=[], help="已运行的 bridge 地址（可重复）")
+    target.add_argument("--bridge-pid", type=int, action="append", default=[],
+                        help="与 --bridge-url 一一对应的 bridge 进程号（用于统计 CPU）")
+    target.add_argument("--startup-timeout", type=float, default=120.0)
+    target.add_argument("--keep-workdir", action="store_true", help="保留临时目录（bridge 日志、输出文件）")
+
+    script = parser.add_argument_group("会话脚本")
+    script.add_argument("--sessions", type=int, default=10, help="会话总数")
+    script.add_argument("--turns", type=int, default=3, help="每个会话的轮数")
+    script.add_argument("--prefills", type=int, default=3, help="单工模式每轮的 prefill 次数")
+    script.add_argument("--chunk-seconds", type=float, default=1.0, help="每次 prefill 上传的音频时长")
+    script.add_argument("--duplex", action="store_true", help="双工模式")
+    script.add_argument("--image", action="store_true", help="每次 prefill 附带一张图片（omni 模式）")
+    script.add_argument("--frames", action="store_true", help="使用二进制帧输出（否则为 SSE）")
+    script.add_argument("--persistent", action="store_true",
+                        help="双工模式使用会话级 /omni/duplex_stream，不再每轮调用 streaming_generate")
+    script.add_argument("--generate-timeout", type=float, default=120.0)
+
+    fake = parser.add_argument_group("假 llama-server 节奏（仅 --launch）")
+    fake.add_argument("--init-ms", type=float, default=200)
+    fake.add_argument("--prefill-ms", type=float, default=30)
+    fake.add_argument("--ttfa-ms", type=float, default=300)
+    fake.add_argument("--chunk-ms", type=float, default=150)
+    fake.add_argument("--chunks", type=int, default=8)
+    fake.add_argument("--tts-chunk-seconds", type=float, default=0.5)
+    fake.add_argument("--speak-every", type=int, default=1)
+    args = parser.parse_args()
+
+    if not args.launch and not args.bridge_url:
+        parser.error("需要 --launch M 或至少一个 --bridge-url")
+    if args.persistent and not args.duplex:
+        parser.error("--persistent 只能用于 --duplex")
+
+    cluster = None
+    if args.launch:
+        cluster = FakeBridgeCluster(args.launch, args.base_port, args)
+        try:
+            cluster.start()
+        except Exception:
+            cluster.stop()
+            raise
+        targets = [(url, proc.pid) for url, proc in zip(cluster.urls, cluster.processes)]
+    else:
+        pids = args.bridge_pid + [None] * (len(args.bridge_url) - len(args.bridge_pid))
+        targets = list(zip(args.bridge_url, pids))
+
+    stats = LoadStats()
+    runners = [SessionRunner(url, pid, args, stats) for url, pid in targets]
+    assignments = [list(range(i, args.sessions, len(runners))) for i in range(len(runners))]
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=r.run, args=(a,), daemon=True) for r, a in zip(runners, assignments)]
+    setup_totals: Dict[str, List[float]] = {}
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if args.duplex:
+            for url, _ in targets:
+                try:
+                    for path, (total, count) in scrape_setup_ms(url).items():
+                        acc = setup_totals.setdefault(path, [0.0, 0.0])
+                        acc[0] += total
+                        acc[1] += count
+                except Exception as e:
+                    print(f"[metrics] 读取 {url}/metrics 失败: {e}", flush=True)
+    finally:
+        if cluster is not None:
+            cluster.stop()
+    report(stats, time.perf_counter() - t0)
+    # decode 建立耗时（bridge 侧），按对话时长折算为每秒开销
+    conversation_s = sum(stats.values["session_s"])
+    for path, (total, count) in sorted(setup_totals.items()):
+        if count:
+            print(f"decode 建立耗时 [{path}]: {count:.0f} 次, 平均 {total / count:.2f}ms, "
+                  f"每秒对话 {total / conversation_s if conversation_s else float('nan'):.2f}ms", flush=True)
+    if stats.sessions_failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
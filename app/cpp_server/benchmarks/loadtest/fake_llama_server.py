@@ -0,0 +1,268 @@
+"""
+假 llama-server（只依赖标准库，不需要 GPU / 模型文件）
+
+实现 bridge 用到的 C++ 接口，按可配置的节奏写出与真实 llama-server 相同布局的输出文件：
+- GET  /health
+- POST /v1/stream/omni_init             记录 output_dir / duplex_mode，重置双工 WAV 计数器
+- POST /v1/stream/update_session_config
+- POST /v1/stream/prefill               等待 FAKE_LLAMA_PREFILL_MS，检查暂存的音频/图片是否存在
+- POST /v1/stream/decode
+    单工: 写出 <output_dir>/round_NNN/tts_wav/wav_N.wav、llm_debug/chunk_N/llm_text.txt、
+          tts_wav/generation_done.flag，全部写完后返回 JSON
+    双工: 写出 <output_dir>/tts_wav/wav_N.wav（跨 decode 全局计数）并追加 llm_debug/llm_text.txt，
+          同时以 SSE 推送 text / is_listen / end_of_turn 事件
+- POST /v1/stream/break                 中止当前 decode
+
+bridge 的 launch_cpp_process 会以 llama-server 的命令行参数启动本脚本（--host/--port/--model ...），
+未识别的参数直接忽略；节奏通过环境变量配置（bridge 启动子进程时会透传环境变量）：
+- FAKE_LLAMA_INIT_MS: omni_init 耗时，默认 200
+- FAKE_LLAMA_PREFILL_MS: 每次 prefill 耗时，默认 30
+- FAKE_LLAMA_TTFA_MS: decode 开始到第一个 wav 写出，默认 300
+- FAKE_LLAMA_CHUNK_MS: 相邻 wav 写出间隔，默认 150
+- FAKE_LLAMA_CHUNKS: 每次 decode 写出的 wav 数，默认 8（双工为每次说话的分片数）
+- FAKE_LLAMA_CHUNK_SECONDS: 每个 wav 的音频时长，默认 0.5
+- FAKE_LLAMA_SPEAK_EVERY: 双工模式下每 N 次 decode 说一次话，其余返回 is_listen，默认 1
+
+用法（单独运行）：
+    python benchmarks/loadtest/fake_llama_server.py --port 19060
+"""
+import argparse
+import json
+import math
+import os
+import struct
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_LLAMA_INIT_MS = float(os.environ.get("FAKE_LLAMA_INIT_MS", "200"))
+FAKE_LLAMA_PREFILL_MS = float(os.environ.get("FAKE_LLAMA_PREFILL_MS", "30"))
+FAKE_LLAMA_TTFA_MS = float(os.environ.get("FAKE_LLAMA_TTFA_MS", "300"))
+FAKE_LLAMA_CHUNK_MS = float(os.environ.get("FAKE_LLAMA_CHUNK_MS", "150"))
+FAKE_LLAMA_CHUNKS = int(os.environ.get("FAKE_LLAMA_CHUNKS", "8"))
+FAKE_LLAMA_CHUNK_SECONDS = float(os.environ.get("FAKE_LLAMA_CHUNK_SECONDS", "0.5"))
+FAKE_LLAMA_SPEAK_EVERY = max(1, int(os.environ.get("FAKE_LLAMA_SPEAK_EVERY", "1")))
+
+# 与真实 TTS 输出一致：24kHz 单声道 int16
+TTS_SAMPLE_RATE = 24000
+
+
+def synth_pcm(seconds: float, freq: float = 220.0) -> bytes:
+    """生成一段正弦波 int16 PCM（所有分片共用，只生成一次）"""
+    n = int(TTS_SAMPLE_RATE * seconds)
+    return struct.pack(f"<{n}h", *(int(8000 * math.sin(2 * math.pi * freq * i / TTS_SAMPLE_RATE)) for i in range(n)))
+
+
+def write_wav(path: str, pcm: bytes):
+    """写出 wav 分片（close 时触发 inotify IN_CLOSE_WRITE，与 C++ 一次性写完的行为一致）"""
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(TTS_SAMPLE_RATE)
+        w.writeframes(pcm)
+
+
+class FakeLlamaState:
+    """omni 上下文状态（一个假 llama-server 进程对应一个 bridge）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.output_dir = ""
+        self.duplex_mode = False
+        self.initialized = False
+        self.duplex_wav_idx = 0       # 双工模式全局 wav 计数
+        self.duplex_decode_count = 0
+        self.break_event = threading.Event()
+        self.pcm = synth_pcm(FAKE_LLAMA_CHUNK_SECONDS)
+        self.counters = {"omni_init": 0, "prefill": 0, "prefill_missing_file": 0, "decode": 0, "break": 0}
+
+    def count(self, name: str):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+
+STATE = FakeLlamaState()
+
+
+def sleep_ms(ms: float) -> bool:
+    """等待 ms 毫秒，收到 break 时提前返回 False"""
+    return not STATE.break_event.wait(ms / 1000.0)
+
+
+class FakeLlamaHandler(BaseHTTPRequestHandler):
+    # 双工 decode 以连接关闭作为 SSE 结束，不使用 chunked 编码
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except Exception:
+            return {}
+
+    def _send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            with STATE.lock:
+                counters = dict(STATE.counters)
+            self._send_json({"status": "ok", "fake": True, "counters": counters})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        req = self._read_json()
+        routes = {
+            "/v1/stream/omni_init": self._omni_init,
+            "/v1/stream/update_session_config": self._update_session_config,
+            "/v1/stream/prefill": self._prefill,
+            "/v1/stream/decode": self._decode,
+            "/v1/stream/break": self._break,
+        }
+        handler = routes.get(self.path)
+        if handler is None:
+            self._send_json({"error": "not found"}, 404)
+            return
+        try:
+            handler(req)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    # ---------------- 接口实现 ----------------
+    def _omni_init(self, req: dict):
+        STATE.count("omni_init")
+        time.sleep(FAKE_LLAMA_INIT_MS / 1000.0)
+        with STATE.lock:
+            STATE.output_dir = req.get("output_dir") or STATE.output_dir
+            STATE.duplex_mode = bool(req.get("duplex_mode", False))
+            STATE.initialized = True
+            STATE.duplex_wav_idx = 0
+            STATE.duplex_decode_count = 0
+        if STATE.output_dir:
+            os.makedirs(STATE.output_dir, exist_ok=True)
+        self._send_json({"success": True})
+
+    def _update_session_config(self, req: dict):
+        self._send_json({"success": True})
+
+    def _prefill(self, req: dict):
+        STATE.count("prefill")
+        for key in ("audio_path_prefix", "img_path_prefix"):
+            path = req.get(key)
+            if path and not os.path.exists(path):
+                STATE.count("prefill_missing_file")
+        time.sleep(FAKE_LLAMA_PREFILL_MS / 1000.0)
+        self._send_json({"success": True, "cnt": req.get("cnt")})
+
+    def _break(self, req: dict):
+        STATE.count("break")
+        STATE.break_event.set()
+        self._send_json({"success": True})
+
+    def _decode(self, req: dict):
+        STATE.count("decode")
+        STATE.break_event.clear()
+        if not STATE.initialized or not STATE.output_dir:
+            self._send_json({"error": "omni context not initialized"}, 400)
+            return
+        if STATE.duplex_mode:
+            self._decode_duplex()
+        else:
+            self._decode_simplex(int(req.get("round_idx", 0)))
+
+    def _decode_simplex(self, round_idx: int):
+        round_dir = os.path.join(STATE.output_dir, f"round_{round_idx:03d}")
+        tts_wav_dir = os.path.join(round_dir, "tts_wav")
+        os.makedirs(tts_wav_dir, exist_ok=True)
+
+        last_idx = -1
+        delay = FAKE_LLAMA_TTFA_MS
+        for i in range(FAKE_LLAMA_CHUNKS):
+            if not sleep_ms(delay):
+                break
+            delay = FAKE_LLAMA_CHUNK_MS
+            # 文本先于 wav 写出（bridge 在收到 wav 时读取对应 chunk 的文本）
+            text_dir = os.path.join(round_dir, "llm_debug", f"chunk_{i}")
+            os.makedirs(text_dir, exist_ok=True)
+            with open(os.path.join(text_dir, "llm_text.txt"), "w", encoding="utf-8") as f:
+                f.write(f"片段{i}。")
+            write_wav(os.path.join(tts_wav_dir, f"wav_{i}.wav"), STATE.pcm)
+            last_idx = i
+
+        with open(os.path.join(tts_wav_dir, "generation_done.flag"), "w") as f:
+            f.write(str(max(last_idx, 0)))
+        self._send_json({"success": True, "chunks": last_idx + 1})
+
+    def _decode_duplex(self):
+        with STATE.lock:
+            STATE.duplex_decode_count += 1
+            speak = STATE.duplex_decode_count % FAKE_LLAMA_SPEAK_EVERY == 0
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send_event(data: dict):
+            self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        if not speak:
+            send_event({"is_listen": True})
+            return
+
+        tts_wav_dir = os.path.join(STATE.output_dir, "tts_wav")
+        llm_debug_dir = os.path.join(STATE.output_dir, "llm_debug")
+        os.makedirs(tts_wav_dir, exist_ok=True)
+        os.makedirs(llm_debug_dir, exist_ok=True)
+
+        delay = FAKE_LLAMA_TTFA_MS
+        for i in range(FAKE_LLAMA_CHUNKS):
+            if not sleep_ms(delay):
+                break
+            delay = FAKE_LLAMA_CHUNK_MS
+            with STATE.lock:
+                wav_idx = STATE.duplex_wav_idx
+                STATE.duplex_wav_idx += 1
+            text = f"片段{wav_idx}。"
+            with open(os.path.join(llm_debug_dir, "llm_text.txt"), "a", encoding="utf-8") as f:
+                f.write(f"[chunk_{wav_idx}] {text}\n")
+            write_wav(os.path.join(tts_wav_dir, f"wav_{wav_idx}.wav"), STATE.pcm)
+            send_event({"text": text, "is_listen": False})
+        send_event({"end_of_turn": True})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="假 llama-server（bridge 压测用）")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=19060)
+    # 兼容 llama-server 的其余参数（--model / --ctx-size / --n-gpu-layers ...）
+    args, _ = parser.parse_known_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeLlamaHandler)
+    server.daemon_threads = True
+    print(f"[FakeLlama] 监听 {args.host}:{args.port} "
+          f"(ttfa={FAKE_LLAMA_TTFA_MS:.0f}ms chunk={FAKE_LLAMA_CHUNK_MS:.0f}ms x{FAKE_LLAMA_CHUNKS})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
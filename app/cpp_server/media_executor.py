@@ -0,0 +1,174 @@
+"""
+bridge 媒体处理执行器：把 CPU 密集的媒体变换移出 uvicorn 事件循环
+
+bridge 以 workers=1 运行，所有请求共享一个事件循环。base64 解码、重采样、图片解码/拼接/编码
+如果直接在事件循环里执行，一帧大图就会让其他协程（包括 generate 的 SSE 推送）整体停顿。
+MediaExecutor 把这些任务提交到线程池或进程池，并记录每类任务的排队/执行耗时和队列深度。
+
+配置（环境变量）：
+- MEDIA_EXECUTOR: "thread"(默认) / "process" / "inline"
+    thread : 线程池（numpy/librosa/PIL 在大部分计算中会释放 GIL）
+    process: CPU 密集的纯函数（cpu_bound=True）走进程池，彻底绕开 GIL；
+             依赖 bridge 内部状态的任务（暂存区写入等）仍走线程池
+    inline : 直接在事件循环中执行（旧行为，用于对比）
+- MEDIA_EXECUTOR_WORKERS: 工作线程/进程数，默认 4
+- MEDIA_SLOW_TASK_MS: 单个任务执行超过该值时打印日志，默认 200
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+MEDIA_EXECUTOR = os.environ.get("MEDIA_EXECUTOR", "thread")
+MEDIA_EXECUTOR_WORKERS = int(os.environ.get("MEDIA_EXECUTOR_WORKERS", "4"))
+MEDIA_SLOW_TASK_MS = float(os.environ.get("MEDIA_SLOW_TASK_MS", "200"))
+
+
+def _timed_call(fn: Callable, args: Tuple) -> Tuple[Any, float, float]:
+    """在工作线程/进程中执行，返回 (结果, 开始时间戳, 执行耗时 ms)"""
+    start = time.time()
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, start, (time.perf_counter() - t0) * 1000
+
+
+class TaskStats:
+    """单类任务的耗时统计"""
+
+    __slots__ = ("count", "errors", "total_wait_ms", "total_run_ms", "max_wait_ms", "max_run_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.max_run_ms = 0.0
+
+    def record(self, wait_ms: float, run_ms: float):
+        self.count += 1
+        self.total_wait_ms += wait_ms
+        self.total_run_ms += run_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.max_run_ms = max(self.max_run_ms, run_ms)
+
+    def to_dict(self) -> dict:
+        n = max(self.count, 1)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.total_wait_ms / n, 2),
+            "avg_run_ms": round(self.total_run_ms / n, 2),
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            "max_run_ms": round(self.max_run_ms, 2),
+        }
+
+
+class MediaExecutor:
+    """媒体任务执行器（线程池 / 进程池 / 内联）"""
+
+    def __init__(self, mode: str = "thread", max_workers: int = 4,
+                 slow_task_ms: float = MEDIA_SLOW_TASK_MS):
+        if mode not in ("thread", "process", "inline"):
+            raise ValueError(f"不支持的 MEDIA_EXECUTOR: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.slow_task_ms = slow_task_ms
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        if mode != "inline":
+            self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="media")
+        if mode == "process":
+            self._processes = ProcessPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, TaskStats] = {}
+        self.in_flight = 0       # 已提交、尚未完成的任务数
+        self.max_in_flight = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """排队中（尚未被工作线程/进程取走）的任务数估计"""
+        if self.mode == "inline":
+            return 0
+        return max(0, self.in_flight - self.max_workers)
+
+    def _pool_for(self, cpu_bound: bool) -> Executor:
+        if cpu_bound and self._processes is not None:
+            return self._processes
+        return self._threads
+
+    def _record(self, name: str, wait_ms: float, run_ms: float, failed: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(name, TaskStats())
+            if failed:
+                stats.errors += 1
+            else:
+                stats.record(wait_ms, run_ms)
+        if run_ms >= self.slow_task_ms:
+            print(f"[MediaExecutor] 慢任务 {name}: 执行 {run_ms:.0f}ms, 排队 {wait_ms:.0f}ms, "
+                  f"队列深度 {self.queue_depth}", flush=True)
+
+    async def run(self, name: str, fn: Callable, *args, cpu_bound: bool = True) -> Any:
+        """执行 fn(*args) 并返回结果
+
+        Args:
+            name: 任务名（统计维度），如 "audio_decode" / "stack_images"
+            fn: 要执行的函数；进程模式下 cpu_bound 任务的 fn 和参数必须可 pickle
+            cpu_bound: 是否为纯 CPU 计算（进程模式下走进程池）
+        """
+        if self.mode == "inline":
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args)
+            except Exception:
+                self._record(name, 0.0, 0.0, failed=True)
+                raise
+            self._record(name, 0.0, (time.perf_counter() - t0) * 1000)
+            return result
+
+        loop = asyncio.get_running_loop()
+        submit_time = time.time()
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            result, start_time, run_ms = await loop.run_in_executor(
+                self._pool_for(cpu_bound), _timed_call, fn, args
+            )
+        except Exception:
+            self._record(name, 0.0, 0.0, failed=True)
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        self._record(name, max(0.0, (start_time - submit_time) * 1000), run_ms)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            tasks = {name: s.to_dict() for name, s in self._stats.items()}
+            return {
+                "mode": self.mode,
+                "workers": self.max_workers,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth,
+                "max_in_flight": self.max_in_flight,
+                "max_queue_depth": max(0, self.max_in_flight - self.max_workers) if self.mode != "inline" else 0,
+                "tasks": tasks,
+            }
+
+    def close(self):
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+def create_media_executor(mode: Optional[str] = None, max_workers: Optional[int] = None) -> MediaExecutor:
+    """根据配置创建执行器"""
+    return MediaExecutor(
+        mode=(mode or MEDIA_EXECUTOR).lower(),
+        max_workers=max_workers or MEDIA_EXECUTOR_WORKERS,
+    )
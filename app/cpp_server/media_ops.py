@@ -0,0 +1,143 @@
+"""
+bridge 媒体变换函数（base64 / 二进制 prefill 解码、音频重采样、图片解码/拼接、TTS WAV 读取）
+
+这些都是 CPU 密集的纯函数，由 media_executor 调度到线程池/进程池执行，不占用 uvicorn 事件循环。
+定义在独立模块中（而不是 minicpmo_cpp_http_server.py 里），保证进程池可以按模块名 pickle。
+"""
+import base64
+import io
+from typing import List, Tuple
+
+import librosa
+import numpy as np
+import soundfile as sf
+from PIL import Image
+
+PREFILL_SAMPLE_RATE = 16000
+
+
+def decode_audio_base64(audio_b64: str) -> np.ndarray:
+    """base64 音频文件 -> 16kHz 单声道 float32"""
+    audio_bytes = base64.b64decode(audio_b64)
+    # 先用 soundfile 读取，获取原始采样率
+    audio_np, file_sr = sf.read(io.BytesIO(audio_bytes), dtype='float32')
+
+    # 如果是立体声，转为单声道
+    if len(audio_np.shape) > 1:
+        audio_np = audio_np.mean(axis=1)
+
+    # 如果采样率不是 16kHz，使用 librosa 重采样
+    if file_sr != PREFILL_SAMPLE_RATE:
+        audio_np = librosa.resample(audio_np, orig_sr=file_sr, target_sr=PREFILL_SAMPLE_RATE)
+
+    return audio_np.astype(np.float32)
+
+
+def decode_audio_pcm16(pcm: bytes) -> np.ndarray:
+    """二进制 prefill 的 16kHz int16 PCM -> float32（直接映射，不经过 WAV 解析和重采样）"""
+    return np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768.0
+
+
+# 后端 compress_audio_with_opus 固定使用 16kHz 单声道、20ms 帧
+OPUS_FRAME_SAMPLES = 320
+
+
+def decode_audio_opus(opus_data: bytes, samples: int = 0) -> np.ndarray:
+    """二进制 prefill 的 Opus 数据 -> 16kHz float32
+
+    数据格式与后端 opuslib_util.compress_audio_with_opus 一致：
+    帧数(2字节大端) + 每帧长度(各2字节大端) + 各帧数据。
+    编码时最后一帧补零到 20ms，samples > 0 时截掉补齐的部分。
+    """
+    # opuslib 只有启用 Opus 传输时才需要
+    import opuslib
+
+    num_frames = int.from_bytes(opus_data[0:2], 'big')
+    offset = 2 + 2 * num_frames
+    if len(opus_data) < offset:
+        raise ValueError("Opus 数据不完整，无法读取帧长度")
+    decoder = opuslib.Decoder(PREFILL_SAMPLE_RATE, 1)
+    pcm = np.empty(num_frames * OPUS_FRAME_SAMPLES, dtype=np.int16)
+    written = 0
+    for i in range(num_frames):
+        frame_len = int.from_bytes(opus_data[2 + i * 2:4 + i * 2], 'big')
+        frame = bytes(opus_data[offset:offset + frame_len])
+        if len(frame) < frame_len:
+            raise ValueError(f"Opus 第 {i} 帧数据不完整")
+        offset += frame_len
+        decoded = np.frombuffer(decoder.decode(frame, OPUS_FRAME_SAMPLES), dtype=np.int16)
+        pcm[written:written + len(decoded)] = decoded
+        written += len(decoded)
+    if samples > 0:
+        written = min(written, samples)
+    return pcm[:written].astype(np.float32) / 32768.0
+
+
+def decode_image_bytes(image_bytes: bytes) -> Image.Image:
+    """图片文件字节 -> RGB PIL Image"""
+    pil_image = Image.open(io.BytesIO(image_bytes))
+    if pil_image.mode != 'RGB':
+        pil_image = pil_image.convert('RGB')
+    else:
+        # Image.open 是惰性解码，在工作线程/进程里完成真正的解码
+        pil_image.load()
+    return pil_image
+
+
+def decode_image_base64(image_b64: str) -> Image.Image:
+    """base64 图片 -> RGB PIL Image"""
+    return decode_image_bytes(base64.b64decode(image_b64))
+
+
+def stack_images(images: List[Image.Image]) -> Image.Image:
+    """将多张图片 stack 成一张
+
+    Stack 策略（根据图片数量）：
+    - 1张：直接返回
+    - 2张：横向拼接 (1x2)
+    - 3张：2x2 布局，右下角空白
+    - 4张：2x2 布局
+
+    Args:
+        images: PIL Image 列表
+
+    Returns:
+        拼接后的单张 PIL Image
+    """
+    if len(images) == 0:
+        raise ValueError("images 列表不能为空")
+    if len(images) == 1:
+        return images[0]
+
+    # 获取单张图片尺寸（假设所有图片尺寸相同）
+    w, h = images[0].size
+
+    if len(images) == 2:
+        # 横向拼接 1x2
+        result = Image.new('RGB', (w * 2, h))
+        result.paste(images[0], (0, 0))
+        result.paste(images[1], (w, 0))
+    elif len(images) == 3:
+        # 2x2 布局，右下角空白（黑色）
+        result = Image.new('RGB', (w * 2, h * 2), (0, 0, 0))
+        result.paste(images[0], (0, 0))
+        result.paste(images[1], (w, 0))
+        result.paste(images[2], (0, h))
+    else:  # 4张或更多（取前4张）
+        # 2x2 布局
+        result = Image.new('RGB', (w * 2, h * 2))
+        result.paste(images[0], (0, 0))
+        result.paste(images[1], (w, 0))
+        result.paste(images[2], (0, h))
+        if len(images) >= 4:
+            result.paste(images[3], (w, h))
+
+    return result
+
+
+def read_tts_wav(wav_path: str) -> Tuple[np.ndarray, int]:
+    """读取 C++ 写出的 TTS 分片，返回 (int16 PCM, 采样率)"""
+    audio_data, audio_sr = sf.read(wav_path)
+    if audio_data.dtype != np.int16:
+        audio_data = (audio_data * 32767).astype(np.int16)
+    return audio_data, audio_sr
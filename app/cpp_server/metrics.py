@@ -0,0 +1,244 @@
+"""
+bridge 运行指标（Prometheus 文本格式）
+
+prefill 各阶段耗时、音频/文本首响、WAV 分片间隔、WAV 写入到发送的延迟、RTF、重启次数等
+原来只打印在日志和 wav_timing.log 里。本模块把它们记录为 Counter / Histogram，
+按 mode（simplex / duplex / high_fps）打标签，由主端口 GET /metrics 和健康检查端口 GET /metrics 输出。
+
+只依赖标准库（不引入 prometheus_client），输出遵循 Prometheus text exposition format 0.0.4。
+FastAPI 事件循环、执行器线程和健康检查线程都会访问，所有指标内部加锁。
+"""
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 毫秒级延迟分桶（prefill 阶段、首响、分片间隔）
+LATENCY_MS_BUCKETS = (5, 10, 25, 50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000, 30000)
+# RTF 分桶（< 1 表示生成快于实时）
+RTF_BUCKETS = (0.1, 0.2, 0.3, 0.5, 0.7, 0.8, 0.9, 1.0, 1.2, 1.5, 2.0, 3.0, 5.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: 标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """单调递增计数"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """瞬时值，通过回调在输出时采集（如活跃会话数、执行器队列深度）"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self._callback = callback
+
+    def _samples(self) -> List[str]:
+        try:
+            value = float(self._callback())
+        except Exception:
+            return []
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """分桶直方图（累积桶 + _sum + _count）"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_MS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # key -> [各桶计数（非累积）..., +Inf 桶计数, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = row
+            row[idx] += 1
+            row[-1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            row = self._values.get(self._key(labels))
+            return int(sum(row[:-1])) if row else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, row in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + (math.inf,), row[:-1]):
+                cumulative += n
+                le = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{le} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(row[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，render() 输出全部指标"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = LATENCY_MS_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, documentation, callback))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+# ====================== bridge 指标 ======================
+REGISTRY = MetricsRegistry()
+
+PREFILL_REQUESTS = REGISTRY.counter(
+    "minicpmo_prefill_requests_total", "streaming_prefill 请求数", ("mode", "result"))
+PREFILL_STAGE_MS = REGISTRY.histogram(
+    "minicpmo_prefill_stage_ms", "streaming_prefill 各阶段耗时（毫秒）", ("mode", "stage"))
+PREFILL_ORDER = REGISTRY.counter(
+    "minicpmo_prefill_order_total", "带 seq 的 prefill 排序结果（in_order/reordered/late/gap_skipped）", ("result",))
+PREFILL_ORDER_WAIT_MS = REGISTRY.histogram(
+    "minicpmo_prefill_order_wait_ms", "prefill 等待前序 seq 处理完成的时间（毫秒）", ("mode",))
+
+GENERATE_REQUESTS = REGISTRY.counter(
+    "minicpmo_generate_requests_total", "streaming_generate 请求数", ("mode",))
+GENERATE_TTFA_MS = REGISTRY.histogram(
+    "minicpmo_generate_ttfa_ms", "streaming_generate 音频首响（毫秒）", ("mode",))
+GENERATE_TTFT_MS = REGISTRY.histogram(
+    "minicpmo_generate_ttft_ms", "streaming_generate 文本首响（毫秒）", ("mode",))
+WAV_CHUNK_GAP_MS = REGISTRY.histogram(
+    "minicpmo_wav_chunk_gap_ms", "相邻两个 WAV 分片发送间隔（毫秒）", ("mode",))
+WAV_SEND_DELAY_MS = REGISTRY.histogram(
+    "minicpmo_wav_send_delay_ms", "C++ 写入 WAV 到 bridge 发送的延迟（毫秒）", ("mode",))
+GENERATE_RTF = REGISTRY.histogram(
+    "minicpmo_generate_rtf", "streaming_generate 整体 RTF（生成耗时 / 音频时长）", ("mode",), RTF_BUCKETS)
+GENERATE_AUDIO_SECONDS = REGISTRY.counter(
+    "minicpmo_generate_audio_seconds_total", "已发送的音频总时长（秒）", ("mode",))
+GENERATE_SETUP_MS = REGISTRY.histogram(
+    "minicpmo_generate_setup_ms",
+    "双工 decode 建立耗时（毫秒）：request=收到 streaming_generate 到 C++ decode 连接建立，"
+    "persistent=prefill 投递 decode 触发到 C++ decode 连接建立", ("mode", "path"))
+DUPLEX_STREAM_CYCLES = REGISTRY.counter(
+    "minicpmo_duplex_stream_cycles_total", "持久双工流中的 decode 次数（result=listen/speak/break/failed）", ("result",))
+
+CPP_RESTARTS = REGISTRY.counter(
+    "minicpmo_cpp_restarts_total", "C++ llama-server 重启次数", ("result",))
+
+
+def observe_prefill(mode: str, timing_stats: Dict[str, float], success: bool = True):
+    """记录一次 prefill 的各阶段耗时（timing_stats 为 streaming_prefill 中的同名字典）"""
+    PREFILL_REQUESTS.inc(mode=mode, result="success" if success else "failed")
+    for stage, ms in timing_stats.items():
+        PREFILL_STAGE_MS.observe(ms, mode=mode, stage=stage)
+
+
+def observe_wav_send(mode: str, send_time: float, wav_mtime: Optional[float], last_send_time: Optional[float]):
+    """发送一个 WAV 分片时记录写入到发送的延迟和与上一分片的间隔（时间均为 time.time() 秒）"""
+    if wav_mtime is not None:
+        WAV_SEND_DELAY_MS.observe(max(0.0, (send_time - wav_mtime) * 1000), mode=mode)
+    if last_send_time is not None:
+        WAV_CHUNK_GAP_MS.observe((send_time - last_send_time) * 1000, mode=mode)
+
+
+def observe_generate_summary(mode: str, total_generate_ms: float, total_audio_seconds: float):
+    """generate 结束时记录 RTF 和音频总时长"""
+    if total_audio_seconds > 0:
+        GENERATE_RTF.observe(total_generate_ms / 1000 / total_audio_seconds, mode=mode)
+        GENERATE_AUDIO_SECONDS.inc(total_audio_seconds, mode=mode)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -8,19 +8,16 @@ MiniCPMO C++ 后端 HTTP 服务器（统一版：支持单工/双工模式切换
 """
 import os
 import sys
-import base64
+import re
 import json
 import asyncio
-import io
-import librosa
 import numpy as np
-import soundfile as sf
 from PIL import Image
 from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
@@ -32,8 +29,20 @@ import socket
 import requests
 import threading
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 import uuid
 import shutil
+import collections
+from wav_watcher import open_output_watcher, parse_wav_index, EVENT_WAV, EVENT_TEXT, EVENT_DONE, LLM_TEXT_NAME
+from tail_reader import TailReader
+from prefill_staging import PrefillStaging, create_prefill_staging
+from session_state import SessionState, SessionRegistry
+from output_frames import OutputEncoder, negotiate_output_encoder
+from media_ops import (decode_audio_base64, decode_audio_opus, decode_audio_pcm16, decode_image_base64,
+                       decode_image_bytes, stack_images, read_tts_wav)
+from prefill_frames import PREFILL_CONTENT_TYPE, AUDIO_CODEC_OPUS, AUDIO_CODEC_PCM16, parse_prefill_body
+from media_executor import MediaExecutor, create_media_executor
+import metrics
 
 # ====================== 配置 ======================
 # 注意: Python Token2Wav 现在由 C++ 程序直接通过 subprocess 调用
@@ -64,6 +73,16 @@ VISION_BACKEND = os.environ.get("VISION_BACKEND", "metal")
 # Token2Wav device: "gpu:1"(默认，GPU加速) 或 "cpu"(节省GPU显存，适合16GB内存机型)
 TOKEN2WAV_DEVICE = os.environ.get("TOKEN2WAV_DEVICE", "gpu:1")
 
+# TTS 输出监听后端: "auto"(默认，Linux 使用 inotify，其他平台轮询) / "inotify" / "poll"
+WAV_WATCHER_BACKEND = os.environ.get("WAV_WATCHER_BACKEND", "auto")
+# 🔧 [有序prefill] 带 seq 的 prefill 等待缺失的前序 seq 的最长时间（毫秒），超时跳过缺口
+PREFILL_REORDER_TIMEOUT_MS = int(os.environ.get("PREFILL_REORDER_TIMEOUT_MS", "500"))
+# 🔧 [输出采样率协商] token2wav 输出 WAV 的采样率，经 /health 和 init_sys_prompt 上报，
+# 后端按它创建 LiveKit AudioSource，由 WebRTC/Opus 完成重采样（实际每个分片仍带 WAV 自身的 sample_rate）
+TTS_SAMPLE_RATE = int(os.environ.get("TTS_SAMPLE_RATE", "24000"))
+# generate 循环在没有文件事件时的唤醒间隔（秒），用于检查 break 标志和超时
+WATCHER_WAKEUP_INTERVAL = 0.02
+
 
 def auto_detect_llm_model(model_dir: str) -> str:
     """自动从模型目录检测 LLM GGUF 文件
@@ -133,46 +152,28 @@ REGISTER_URL = os.environ.get("REGISTER_URL", _get_default_register_url())
 cpp_server_process: Optional[subprocess.Popen] = None
 current_msg_type: Optional[int] = None  # 1=audio, 2=video/omni
 current_duplex_mode: bool = False  # 是否启用双工模式
-current_high_quality_mode: bool = False  # 是否启用高清模式（max_slice_nums=2）
-current_high_fps_mode: bool = False  # 是否启用高刷模式（1秒5帧stack）
-current_active_session_id: Optional[str] = None
-current_request_counter: int = 0
-current_round_number: int = 0
-session_lock = threading.Lock()
 model_state_initialized: bool = False
-pending_prefill_data: Optional[dict] = None
-is_breaking: bool = False  # break 标志：为 True 时中间层停止向前端发送数据
 health_server_thread: Optional[threading.Thread] = None
 
-# 🔧 [高刷模式] 子图缓存：按 image_audio_id 分组存储（frame_index 1-4 的子图）
-# key: image_audio_id, value: {frame_index: PIL.Image}
-# 注意：主图（frame_index=0）立即处理，不缓存
-high_fps_subimage_cache: Dict[int, Dict[int, Image.Image]] = {}
-high_fps_cache_lock = threading.Lock()
-# 🔧 [高刷模式] 待处理音频缓存：当音频先于子图到达时暂存
-# key: image_audio_id, value: (audio_np, sr, audio_path)
-high_fps_pending_audio: Dict[int, tuple] = {}
-high_fps_audio_lock = threading.Lock()
-
-# 🔧 [双工模式] 全局 WAV 发送计数器（跨 generate 调用保持状态）
-global_sent_wav_count: int = 0
-# 全局文本行计数器（跨 generate 调用保持状态，用于累积解析 llm_text.txt）
-global_parsed_line_count: int = 0
-# 全局文本列表（跨 generate 调用保持状态）
-global_parsed_texts: list = []
-# 全局文本发送索引（已发送的文本数量，用于顺序消费文本）
-global_text_send_idx: int = 0
-# 🔧 [修复回文] 全局已发送 WAV 文件名集合（跨 generate 调用保持状态）
-global_sent_wav_files: set = set()
+# 会话注册表：session_id -> SessionState（计数器、延迟一拍缓存、高刷缓存、双工进度、break 标志等）
+# 见 session_state.py；C++ worker 同一时刻只服务一个会话，新会话初始化时旧会话会被替换
+sessions = SessionRegistry()
+
+# 双工 llm_text.txt 行格式: "[chunk_N] 文本"
+LLM_CHUNK_LINE_RE = re.compile(r'\[chunk_\d+\]\s*(.*)')
 
 # WAV 发送时序日志
 WAV_TIMING_LOG_PATH = os.path.join(os.path.dirname(__file__), "wav_timing.log")
-wav_timing_log_file: Optional[Any] = None  # 全局日志文件句柄
-last_wav_send_time: Optional[float] = None  # 上一次 WAV 发送时间
 
 # HTTP 客户端
 http_client: Optional[httpx.AsyncClient] = None
 
+# prefill 媒体暂存区（disk / shm / memfd，见 prefill_staging.py）
+prefill_staging: Optional[PrefillStaging] = None
+
+# 媒体处理执行器（解码/重采样/拼图/编码移出事件循环，见 media_executor.py）
+media_executor: Optional[MediaExecutor] = None
+
 # ====================== 显存监控配置 ======================
 GPU_MEMORY_THRESHOLD_MB = 2000  # 显存剩余低于此值时触发重启 (MB)
 # 🔧 [本地部署] 默认禁用显存检查和自动重启功能（生产环境可通过环境变量启用）
@@ -182,6 +183,34 @@ GPU_CHECK_ENABLED = os.environ.get("GPU_MEMORY_CHECK", "0") == "1"
 cpp_restart_lock = threading.Lock()  # 重启锁，防止并发重启
 cpp_restarting = False  # 🔧 [修复] 正在重启标志，防止重启期间接收新请求
 
+# 🔧 [热备] 可选的热备 llama-server，运行在 C++ 端口 + 1，显存重启时直接切换过去
+# CPP_STANDBY_MODE:
+#   off(默认)  : 不启用，重启时停机重启（旧行为）
+#   always     : 启动后常驻一个已完成 omni_init 的热备（多占用一份显存）
+#   predictive : 显存剩余低于 CPP_STANDBY_PRELAUNCH_MB 或持续下降时才提前拉起热备，
+#                且剩余显存必须放得下一份模型（实测占用 + GPU_MEMORY_THRESHOLD_MB），否则跳过
+CPP_STANDBY_MODE = os.environ.get("CPP_STANDBY_MODE", "off").lower()
+# 0（默认）表示按实测模型占用自动计算：模型占用 + 2 × GPU_MEMORY_THRESHOLD_MB
+CPP_STANDBY_PRELAUNCH_MB = int(os.environ.get("CPP_STANDBY_PRELAUNCH_MB", "0"))
+CPP_PRIMARY_PORT = None        # 在 lifespan 中设置；热备在 CPP_PRIMARY_PORT / CPP_PRIMARY_PORT + 1 之间轮换
+CPP_PRIMARY_OUTPUT_DIR = None  # 在 lifespan 中设置；热备端口使用 <output_dir>_standby
+standby_lock = threading.Lock()
+standby_worker = None          # Optional[CppStandby]，已就绪的热备
+standby_launching = False
+gpu_free_history = collections.deque(maxlen=5)  # 最近几次显存剩余读数 (MB)，用于判断下降趋势
+cpp_model_footprint_mb: Optional[int] = None  # 一个 llama-server（模型 + omni_init）实测占用的显存 (MB)
+standby_skip_logged = False    # 显存不足以预启动热备的日志只在状态变化时打印一次
+
+# /metrics 中按需采集的瞬时值
+metrics.REGISTRY.gauge("minicpmo_active_sessions", "活跃会话数", lambda: len(sessions))
+metrics.REGISTRY.gauge("minicpmo_cpp_restarting", "C++ llama-server 是否正在重启", lambda: 1 if cpp_restarting else 0)
+metrics.REGISTRY.gauge("minicpmo_media_executor_queue_depth", "媒体处理执行器排队任务数",
+                       lambda: media_executor.queue_depth if media_executor else 0)
+metrics.REGISTRY.gauge("minicpmo_cpp_standby_ready", "热备 llama-server 是否就绪",
+                       lambda: 1 if standby_worker is not None else 0)
+metrics.REGISTRY.gauge("minicpmo_duplex_streams_active", "已打开的持久双工流数",
+                       lambda: sum(1 for s in sessions.sessions() if s.duplex_stream_active))
+
 
 def get_gpu_memory_info() -> dict:
     """获取 GPU 显存信息
@@ -239,6 +268,12 @@ def check_gpu_memory_and_restart_if_needed() -> bool:
     free_mb = mem_info['free_mb']
     print(f"[显存监控] 剩余显存: {free_mb} MB (阈值: {GPU_MEMORY_THRESHOLD_MB} MB)", flush=True)
     
+    # 🔧 [热备] 显存开始吃紧时提前拉起热备，真正需要重启时即可直接切换
+    gpu_free_history.append(free_mb)
+    if (CPP_STANDBY_MODE == "predictive" and gpu_memory_trending_low()
+            and not standby_available() and standby_has_headroom(free_mb)):
+        ensure_standby_async("显存下降")
+    
     if free_mb < GPU_MEMORY_THRESHOLD_MB:
         print(f"[显存监控] ⚠️ 显存不足 ({free_mb} MB < {GPU_MEMORY_THRESHOLD_MB} MB)，准备重启 C++ 服务器...", flush=True)
         
@@ -253,6 +288,7 @@ def check_gpu_memory_and_restart_if_needed() -> bool:
                 restart_cpp_server()
                 return True
             except Exception as e:
+                metrics.CPP_RESTARTS.inc(result="failed")
                 print(f"[显存监控] 重启失败: {e}", flush=True)
                 return False
     
@@ -262,14 +298,17 @@ def check_gpu_memory_and_restart_if_needed() -> bool:
 def restart_cpp_server():
     """重启 C++ llama-server（保持相同配置）"""
     global cpp_server_process, model_state_initialized, current_msg_type
-    global current_round_number, global_sent_wav_count, global_parsed_line_count
-    global global_parsed_texts, global_text_send_idx, global_sent_wav_files
     global current_duplex_mode, cpp_restarting
     
     print("=" * 60, flush=True)
     print("[重启] 开始重启 C++ llama-server...", flush=True)
     print("=" * 60, flush=True)
     
+    # 🔧 [热备] 有就绪的热备时直接切换，旧进程在后台回收
+    if failover_to_standby():
+        print("=" * 60, flush=True)
+        return
+    
     # 🔧 [修复] 设置重启标志，阻止新请求
     cpp_restarting = True
     
@@ -289,12 +328,11 @@ def restart_cpp_server():
     # 4. 重置状态
     model_state_initialized = False
     current_msg_type = None
-    current_round_number = 0
-    global_sent_wav_count = 0
-    global_parsed_line_count = 0
-    global_parsed_texts = []
-    global_text_send_idx = 0
-    global_sent_wav_files = set()
+    # 会话保留，但 C++ 端的 round / WAV 编号已从头开始
+    for session in sessions.sessions():
+        with session.lock:
+            session.round_number = 0
+            session.reset_duplex_progress()
     
     # 5. 重新启动 C++ 服务器
     start_cpp_server(
@@ -309,27 +347,8 @@ def restart_cpp_server():
     try:
         print("[重启] 重新初始化 omni context...", flush=True)
         
-        model_dir = app.state.model_dir
-        # TTS 模型在 tts/ 目录，Token2Wav 模型在 token2wav-gguf/ 目录
-        tts_bin_dir = os.path.join(model_dir, "tts")
-        
-        cpp_request = {
-            "media_type": saved_msg_type,      # 恢复之前的模式
-            "use_tts": True,
-            "duplex_mode": saved_duplex_mode,
-            "model_dir": model_dir,
-            "tts_bin_dir": tts_bin_dir,
-            "tts_gpu_layers": 100,
-            "token2wav_device": TOKEN2WAV_DEVICE,
-            "output_dir": CPP_OUTPUT_DIR,
-        }
-        
-        # 视觉编码器后端
-        cpp_request["vision_backend"] = VISION_BACKEND
-        
-        # 使用固定音色文件
-        if os.path.exists(FIXED_TIMBRE_PATH):
-            cpp_request["voice_audio"] = FIXED_TIMBRE_PATH
+        # 恢复之前的模式
+        cpp_request = build_omni_init_request(saved_msg_type, saved_duplex_mode, CPP_OUTPUT_DIR)
         
         # 使用同步 requests（因为当前在后台线程中）
         resp = requests.post(
@@ -342,62 +361,38 @@ def restart_cpp_server():
             model_state_initialized = True
             current_msg_type = saved_msg_type
             current_duplex_mode = saved_duplex_mode
+            metrics.CPP_RESTARTS.inc(result="success")
             print(f"[重启] omni context 初始化成功: {resp.json()}", flush=True)
         else:
+            metrics.CPP_RESTARTS.inc(result="init_failed")
             print(f"[重启] omni context 初始化失败: {resp.text}", flush=True)
     except Exception as e:
+        metrics.CPP_RESTARTS.inc(result="init_failed")
         print(f"[重启] omni context 初始化异常: {e}", flush=True)
     finally:
         # 🔧 [修复] 无论成功失败，都清除重启标志
         cpp_restarting = False
     
+    # 🔧 [热备] 常驻模式下补回热备（重启前的热备不可用或已失效）
+    if CPP_STANDBY_MODE == "always":
+        ensure_standby_async("重启后补充热备")
+    
     print("=" * 60, flush=True)
 
 
-def stack_images(images: List[Image.Image]) -> Image.Image:
-    """将多张图片 stack 成一张
-    
-    Stack 策略（根据图片数量）：
-    - 1张：直接返回
-    - 2张：横向拼接 (1x2)
-    - 3张：2x2 布局，右下角空白
-    - 4张：2x2 布局
-    
-    Args:
-        images: PIL Image 列表
-        
-    Returns:
-        拼接后的单张 PIL Image
-    """
-    if len(images) == 0:
-        raise ValueError("images 列表不能为空")
-    if len(images) == 1:
-        return images[0]
-    
-    # 获取单张图片尺寸（假设所有图片尺寸相同）
-    w, h = images[0].size
-    
-    if len(images) == 2:
-        # 横向拼接 1x2
-        result = Image.new('RGB', (w * 2, h))
-        result.paste(images[0], (0, 0))
-        result.paste(images[1], (w, 0))
-    elif len(images) == 3:
-        # 2x2 布局，右下角空白（黑色）
-        result = Image.new('RGB', (w * 2, h * 2), (0, 0, 0))
-        result.paste(images[0], (0, 0))
-        result.paste(images[1], (w, 0))
-        result.paste(images[2], (0, h))
-    else:  # 4张或更多（取前4张）
-        # 2x2 布局
-        result = Image.new('RGB', (w * 2, h * 2))
-        result.paste(images[0], (0, 0))
-        result.paste(images[1], (w, 0))
-        result.paste(images[2], (0, h))
-        if len(images) >= 4:
-            result.paste(images[3], (w, h))
-    
-    return result
+async def stage_audio(audio_np: np.ndarray, tag: str) -> str:
+    """在执行器中把音频写入暂存区，返回 C++ 可读取的路径"""
+    return await media_executor.run("stage_audio", prefill_staging.stage_audio, audio_np, tag, cpu_bound=False)
+
+
+async def stage_image(img: Image.Image, tag: str) -> str:
+    """在执行器中把图片编码写入暂存区，返回 C++ 可读取的路径"""
+    return await media_executor.run("stage_image", prefill_staging.stage_image, img, tag, cpu_bound=False)
+
+
+async def stack_images_async(images: List[Image.Image]) -> Image.Image:
+    """在执行器中拼接高刷子图"""
+    return await media_executor.run("stack_images", stack_images, images)
 
 
 class HealthCheckHandler(BaseHTTPRequestHandler):
@@ -405,8 +400,11 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
     
     支持的接口：
     - GET /health - 健康检查
+    - GET /metrics - Prometheus 指标（推理阻塞主线程时也能抓取）
     - POST /omni/break - 打断当前生成（快速响应，不阻塞）
     - POST /omni/stop - 停止会话（快速响应，不阻塞）
+    
+    break/stop 可携带 ?session_id=xxx 只作用于指定会话，未携带时作用于最近初始化的会话
     """
     
     def log_message(self, format, *args):
@@ -414,7 +412,8 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
         pass
     
     def do_GET(self):
-        if self.path == "/health" or self.path == "/":
+        path = urlparse(self.path).path
+        if path == "/health" or path == "/":
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
             self.send_header("Access-Control-Allow-Origin", "*")
@@ -425,93 +424,91 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
                 "backend": "cpp"
             })
             self.wfile.write(response.encode())
+        elif path == "/metrics":
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", metrics.CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
         else:
             self.send_response(404)
             self.end_headers()
     
+    def _break_session(self, session_id: Optional[str], reason: str, tag: str) -> Optional[dict]:
+        """设置会话的 break 标志并调用 C++ break 接口
+        
+        携带 session_id 但会话不存在（已停止或已被新会话替换）时返回 None，
+        不打断当前 worker 上其他会话的生成。
+        """
+        session = sessions.get(session_id)
+        if session is None and session_id:
+            print(f"[独立线程] 会话 {session_id} 不存在，忽略{tag}", flush=True)
+            return None
+        
+        # 【关键】立即设置 break 标志，让 generate_stream 停止向前端发送数据
+        if session is not None:
+            session.is_breaking = True
+            print(f"[独立线程] 会话 {session.session_id} is_breaking 已设置为 True ({tag})", flush=True)
+        
+        # 调用 C++ 服务器的 break 接口
+        cpp_url = session.cpp_url if session is not None else CPP_SERVER_URL
+        cpp_break_success = False
+        if cpp_url:
+            try:
+                break_resp = requests.post(
+                    f"{cpp_url}/v1/stream/break",
+                    json={"reason": reason},
+                    timeout=5.0
+                )
+                if break_resp.status_code == 200:
+                    print(f"[独立线程] C++ 生成已中止 ({tag}): {break_resp.json()}", flush=True)
+                    cpp_break_success = True
+                else:
+                    print(f"[独立线程] C++ break 调用失败 ({tag}): {break_resp.status_code}", flush=True)
+            except Exception as e:
+                print(f"[独立线程] C++ break 调用异常 ({tag}): {e}", flush=True)
+        
+        return {
+            "session_id": session.session_id if session is not None else None,
+            "cpp_break": cpp_break_success
+        }
+    
     def do_POST(self):
-        """处理 POST 请求 - 打断和停止"""
-        global is_breaking, CPP_SERVER_URL
+        """处理 POST 请求 - 打断和停止（可通过 ?session_id= 指定会话）"""
+        parsed = urlparse(self.path)
+        session_id = parse_qs(parsed.query).get("session_id", [None])[0]
         
-        if self.path == "/omni/break":
+        if parsed.path == "/omni/break":
             # 快速打断 - 在独立线程中设置 break 标志并调用 C++ break 接口
-            print("======= [独立线程] 收到快速打断指令 =======", flush=True)
-            
-            # 【关键】立即设置 break 标志，让 generate_stream 停止向前端发送数据
-            is_breaking = True
-            print("[独立线程] is_breaking 已设置为 True，中间层将停止发送数据", flush=True)
-            
-            # 调用 C++ 服务器的 break 接口
-            cpp_break_success = False
-            if CPP_SERVER_URL:
-                try:
-                    break_resp = requests.post(
-                        f"{CPP_SERVER_URL}/v1/stream/break",
-                        json={"reason": "user_interrupt_from_health_thread"},
-                        timeout=5.0
-                    )
-                    if break_resp.status_code == 200:
-                        print(f"[独立线程] C++ 生成已中止: {break_resp.json()}", flush=True)
-                        cpp_break_success = True
-                    else:
-                        print(f"[独立线程] C++ break 调用失败: {break_resp.status_code}", flush=True)
-                except Exception as e:
-                    print(f"[独立线程] C++ break 调用异常: {e}", flush=True)
-            
-            response = json.dumps({
-                "success": True,
-                "message": "当前轮对话已打断",
-                "state": "break",
-                "cpp_break": cpp_break_success
-            })
-            
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(response.encode())
+            print(f"======= [独立线程] 收到快速打断指令 (session={session_id}) =======", flush=True)
+            result = self._break_session(session_id, "user_interrupt_from_health_thread", "break")
+            if result is None:
+                response = {"success": True, "message": "会话不存在，忽略打断", "state": "session_not_found",
+                            "session_id": session_id, "cpp_break": False}
+            else:
+                response = {"success": True, "message": "当前轮对话已打断", "state": "break", **result}
             
-        elif self.path == "/omni/stop":
+        elif parsed.path == "/omni/stop":
             # 快速停止 - 设置 break 标志并调用 C++ break 接口
-            print("======= [独立线程] 收到快速停止指令 =======", flush=True)
-            
-            # 设置 break 标志
-            is_breaking = True
-            print("[独立线程] is_breaking 已设置为 True (stop)", flush=True)
-            
-            # 调用 C++ 服务器的 break 接口
-            cpp_break_success = False
-            if CPP_SERVER_URL:
-                try:
-                    break_resp = requests.post(
-                        f"{CPP_SERVER_URL}/v1/stream/break",
-                        json={"reason": "session_stop_from_health_thread"},
-                        timeout=5.0
-                    )
-                    if break_resp.status_code == 200:
-                        print(f"[独立线程] C++ 生成已中止 (stop): {break_resp.json()}", flush=True)
-                        cpp_break_success = True
-                    else:
-                        print(f"[独立线程] C++ break 调用失败 (stop): {break_resp.status_code}", flush=True)
-                except Exception as e:
-                    print(f"[独立线程] C++ break 调用异常 (stop): {e}", flush=True)
-            
-            response = json.dumps({
-                "success": True,
-                "message": "会话已停止",
-                "state": "session_stop",
-                "cpp_break": cpp_break_success
-            })
-            
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(response.encode())
+            print(f"======= [独立线程] 收到快速停止指令 (session={session_id}) =======", flush=True)
+            result = self._break_session(session_id, "session_stop_from_health_thread", "stop")
+            if result is None:
+                response = {"success": True, "message": "会话不存在，忽略停止", "state": "session_not_found",
+                            "session_id": session_id, "cpp_break": False}
+            else:
+                response = {"success": True, "message": "会话已停止", "state": "session_stop", **result}
             
         else:
             self.send_response(404)
             self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode())
     
     def do_OPTIONS(self):
         """处理CORS预检请求"""
@@ -627,9 +624,14 @@ def clear_output_subfolders():
 
 
 def start_cpp_server(model_dir: str, gpu_devices: str, port: int):
-    """启动 C++ llama-server"""
+    """启动 C++ llama-server（作为当前工作进程）"""
     global cpp_server_process
-    
+    cpp_server_process = launch_cpp_process(model_dir, gpu_devices, port)
+    return True
+
+
+def launch_cpp_process(model_dir: str, gpu_devices: str, port: int, log_tag: str = "CPP") -> subprocess.Popen:
+    """启动一个 llama-server 进程并等待 /health 就绪，返回进程对象"""
     # 构建启动命令
     llamacpp_root = LLAMACPP_ROOT
     
@@ -711,7 +713,7 @@ def start_cpp_server(model_dir: str, gpu_devices: str, port: int):
     print(f"启动 C++ llama-server: {' '.join(cmd)}", flush=True)
     
     # 启动进程
-    cpp_server_process = subprocess.Popen(
+    process = subprocess.Popen(
         cmd,
         env=env,
         cwd=llamacpp_root,
@@ -725,10 +727,10 @@ def start_cpp_server(model_dir: str, gpu_devices: str, port: int):
     # 启动日志读取线程
     def log_reader():
         try:
-            for line in cpp_server_process.stdout:
-                print(f"[CPP] {line.rstrip()}", flush=True)
+            for line in process.stdout:
+                print(f"[{log_tag}] {line.rstrip()}", flush=True)
         except Exception as e:
-            print(f"[CPP log_reader] 异常: {e}", flush=True)
+            print(f"[{log_tag} log_reader] 异常: {e}", flush=True)
     
     log_thread = threading.Thread(target=log_reader, daemon=True)
     log_thread.start()
@@ -736,39 +738,280 @@ def start_cpp_server(model_dir: str, gpu_devices: str, port: int):
     # 等待服务器启动
     max_wait = 180
     for i in range(max_wait):
+        if process.poll() is not None:
+            raise RuntimeError(f"C++ llama-server (端口 {port}) 启动失败，进程已退出 (code={process.returncode})")
         try:
             resp = requests.get(f"http://{CPP_SERVER_HOST}:{port}/health", timeout=2)
             if resp.status_code == 200:
-                print(f"C++ llama-server 启动成功 (等待 {i+1} 秒)", flush=True)
-                return True
+                print(f"C++ llama-server 启动成功 (端口 {port}, 等待 {i+1} 秒)", flush=True)
+                return process
         except:
             pass
         time.sleep(1)
     
+    terminate_cpp_process(process)
     raise RuntimeError(f"C++ llama-server 启动超时 ({max_wait}秒)")
 
 
+def terminate_cpp_process(process: Optional[subprocess.Popen]):
+    """终止一个 llama-server 进程"""
+    if process is None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
 def stop_cpp_server():
     """停止 C++ llama-server"""
     global cpp_server_process
     if cpp_server_process:
         print("停止 C++ llama-server...", flush=True)
-        cpp_server_process.terminate()
-        try:
-            cpp_server_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            cpp_server_process.kill()
+        terminate_cpp_process(cpp_server_process)
         cpp_server_process = None
 
 
+def build_omni_init_request(msg_type: int, duplex_mode: bool, output_dir: str) -> dict:
+    """构造 C++ /v1/stream/omni_init 请求（预初始化、重启恢复、热备初始化共用）"""
+    model_dir = app.state.model_dir
+    cpp_request = {
+        "media_type": msg_type,
+        "use_tts": True,
+        "duplex_mode": duplex_mode,
+        "model_dir": model_dir,
+        "tts_bin_dir": os.path.join(model_dir, "tts"),  # TTS 模型在 tts/ 目录
+        "tts_gpu_layers": 100,
+        "token2wav_device": TOKEN2WAV_DEVICE,
+        "output_dir": output_dir,
+        "vision_backend": VISION_BACKEND,  # 视觉编码器后端
+    }
+    # 使用固定音色文件
+    if os.path.exists(FIXED_TIMBRE_PATH):
+        cpp_request["voice_audio"] = FIXED_TIMBRE_PATH
+    return cpp_request
+
+
+# ====================== 热备 llama-server ======================
+class CppStandby:
+    """已启动并完成 omni_init 的热备 llama-server"""
+    
+    def __init__(self, port: int, output_dir: str, process: subprocess.Popen,
+                 msg_type: int, duplex_mode: bool):
+        self.port = port
+        self.url = f"http://{CPP_SERVER_HOST}:{port}"
+        self.output_dir = output_dir
+        self.process = process
+        self.msg_type = msg_type
+        self.duplex_mode = duplex_mode
+        self.ready_at = time.time()
+    
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+
+def standby_slot() -> tuple:
+    """热备使用的 (端口, 输出目录)：与当前工作进程不同的另一个槽位"""
+    if CPP_SERVER_PORT == CPP_PRIMARY_PORT:
+        return CPP_PRIMARY_PORT + 1, CPP_PRIMARY_OUTPUT_DIR + "_standby"
+    return CPP_PRIMARY_PORT, CPP_PRIMARY_OUTPUT_DIR
+
+
+def record_model_footprint(mem_before: Optional[dict], source: str):
+    """按启动 llama-server 前后的显存剩余差值记录一份模型的显存占用"""
+    global cpp_model_footprint_mb
+    if mem_before is None:
+        return
+    mem_after = get_gpu_memory_info()
+    if mem_after is None:
+        return
+    footprint = mem_before['free_mb'] - mem_after['free_mb']
+    if footprint <= 0:
+        return
+    cpp_model_footprint_mb = footprint
+    print(f"[热备] {source}实测显存占用 {footprint} MB", flush=True)
+
+
+def standby_required_mb() -> int:
+    """预启动热备所需的最少剩余显存：热备占用一份模型后，剩余仍不低于重启阈值"""
+    return (cpp_model_footprint_mb or 0) + GPU_MEMORY_THRESHOLD_MB
+
+
+def standby_has_headroom(free_mb: int) -> bool:
+    """剩余显存能否再放下一份模型；放不下时拉起热备只会让主进程更快触发重启，跳过并记录日志"""
+    global standby_skip_logged
+    if cpp_model_footprint_mb is not None and free_mb >= standby_required_mb():
+        standby_skip_logged = False
+        return True
+    if not standby_skip_logged:
+        standby_skip_logged = True
+        if cpp_model_footprint_mb is None:
+            print(f"[热备] 未测得模型显存占用，跳过预启动热备 (剩余 {free_mb} MB)", flush=True)
+        else:
+            print(f"[热备] 剩余显存 {free_mb} MB < 模型占用 {cpp_model_footprint_mb} MB + 阈值 "
+                  f"{GPU_MEMORY_THRESHOLD_MB} MB，跳过预启动热备（需要重启时停机重启）", flush=True)
+    return False
+
+
+def gpu_memory_trending_low() -> bool:
+    """显存剩余低于预启动阈值，或最近几次读数持续下降且按当前速度很快会放不下热备"""
+    if not gpu_free_history:
+        return False
+    latest = gpu_free_history[-1]
+    prelaunch_mb = CPP_STANDBY_PRELAUNCH_MB or standby_required_mb() + GPU_MEMORY_THRESHOLD_MB
+    if latest < prelaunch_mb:
+        return True
+    readings = list(gpu_free_history)
+    if len(readings) < 3 or any(b >= a for a, b in zip(readings, readings[1:])):
+        return False
+    avg_drop = (readings[0] - readings[-1]) / (len(readings) - 1)
+    # 按平均下降速度，再检查 3 次就放不下热备了
+    return latest - avg_drop * 3 < standby_required_mb()
+
+
+def prepare_standby(reason: str):
+    """启动热备 llama-server 并完成 omni_init（阻塞，在后台线程中调用）"""
+    global standby_worker, standby_launching
+    with standby_lock:
+        if standby_launching or (standby_worker is not None and standby_worker.alive()):
+            return
+        standby_launching = True
+    
+    port, output_dir = standby_slot()
+    msg_type = current_msg_type if current_msg_type else 2
+    duplex_mode = current_duplex_mode
+    process = None
+    try:
+        print(f"[热备] 开始准备热备 llama-server (端口 {port}，原因: {reason})", flush=True)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir, exist_ok=True)
+        mem_before = get_gpu_memory_info()
+        process = launch_cpp_process(app.state.model_dir, app.state.gpu_devices, port, log_tag="CPP-standby")
+        resp = requests.post(
+            f"http://{CPP_SERVER_HOST}:{port}/v1/stream/omni_init",
+            json=build_omni_init_request(msg_type, duplex_mode, output_dir),
+            timeout=120.0
+        )
+        if resp.status_code != 200:
+            raise RuntimeError(f"omni_init 失败: {resp.text}")
+        record_model_footprint(mem_before, "热备 llama-server ")
+        with standby_lock:
+            standby_worker = CppStandby(port, output_dir, process, msg_type, duplex_mode)
+        process = None
+        print(f"[热备] 热备 llama-server 就绪 (端口 {port})", flush=True)
+    except Exception as e:
+        print(f"[热备] 准备热备失败: {e}", flush=True)
+    finally:
+        terminate_cpp_process(process)
+        with standby_lock:
+            standby_launching = False
+
+
+def standby_available() -> bool:
+    """已有可用热备或正在准备"""
+    with standby_lock:
+        return standby_launching or (standby_worker is not None and standby_worker.alive())
+
+
+def ensure_standby_async(reason: str):
+    """后台准备热备（已有可用热备或正在准备时不重复启动）"""
+    if standby_available():
+        return
+    threading.Thread(target=prepare_standby, args=(reason,), daemon=True).start()
+
+
+def discard_standby():
+    """停止热备进程"""
+    global standby_worker
+    with standby_lock:
+        standby, standby_worker = standby_worker, None
+    if standby is not None:
+        terminate_cpp_process(standby.process)
+
+
+def failover_to_standby() -> bool:
+    """切换到热备 llama-server，返回是否切换成功
+
+    切换只替换 CPP_SERVER_PORT / CPP_SERVER_URL / CPP_OUTPUT_DIR 和工作进程，并把所有会话
+    重新绑定到新 worker；旧进程在后台终止（常驻模式下随后在旧槽位上重新准备热备）。
+    """
+    global standby_worker, cpp_server_process, cpp_restarting
+    global CPP_SERVER_PORT, CPP_SERVER_URL, CPP_OUTPUT_DIR
+    global model_state_initialized, current_msg_type, current_duplex_mode
+    
+    with standby_lock:
+        standby, standby_worker = standby_worker, None
+    if standby is None:
+        return False
+    if not standby.alive():
+        print(f"[热备] 热备进程已退出 (端口 {standby.port})，回退为停机重启", flush=True)
+        return False
+    
+    saved_msg_type = current_msg_type if current_msg_type else 2
+    saved_duplex_mode = current_duplex_mode
+    if (standby.msg_type, standby.duplex_mode) != (saved_msg_type, saved_duplex_mode):
+        # 热备按准备时的模式初始化，模式已变化时重新 omni_init
+        try:
+            resp = requests.post(
+                f"{standby.url}/v1/stream/omni_init",
+                json=build_omni_init_request(saved_msg_type, saved_duplex_mode, standby.output_dir),
+                timeout=60.0
+            )
+            if resp.status_code != 200:
+                raise RuntimeError(resp.text)
+        except Exception as e:
+            print(f"[热备] 热备重新初始化失败: {e}，回退为停机重启", flush=True)
+            terminate_cpp_process(standby.process)
+            return False
+    
+    switch_start = time.time()
+    cpp_restarting = True
+    old_process = cpp_server_process
+    old_port = CPP_SERVER_PORT
+    try:
+        cpp_server_process = standby.process
+        CPP_SERVER_PORT = standby.port
+        CPP_SERVER_URL = standby.url
+        CPP_OUTPUT_DIR = standby.output_dir
+        model_state_initialized = True
+        current_msg_type = saved_msg_type
+        current_duplex_mode = saved_duplex_mode
+        # 会话保留并绑定到新 worker，C++ 端的 round / WAV 编号从头开始
+        for session in sessions.sessions():
+            with session.lock:
+                session.cpp_url = standby.url
+                session.output_dir = standby.output_dir
+                session.round_number = 0
+                session.reset_duplex_progress()
+    finally:
+        cpp_restarting = False
+    
+    metrics.CPP_RESTARTS.inc(result="failover")
+    print(f"[热备] 已切换到热备 llama-server: 端口 {old_port} -> {standby.port} "
+          f"(切换耗时 {(time.time() - switch_start) * 1000:.1f}ms)", flush=True)
+    
+    def recycle_old_process():
+        print(f"[热备] 后台回收旧 llama-server (端口 {old_port})", flush=True)
+        terminate_cpp_process(old_process)
+        if CPP_STANDBY_MODE == "always":
+            prepare_standby("切换后补充热备")
+    
+    threading.Thread(target=recycle_old_process, daemon=True).start()
+    return True
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    global http_client, health_server_thread, CPP_SERVER_PORT, CPP_SERVER_URL
+    global http_client, health_server_thread, CPP_SERVER_PORT, CPP_SERVER_URL, prefill_staging, media_executor
+    global CPP_PRIMARY_PORT, CPP_PRIMARY_OUTPUT_DIR
     
     # 动态计算 C++ 端口：Python 端口 + 10000
     CPP_SERVER_PORT = app.state.port + 10000
     CPP_SERVER_URL = f"http://{CPP_SERVER_HOST}:{CPP_SERVER_PORT}"
+    CPP_PRIMARY_PORT = CPP_SERVER_PORT
+    CPP_PRIMARY_OUTPUT_DIR = CPP_OUTPUT_DIR
     print(f"C++ 服务器端口: {CPP_SERVER_PORT} (Python 端口 {app.state.port} + 10000)", flush=True)
     print(f"显存监控: {'启用' if GPU_CHECK_ENABLED else '禁用'} (设置 GPU_MEMORY_CHECK=1 启用)", flush=True)
     
@@ -786,11 +1029,21 @@ async def lifespan(app: FastAPI):
         shutil.rmtree(TEMP_DIR, ignore_errors=True)
     os.makedirs(TEMP_DIR, exist_ok=True)
     
+    # 创建 prefill 暂存区（优先内存文件系统，不可用时回退到 TEMP_DIR）
+    prefill_staging = create_prefill_staging(TEMP_DIR, app.state.port)
+    print(f"Prefill 暂存区: {prefill_staging.backend} ({prefill_staging.root_dir}, 图片格式 {prefill_staging.image_format})", flush=True)
+    
+    # 创建媒体处理执行器
+    media_executor = create_media_executor()
+    print(f"媒体处理执行器: {media_executor.mode} (workers={media_executor.max_workers})", flush=True)
+    
     # 启动时清理 output 目录
     reset_output_dir()
     
     # 启动 C++ 服务器
     print("正在启动 C++ llama-server...", flush=True)
+    # 🔧 [热备] 预测模式按主进程启动前后的显存差值估算一份模型的占用
+    mem_before_start = get_gpu_memory_info() if CPP_STANDBY_MODE == "predictive" else None
     try:
         start_cpp_server(
             model_dir=app.state.model_dir,
@@ -808,27 +1061,8 @@ async def lifespan(app: FastAPI):
     # 这样用户调用 /omni/init_sys_prompt 时就不需要等待 ~12s 了
     print("正在预初始化 omni context（TTS + APM + Python T2W）...", flush=True)
     try:
-        model_dir = app.state.model_dir
-        # TTS 模型在 tts/ 目录
-        tts_bin_dir = os.path.join(model_dir, "tts")
-        
-        pre_init_request = {
-            "media_type": 2,  # 🔧 [修复] 使用 omni 模式预初始化，这样 VPM 也会被加载
-            "use_tts": True,
-            "duplex_mode": app.state.default_duplex_mode,
-            "model_dir": model_dir,
-            "tts_bin_dir": tts_bin_dir,
-            "tts_gpu_layers": 100,
-            "token2wav_device": TOKEN2WAV_DEVICE,
-            "output_dir": CPP_OUTPUT_DIR,
-        }
-        
-        # 视觉编码器后端
-        pre_init_request["vision_backend"] = VISION_BACKEND
-        
-        # 使用固定音色文件进行预初始化
-        if os.path.exists(FIXED_TIMBRE_PATH):
-            pre_init_request["voice_audio"] = FIXED_TIMBRE_PATH
+        # 🔧 [修复] 使用 omni 模式预初始化，这样 VPM 也会被加载
+        pre_init_request = build_omni_init_request(2, app.state.default_duplex_mode, CPP_OUTPUT_DIR)
         
         pre_init_resp = await http_client.post(
             f"{CPP_SERVER_URL}/v1/stream/omni_init",
@@ -846,6 +1080,12 @@ async def lifespan(app: FastAPI):
             print(f"预初始化失败（不影响后续使用）: {pre_init_resp.text}", flush=True)
     except Exception as e:
         print(f"预初始化异常（不影响后续使用）: {e}", flush=True)
+    record_model_footprint(mem_before_start, "主 llama-server ")
+    
+    # 🔧 [热备] 常驻模式：后台启动热备（不阻塞服务启动）
+    print(f"热备 llama-server: {CPP_STANDBY_MODE} (热备端口 {CPP_PRIMARY_PORT + 1})", flush=True)
+    if CPP_STANDBY_MODE == "always":
+        ensure_standby_async("启动常驻热备")
     
     print("MiniCPMO C++ HTTP 服务器初始化完成", flush=True)
     
@@ -861,8 +1101,13 @@ async def lifespan(app: FastAPI):
         # 关闭 HTTP 客户端
         if http_client:
             await http_client.aclose()
-        # 停止 C++ 服务器
+        # 停止 C++ 服务器（含热备）
         stop_cpp_server()
+        discard_standby()
+        if prefill_staging:
+            prefill_staging.close()
+        if media_executor:
+            media_executor.close()
 
 
 app = FastAPI(title="MiniCPMO C++ HTTP Server (Unified)", lifespan=lifespan)
@@ -884,6 +1129,7 @@ class InitSysPromptRequest(BaseModel):
     high_quality_mode: Optional[bool] = False  # 🔧 [高清模式] 启用图片切片 (max_slice_nums=2)
     high_fps_mode: Optional[bool] = False  # 🔧 [高刷模式] 1秒5帧 stack
     language: Optional[str] = "zh"  # 🔧 [语言切换] "zh" 中文, "en" 英文
+    session_id: Optional[str] = None  # 调用方指定的会话ID（不指定则自动生成）
 
 class StreamingPrefillRequest(BaseModel):
     audio: Optional[str] = None  # base64编码的音频
@@ -894,9 +1140,29 @@ class StreamingPrefillRequest(BaseModel):
     max_slice_nums: Optional[int] = None
     session_id: Optional[str] = None
     is_last_chunk: bool = False
+    seq: Optional[int] = None  # 🔧 [有序prefill] 会话内单调递增的序号，bridge 按序号串行处理
+
+class StreamingGenerateRequest(BaseModel):
+    session_id: Optional[str] = None  # 不指定时使用最近初始化的会话
 
 
 # ====================== API 端点 ======================
+def resolve_session(session_id: Optional[str]) -> SessionState:
+    """查找请求对应的会话（未携带 session_id 时使用最近初始化的会话）"""
+    session = sessions.get(session_id)
+    if session is None:
+        if session_id:
+            raise HTTPException(
+                status_code=404,
+                detail=f"会话不存在或已被新会话替换: {session_id}，请重新调用 /omni/init_sys_prompt"
+            )
+        raise HTTPException(
+            status_code=400,
+            detail="未找到活跃会话，请先调用 /omni/init_sys_prompt 初始化会话"
+        )
+    return session
+
+
 @app.get("/health")
 async def health():
     """健康检查"""
@@ -904,26 +1170,52 @@ async def health():
         "status": "healthy",
         "message": "服务正常 (C++ backend)",
         "backend": "cpp",
-        "duplex_mode": current_duplex_mode
+        "duplex_mode": current_duplex_mode,
+        "tts_sample_rate": TTS_SAMPLE_RATE,
+        "duplex_stream": True,
+        "active_sessions": len(sessions),
+        "media_executor": media_executor.stats() if media_executor else None,
+        "prefill_order": {s.session_id: s.prefill_sequencer.stats() for s in sessions.sessions()},
+        "cpp_server_port": CPP_SERVER_PORT,
+        "standby": {
+            "mode": CPP_STANDBY_MODE,
+            "ready": standby_worker is not None,
+            "launching": standby_launching,
+            "port": standby_worker.port if standby_worker is not None else None,
+        }
     }
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus 指标"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.post("/omni/stop")
 async def omni_stop(session_id: Optional[str] = None):
-    """会话停止（中止当前生成，但保留 KV cache 和会话状态）"""
-    global current_active_session_id, current_request_counter, current_round_number
-    global model_state_initialized, pending_prefill_data, is_breaking
-    global wav_timing_log_file, last_wav_send_time
-    global global_sent_wav_count, global_parsed_line_count, global_parsed_texts, global_text_send_idx, global_sent_wav_files
+    """会话停止（中止当前生成，但保留 KV cache）
     
-    print("======= 收到会话停止指令 =======", flush=True)
+    携带 session_id 时只停止该会话；会话不存在时不做任何操作，避免误停其他用户的会话。
+    """
+    print(f"======= 收到会话停止指令 (session={session_id}) =======", flush=True)
     
-    stopped_session_id = current_active_session_id
+    session = sessions.get(session_id)
+    if session is None and session_id:
+        print(f"[omni_stop] 会话 {session_id} 不存在（已停止或已被新会话替换），忽略", flush=True)
+        return {
+            "success": True,
+            "message": "会话不存在，无需停止",
+            "state": "session_not_found",
+            "session_id": session_id,
+            "kv_cache_preserved": True
+        }
     
     # 调用 C++ 服务器的 break 接口，中止生成但不清空 KV cache
+    cpp_url = session.cpp_url if session is not None else CPP_SERVER_URL
     try:
         break_resp = await http_client.post(
-            f"{CPP_SERVER_URL}/v1/stream/break",
+            f"{cpp_url}/v1/stream/break",
             json={}
         )
         if break_resp.status_code == 200:
@@ -933,35 +1225,22 @@ async def omni_stop(session_id: Optional[str] = None):
     except Exception as e:
         print(f"[omni_stop] C++ break 调用异常: {e}", flush=True)
     
-    # 设置 break 标志，让 generate_stream 停止发送数据
-    is_breaking = True
-    
-    # 关闭并写入 WAV 时序日志总结
-    if wav_timing_log_file:
-        try:
-            wav_timing_log_file.write(f"{'-'*120}\n")
-            wav_timing_log_file.write(f"[会话停止] {datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}\n")
-            wav_timing_log_file.close()
+    stopped_session_id = None
+    if session is not None:
+        stopped_session_id = session.session_id
+        # 设置 break 标志，让 generate_stream 停止发送数据
+        session.is_breaking = True
+        
+        # 关闭并写入 WAV 时序日志总结
+        if session.close_timing_log("会话停止"):
             print(f"[📊 WAV 时序日志已写入] {WAV_TIMING_LOG_PATH}", flush=True)
-        except:
-            pass
-        wav_timing_log_file = None
-    last_wav_send_time = None
-    
-    # 重置计数器和缓存
-    with session_lock:
-        current_active_session_id = None
-        current_request_counter = 0
-        current_round_number = 0
-        pending_prefill_data = None
-        # 双工模式需要重置的全局状态
-        global_sent_wav_count = 0
-        global_parsed_line_count = 0
-        global_parsed_texts = []
-        global_text_send_idx = 0
-        global_sent_wav_files = set()
-    
-    print(f"会话已暂停: {stopped_session_id} (会话状态保留，可继续对话)", flush=True)
+        
+        # 重置计数器和缓存，并从注册表移除
+        session.reset_counters()
+        session.clear_high_fps_cache()
+        sessions.remove(stopped_session_id)
+    
+    print(f"会话已暂停: {stopped_session_id} (KV cache 保留，可重新 init 后继续对话)", flush=True)
     print("======= 生成已中止，会话和 KV cache 保留，可直接继续 prefill =======", flush=True)
     
     return {
@@ -974,24 +1253,29 @@ async def omni_stop(session_id: Optional[str] = None):
 
 
 @app.post("/omni/break")
-async def omni_break():
+async def omni_break(session_id: Optional[str] = None):
     """单轮打断（只打断当前轮decode，不重置会话）"""
-    global is_breaking
-    
     if not model_state_initialized:
         raise HTTPException(status_code=503, detail="模型未初始化")
     
+    session = sessions.get(session_id)
+    if session is None and session_id:
+        print(f"[omni_break] 会话 {session_id} 不存在，忽略打断", flush=True)
+        return {"success": True, "message": "会话不存在，忽略打断", "state": "session_not_found"}
+    
     try:
-        print("======= 收到单轮打断指令 =======", flush=True)
+        print(f"======= 收到单轮打断指令 (session={session_id}) =======", flush=True)
         
         # 【关键】立即设置 break 标志，让 generate_stream 停止向前端发送数据
-        is_breaking = True
-        print("[omni_break] is_breaking 已设置为 True，中间层将停止发送数据", flush=True)
+        if session is not None:
+            session.is_breaking = True
+            print("[omni_break] is_breaking 已设置为 True，中间层将停止发送数据", flush=True)
         
         # 调用 C++ 服务器的 break 接口，中止当前生成
+        cpp_url = session.cpp_url if session is not None else CPP_SERVER_URL
         try:
             break_resp = await http_client.post(
-                f"{CPP_SERVER_URL}/v1/stream/break",
+                f"{cpp_url}/v1/stream/break",
                 json={}
             )
             if break_resp.status_code == 200:
@@ -1023,19 +1307,10 @@ async def init_sys_prompt(request: InitSysPromptRequest):
     - duplex_mode=True: 双工模式，直接转发 prefill，全局 WAV 计数器
     - duplex_mode=False: 单工模式，使用"延迟一拍"机制
     """
-    global current_msg_type, current_duplex_mode, current_active_session_id, current_request_counter
-    global current_round_number, model_state_initialized, pending_prefill_data
-    global current_high_quality_mode, current_high_fps_mode
-    global global_sent_wav_count, global_parsed_line_count, global_parsed_texts, global_text_send_idx, global_sent_wav_files
-    global wav_timing_log_file, last_wav_send_time
-    global is_breaking
-    
-    # 🔧 [修复] 重置 is_breaking 标志，防止上一次 stop 后残留的状态影响新会话
-    # 场景：调度中心调用 /omni/stop 设置 is_breaking=True，之后新用户开始会话
-    #       如果不在 init_sys_prompt 中重置，新用户的 streaming_generate 会检测到残留的 is_breaking=True
-    if is_breaking:
-        print("[init_sys_prompt] 检测到残留的 is_breaking=True，重置为 False", flush=True)
-        is_breaking = False
+    global current_msg_type, current_duplex_mode, model_state_initialized
+    
+    # 注：每次 init 都会创建新的 SessionState（is_breaking=False），
+    #     上一次 stop 残留的 break 标志只留在旧会话上，不会影响新会话
     
     # 🔧 [修复] 检查是否正在重启，防止重启期间的请求导致冲突
     if cpp_restarting:
@@ -1056,8 +1331,8 @@ async def init_sys_prompt(request: InitSysPromptRequest):
         # 原因：预初始化时已经 prefill 了 system prompt，清空 KV cache 会导致上下文丢失
         # LLM 线程在 decode 时会自己清理用户对话部分（保留 n_keep = system prompt）
         
-        # 生成新的会话ID
-        new_session_id = str(uuid.uuid4())[:8]
+        # 会话ID：优先使用调用方传入的 session_id，否则生成新的
+        new_session_id = request.session_id or str(uuid.uuid4())[:8]
         
         # 设置 msg_type
         if request.media_type:
@@ -1128,10 +1403,6 @@ async def init_sys_prompt(request: InitSysPromptRequest):
                 cpp_request["max_slice_nums"] = 2  # 高清模式：切图
                 print(f"[高清模式] 启用图片切片 max_slice_nums=2", flush=True)
             
-            # 保存模式状态
-            current_high_quality_mode = high_quality_mode
-            current_high_fps_mode = high_fps_mode
-            
             print(f"[模式设置] 双工={duplex_mode}, 高清={high_quality_mode}, 高刷={high_fps_mode}", flush=True)
             
             # 使用固定音色文件
@@ -1158,9 +1429,6 @@ async def init_sys_prompt(request: InitSysPromptRequest):
             init_message = f"初始化完成（{mode_name}模式，{duplex_name}，{quality_name}画质，{fps_name}）"
         elif media_type_changed:
             # 🔧 [优化] media_type 变化，调用 update_session_config（不重新加载模型）
-            current_high_quality_mode = high_quality_mode
-            current_high_fps_mode = high_fps_mode
-            
             update_request = {
                 "media_type": msg_type,
                 "duplex_mode": duplex_mode,
@@ -1192,9 +1460,6 @@ async def init_sys_prompt(request: InitSysPromptRequest):
             # 已初始化且模式未变，但仍需通知 C++ 重置状态
             # 🔧 [修复] 调用 update_session_config 确保 C++ 端状态正确重置
             # 原因：TTS 线程可能还有残留状态，需要等待其完成并清理队列
-            current_high_quality_mode = high_quality_mode
-            current_high_fps_mode = high_fps_mode
-            
             update_request = {
                 "media_type": msg_type,
                 "duplex_mode": duplex_mode,
@@ -1223,34 +1488,24 @@ async def init_sys_prompt(request: InitSysPromptRequest):
             fast_resume = True
             init_message = f"初始化成功（{mode_name}模式，{duplex_name}，{quality_name}画质，{fps_name}，快速恢复）"
         
-        # 关闭之前的日志文件（如果有）
-        if wav_timing_log_file:
-            try:
-                wav_timing_log_file.write(f"{'-'*120}\n")
-                wav_timing_log_file.write(f"[新会话初始化，关闭旧日志] {datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}\n")
-                wav_timing_log_file.close()
-            except:
-                pass
-            wav_timing_log_file = None
-        last_wav_send_time = None
-        
-        # 更新会话状态
-        with session_lock:
-            current_active_session_id = new_session_id
-            current_request_counter = 0
-            current_round_number = 0
-            pending_prefill_data = None
-            # 双工模式需要重置的全局状态
-            global_sent_wav_count = 0
-            global_parsed_line_count = 0
-            global_parsed_texts = []
-            global_text_send_idx = 0
-            global_sent_wav_files = set()
-        
-        # 🔧 [高刷模式] 清理图片缓存
-        with high_fps_cache_lock:
-            high_fps_subimage_cache.clear()
-            print(f"[init_sys_prompt] 已清理高刷模式图片缓存", flush=True)
+        # 注册新会话（同一个 C++ worker 上的旧会话会被打断并替换）
+        session = SessionState(
+            session_id=new_session_id,
+            cpp_url=CPP_SERVER_URL,
+            output_dir=CPP_OUTPUT_DIR,
+            work_dir=os.path.join(TEMP_DIR, f"session_{new_session_id}"),
+            msg_type=msg_type,
+            duplex_mode=duplex_mode,
+            high_quality_mode=high_quality_mode,
+            high_fps_mode=high_fps_mode,
+            language=language,
+            prefill_gap_timeout=PREFILL_REORDER_TIMEOUT_MS / 1000,
+        )
+        for old_session in sessions.register(session):
+            # 关闭旧会话的日志文件（如果有）
+            old_session.close_timing_log("新会话初始化，关闭旧日志")
+            old_session.clear_high_fps_cache()
+            print(f"[init_sys_prompt] 旧会话 {old_session.session_id} 已被新会话 {new_session_id} 替换", flush=True)
         
         return {
             "success": True,
@@ -1258,7 +1513,8 @@ async def init_sys_prompt(request: InitSysPromptRequest):
             "msg_type": msg_type,
             "duplex_mode": duplex_mode,
             "session_id": new_session_id,
-            "fast_resume": fast_resume
+            "fast_resume": fast_resume,
+            "tts_sample_rate": TTS_SAMPLE_RATE
         }
         
     except HTTPException:
@@ -1269,51 +1525,79 @@ async def init_sys_prompt(request: InitSysPromptRequest):
         raise HTTPException(status_code=500, detail=f"初始化失败: {str(e)}")
 
 
+# 解码任务：(任务名, 函数, 参数, 是否 CPU 密集)，交给 media_executor 执行
+DecodeJob = Optional[tuple]
+
+
 @app.post("/omni/streaming_prefill")
 async def streaming_prefill(request: StreamingPrefillRequest):
+    """流式预填充（JSON，音频 / 图片为 base64 编码的文件）"""
+    audio_job = ("audio_decode", decode_audio_base64, (request.audio,), True) if request.audio else None
+    image_job = ("image_decode", decode_image_base64, (request.image,), True) if request.image else None
+    return await _streaming_prefill(request, audio_job, image_job)
+
+
+@app.post("/omni/streaming_prefill_bin")
+async def streaming_prefill_bin(http_request: Request):
+    """流式预填充（二进制，格式见 prefill_frames.py）
+
+    音频为 16kHz int16 PCM（直接映射为 NumPy）或 Opus，图片为编码后的文件字节，
+    处理逻辑与 /omni/streaming_prefill 完全相同。
+    """
+    content_type = http_request.headers.get("content-type", "")
+    if PREFILL_CONTENT_TYPE not in content_type:
+        raise HTTPException(status_code=415, detail=f"Content-Type 必须为 {PREFILL_CONTENT_TYPE}")
+    try:
+        meta, audio, image = parse_prefill_body(await http_request.body())
+        request = StreamingPrefillRequest(**meta)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"二进制请求体解析失败: {str(e)}")
+
+    audio_job = None
+    if len(audio):
+        codec = meta.get("audio_codec", AUDIO_CODEC_PCM16)
+        if codec == AUDIO_CODEC_PCM16:
+            if meta.get("sample_rate", 16000) != 16000:
+                raise HTTPException(status_code=400, detail=f"pcm16 音频必须为 16kHz，收到 {meta.get('sample_rate')}")
+            # 只是一次 frombuffer + 类型转换，不值得进程池的 pickle 开销
+            audio_job = ("audio_decode_pcm16", decode_audio_pcm16, (audio,), False)
+        elif codec == AUDIO_CODEC_OPUS:
+            audio_job = ("audio_decode_opus", decode_audio_opus, (bytes(audio), int(meta.get("samples", 0))), True)
+        else:
+            raise HTTPException(status_code=400, detail=f"不支持的音频编码: {codec}")
+    image_job = ("image_decode", decode_image_bytes, (bytes(image),), True) if len(image) else None
+    return await _streaming_prefill(request, audio_job, image_job)
+
+
+async def _streaming_prefill(request: StreamingPrefillRequest, audio_job: DecodeJob, image_job: DecodeJob):
     """流式预填充
     
     根据 duplex_mode 使用不同的处理逻辑：
     - 单工模式：使用"延迟一拍"机制
     - 双工模式：直接转发给 C++ /v1/stream/prefill
     """
-    global pending_prefill_data, current_request_counter
-    
     # 🔧 [修复] 检查是否正在重启
     if cpp_restarting:
         raise HTTPException(status_code=503, detail="服务正在重启中，请稍后重试")
     
-    if not current_active_session_id:
-        raise HTTPException(
-            status_code=400,
-            detail="未找到活跃会话，请先调用 /omni/init_sys_prompt 初始化会话"
-        )
+    session = resolve_session(request.session_id)
     
     prefill_start_time = time.time()
     
     # ========== 性能统计变量 ==========
     timing_stats = {}
+    # 🔧 [有序prefill] 解码与前序请求的 prefill 重叠，之后按 seq 等到轮到自己再处理
+    sequenced = request.seq is not None
     
     try:
         # 1. 解码音频
         t0 = time.time()
         audio_np = None
         sr = 16000
-        if request.audio:
+        if audio_job is not None:
             try:
-                audio_bytes = base64.b64decode(request.audio)
-                # 先用 soundfile 读取，获取原始采样率
-                audio_np, file_sr = sf.read(io.BytesIO(audio_bytes), dtype='float32')
-                
-                # 如果是立体声，转为单声道
-                if len(audio_np.shape) > 1:
-                    audio_np = audio_np.mean(axis=1)
-                
-                # 如果采样率不是 16kHz，使用 librosa 重采样
-                if file_sr != 16000:
-                    audio_np = librosa.resample(audio_np, orig_sr=file_sr, target_sr=16000)
-                
-                audio_np = audio_np.astype(np.float32)
+                name, fn, args, cpu_bound = audio_job
+                audio_np = await media_executor.run(name, fn, *args, cpu_bound=cpu_bound)
                 sr = 16000
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"音频数据解码失败: {str(e)}")
@@ -1322,16 +1606,24 @@ async def streaming_prefill(request: StreamingPrefillRequest):
         # 2. 解码图片
         t0 = time.time()
         pil_image = None
-        if request.image:
+        if image_job is not None:
             try:
-                image_bytes = base64.b64decode(request.image)
-                pil_image = Image.open(io.BytesIO(image_bytes))
-                if pil_image.mode != 'RGB':
-                    pil_image = pil_image.convert('RGB')
+                name, fn, args, cpu_bound = image_job
+                pil_image = await media_executor.run(name, fn, *args, cpu_bound=cpu_bound)
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"图片数据解码失败: {str(e)}")
         timing_stats['image_decode'] = (time.time() - t0) * 1000
         
+        if sequenced:
+            t0 = time.time()
+            order_result = await session.prefill_sequencer.acquire(request.seq)
+            timing_stats['order_wait'] = (time.time() - t0) * 1000
+            metrics.PREFILL_ORDER.inc(result=order_result)
+            metrics.PREFILL_ORDER_WAIT_MS.observe(timing_stats['order_wait'], mode=session.metrics_mode)
+            if order_result in ("late", "gap_skipped"):
+                print(f"[有序prefill] seq={request.seq} {order_result}, 期望 seq={session.prefill_sequencer.next_seq}, "
+                      f"等待 {timing_stats['order_wait']:.1f}ms", flush=True)
+        
         # 🔧 [高刷模式] 新的图片/音频分离处理逻辑
         # 逻辑：
         # 1. 主图（frame_index=0）立即 prefill
@@ -1341,7 +1633,7 @@ async def streaming_prefill(request: StreamingPrefillRequest):
         # 🔧 [高清+高刷] 标记是否为主图（用于决定高清切片）
         is_main_image = False
         
-        if current_high_fps_mode and request.image_audio_id is not None:
+        if session.high_fps_mode and request.image_audio_id is not None:
             frame_idx = request.frame_index if request.frame_index is not None else 0
             
             # 情况1：只有图片，没有音频
@@ -1354,37 +1646,31 @@ async def streaming_prefill(request: StreamingPrefillRequest):
                     is_main_image = True  # 🔧 [高清+高刷] 标记为主图
                     # 继续后面的 prefill 流程
                 else:
-                    # 子图（frame_index 1-4）：缓存
-                    with high_fps_cache_lock:
-                        if request.image_audio_id not in high_fps_subimage_cache:
-                            high_fps_subimage_cache[request.image_audio_id] = {}
-                        high_fps_subimage_cache[request.image_audio_id][frame_idx] = pil_image
-                        cached_count = len(high_fps_subimage_cache[request.image_audio_id])
-                        # 检查是否收齐4张子图（frame 1,2,3,4）
-                        all_subframes_ready = all(
-                            i in high_fps_subimage_cache[request.image_audio_id] 
-                            for i in [1, 2, 3, 4]
-                        )
+                    # 子图（frame_index 1-4）：直接写入该 image_audio_id 的 2x2 拼接缓冲区
+                    # 返回已缓存帧数，以及是否收齐4张子图（frame 1,2,3,4）
+                    cached_count, all_subframes_ready = await media_executor.run(
+                        "mosaic_put", session.high_fps_mosaics.put,
+                        request.image_audio_id, frame_idx, pil_image, cpu_bound=False
+                    )
                     
                     print(f"[高刷模式] 子图缓存 image_audio_id={request.image_audio_id}, frame={frame_idx}, 已缓存{cached_count}帧", flush=True)
                     
                     if all_subframes_ready:
                         # 收齐4张子图，检查是否有待处理的音频
                         pending_audio = None
-                        with high_fps_audio_lock:
-                            if request.image_audio_id in high_fps_pending_audio:
-                                pending_audio = high_fps_pending_audio.pop(request.image_audio_id)
+                        with session.high_fps_audio_lock:
+                            if request.image_audio_id in session.high_fps_pending_audio:
+                                pending_audio = session.high_fps_pending_audio.pop(request.image_audio_id)
                         
                         if pending_audio is not None:
                             # 有待处理的音频，取出子图，stack，然后 prefill
                             audio_np, sr, _ = pending_audio
-                            with high_fps_cache_lock:
-                                cached_frames = high_fps_subimage_cache.pop(request.image_audio_id, {})
-                            sorted_frames = sorted(cached_frames.items(), key=lambda x: x[0])
-                            subimages = [img for _, img in sorted_frames]
-                            stacked_image = stack_images(subimages)
+                            stacked_image, stacked_count = await media_executor.run(
+                                "mosaic_stack", session.high_fps_mosaics.pop_stacked,
+                                request.image_audio_id, cpu_bound=False
+                            )
                             pil_images = [stacked_image]
-                            print(f"[高刷模式] 子图收齐+待处理音频，stack {len(subimages)} 帧，prefill", flush=True)
+                            print(f"[高刷模式] 子图收齐+待处理音频，stack {stacked_count} 帧，prefill", flush=True)
                             # 继续后面的 prefill 流程
                         else:
                             # 没有待处理的音频，只是缓存完成
@@ -1406,16 +1692,15 @@ async def streaming_prefill(request: StreamingPrefillRequest):
             # 情况2：有音频（可能同时有图片）
             elif audio_np is not None:
                 # 从缓存取出子图
-                with high_fps_cache_lock:
-                    cached_frames = high_fps_subimage_cache.pop(request.image_audio_id, {})
+                stacked_image, stacked_count = await media_executor.run(
+                    "mosaic_stack", session.high_fps_mosaics.pop_stacked,
+                    request.image_audio_id, cpu_bound=False
+                )
                 
-                if len(cached_frames) > 0:
+                if stacked_image is not None:
                     # 有缓存的子图，stack 后 prefill
-                    sorted_frames = sorted(cached_frames.items(), key=lambda x: x[0])
-                    subimages = [img for _, img in sorted_frames]
-                    stacked_image = stack_images(subimages)
                     pil_images = [stacked_image]
-                    print(f"[高刷模式] 音频到达，取出 {len(subimages)} 帧子图 stack，prefill", flush=True)
+                    print(f"[高刷模式] 音频到达，取出 {stacked_count} 帧子图 stack，prefill", flush=True)
                     
                     # 如果当前请求也带图片（不应该发生，但做个保护）
                     if pil_image is not None:
@@ -1423,8 +1708,8 @@ async def streaming_prefill(request: StreamingPrefillRequest):
                 else:
                     # 没有缓存的子图，检查子图是否还没到齐
                     # 缓存音频，等子图到齐
-                    with high_fps_audio_lock:
-                        high_fps_pending_audio[request.image_audio_id] = (audio_np, sr, None)
+                    with session.high_fps_audio_lock:
+                        session.high_fps_pending_audio[request.image_audio_id] = (audio_np, sr, None)
                     print(f"[高刷模式] 音频到达但无子图缓存，暂存音频等待子图 image_audio_id={request.image_audio_id}", flush=True)
                     return {
                         "success": True,
@@ -1439,53 +1724,57 @@ async def streaming_prefill(request: StreamingPrefillRequest):
             raise HTTPException(status_code=400, detail="必须提供音频或图片至少一项")
         
         audio_duration = len(audio_np) / sr if audio_np is not None else 0.0
-        omni_mode = (current_msg_type == 2)
+        omni_mode = (session.msg_type == 2)
         
         # ========== 根据模式选择不同的处理逻辑 ==========
-        if current_duplex_mode:
+        if session.duplex_mode:
             # ========== 双工模式：直接转发给 C++ ==========
-            return await _streaming_prefill_duplex(
-                request, audio_np, pil_images, sr, audio_duration, 
+            result = await _streaming_prefill_duplex(
+                session, request, audio_np, pil_images, sr, audio_duration, 
                 omni_mode, timing_stats, prefill_start_time
             )
-        elif current_high_fps_mode and current_msg_type == 2:
+        elif session.high_fps_mode and session.msg_type == 2:
             # ========== 高刷单工模式：直接 prefill，不延迟 ==========
             # 高刷模式只对 omni 模式（有图片）有意义，audio 模式走普通单工路径
             # 高刷模式通过 image_audio_id 保证配对，不需要"延迟一拍"
             # 主图立即 prefill，音频+stack图也立即 prefill
-            return await _streaming_prefill_highfps_direct(
-                request, audio_np, pil_images, sr, audio_duration,
+            result = await _streaming_prefill_highfps_direct(
+                session, request, audio_np, pil_images, sr, audio_duration,
                 omni_mode, timing_stats, prefill_start_time,
                 is_main_image=is_main_image  # 🔧 [高清+高刷] 传入主图标记
             )
         else:
             # ========== 普通单工模式：使用"延迟一拍"机制 ==========
-            return await _streaming_prefill_simplex(
-                request, audio_np, pil_images, sr, audio_duration,
+            result = await _streaming_prefill_simplex(
+                session, request, audio_np, pil_images, sr, audio_duration,
                 omni_mode, timing_stats, prefill_start_time
             )
         
+        metrics.observe_prefill(session.metrics_mode, timing_stats, success=result.get("success", True))
+        return result
+        
     except HTTPException:
         raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"预填充失败: {str(e)}")
+    finally:
+        if sequenced:
+            await session.prefill_sequencer.release(request.seq)
 
 
 async def _streaming_prefill_duplex(
-    request, audio_np, pil_images, sr, audio_duration, 
+    session: SessionState, request, audio_np, pil_images, sr, audio_duration, 
     omni_mode, timing_stats, prefill_start_time
 ):
     """双工模式的 streaming_prefill 实现：直接转发给 C++"""
-    global current_request_counter
-    
     # 增加请求计数，计算 cnt（从 0 开始）
-    with session_lock:
-        cnt = current_request_counter
-        current_request_counter += 1
+    with session.lock:
+        cnt = session.request_counter
+        session.request_counter += 1
     
-    # 3. 保存音频到临时文件
+    # 3. 保存音频到暂存区
     t0 = time.time()
     temp_audio_path = ""
     if audio_np is not None and len(audio_np) > 0:
@@ -1496,36 +1785,28 @@ async def _streaming_prefill_duplex(
             padding_len = MIN_AUDIO_SAMPLES - original_len
             audio_np = np.pad(audio_np, (0, padding_len), mode='constant', constant_values=0)
         
-        temp_audio_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{cnt}.wav")
-        audio_to_save = np.clip(audio_np, -1.0, 1.0).astype(np.float32)
-        sf.write(temp_audio_path, audio_to_save, 16000, format='WAV', subtype='PCM_16')
+        temp_audio_path = await stage_audio(audio_np, f"{session.session_id}_{cnt}")
     timing_stats['audio_save'] = (time.time() - t0) * 1000
     
-    # 4. 处理图片并保存到临时文件
+    # 4. 处理图片并保存到暂存区
     t0 = time.time()
     temp_image_paths = []
     
     if len(pil_images) > 0:
-        if current_high_fps_mode and len(pil_images) > 1:
+        if session.high_fps_mode and len(pil_images) > 1:
             # 高刷模式：第1张是主图，后面的 stack 成一张
             main_image = pil_images[0]
             rest_images = pil_images[1:]
             
-            main_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{cnt}_main.png")
-            main_image.save(main_path, format='PNG')
-            temp_image_paths.append(main_path)
+            temp_image_paths.append(await stage_image(main_image, f"{session.session_id}_{cnt}_main"))
             
             if len(rest_images) > 0:
-                stacked_image = stack_images(rest_images)
-                stack_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{cnt}_stack.png")
-                stacked_image.save(stack_path, format='PNG')
-                temp_image_paths.append(stack_path)
+                stacked_image = await stack_images_async(rest_images)
+                temp_image_paths.append(await stage_image(stacked_image, f"{session.session_id}_{cnt}_stack"))
                 print(f"[高刷模式] 处理 {len(pil_images)} 帧，主图1张 + stack {len(rest_images)} 帧成1张", flush=True)
         else:
             # 普通模式：单张图
-            img_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{cnt}.png")
-            pil_images[0].save(img_path, format='PNG')
-            temp_image_paths.append(img_path)
+            temp_image_paths.append(await stage_image(pil_images[0], f"{session.session_id}_{cnt}"))
     
     timing_stats['image_save'] = (time.time() - t0) * 1000
     
@@ -1533,39 +1814,43 @@ async def _streaming_prefill_duplex(
     t0 = time.time()
     cpp_success = True
     
-    if len(temp_image_paths) == 0:
-        # 只有音频，没有图片
-        cpp_request = {
-            "audio_path_prefix": temp_audio_path,
-            "img_path_prefix": "",
-            "cnt": cnt
-        }
-        resp = await http_client.post(
-            f"{CPP_SERVER_URL}/v1/stream/prefill",
-            json=cpp_request,
-            timeout=30.0
-        )
-        cpp_success = (resp.status_code == 200)
-    else:
-        # 有图片：第一张图和音频一起发，后续图片单独发
-        for i, img_path in enumerate(temp_image_paths):
+    try:
+        if len(temp_image_paths) == 0:
+            # 只有音频，没有图片
             cpp_request = {
-                "audio_path_prefix": temp_audio_path if i == 0 else "",
-                "img_path_prefix": img_path,
-                "cnt": cnt + i
+                "audio_path_prefix": temp_audio_path,
+                "img_path_prefix": "",
+                "cnt": cnt
             }
             resp = await http_client.post(
-                f"{CPP_SERVER_URL}/v1/stream/prefill",
+                f"{session.cpp_url}/v1/stream/prefill",
                 json=cpp_request,
                 timeout=30.0
             )
-            if resp.status_code != 200:
-                cpp_success = False
-                break
-        
-        # 更新 counter
-        with session_lock:
-            current_request_counter += len(temp_image_paths) - 1
+            cpp_success = (resp.status_code == 200)
+        else:
+            # 有图片：第一张图和音频一起发，后续图片单独发
+            for i, img_path in enumerate(temp_image_paths):
+                cpp_request = {
+                    "audio_path_prefix": temp_audio_path if i == 0 else "",
+                    "img_path_prefix": img_path,
+                    "cnt": cnt + i
+                }
+                resp = await http_client.post(
+                    f"{session.cpp_url}/v1/stream/prefill",
+                    json=cpp_request,
+                    timeout=30.0
+                )
+                if resp.status_code != 200:
+                    cpp_success = False
+                    break
+            
+            # 更新 counter
+            with session.lock:
+                session.request_counter += len(temp_image_paths) - 1
+    finally:
+        # 🔧 释放暂存文件（C++ 已读取完毕或请求失败，都不再需要）
+        prefill_staging.release([temp_audio_path] + temp_image_paths)
     
     timing_stats['cpp_http'] = (time.time() - t0) * 1000
     
@@ -1580,19 +1865,13 @@ async def _streaming_prefill_duplex(
     else:
         print(f"[Prefill #{cnt}] ✗ C++ prefill 失败 [双工]", flush=True)
     
-    # 🔧 清理临时文件（C++ 已读取完毕，不再需要）
-    try:
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            os.remove(temp_audio_path)
-        for img_path in temp_image_paths:
-            if os.path.exists(img_path):
-                os.remove(img_path)
-    except Exception:
-        pass
+    # 🔧 [持久双工流] prefill 完成后由 bridge 直接触发 decode，后端不再为每次 prefill 发起 streaming_generate
+    if cpp_success and session.duplex_stream_active:
+        session.duplex_decode_triggers.put_nowait((cnt, time.time()))
     
     return {
         "success": cpp_success,
-        "session_id": current_active_session_id,
+        "session_id": session.session_id,
         "cnt": cnt,
         "audio_duration_seconds": float(audio_duration),
         "timing": timing_stats,
@@ -1601,7 +1880,7 @@ async def _streaming_prefill_duplex(
 
 
 async def _streaming_prefill_highfps_direct(
-    request, audio_np, pil_images, sr, audio_duration,
+    session: SessionState, request, audio_np, pil_images, sr, audio_duration,
     omni_mode, timing_stats, prefill_start_time,
     is_main_image: bool = False  # 🔧 [高清+高刷] 标记是否为主图（决定是否使用高清切片）
 ):
@@ -1611,14 +1890,12 @@ async def _streaming_prefill_highfps_direct(
     - 主图到达：立即 prefill 主图（无音频），如果开启高清则 max_slice_nums=2
     - 音频+stack图到达：立即 prefill stack图+音频，max_slice_nums=1（不切片）
     """
-    global current_request_counter
-    
     # 增加请求计数
-    with session_lock:
-        cnt = current_request_counter
-        current_request_counter += 1
+    with session.lock:
+        cnt = session.request_counter
+        session.request_counter += 1
     
-    # 保存音频到临时文件
+    # 保存音频到暂存区
     t0 = time.time()
     temp_audio_path = ""
     if audio_np is not None and len(audio_np) > 0:
@@ -1628,20 +1905,16 @@ async def _streaming_prefill_highfps_direct(
             padding_len = MIN_AUDIO_SAMPLES - len(audio_np)
             audio_np = np.pad(audio_np, (0, padding_len), mode='constant', constant_values=0)
         
-        temp_audio_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{cnt}.wav")
-        audio_to_save = np.clip(audio_np, -1.0, 1.0).astype(np.float32)
-        sf.write(temp_audio_path, audio_to_save, 16000, format='WAV', subtype='PCM_16')
+        temp_audio_path = await stage_audio(audio_np, f"{session.session_id}_{cnt}")
     timing_stats['audio_save'] = (time.time() - t0) * 1000
     
-    # 保存图片到临时文件
+    # 保存图片到暂存区
     t0 = time.time()
     temp_image_paths = []
     
     if len(pil_images) > 0:
         for i, img in enumerate(pil_images):
-            img_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{cnt}_{i}.png")
-            img.save(img_path, format='PNG')
-            temp_image_paths.append(img_path)
+            temp_image_paths.append(await stage_image(img, f"{session.session_id}_{cnt}_{i}"))
     
     timing_stats['image_save'] = (time.time() - t0) * 1000
     
@@ -1652,47 +1925,51 @@ async def _streaming_prefill_highfps_direct(
     # 🔧 [高清+高刷] 根据 is_main_image 决定 max_slice_nums
     # 主图且高清开启：max_slice_nums=2（切片）
     # Stacked 图或普通模式：max_slice_nums=1（不切片）
-    if is_main_image and current_high_quality_mode:
+    if is_main_image and session.high_quality_mode:
         slice_nums = 2  # 主图使用高清切片
         slice_desc = "高清"
     else:
         slice_nums = 1  # Stacked 图不切片
         slice_desc = "普通"
     
-    if len(temp_image_paths) == 0:
-        # 只有音频，没有图片（不太可能在高刷模式下发生）
-        cpp_request = {
-            "audio_path_prefix": temp_audio_path,
-            "img_path_prefix": "",
-            "cnt": cnt
-        }
-        resp = await http_client.post(
-            f"{CPP_SERVER_URL}/v1/stream/prefill",
-            json=cpp_request,
-            timeout=30.0
-        )
-        cpp_success = (resp.status_code == 200)
-    else:
-        # 有图片：图片和音频一起发
-        for i, img_path in enumerate(temp_image_paths):
+    try:
+        if len(temp_image_paths) == 0:
+            # 只有音频，没有图片（不太可能在高刷模式下发生）
             cpp_request = {
-                "audio_path_prefix": temp_audio_path if i == 0 else "",
-                "img_path_prefix": img_path,
-                "cnt": cnt + i,
-                "max_slice_nums": slice_nums  # 🔧 [高清+高刷] 传入切片参数
+                "audio_path_prefix": temp_audio_path,
+                "img_path_prefix": "",
+                "cnt": cnt
             }
             resp = await http_client.post(
-                f"{CPP_SERVER_URL}/v1/stream/prefill",
+                f"{session.cpp_url}/v1/stream/prefill",
                 json=cpp_request,
                 timeout=30.0
             )
-            if resp.status_code != 200:
-                cpp_success = False
-                break
-        
-        # 更新 counter
-        with session_lock:
-            current_request_counter += len(temp_image_paths) - 1
+            cpp_success = (resp.status_code == 200)
+        else:
+            # 有图片：图片和音频一起发
+            for i, img_path in enumerate(temp_image_paths):
+                cpp_request = {
+                    "audio_path_prefix": temp_audio_path if i == 0 else "",
+                    "img_path_prefix": img_path,
+                    "cnt": cnt + i,
+                    "max_slice_nums": slice_nums  # 🔧 [高清+高刷] 传入切片参数
+                }
+                resp = await http_client.post(
+                    f"{session.cpp_url}/v1/stream/prefill",
+                    json=cpp_request,
+                    timeout=30.0
+                )
+                if resp.status_code != 200:
+                    cpp_success = False
+                    break
+            
+            # 更新 counter
+            with session.lock:
+                session.request_counter += len(temp_image_paths) - 1
+    finally:
+        # 🔧 释放暂存文件（C++ 已读取完毕或请求失败，都不再需要）
+        prefill_staging.release([temp_audio_path] + temp_image_paths)
     
     timing_stats['cpp_http'] = (time.time() - t0) * 1000
     
@@ -1709,19 +1986,9 @@ async def _streaming_prefill_highfps_direct(
     else:
         print(f"[Prefill #{cnt}] ✗ C++ prefill 失败 (status={resp.status_code if 'resp' in dir() else 'N/A'}) [高刷单工]", flush=True)
     
-    # 🔧 清理临时文件（C++ 已读取完毕，不再需要）
-    try:
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            os.remove(temp_audio_path)
-        for img_path in temp_image_paths:
-            if os.path.exists(img_path):
-                os.remove(img_path)
-    except Exception:
-        pass
-    
     return {
         "success": cpp_success,
-        "session_id": current_active_session_id,
+        "session_id": session.session_id,
         "cnt": cnt,
         "audio_duration_seconds": float(audio_duration),
         "timing": timing_stats,
@@ -1730,21 +1997,19 @@ async def _streaming_prefill_highfps_direct(
 
 
 async def _streaming_prefill_simplex(
-    request, audio_np, pil_images, sr, audio_duration,
+    session: SessionState, request, audio_np, pil_images, sr, audio_duration,
     omni_mode, timing_stats, prefill_start_time
 ):
     """普通单工模式的 streaming_prefill 实现：使用"延迟一拍"机制"""
-    global pending_prefill_data, current_request_counter
-    
     # 增加请求计数
-    with session_lock:
-        current_request_counter += 1
-        request_idx = current_request_counter
+    with session.lock:
+        session.request_counter += 1
+        request_idx = session.request_counter
     
     # 【延迟一拍】先处理上一次缓存的数据
     model_prefill_start = time.time()
-    if pending_prefill_data is not None:
-        prev_data = pending_prefill_data
+    if session.pending_prefill_data is not None:
+        prev_data = session.pending_prefill_data
         prev_images = prev_data.get("images", [])
         prev_audio = prev_data["audio_np"]
         has_prev_audio = prev_audio is not None and len(prev_audio) > 0
@@ -1755,51 +2020,51 @@ async def _streaming_prefill_simplex(
             prev_cnt = prev_data["cnt"]
             
             # 处理音频
+            t0 = time.time()
             temp_audio_path = ""
             if has_prev_audio:
-                temp_audio_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{prev_cnt}.wav")
-                audio_to_save = np.clip(prev_audio, -1.0, 1.0).astype(np.float32)
-                sf.write(temp_audio_path, audio_to_save, 16000, format='WAV', subtype='PCM_16')
+                temp_audio_path = await stage_audio(prev_audio, f"{session.session_id}_{prev_cnt}")
+            timing_stats['audio_save'] = (time.time() - t0) * 1000
             
             # 处理图片列表
+            t0 = time.time()
             temp_image_paths = []
             
             if has_prev_images:
-                if current_high_fps_mode and len(prev_images) > 1:
+                if session.high_fps_mode and len(prev_images) > 1:
                     main_image = prev_images[0]
                     rest_images = prev_images[1:]
                     
-                    main_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{prev_cnt}_main.png")
-                    main_image.save(main_path, format='PNG')
-                    temp_image_paths.append(main_path)
+                    temp_image_paths.append(await stage_image(main_image, f"{session.session_id}_{prev_cnt}_main"))
                     
                     if len(rest_images) > 0:
-                        stacked_image = stack_images(rest_images)
-                        stack_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{prev_cnt}_stack.png")
-                        stacked_image.save(stack_path, format='PNG')
-                        temp_image_paths.append(stack_path)
+                        stacked_image = await stack_images_async(rest_images)
+                        temp_image_paths.append(await stage_image(stacked_image, f"{session.session_id}_{prev_cnt}_stack"))
                 else:
                     for i, img in enumerate(prev_images):
-                        img_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{prev_cnt}_{i}.png")
-                        img.save(img_path, format='PNG')
-                        temp_image_paths.append(img_path)
+                        temp_image_paths.append(await stage_image(img, f"{session.session_id}_{prev_cnt}_{i}"))
+            timing_stats['image_save'] = (time.time() - t0) * 1000
             
             # 调用 C++ prefill
-            if len(temp_image_paths) == 0:
-                cpp_request = {
-                    "audio_path_prefix": temp_audio_path,
-                    "img_path_prefix": "",
-                    "cnt": prev_cnt
-                }
-                await http_client.post(f"{CPP_SERVER_URL}/v1/stream/prefill", json=cpp_request)
-            else:
-                for i, img_path in enumerate(temp_image_paths):
+            try:
+                if len(temp_image_paths) == 0:
                     cpp_request = {
-                        "audio_path_prefix": temp_audio_path if i == 0 else "",
-                        "img_path_prefix": img_path,
-                        "cnt": prev_cnt + i
+                        "audio_path_prefix": temp_audio_path,
+                        "img_path_prefix": "",
+                        "cnt": prev_cnt
                     }
-                    await http_client.post(f"{CPP_SERVER_URL}/v1/stream/prefill", json=cpp_request)
+                    await http_client.post(f"{session.cpp_url}/v1/stream/prefill", json=cpp_request)
+                else:
+                    for i, img_path in enumerate(temp_image_paths):
+                        cpp_request = {
+                            "audio_path_prefix": temp_audio_path if i == 0 else "",
+                            "img_path_prefix": img_path,
+                            "cnt": prev_cnt + i
+                        }
+                        await http_client.post(f"{session.cpp_url}/v1/stream/prefill", json=cpp_request)
+            finally:
+                # 释放暂存文件（C++ 已读取完毕）
+                prefill_staging.release([temp_audio_path] + temp_image_paths)
             
             print(f"[延迟一拍] 处理了上一次缓存的 prefill 数据 (cnt={prev_cnt}) [单工]", flush=True)
     else:
@@ -1809,7 +2074,7 @@ async def _streaming_prefill_simplex(
     current_cnt = request_idx - 1
     
     # 缓存当前数据
-    pending_prefill_data = {
+    session.pending_prefill_data = {
         "audio_np": audio_np,
         "images": pil_images,
         "omni_mode": omni_mode,
@@ -1823,15 +2088,18 @@ async def _streaming_prefill_simplex(
     
     model_prefill_time = (time.time() - model_prefill_start) * 1000
     total_prefill_time = (time.time() - prefill_start_time) * 1000
+    timing_stats['total'] = total_prefill_time
     
     return {
         "success": True,
-        "session_id": current_active_session_id,
+        "session_id": session.session_id,
         "request_idx": request_idx,
         "audio_duration_seconds": float(audio_duration),
         "timing": {
             "audio_decode_ms": round(timing_stats.get('audio_decode', 0), 1),
             "image_decode_ms": round(timing_stats.get('image_decode', 0), 1),
+            "audio_save_ms": round(timing_stats.get('audio_save', 0), 1),
+            "image_save_ms": round(timing_stats.get('image_save', 0), 1),
             "model_prefill_ms": round(model_prefill_time, 1),
             "total_ms": round(total_prefill_time, 1),
             "rtf": round(total_prefill_time / 1000 / audio_duration, 2) if audio_duration > 0 else None
@@ -1841,52 +2109,53 @@ async def _streaming_prefill_simplex(
 
 
 @app.post("/omni/streaming_generate")
-async def streaming_generate():
+async def streaming_generate(http_request: Request, request: Optional[StreamingGenerateRequest] = None):
     """流式生成
     
     根据 duplex_mode 使用不同的处理逻辑：
     - 单工模式：每个 round 有独立目录
     - 双工模式：全局 WAV 计数器，使用 SSE 流式读取
-    """
-    global pending_prefill_data, current_round_number, is_breaking
     
+    输出编码按 Accept 头协商（见 output_frames.py）：
+    - Accept 包含 application/x-minicpmo-frames：二进制长度前缀帧（PCM 不做 base64）
+    - 其他：SSE（旧客户端）
+    """
     # 🔧 [修复] 检查是否正在重启
     if cpp_restarting:
         raise HTTPException(status_code=503, detail="服务正在重启中，请稍后重试")
     
-    if not current_active_session_id:
-        raise HTTPException(
-            status_code=400,
-            detail="未找到活跃会话，请先调用 /omni/init_sys_prompt 初始化会话"
-        )
+    session = resolve_session(request.session_id if request else None)
+    if session.duplex_stream_active:
+        # 持久双工流打开期间由 bridge 自动 decode，再单独 generate 会与其争用同一个 C++ decode
+        raise HTTPException(status_code=409, detail=f"会话 {session.session_id} 已打开持久双工流，无需调用 streaming_generate")
+    encoder = negotiate_output_encoder(http_request.headers.get("accept"))
     
-    # 【重置 break 标志】开始新一轮生成时，重置 is_breaking
-    is_breaking = False
+    # 【重置 break 标志】开始新一轮生成时，重置 session.is_breaking
+    session.is_breaking = False
     
     generate_request_time = time.time()
-    print(f"[Generate] 开始生成 (Round #{current_round_number}, duplex_mode={current_duplex_mode})", flush=True)
+    print(f"[Generate] 开始生成 (session={session.session_id}, Round #{session.round_number}, duplex_mode={session.duplex_mode}, output={encoder.media_type})", flush=True)
     
     # 根据模式选择不同的实现
-    if current_duplex_mode:
-        return await _streaming_generate_duplex(generate_request_time)
+    if session.duplex_mode:
+        return await _streaming_generate_duplex(session, encoder, generate_request_time)
     else:
-        return await _streaming_generate_simplex(generate_request_time)
+        return await _streaming_generate_simplex(session, encoder, generate_request_time)
 
 
-async def _streaming_generate_simplex(generate_request_time):
+async def _streaming_generate_simplex(session: SessionState, encoder: OutputEncoder, generate_request_time):
     """单工模式的 streaming_generate 实现"""
-    global pending_prefill_data, current_round_number, is_breaking
     
     # 🔧 [诊断] 记录 generate 调用时的状态
-    has_pending = pending_prefill_data is not None
-    pending_cnt = pending_prefill_data.get("cnt", -1) if has_pending else -1
-    print(f"[streaming_generate] 开始, pending_data={has_pending}, pending_cnt={pending_cnt}, round={current_round_number} [单工]", flush=True)
+    has_pending = session.pending_prefill_data is not None
+    pending_cnt = session.pending_prefill_data.get("cnt", -1) if has_pending else -1
+    print(f"[streaming_generate] 开始, pending_data={has_pending}, pending_cnt={pending_cnt}, round={session.round_number} [单工]", flush=True)
     
     # 【延迟一拍】处理缓存的最后一片数据
-    if pending_prefill_data is not None:
+    if session.pending_prefill_data is not None:
         try:
             print("[streaming_generate] 处理缓存的最后一片数据 (is_last_chunk=True)... [单工]", flush=True)
-            last_data = pending_prefill_data
+            last_data = session.pending_prefill_data
             
             audio_np = last_data["audio_np"]
             if audio_np is not None and len(audio_np) > 0:
@@ -1898,15 +2167,12 @@ async def _streaming_generate_simplex(generate_request_time):
                     print(f"[音频Padding] {original_len} -> {MIN_AUDIO_SAMPLES} samples", flush=True)
                 
                 last_cnt = last_data["cnt"]
-                temp_audio_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{last_cnt}.wav")
-                audio_to_save = np.clip(audio_np, -1.0, 1.0).astype(np.float32)
-                sf.write(temp_audio_path, audio_to_save, 16000, format='WAV', subtype='PCM_16')
+                temp_audio_path = await stage_audio(audio_np, f"{session.session_id}_{last_cnt}")
                 
                 temp_image_path = ""
                 images = last_data.get("images", [])
                 if len(images) > 0:
-                    temp_image_path = os.path.join(TEMP_DIR, f"prefill_{current_active_session_id}_{last_cnt}.png")
-                    images[0].save(temp_image_path, format='PNG')
+                    temp_image_path = await stage_image(images[0], f"{session.session_id}_{last_cnt}")
                 
                 cpp_request = {
                     "audio_path_prefix": temp_audio_path,
@@ -1914,135 +2180,149 @@ async def _streaming_generate_simplex(generate_request_time):
                     "cnt": last_cnt
                 }
                 
-                resp = await http_client.post(
-                    f"{CPP_SERVER_URL}/v1/stream/prefill",
-                    json=cpp_request
-                )
+                try:
+                    resp = await http_client.post(
+                        f"{session.cpp_url}/v1/stream/prefill",
+                        json=cpp_request
+                    )
+                finally:
+                    prefill_staging.release([temp_audio_path, temp_image_path])
                 
                 if resp.status_code != 200:
                     print(f"C++ 最后一片 prefill 失败: {resp.text}", flush=True)
                 else:
                     print(f"[streaming_generate] 最后一片 prefill 成功 (cnt={last_cnt}) [单工]", flush=True)
             
-            pending_prefill_data = None
+            session.pending_prefill_data = None
             print("[streaming_generate] 最后一片已处理 [单工]", flush=True)
             
         except Exception as e:
             print(f"[streaming_generate] 处理最后一片失败: {e}", flush=True)
-            pending_prefill_data = None
+            session.pending_prefill_data = None
     
     # 输出目录（单工模式：每个 round 有独立目录）
-    output_dir = os.path.join(TEMP_DIR, f"session_{current_active_session_id}", f"round_{current_round_number:04d}", "output")
+    output_dir = session.round_output_dir()
     os.makedirs(output_dir, exist_ok=True)
     
     async def generate_stream():
-        global current_round_number
-        import re
         
         generate_start_time = time.time()
         first_chunk_time = None
         first_text_time = None
         chunk_durations = []
         sent_chunk_count = 0
+        last_send_time = None
         last_text_len = 0
-        sr = 24000
-        
-        def sort_wav_files(files):
-            def extract_num(f):
-                match = re.search(r'wav_(\d+)\.wav', f)
-                return int(match.group(1)) if match else 0
-            return sorted(files, key=extract_num)
+        metrics.GENERATE_REQUESTS.inc(mode=session.metrics_mode)
         
         try:
             cpp_request = {
                 "debug_dir": output_dir,
                 "stream": True,
-                "round_idx": current_round_number
+                "round_idx": session.round_number
             }
             
             print(f"[streaming_generate] 调用 C++ decode: {json.dumps(cpp_request)} [单工]", flush=True)
             
             decode_task = asyncio.create_task(
                 http_client.post(
-                    f"{CPP_SERVER_URL}/v1/stream/decode",
+                    f"{session.cpp_url}/v1/stream/decode",
                     json=cpp_request,
                     timeout=600.0
                 )
             )
             
-            cpp_output_base = CPP_OUTPUT_DIR
-            round_dir = os.path.join(cpp_output_base, f"round_{current_round_number:03d}")
+            cpp_output_base = session.output_dir
+            round_dir = os.path.join(cpp_output_base, f"round_{session.round_number:03d}")
             tts_wav_dir = os.path.join(round_dir, "tts_wav")
             llm_debug_dir = os.path.join(round_dir, "llm_debug")
             
-            print(f"[streaming_generate] 当前轮次: {current_round_number} [单工]", flush=True)
+            print(f"[streaming_generate] 当前轮次: {session.round_number} [单工]", flush=True)
             print(f"  WAV 目录: {tts_wav_dir}", flush=True)
             
             max_wait = 1800
-            check_interval = 0.01
-            no_new_wav_count = 0
-            max_no_new_wav = 1000
+            # decode 完成后：一直没有 wav 输出 / 最后一次发送后再无新 wav 的超时时间
+            max_no_wav_wait = 10.0
+            max_idle_wait = 300.0
             decode_done = False
             chunk_texts = {}
             all_generated_text = []
             existing_wav_files = set()
             sent_wav_files = set()
             llm_chunk_idx = 0
-            
+            done_last_wav_file = None
+
             if os.path.exists(tts_wav_dir):
-                existing_wav_files = set(f for f in os.listdir(tts_wav_dir) if f.startswith("wav_") and f.endswith(".wav"))
+                existing_wav_files = set(f for f in os.listdir(tts_wav_dir) if parse_wav_index(f) is not None)
+
+            # 🔧 [事件驱动] 监听 tts_wav 目录（目录可能尚未创建，watcher 会等待其出现）
+            watcher = await open_output_watcher(
+                tts_wav_dir, skip_names=existing_wav_files,
+                backend=WAV_WATCHER_BACKEND, poll_interval=0.01
+            )
+            print(f"  WAV 监听: {watcher.backend}", flush=True)
+
+            # 每个 chunk 的文本文件一个增量读取器：文件尚未写完时，下次只读取新增部分
+            chunk_text_readers = {}
             
             def read_chunk_text(llm_debug_dir, chunk_idx):
-                chunk_dir = os.path.join(llm_debug_dir, f"chunk_{chunk_idx}")
-                text_file = os.path.join(chunk_dir, "llm_text.txt")
-                if os.path.exists(text_file):
-                    try:
-                        with open(text_file, 'r', encoding='utf-8', errors='ignore') as f:
-                            return f.read().strip()
-                    except:
-                        pass
-                return ""
+                reader = chunk_text_readers.get(chunk_idx)
+                if reader is None:
+                    reader = TailReader(os.path.join(llm_debug_dir, f"chunk_{chunk_idx}", LLM_TEXT_NAME))
+                    chunk_text_readers[chunk_idx] = reader
+                try:
+                    return "\n".join(reader.read_lines(include_partial=True)).strip()
+                except Exception:
+                    return ""
             
-            for _ in range(int(max_wait / check_interval)):
-                await asyncio.sleep(check_interval)
-                
-                if is_breaking:
-                    print(f"[streaming_generate] 检测到 break 标志，停止发送数据 [单工]", flush=True)
-                    yield f"data: {json.dumps({'break': True, 'done': True, 'message': '用户打断'}, ensure_ascii=False)}\n\n"
-                    break
-                
-                if decode_task.done() and not decode_done:
-                    decode_done = True
-                    try:
-                        resp = decode_task.result()
-                        if resp.status_code != 200:
-                            print(f"[streaming_generate] C++ decode 返回错误: {resp.text}", flush=True)
-                        else:
-                            print(f"[streaming_generate] C++ decode 完成 [单工]", flush=True)
-                    except Exception as e:
-                        print(f"[streaming_generate] C++ decode 异常: {e}", flush=True)
-                
-                if os.path.exists(tts_wav_dir):
-                    wav_files = [f for f in os.listdir(tts_wav_dir) if f.startswith("wav_") and f.endswith(".wav")]
-                    wav_files = sort_wav_files(wav_files)
+            wait_start = time.time()
+            last_activity_time = wait_start
+            try:
+                while (time.time() - wait_start) < max_wait:
+                    # 有事件立即返回；没有事件时最多等待 WATCHER_WAKEUP_INTERVAL，用于检查 break/超时
+                    event = await watcher.get(timeout=WATCHER_WAKEUP_INTERVAL)
                     
-                    new_wav_files = [f for f in wav_files if f not in existing_wav_files and f not in sent_wav_files]
+                    if session.is_breaking:
+                        print(f"[streaming_generate] 检测到 break 标志，停止发送数据 [单工]", flush=True)
+                        yield encoder.event({'break': True, 'done': True, 'message': '用户打断'})
+                        break
                     
-                    for wav_file in new_wav_files:
-                        wav_path = os.path.join(tts_wav_dir, wav_file)
-                        
-                        if not os.path.exists(wav_path):
-                            await asyncio.sleep(0.05)
-                            if not os.path.exists(wav_path):
-                                continue
-                        
-                        match = re.search(r'wav_(\d+)\.wav', wav_file)
-                        chunk_idx = int(match.group(1)) if match else sent_chunk_count
+                    if decode_task.done() and not decode_done:
+                        decode_done = True
+                        try:
+                            resp = decode_task.result()
+                            if resp.status_code != 200:
+                                print(f"[streaming_generate] C++ decode 返回错误: {resp.text}", flush=True)
+                            else:
+                                print(f"[streaming_generate] C++ decode 完成 [单工]", flush=True)
+                        except Exception as e:
+                            print(f"[streaming_generate] C++ decode 异常: {e}", flush=True)
+                    
+                    if event is None:
+                        idle_time = time.time() - last_activity_time
+                        if decode_done and sent_chunk_count == 0 and idle_time >= max_no_wav_wait:
+                            print(f"[streaming_generate] decode完成但无wav输出，超时退出 [单工]", flush=True)
+                            break
+                        if decode_done and idle_time >= max_idle_wait:
+                            print(f"[streaming_generate] 超时退出 [单工]", flush=True)
+                            break
+                        continue
+                    
+                    if event.kind == EVENT_DONE:
+                        # 检查结束标记
+                        try:
+                            with open(event.path, 'r') as f:
+                                done_last_wav_file = f"wav_{int(f.read().strip())}.wav"
+                        except:
+                            pass
+                    elif event.kind == EVENT_WAV:
+                        wav_file = event.name
+                        wav_path = event.path
+                        chunk_idx = event.index
+                        last_activity_time = time.time()
                         
                         try:
-                            await asyncio.sleep(0.01)
-                            
-                            audio_data, audio_sr = sf.read(wav_path)
+                            audio_data, audio_sr = await media_executor.run("read_tts_wav", read_tts_wav, wav_path, cpu_bound=False)
                             
                             if len(audio_data) == 0:
                                 sent_wav_files.add(wav_file)
@@ -2050,12 +2330,9 @@ async def _streaming_generate_simplex(generate_request_time):
                             
                             if first_chunk_time is None:
                                 first_chunk_time = (time.time() - generate_start_time) * 1000
+                                metrics.GENERATE_TTFA_MS.observe(first_chunk_time, mode=session.metrics_mode)
                                 print(f"[⏱️ Generate 音频首响] {first_chunk_time:.1f}ms [单工]", flush=True)
                             
-                            if audio_data.dtype != np.int16:
-                                audio_data = (audio_data * 32767).astype(np.int16)
-                            wav_base64 = base64.b64encode(audio_data.tobytes()).decode('utf-8')
-                            
                             chunk_duration = len(audio_data) / audio_sr
                             chunk_durations.append(chunk_duration)
                             
@@ -2067,61 +2344,39 @@ async def _streaming_generate_simplex(generate_request_time):
                                     llm_chunk_idx += 1
                                     if first_text_time is None:
                                         first_text_time = (time.time() - generate_start_time) * 1000
+                                        metrics.GENERATE_TTFT_MS.observe(first_text_time, mode=session.metrics_mode)
                                         print(f"[⏱️ Generate 文本首响] {first_text_time:.1f}ms [单工]", flush=True)
                             
-                            chunk_data = {
-                                "chunk_idx": sent_chunk_count,
-                                "chunk_data": {
-                                    "wav": wav_base64,
-                                    "sample_rate": int(audio_sr)
-                                }
-                            }
-                            
                             if chunk_idx in chunk_texts:
-                                chunk_data["chunk_data"]["text"] = chunk_texts[chunk_idx]
                                 last_text_len += len(chunk_texts[chunk_idx])
                                 print(f"[Chunk #{chunk_idx}] 发送 {wav_file} ({chunk_duration:.3f}s) + 文本 [单工]", flush=True)
                             else:
                                 print(f"[Chunk #{chunk_idx}] 发送 {wav_file} ({chunk_duration:.3f}s) [单工]", flush=True)
                             
-                            yield f"data: {json.dumps(chunk_data, ensure_ascii=False)}\n\n"
+                            send_time = time.time()
+                            try:
+                                wav_mtime = os.path.getmtime(wav_path)
+                            except OSError:
+                                wav_mtime = None
+                            metrics.observe_wav_send(session.metrics_mode, send_time, wav_mtime, last_send_time)
+                            last_send_time = send_time
+                            
+                            yield encoder.audio(sent_chunk_count, audio_data, audio_sr, chunk_texts.get(chunk_idx))
                             
                             sent_wav_files.add(wav_file)
                             sent_chunk_count += 1
                             
-                        except FileNotFoundError:
-                            print(f"[Chunk #{chunk_idx}] 文件尚未就绪，稍后重试 [单工]", flush=True)
                         except Exception as e:
                             print(f"[Chunk #{chunk_idx}] 读取失败: {e} [单工]", flush=True)
                             sent_wav_files.add(wav_file)
                     
-                    # 检查结束标记
-                    done_flag_path = os.path.join(tts_wav_dir, "generation_done.flag")
-                    if os.path.exists(done_flag_path):
-                        try:
-                            with open(done_flag_path, 'r') as f:
-                                last_wav_idx = int(f.read().strip())
-                            last_wav_file = f"wav_{last_wav_idx}.wav"
-                            if last_wav_file in sent_wav_files or last_wav_file in existing_wav_files:
-                                print(f"[streaming_generate] 所有 wav 已发送，立即结束 [单工]", flush=True)
-                                break
-                        except:
-                            pass
-                    
-                    current_new_count = len([f for f in wav_files if f not in existing_wav_files])
-                    if current_new_count == len(sent_wav_files):
-                        no_new_wav_count += 1
-                        if decode_done and no_new_wav_count >= 30000:
-                            print(f"[streaming_generate] 超时退出 [单工]", flush=True)
-                            break
-                    else:
-                        no_new_wav_count = 0
-                
-                if decode_done and sent_chunk_count == 0:
-                    no_new_wav_count += 1
-                    if no_new_wav_count >= max_no_new_wav:
-                        print(f"[streaming_generate] decode完成但无wav输出，超时退出 [单工]", flush=True)
+                    if done_last_wav_file is not None and (
+                        done_last_wav_file in sent_wav_files or done_last_wav_file in existing_wav_files
+                    ):
+                        print(f"[streaming_generate] 所有 wav 已发送，立即结束 [单工]", flush=True)
                         break
+            finally:
+                watcher.close()
             
             if not decode_task.done():
                 print("[streaming_generate] 等待 C++ decode 完成... [单工]", flush=True)
@@ -2137,6 +2392,7 @@ async def _streaming_generate_simplex(generate_request_time):
             total_generate_time = (time.time() - generate_start_time) * 1000
             total_audio_duration = sum(chunk_durations) if chunk_durations else 0
             overall_rtf = total_generate_time / 1000 / total_audio_duration if total_audio_duration > 0 else 0
+            metrics.observe_generate_summary(session.metrics_mode, total_generate_time, total_audio_duration)
             
             print(f"\n{'='*60}", flush=True)
             print(f"[⏱️ Generate 性能总结] [单工]", flush=True)
@@ -2151,14 +2407,13 @@ async def _streaming_generate_simplex(generate_request_time):
             import traceback
             error_detail = traceback.format_exc()
             print(f"[streaming_generate] 异常: {e}\n{error_detail} [单工]", flush=True)
-            yield f"data: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+            yield encoder.event({'error': str(e)})
         
-        with session_lock:
-            current_round_number += 1
+        with session.lock:
+            session.round_number += 1
             # 🔧 [修复多轮 user prompt] 每轮结束后重置 prefill 计数器
             # 这样下一轮的 prefill 会从 cnt=0 开始，C++ 端能正确识别新一轮的开始
-            global current_request_counter
-            current_request_counter = 0
+            session.request_counter = 0
         
         # 推理结束后，在后台检查显存并在需要时重启
         def background_memory_check():
@@ -2168,11 +2423,11 @@ async def _streaming_generate_simplex(generate_request_time):
         
         threading.Thread(target=background_memory_check, daemon=True).start()
         
-        yield f"data: {json.dumps({'done': True}, ensure_ascii=False)}\n\n"
+        yield encoder.event({'done': True})
     
     return StreamingResponse(
         generate_stream(),
-        media_type="text/event-stream",
+        media_type=encoder.media_type,
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
@@ -2181,21 +2436,127 @@ async def _streaming_generate_simplex(generate_request_time):
     )
 
 
-async def _streaming_generate_duplex(generate_request_time):
+def schedule_gpu_memory_check(tag: str):
+    """推理结束后在后台检查显存，需要时触发重启"""
+    def background_memory_check():
+        time.sleep(1.0)  # 等待一会儿让当前请求完全结束
+        if check_gpu_memory_and_restart_if_needed():
+            print(f"[{tag}] 显存不足，已在后台触发重启", flush=True)
+    
+    threading.Thread(target=background_memory_check, daemon=True).start()
+
+
+async def run_duplex_wav_scanner(session: SessionState, stop_event: asyncio.Event, on_texts, on_wav,
+                                 scan_interval: float = 0.05):
+    """监听双工输出目录，按顺序读取 C++ 写出的 WAV 分片并与 llm_text.txt 中的文本配对
+    
+    streaming_generate（每次请求一个）和 /omni/duplex_stream（每个会话一个）共用：
+    - on_texts(new_texts)：llm_text.txt 解析出新文本时调用
+    - await on_wav(wav_file, audio_data, audio_sr, chunk_text, write_to_send_delay_ms)：每个非空 WAV 分片调用一次
+    WAV 发送指标和时序日志在这里统一记录。
+    """
+    tts_wav_dir = os.path.join(session.output_dir, "tts_wav")
+    llm_debug_dir = os.path.join(session.output_dir, "llm_debug")
+    # 🔧 [增量读取] 只读取 llm_text.txt 新追加的完整行（记录字节偏移，不再每次 readlines 整个文件）
+    llm_text_reader = session.get_llm_text_reader(os.path.join(llm_debug_dir, LLM_TEXT_NAME))
+    
+    def consume_new_texts():
+        new_texts = []
+        try:
+            for line in llm_text_reader.read_lines():
+                line = line.strip()
+                if not line:
+                    continue
+                match = LLM_CHUNK_LINE_RE.match(line)
+                text = match.group(1).strip() if match else line
+                if text:
+                    session.parsed_texts.append(text)
+                    new_texts.append(text)
+        except Exception as e:
+            print(f"[Parse LLM Text] 解析失败: {e} [双工]", flush=True)
+        if new_texts:
+            on_texts(new_texts)
+    
+    # 🔧 [事件驱动] 由 watcher 推送 wav/llm_text 变化，不再每 50ms 重新 listdir
+    watcher = await open_output_watcher(
+        tts_wav_dir, llm_debug_dir, skip_names=session.sent_wav_files,
+        backend=WAV_WATCHER_BACKEND, poll_interval=scan_interval
+    )
+    print(f"  WAV 监听: {watcher.backend}", flush=True)
+    
+    try:
+        while not stop_event.is_set():
+            try:
+                event = await watcher.get(timeout=scan_interval)
+                if event is None:
+                    continue
+                
+                if event.kind == EVENT_TEXT:
+                    consume_new_texts()
+                    continue
+                if event.kind != EVENT_WAV:
+                    continue
+                
+                wav_file = event.name
+                if wav_file in session.sent_wav_files:
+                    continue
+                session.sent_wav_files.add(wav_file)
+                
+                # 先解析文本，保证 wav 与文本的配对顺序与旧的扫描逻辑一致
+                consume_new_texts()
+                
+                try:
+                    file_mtime = os.path.getmtime(event.path)
+                    cpp_write_time = datetime.fromtimestamp(file_mtime)
+                    
+                    audio_data, audio_sr = await media_executor.run("read_tts_wav", read_tts_wav, event.path, cpu_bound=False)
+                    
+                    if len(audio_data) == 0:
+                        continue
+                    
+                    chunk_duration = len(audio_data) / audio_sr
+                    chunk_text = ""
+                    if session.text_send_idx < len(session.parsed_texts):
+                        chunk_text = session.parsed_texts[session.text_send_idx]
+                        session.text_send_idx += 1
+                    
+                    send_time = time.time()
+                    send_datetime = datetime.fromtimestamp(send_time)
+                    write_to_send_delay_ms = (send_time - file_mtime) * 1000
+                    interval_from_last_ms = (send_time - session.last_wav_send_time) * 1000 if session.last_wav_send_time else 0
+                    metrics.observe_wav_send(session.metrics_mode, send_time, file_mtime, session.last_wav_send_time)
+                    session.last_wav_send_time = send_time
+                    
+                    timing_log = session.open_timing_log(WAV_TIMING_LOG_PATH)
+                    timing_log.write(
+                        f"{wav_file:<20} "
+                        f"{cpp_write_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:23]:<26} "
+                        f"{send_datetime.strftime('%Y-%m-%d %H:%M:%S.%f')[:23]:<26} "
+                        f"{write_to_send_delay_ms:>10.1f}ms    "
+                        f"{interval_from_last_ms:>10.1f}ms    "
+                        f"{chunk_duration:>6.3f}s\n"
+                    )
+                    timing_log.flush()
+                    
+                    await on_wav(wav_file, audio_data, audio_sr, chunk_text, write_to_send_delay_ms)
+                    
+                except Exception as e:
+                    print(f"[WAV #{event.index}] 读取失败: {e} [双工]", flush=True)
+                
+            except Exception as e:
+                print(f"[WAV Scanner] 异常: {e} [双工]", flush=True)
+                await asyncio.sleep(scan_interval)
+    finally:
+        watcher.close()
+
+
+async def _streaming_generate_duplex(session: SessionState, encoder: OutputEncoder, generate_request_time):
     """双工模式的 streaming_generate 实现"""
-    global current_round_number, is_breaking
-    global global_sent_wav_count, global_parsed_line_count, global_parsed_texts, global_text_send_idx, global_sent_wav_files
-    global wav_timing_log_file, last_wav_send_time
     
-    output_dir = os.path.join(TEMP_DIR, f"session_{current_active_session_id}", f"round_{current_round_number:04d}", "output")
+    output_dir = session.round_output_dir()
     os.makedirs(output_dir, exist_ok=True)
     
     async def generate_stream():
-        global current_round_number, global_sent_wav_count, global_parsed_line_count
-        global global_parsed_texts, global_text_send_idx, is_breaking, global_sent_wav_files
-        global wav_timing_log_file, last_wav_send_time
-        import re
-        
         generate_start_time = time.time()
         setup_time = (generate_start_time - generate_request_time) * 1000
         if setup_time > 10:
@@ -2203,15 +2564,10 @@ async def _streaming_generate_duplex(generate_request_time):
         first_chunk_time = None
         first_text_time = None
         chunk_durations = []
-        sent_chunk_count = global_sent_wav_count
+        sent_chunk_count = session.sent_wav_count
         last_text_len = 0
         is_listen = True
-        
-        def sort_wav_files(files):
-            def extract_num(f):
-                match = re.search(r'wav_(\d+)\.wav', f)
-                return int(match.group(1)) if match else 0
-            return sorted(files, key=extract_num)
+        metrics.GENERATE_REQUESTS.inc(mode=session.metrics_mode)
         
         try:
             cpp_request = {
@@ -2222,160 +2578,44 @@ async def _streaming_generate_duplex(generate_request_time):
             print(f"[streaming_generate] 调用 C++ decode: {json.dumps(cpp_request)} [双工]", flush=True)
             
             # 🔧 [多实例支持] 使用配置的输出目录
-            cpp_output_base = CPP_OUTPUT_DIR
+            cpp_output_base = session.output_dir
             tts_wav_dir = os.path.join(cpp_output_base, "tts_wav")
-            llm_debug_dir = os.path.join(cpp_output_base, "llm_debug")
             
             all_generated_text = []
             end_of_turn = False
             
-            def parse_llm_text_file():
-                global global_parsed_line_count, global_parsed_texts
-                text_file = os.path.join(llm_debug_dir, "llm_text.txt")
-                new_count = 0
-                if os.path.exists(text_file):
-                    try:
-                        with open(text_file, 'r', encoding='utf-8', errors='ignore') as f:
-                            lines = f.readlines()
-                        
-                        for line in lines[global_parsed_line_count:]:
-                            line = line.strip()
-                            if not line:
-                                continue
-                            match = re.match(r'\[chunk_\d+\]\s*(.*)', line)
-                            if match:
-                                text = match.group(1).strip()
-                                if text:
-                                    global_parsed_texts.append(text)
-                                    new_count += 1
-                            else:
-                                global_parsed_texts.append(line)
-                                new_count += 1
-                        
-                        global_parsed_line_count = len(lines)
-                    except Exception as e:
-                        print(f"[Parse LLM Text] 解析失败: {e} [双工]", flush=True)
-                return new_count
-            
-            def init_wav_timing_log():
-                global wav_timing_log_file
-                if wav_timing_log_file is None:
-                    wav_timing_log_file = open(WAV_TIMING_LOG_PATH, 'a', encoding='utf-8')
-                    wav_timing_log_file.write(f"\n{'='*80}\n")
-                    wav_timing_log_file.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}] 新会话开始 (双工模式)\n")
-                    wav_timing_log_file.write(f"{'='*80}\n")
-                    wav_timing_log_file.flush()
-            
             print(f"[streaming_generate] 开始监控 [双工]:", flush=True)
             print(f"  WAV目录: {tts_wav_dir}", flush=True)
             
             wav_queue = asyncio.Queue()
             stop_wav_scanner = asyncio.Event()
             
+            def on_texts(new_texts):
+                nonlocal first_text_time
+                all_generated_text.extend(new_texts)
+                if first_text_time is None:
+                    first_text_time = (time.time() - generate_start_time) * 1000
+                    metrics.GENERATE_TTFT_MS.observe(first_text_time, mode=session.metrics_mode)
+                    print(f"[⏱️ Generate 文本首响] {first_text_time:.1f}ms [双工]", flush=True)
+            
+            async def on_wav(wav_file, audio_data, audio_sr, chunk_text, write_to_send_delay_ms):
+                nonlocal sent_chunk_count, first_chunk_time, last_text_len
+                if first_chunk_time is None:
+                    first_chunk_time = (time.time() - generate_start_time) * 1000
+                    metrics.GENERATE_TTFA_MS.observe(first_chunk_time, mode=session.metrics_mode)
+                    print(f"[⏱️ Generate 音频首响] {first_chunk_time:.1f}ms [双工]", flush=True)
+                chunk_duration = len(audio_data) / audio_sr
+                chunk_durations.append(chunk_duration)
+                if chunk_text:
+                    last_text_len += len(chunk_text)
+                    print(f"[WAV #{sent_chunk_count}] 发送 {wav_file} ({chunk_duration:.3f}s) + 文本 | 延迟:{write_to_send_delay_ms:.0f}ms [双工]", flush=True)
+                else:
+                    print(f"[WAV #{sent_chunk_count}] 发送 {wav_file} ({chunk_duration:.3f}s) | 延迟:{write_to_send_delay_ms:.0f}ms [双工]", flush=True)
+                await wav_queue.put(encoder.audio(sent_chunk_count, audio_data, audio_sr, chunk_text))
+                sent_chunk_count += 1
+            
             async def wav_scanner_coroutine():
-                global last_wav_send_time, wav_timing_log_file, global_parsed_texts, global_text_send_idx, global_sent_wav_files
-                nonlocal sent_chunk_count, first_chunk_time, first_text_time, last_text_len
-                scan_interval = 0.05
-                
-                while not stop_wav_scanner.is_set():
-                    try:
-                        if not os.path.exists(tts_wav_dir):
-                            await asyncio.sleep(scan_interval)
-                            continue
-                        
-                        new_count = parse_llm_text_file()
-                        if new_count > 0:
-                            new_texts = global_parsed_texts[-new_count:]
-                            all_generated_text.extend(new_texts)
-                            if first_text_time is None and global_parsed_texts:
-                                first_text_time = (time.time() - generate_start_time) * 1000
-                                print(f"[⏱️ Generate 文本首响] {first_text_time:.1f}ms [双工]", flush=True)
-                        
-                        wav_files = [f for f in os.listdir(tts_wav_dir) if f.startswith("wav_") and f.endswith(".wav")]
-                        wav_files = sort_wav_files(wav_files)
-                        
-                        new_wav_files = [f for f in wav_files if f not in global_sent_wav_files]
-                        
-                        for wav_file in new_wav_files:
-                            if wav_file in global_sent_wav_files:
-                                continue
-                            global_sent_wav_files.add(wav_file)
-                            
-                            wav_path = os.path.join(tts_wav_dir, wav_file)
-                            match = re.search(r'wav_(\d+)\.wav', wav_file)
-                            wav_idx = int(match.group(1)) if match else sent_chunk_count
-                            
-                            try:
-                                await asyncio.sleep(0.02)
-                                
-                                file_mtime = os.path.getmtime(wav_path)
-                                cpp_write_time = datetime.fromtimestamp(file_mtime)
-                                
-                                audio_data, audio_sr = sf.read(wav_path)
-                                
-                                if len(audio_data) == 0:
-                                    continue
-                                
-                                if first_chunk_time is None:
-                                    first_chunk_time = (time.time() - generate_start_time) * 1000
-                                    print(f"[⏱️ Generate 音频首响] {first_chunk_time:.1f}ms [双工]", flush=True)
-                                
-                                if audio_data.dtype != np.int16:
-                                    audio_data = (audio_data * 32767).astype(np.int16)
-                                wav_base64 = base64.b64encode(audio_data.tobytes()).decode('utf-8')
-                                
-                                chunk_duration = len(audio_data) / audio_sr
-                                chunk_durations.append(chunk_duration)
-                                
-                                chunk_text = ""
-                                if global_text_send_idx < len(global_parsed_texts):
-                                    chunk_text = global_parsed_texts[global_text_send_idx]
-                                    global_text_send_idx += 1
-                                
-                                chunk_data = {
-                                    "chunk_idx": sent_chunk_count,
-                                    "chunk_data": {
-                                        "wav": wav_base64,
-                                        "sample_rate": int(audio_sr)
-                                    }
-                                }
-                                
-                                send_time = time.time()
-                                send_datetime = datetime.fromtimestamp(send_time)
-                                write_to_send_delay_ms = (send_time - file_mtime) * 1000
-                                interval_from_last_ms = (send_time - last_wav_send_time) * 1000 if last_wav_send_time else 0
-                                last_wav_send_time = send_time
-                                
-                                init_wav_timing_log()
-                                wav_timing_log_file.write(
-                                    f"{wav_file:<20} "
-                                    f"{cpp_write_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:23]:<26} "
-                                    f"{send_datetime.strftime('%Y-%m-%d %H:%M:%S.%f')[:23]:<26} "
-                                    f"{write_to_send_delay_ms:>10.1f}ms    "
-                                    f"{interval_from_last_ms:>10.1f}ms    "
-                                    f"{chunk_duration:>6.3f}s\n"
-                                )
-                                wav_timing_log_file.flush()
-                                
-                                if chunk_text:
-                                    chunk_data["chunk_data"]["text"] = chunk_text
-                                    last_text_len += len(chunk_text)
-                                    print(f"[WAV #{sent_chunk_count}] 发送 {wav_file} ({chunk_duration:.3f}s) + 文本 | 延迟:{write_to_send_delay_ms:.0f}ms [双工]", flush=True)
-                                else:
-                                    print(f"[WAV #{sent_chunk_count}] 发送 {wav_file} ({chunk_duration:.3f}s) | 延迟:{write_to_send_delay_ms:.0f}ms [双工]", flush=True)
-                                
-                                await wav_queue.put(f"data: {json.dumps(chunk_data, ensure_ascii=False)}\n\n")
-                                sent_chunk_count += 1
-                                
-                            except Exception as e:
-                                print(f"[WAV #{wav_idx}] 读取失败: {e} [双工]", flush=True)
-                        
-                        await asyncio.sleep(scan_interval)
-                        
-                    except Exception as e:
-                        print(f"[WAV Scanner] 异常: {e} [双工]", flush=True)
-                        await asyncio.sleep(scan_interval)
-                
+                await run_duplex_wav_scanner(session, stop_wav_scanner, on_texts, on_wav)
                 print(f"[WAV Scanner] 停止，已发送 {sent_chunk_count} chunks [双工]", flush=True)
             
             wav_scanner_task = asyncio.create_task(wav_scanner_coroutine())
@@ -2383,20 +2623,22 @@ async def _streaming_generate_duplex(generate_request_time):
             http_start = time.time()
             async with http_client.stream(
                 "POST",
-                f"{CPP_SERVER_URL}/v1/stream/decode",
+                f"{session.cpp_url}/v1/stream/decode",
                 json=cpp_request,
                 timeout=600.0
             ) as response:
                 http_connect_time = (time.time() - http_start) * 1000
                 if http_connect_time > 50:
                     print(f"[Generate] ⚠️ HTTP连接延迟: {http_connect_time:.0f}ms [双工]", flush=True)
+                metrics.GENERATE_SETUP_MS.observe(
+                    (time.time() - generate_request_time) * 1000, mode=session.metrics_mode, path="request")
                 
                 if response.status_code != 200:
                     error_text = await response.aread()
                     print(f"[streaming_generate] C++ decode 错误: {error_text.decode()} [双工]", flush=True)
                     stop_wav_scanner.set()
                     wav_scanner_task.cancel()
-                    yield f"data: {json.dumps({'error': 'decode failed'}, ensure_ascii=False)}\n\n"
+                    yield encoder.event({'error': 'decode failed'})
                     return
                 
                 buffer = ""
@@ -2405,9 +2647,9 @@ async def _streaming_generate_duplex(generate_request_time):
                 sse_iterator = response.aiter_text().__aiter__()
                 
                 while not should_exit:
-                    if is_breaking:
+                    if session.is_breaking:
                         print(f"[streaming_generate] 检测到 break 标志，停止发送数据 [双工]", flush=True)
-                        yield f"data: {json.dumps({'break': True, 'done': True, 'message': '用户打断'}, ensure_ascii=False)}\n\n"
+                        yield encoder.event({'break': True, 'done': True, 'message': '用户打断'})
                         should_exit = True
                         break
                     
@@ -2454,6 +2696,7 @@ async def _streaming_generate_duplex(generate_request_time):
                                             all_generated_text.append(event_data['text'])
                                             if first_text_time is None:
                                                 first_text_time = (time.time() - generate_start_time) * 1000
+                                                metrics.GENERATE_TTFT_MS.observe(first_text_time, mode=session.metrics_mode)
                                                 print(f"[streaming_generate] 文本首响: {first_text_time:.1f}ms [双工]", flush=True)
                                         
                                     except json.JSONDecodeError:
@@ -2488,7 +2731,7 @@ async def _streaming_generate_duplex(generate_request_time):
                                     await asyncio.sleep(0.02)
                                 
                                 print(f"[streaming_generate] is_listen=True，已发送 {sent_chunk_count} chunks [双工]", flush=True)
-                                yield f"data: {json.dumps({'is_listen': True, 'chunks_received': sent_chunk_count}, ensure_ascii=False)}\n\n"
+                                yield encoder.event({'is_listen': True, 'chunks_received': sent_chunk_count})
                                 should_exit = True
                                 break
                             
@@ -2539,6 +2782,7 @@ async def _streaming_generate_duplex(generate_request_time):
             total_generate_time = (time.time() - generate_start_time) * 1000
             total_audio_duration = sum(chunk_durations) if chunk_durations else 0
             overall_rtf = total_generate_time / 1000 / total_audio_duration if total_audio_duration > 0 else 0
+            metrics.observe_generate_summary(session.metrics_mode, total_generate_time, total_audio_duration)
             
             print(f"\n{'='*60}", flush=True)
             print(f"[⏱️ Generate 性能总结] [双工]", flush=True)
@@ -2553,32 +2797,291 @@ async def _streaming_generate_duplex(generate_request_time):
             import traceback
             error_detail = traceback.format_exc()
             print(f"[streaming_generate] 异常: {e}\n{error_detail} [双工]", flush=True)
-            yield f"data: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+            yield encoder.event({'error': str(e)})
         
-        with session_lock:
-            current_round_number += 1
-            global_sent_wav_count = sent_chunk_count
+        with session.lock:
+            session.round_number += 1
+            session.sent_wav_count = sent_chunk_count
             # 🔧 [修复多轮 user prompt] 每轮结束后重置 prefill 计数器
             # 这样下一轮的 prefill 会从 cnt=0 开始，C++ 端能正确识别新一轮的开始
-            global current_request_counter
-            current_request_counter = 0
+            session.request_counter = 0
         
-        print(f"[Generate] 本轮结束，round_number={current_round_number}，已发送WAV={global_sent_wav_count} [双工]", flush=True)
+        print(f"[Generate] 本轮结束，round_number={session.round_number}，已发送WAV={session.sent_wav_count} [双工]", flush=True)
         
         # 推理结束后，在后台检查显存并在需要时重启
-        def background_memory_check():
-            time.sleep(1.0)  # 等待一会儿让当前请求完全结束
-            if check_gpu_memory_and_restart_if_needed():
-                print("[双工] 显存不足，已在后台触发重启", flush=True)
-        
-        threading.Thread(target=background_memory_check, daemon=True).start()
+        schedule_gpu_memory_check("双工")
         
         total_audio_duration = sum(chunk_durations) if chunk_durations else 0
-        yield f"data: {json.dumps({'done': True, 'is_listen': is_listen, 'chunks_received': sent_chunk_count, 'audio_duration_seconds': total_audio_duration}, ensure_ascii=False)}\n\n"
+        yield encoder.event({'done': True, 'is_listen': is_listen, 'chunks_received': sent_chunk_count, 'audio_duration_seconds': total_audio_duration})
     
     return StreamingResponse(
         generate_stream(),
-        media_type="text/event-stream",
+        media_type=encoder.media_type,
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+# 🔧 [持久双工流] 没有触发时的检查间隔（秒）：发送心跳，避免代理按空闲超时断开，并检查会话是否已被替换
+DUPLEX_STREAM_HEARTBEAT_SECONDS = 5.0
+
+
+def split_sse_events(buffer: str):
+    """从 C++ decode 的 SSE 缓冲区中取出完整事件，返回 (事件字典列表, 剩余缓冲区)"""
+    events = []
+    while "\n\n" in buffer or "\r\n\r\n" in buffer:
+        if "\r\n\r\n" in buffer:
+            event_str, buffer = buffer.split("\r\n\r\n", 1)
+        else:
+            event_str, buffer = buffer.split("\n\n", 1)
+        for line in event_str.split("\n"):
+            line = line.strip()
+            if line.startswith("data: "):
+                try:
+                    events.append(json.loads(line[6:]))
+                except json.JSONDecodeError:
+                    pass
+    return events, buffer
+
+
+class DuplexStream:
+    """会话级持久双工输出流（/omni/duplex_stream）
+    
+    streaming_generate 每次请求都要重新连接、启动 WAV 监听、在 is_listen 后最多再扫描 3 秒；
+    持久流在会话期间只建立一次：
+    - WAV 监听协程随流常驻，C++ 写出的音频分片（包括上一次 decode 结束后 TTS 才写完的）随时推送
+    - 双工 prefill 成功后投递 decode 触发，decode 协程逐次调用 C++ decode（C++ 侧仍按单元 decode），
+      decode 期间积压的触发合并为一次
+    - 打断时中止当前 decode，并丢弃打断期间写出的音频；下一次 decode 开始时清除打断标志
+    """
+    
+    def __init__(self, session: SessionState, encoder: OutputEncoder):
+        self.session = session
+        self.encoder = encoder
+        self.output: asyncio.Queue = asyncio.Queue()
+        self.stop_event = asyncio.Event()
+        self.tasks: List[asyncio.Task] = []
+        self.chunk_idx = session.sent_wav_count
+        self.cycles = 0
+        self.dropped_chunks = 0
+        self.audio_seconds = 0.0
+        # 当前 decode 的首响统计
+        self.cycle_start_time: Optional[float] = None
+        self.cycle_first_audio = True
+        self.cycle_first_text = True
+        self.cycle_texts: List[str] = []
+    
+    def alive(self) -> bool:
+        """会话被 stop / 被新会话替换，或同一会话打开了新的持久流（后端重连）后流结束"""
+        return (not self.stop_event.is_set()
+                and self.session.duplex_stream is self
+                and sessions.get(self.session.session_id) is self.session)
+    
+    def stop(self):
+        """被新连接接管：立即停止 WAV 监听和 decode，不再消费会话的触发和分片"""
+        self.stop_event.set()
+        for task in self.tasks:
+            task.cancel()
+    
+    def on_texts(self, new_texts):
+        self.cycle_texts.extend(new_texts)
+        if not self.cycle_first_text:
+            self.cycle_first_text = True
+            metrics.GENERATE_TTFT_MS.observe((time.time() - self.cycle_start_time) * 1000, mode=self.session.metrics_mode)
+    
+    async def on_wav(self, wav_file, audio_data, audio_sr, chunk_text, write_to_send_delay_ms):
+        if self.session.is_breaking:
+            self.dropped_chunks += 1
+            print(f"[duplex_stream] 打断中，丢弃 {wav_file}", flush=True)
+            return
+        if not self.cycle_first_audio:
+            self.cycle_first_audio = True
+            ttfa = (time.time() - self.cycle_start_time) * 1000
+            metrics.GENERATE_TTFA_MS.observe(ttfa, mode=self.session.metrics_mode)
+            print(f"[⏱️ Generate 音频首响] {ttfa:.1f}ms [持久双工]", flush=True)
+        chunk_duration = len(audio_data) / audio_sr
+        self.audio_seconds += chunk_duration
+        print(f"[WAV #{self.chunk_idx}] 发送 {wav_file} ({chunk_duration:.3f}s){' + 文本' if chunk_text else ''} | 延迟:{write_to_send_delay_ms:.0f}ms [持久双工]", flush=True)
+        await self.output.put(self.encoder.audio(self.chunk_idx, audio_data, audio_sr, chunk_text))
+        self.chunk_idx += 1
+    
+    async def scanner_loop(self):
+        await run_duplex_wav_scanner(self.session, self.stop_event, self.on_texts, self.on_wav)
+    
+    async def decode_loop(self):
+        session = self.session
+        while self.alive():
+            try:
+                cnt, trigger_time = await asyncio.wait_for(
+                    session.duplex_decode_triggers.get(), timeout=DUPLEX_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                await self.output.put(self.encoder.event({'duplex': 'heartbeat', 'cycles': self.cycles}))
+                continue
+            # 上一次 decode 期间到达的 prefill 由本次 decode 一并处理（与 streaming_generate 结束时重置 cnt 一致）
+            while not session.duplex_decode_triggers.empty():
+                cnt, _ = session.duplex_decode_triggers.get_nowait()
+            await self.decode_once(cnt, trigger_time)
+    
+    async def decode_once(self, cnt: int, trigger_time: float):
+        session = self.session
+        # 与 streaming_generate 相同：新的 decode 开始时清除打断标志
+        session.is_breaking = False
+        self.cycles += 1
+        cycle = self.cycles
+        self.cycle_start_time = time.time()
+        self.cycle_first_audio = False
+        self.cycle_first_text = False
+        self.cycle_texts = []
+        chunk_start = self.chunk_idx
+        audio_start = self.audio_seconds
+        is_listen = True
+        end_of_turn = False
+        result = "failed"
+        metrics.GENERATE_REQUESTS.inc(mode=session.metrics_mode)
+        await self.output.put(self.encoder.event({'duplex': 'cycle_start', 'cycle': cycle, 'cnt': cnt}))
+        
+        try:
+            async with http_client.stream(
+                "POST",
+                f"{session.cpp_url}/v1/stream/decode",
+                json={"debug_dir": "./tools/omni/output", "stream": True},
+                timeout=600.0
+            ) as response:
+                metrics.GENERATE_SETUP_MS.observe(
+                    (time.time() - trigger_time) * 1000, mode=session.metrics_mode, path="persistent")
+                if response.status_code != 200:
+                    error_text = await response.aread()
+                    print(f"[duplex_stream] C++ decode 错误: {error_text.decode()}", flush=True)
+                    await self.output.put(self.encoder.event({'duplex': 'cycle_error', 'cycle': cycle, 'error': 'decode failed'}))
+                    return
+                
+                buffer = ""
+                sse_iterator = response.aiter_text().__aiter__()
+                pending = None
+                try:
+                    while True:
+                        if session.is_breaking:
+                            result = "break"
+                            break
+                        # 读取任务跨超时保留（不取消），只为及时响应打断
+                        if pending is None:
+                            pending = asyncio.ensure_future(sse_iterator.__anext__())
+                        done, _ = await asyncio.wait({pending}, timeout=0.1)
+                        if not done:
+                            continue
+                        task, pending = pending, None
+                        try:
+                            chunk = task.result()
+                        except StopAsyncIteration:
+                            result = "listen" if is_listen else "speak"
+                            break
+                        events, buffer = split_sse_events(buffer + chunk)
+                        for event_data in events:
+                            if 'is_listen' in event_data:
+                                is_listen = event_data['is_listen']
+                            if event_data.get('end_of_turn'):
+                                end_of_turn = True
+                            if event_data.get('text'):
+                                self.on_texts([event_data['text']])
+                        if events and (is_listen or end_of_turn):
+                            result = "listen" if is_listen else "speak"
+                            break
+                finally:
+                    # 先取消未完成的读取，再关闭响应
+                    if pending is not None:
+                        pending.cancel()
+        except Exception as e:
+            print(f"[duplex_stream] decode #{cycle} 异常: {e}", flush=True)
+            await self.output.put(self.encoder.event({'duplex': 'cycle_error', 'cycle': cycle, 'error': str(e)}))
+        finally:
+            with session.lock:
+                session.round_number += 1
+                session.sent_wav_count = self.chunk_idx
+                # 🔧 [修复多轮 user prompt] 每次 decode 结束后重置 prefill 计数器
+                session.request_counter = 0
+            metrics.DUPLEX_STREAM_CYCLES.inc(result=result)
+            schedule_gpu_memory_check("持久双工")
+        
+        cycle_ms = (time.time() - self.cycle_start_time) * 1000
+        metrics.observe_generate_summary(session.metrics_mode, cycle_ms, self.audio_seconds - audio_start)
+        if self.cycle_texts:
+            print(f"[📝 decode #{cycle} 文本] {''.join(self.cycle_texts)}", flush=True)
+        print(f"[duplex_stream] decode #{cycle} 结束: {result}, {cycle_ms:.0f}ms, 分片 {self.chunk_idx - chunk_start}, "
+              f"round_number={session.round_number}", flush=True)
+        if result == "break":
+            await self.output.put(self.encoder.event({'duplex': 'break', 'cycle': cycle, 'message': '用户打断'}))
+        elif result != "failed":
+            await self.output.put(self.encoder.event({
+                'duplex': 'cycle_end', 'cycle': cycle, 'is_listen': is_listen,
+                'end_of_turn': end_of_turn, 'chunks_received': self.chunk_idx
+            }))
+    
+    async def run(self):
+        session = self.session
+        # 丢弃上一条流遗留的触发；流建立之前已经 prefill 的内容立即 decode 一次
+        previous = session.duplex_stream
+        if previous is not None:
+            print(f"[duplex_stream] 会话 {session.session_id} 已有持久流，由新连接接管", flush=True)
+            previous.stop()
+        session.duplex_stream = self
+        while not session.duplex_decode_triggers.empty():
+            session.duplex_decode_triggers.get_nowait()
+        session.duplex_stream_active = True
+        if session.request_counter > 0:
+            session.duplex_decode_triggers.put_nowait((session.request_counter - 1, time.time()))
+        self.tasks = [asyncio.create_task(self.scanner_loop()), asyncio.create_task(self.decode_loop())]
+        print(f"[duplex_stream] 打开 (session={session.session_id}, output={self.encoder.media_type})", flush=True)
+        try:
+            yield self.encoder.event({'duplex': 'stream_open', 'session_id': session.session_id, 'chunks_received': self.chunk_idx})
+            while self.alive():
+                try:
+                    yield await asyncio.wait_for(self.output.get(), timeout=DUPLEX_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    continue
+            while not self.output.empty():
+                yield self.output.get_nowait()
+            yield self.encoder.event({'done': True, 'duplex': 'closed', 'cycles': self.cycles,
+                                      'chunks_received': self.chunk_idx, 'audio_duration_seconds': self.audio_seconds})
+        finally:
+            self.stop()
+            if session.duplex_stream is self:
+                session.duplex_stream = None
+                session.duplex_stream_active = False
+            print(f"[duplex_stream] 关闭 (session={session.session_id}): decode {self.cycles} 次, "
+                  f"发送 {self.chunk_idx} 分片 / {self.audio_seconds:.1f}s, 打断丢弃 {self.dropped_chunks} 分片", flush=True)
+
+
+@app.post("/omni/duplex_stream")
+async def duplex_stream(http_request: Request, request: Optional[StreamingGenerateRequest] = None):
+    """🔧 [持久双工流] 会话级双工输出流，整个会话只需请求一次
+    
+    替代双工模式下每次 prefill 之后的 /omni/streaming_generate：prefill 成功后由 bridge 自动触发 decode，
+    音频分片和文本与 streaming_generate 的格式相同（按 Accept 协商 SSE / 二进制帧），另有状态事件：
+    - {'duplex': 'stream_open'}：流已建立
+    - {'duplex': 'cycle_start', 'cycle': n}：开始一次 decode
+    - {'duplex': 'cycle_end', 'cycle': n, 'is_listen': bool, 'end_of_turn': bool}：decode 结束
+    - {'duplex': 'cycle_error', 'cycle': n}：decode 失败（流保持打开）
+    - {'duplex': 'break', 'cycle': n}：decode 被打断（流保持打开）
+    - {'duplex': 'heartbeat'}：空闲心跳
+    - {'done': True, 'duplex': 'closed'}：会话停止或被替换，流结束
+    
+    同一会话重复打开时新流接管，旧流立即停止（后端断线重连时旧连接可能还未被发现断开）。
+    """
+    if cpp_restarting:
+        raise HTTPException(status_code=503, detail="服务正在重启中，请稍后重试")
+    
+    session = resolve_session(request.session_id if request else None)
+    if not session.duplex_mode:
+        raise HTTPException(status_code=400, detail="持久双工流只支持双工模式会话")
+    # 同一会话已有持久流时（后端断线重连而 bridge 还没发现旧连接断开）由新流接管，见 DuplexStream.run
+    encoder = negotiate_output_encoder(http_request.headers.get("accept"))
+    
+    return StreamingResponse(
+        DuplexStream(session, encoder).run(),
+        media_type=encoder.media_type,
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
@@ -0,0 +1,111 @@
+"""
+高刷模式子图拼接（2x2 马赛克）
+
+旧逻辑把 frame_index 1-4 的子图以完整 PIL Image 缓存在 high_fps_subimage_cache 中，
+音频到达时再 Image.new 一块画布、paste 四次得到拼接图，整个拼接都落在音频到达后的关键路径上。
+
+本模块改为：每个 image_audio_id 在第一张子图到达时分配一块 2x2 画布，之后每张子图到达时
+直接 paste 到对应象限，子图对象随即释放；音频到达时直接交出画布，不再有画布分配和像素拷贝。
+
+画布使用 PIL Image 而不是 numpy 缓冲区：PIL 内部 RGB 按 4 字节/像素存储，numpy (H, W, 3)
+与 PIL 之间的互转（np.asarray / Image.fromarray）本身就比四次 paste 更慢，见 benchmarks/bench_mosaic.py。
+
+布局与 media_ops.stack_images 保持一致（按 frame_index 排序后依次摆放）：
+- 1 张：原图
+- 2 张：横向 1x2
+- 3 张：2x2，右下角黑色
+- 4 张：2x2
+子图尺寸以第一张到达的子图为准，尺寸不一致的子图先用最近邻缩放到该尺寸再写入。
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+# 2x2 马赛克最多 4 个象限，对应 frame_index 1-4
+MOSAIC_SLOTS = 4
+
+
+class FrameMosaic:
+    """单个 image_audio_id 的拼接画布"""
+
+    def __init__(self, w: int, h: int):
+        self.w = w
+        self.h = h
+        # 新画布为黑色，3 张子图时右下角保持空白
+        self.canvas = Image.new('RGB', (w * 2, h * 2))
+        self.filled: set = set()  # 已写入的 frame_index (1-4)
+
+    def _origin(self, pos: int) -> Tuple[int, int]:
+        return (pos % 2) * self.w, (pos // 2) * self.h
+
+    def _box(self, pos: int) -> Tuple[int, int, int, int]:
+        x, y = self._origin(pos)
+        return x, y, x + self.w, y + self.h
+
+    def put(self, frame_idx: int, image: Image.Image):
+        """把子图写入 frame_idx 对应的象限"""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if image.size != (self.w, self.h):
+            image = image.resize((self.w, self.h), Image.NEAREST)
+        self.canvas.paste(image, self._origin(frame_idx - 1))
+        self.filled.add(frame_idx)
+
+    def build(self) -> Image.Image:
+        """按 stack_images 的布局交出拼接图（4 帧时即画布本身，不拷贝）"""
+        frames = sorted(self.filled)
+        # 缺帧时（如只有 1、2、4）把后面的象限前移，保持与按序 paste 相同的布局
+        for pos, frame_idx in enumerate(frames):
+            if frame_idx - 1 != pos:
+                self.canvas.paste(self.canvas.crop(self._box(frame_idx - 1)), self._origin(pos))
+                self.canvas.paste((0, 0, 0), self._box(frame_idx - 1))
+        n = len(frames)
+        if n == 1:
+            return self.canvas.crop(self._box(0))
+        if n == 2:
+            return self.canvas.crop((0, 0, self.w * 2, self.h))
+        return self.canvas
+
+
+class MosaicCache:
+    """image_audio_id -> FrameMosaic（替代 {image_audio_id: {frame_index: PIL.Image}} 子图缓存）
+
+    put 可能在执行器线程中调用，所有操作都由内部锁保护。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mosaics: Dict[int, FrameMosaic] = {}
+
+    def put(self, image_audio_id: int, frame_idx: int, image: Image.Image) -> Tuple[int, bool]:
+        """写入一张子图，返回 (已缓存帧数, 是否收齐 1-4 帧)
+
+        frame_idx 超出 1-4 的子图会被忽略。
+        """
+        with self._lock:
+            mosaic = self._mosaics.get(image_audio_id)
+            if 1 <= frame_idx <= MOSAIC_SLOTS:
+                if mosaic is None:
+                    mosaic = FrameMosaic(*image.size)
+                    self._mosaics[image_audio_id] = mosaic
+                mosaic.put(frame_idx, image)
+            if mosaic is None:
+                return 0, False
+            return len(mosaic.filled), len(mosaic.filled) == MOSAIC_SLOTS
+
+    def pop_stacked(self, image_audio_id: int) -> Tuple[Optional[Image.Image], int]:
+        """取出拼接图，返回 (拼接图, 帧数)；没有缓存的子图时返回 (None, 0)"""
+        with self._lock:
+            mosaic = self._mosaics.pop(image_audio_id, None)
+        if mosaic is None or not mosaic.filled:
+            return None, 0
+        return mosaic.build(), len(mosaic.filled)
+
+    def clear(self):
+        with self._lock:
+            self._mosaics.clear()
+
+    def __contains__(self, image_audio_id: int) -> bool:
+        with self._lock:
+            return image_audio_id in self._mosaics
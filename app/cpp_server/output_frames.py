@@ -0,0 +1,83 @@
+"""
+streaming_generate 输出编码（SSE / 二进制帧）
+
+旧协议（SSE）：每个 TTS 分片 int16 -> base64 -> json.dumps -> "data: ...\\n\\n"，
+客户端再逐步反解，base64 带来约 33% 的体积膨胀和多次整块拷贝。
+
+二进制帧协议（客户端 Accept 中包含 application/x-minicpmo-frames 时启用）：
+通过 chunked HTTP 连续发送长度前缀帧，每帧格式（小端）：
+
+    +--------+-------------+-------------+-----------+-------------+
+    | type:1 | meta_len:4  | payload:4   | meta JSON | payload     |
+    +--------+-------------+-------------+-----------+-------------+
+
+- FRAME_AUDIO: meta = {"chunk_idx", "sample_rate", "dtype": "int16", ["text"]}，payload = 原始 PCM int16
+- FRAME_EVENT: meta = 原 SSE 中的 JSON 对象（done / break / is_listen / error ...），payload 为空
+
+未声明支持二进制帧的旧客户端继续使用 SSE，输出内容与原来完全一致。
+"""
+import base64
+import json
+import struct
+from typing import Optional, Union
+
+import numpy as np
+
+FRAME_CONTENT_TYPE = "application/x-minicpmo-frames"
+SSE_CONTENT_TYPE = "text/event-stream"
+
+FRAME_AUDIO = 1
+FRAME_EVENT = 2
+
+FRAME_HEADER = struct.Struct('<BII')
+
+
+class SseOutputEncoder:
+    """旧协议：base64-in-JSON 的 SSE 行"""
+
+    media_type = SSE_CONTENT_TYPE
+
+    def audio(self, chunk_idx: int, pcm: np.ndarray, sample_rate: int, text: Optional[str] = None) -> str:
+        chunk_data = {
+            "chunk_idx": chunk_idx,
+            "chunk_data": {
+                "wav": base64.b64encode(pcm.tobytes()).decode('utf-8'),
+                "sample_rate": int(sample_rate)
+            }
+        }
+        if text:
+            chunk_data["chunk_data"]["text"] = text
+        return f"data: {json.dumps(chunk_data, ensure_ascii=False)}\n\n"
+
+    def event(self, data: dict) -> str:
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class FrameOutputEncoder:
+    """二进制长度前缀帧"""
+
+    media_type = FRAME_CONTENT_TYPE
+
+    @staticmethod
+    def _frame(frame_type: int, meta: dict, payload: bytes = b"") -> bytes:
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        return FRAME_HEADER.pack(frame_type, len(meta_bytes), len(payload)) + meta_bytes + payload
+
+    def audio(self, chunk_idx: int, pcm: np.ndarray, sample_rate: int, text: Optional[str] = None) -> bytes:
+        meta = {"chunk_idx": chunk_idx, "sample_rate": int(sample_rate), "dtype": "int16"}
+        if text:
+            meta["text"] = text
+        return self._frame(FRAME_AUDIO, meta, pcm.astype('<i2', copy=False).tobytes())
+
+    def event(self, data: dict) -> bytes:
+        return self._frame(FRAME_EVENT, data)
+
+
+OutputEncoder = Union[SseOutputEncoder, FrameOutputEncoder]
+
+
+def negotiate_output_encoder(accept: Optional[str]) -> OutputEncoder:
+    """根据请求的 Accept 头选择输出编码，默认 SSE"""
+    if accept and FRAME_CONTENT_TYPE in accept:
+        return FrameOutputEncoder()
+    return SseOutputEncoder()
@@ -0,0 +1,46 @@
+"""
+streaming_prefill 二进制请求体解析（/omni/streaming_prefill_bin）
+
+旧协议（JSON）：后端把 1 秒音频写成 WAV -> base64 -> JSON，bridge 再 base64 解码 -> sf.read
+-> 下混 -> 必要时 librosa 重采样；图片 JPEG -> base64 -> PIL。base64 带来约 33% 的体积膨胀，
+两端都要多次整块拷贝。
+
+二进制协议（Content-Type: application/x-minicpmo-prefill），请求体格式（小端）：
+
+    +-------------+--------------+--------------+-----------+-------+-------+
+    | meta_len:4  | audio_len:4  | image_len:4  | meta JSON | audio | image |
+    +-------------+--------------+--------------+-----------+-------+-------+
+
+- meta: 与 StreamingPrefillRequest 相同的字段（session_id / seq / image_audio_id / frame_index /
+  max_slice_nums / is_last_chunk），另加 audio_codec（"pcm16" / "opus"）、sample_rate、samples
+- audio: pcm16 为 16kHz 单声道 int16 原始 PCM；opus 为后端 opuslib_util.compress_audio_with_opus 的输出
+- image: 编码后的图片文件字节（JPEG 等）
+
+解析只切片不拷贝，pcm16 音频由 media_ops.decode_audio_pcm16 直接 np.frombuffer 映射。
+"""
+import json
+import struct
+from typing import Any, Dict, Tuple
+
+PREFILL_CONTENT_TYPE = "application/x-minicpmo-prefill"
+
+PREFILL_HEADER = struct.Struct('<III')
+
+AUDIO_CODEC_PCM16 = "pcm16"
+AUDIO_CODEC_OPUS = "opus"
+
+
+def parse_prefill_body(body: bytes) -> Tuple[Dict[str, Any], memoryview, memoryview]:
+    """拆分二进制 prefill 请求体，返回 (meta, audio, image)，音频/图片为请求体的切片视图"""
+    if len(body) < PREFILL_HEADER.size:
+        raise ValueError(f"请求体太短: {len(body)} 字节")
+    meta_len, audio_len, image_len = PREFILL_HEADER.unpack_from(body, 0)
+    expected = PREFILL_HEADER.size + meta_len + audio_len + image_len
+    if len(body) != expected:
+        raise ValueError(f"请求体长度不匹配: 期望 {expected} 字节，实际 {len(body)} 字节")
+    view = memoryview(body)
+    meta_start = PREFILL_HEADER.size
+    audio_start = meta_start + meta_len
+    image_start = audio_start + audio_len
+    meta = json.loads(bytes(view[meta_start:audio_start])) if meta_len else {}
+    return meta, view[audio_start:image_start], view[image_start:expected]
@@ -0,0 +1,100 @@
+"""
+按 seq 串行处理同一会话的 streaming_prefill
+
+后端每个会话的 prefill 流水线会同时发出多个请求（prefill_max_inflight），每个请求带单调递增的 seq。
+HTTP 请求到达 bridge 的顺序不一定等于 seq 顺序，而延迟一拍缓存、高刷子图缓存和 C++ 的 KV cache
+都要求按产生顺序 prefill。
+
+PrefillSequencer 每个会话一个（只在 FastAPI 事件循环中使用）：
+- 请求先完成音频/图片解码（与前一个请求的 prefill 重叠），再 acquire(seq) 等到轮到自己
+- 处理完 release(seq)；解码失败等没有 acquire 的请求也要 release，让后面的请求不必等待
+- 前序请求正在处理时一直等待；前序请求一直没到（后端发送失败）时，等待 gap_timeout 秒后跳过缺口
+- seq 小于期望值（已被跳过后才到达）的请求不再等待，直接处理
+- 不带 seq 的请求（旧客户端）不经过排序
+"""
+import asyncio
+import time
+from typing import Optional, Set
+
+
+class PrefillSequencer:
+    """单个会话的 prefill 排序器"""
+
+    def __init__(self, gap_timeout: float = 0.5):
+        self.gap_timeout = gap_timeout
+        self._cond = asyncio.Condition()
+        # 后端每个会话的 seq 从 1 开始，bridge 会话在 init_sys_prompt 时新建
+        self._next_seq = 1
+        self._running: Optional[int] = None
+        self._done: Set[int] = set()
+        # 统计
+        self.in_order = 0
+        self.reordered = 0
+        self.late = 0
+        self.gaps_skipped = 0
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    def _advance(self):
+        while self._next_seq in self._done:
+            self._done.discard(self._next_seq)
+            self._next_seq += 1
+
+    async def acquire(self, seq: int) -> str:
+        """等待轮到 seq，返回 in_order / reordered / late / gap_skipped"""
+        async with self._cond:
+            if seq < self._next_seq:
+                self.late += 1
+                return "late"
+            if seq == self._next_seq and self._running is None:
+                self._running = seq
+                self.in_order += 1
+                return "in_order"
+            deadline = time.monotonic() + self.gap_timeout
+            while seq > self._next_seq or self._running is not None:
+                if self._running is not None:
+                    # 前序请求正在处理，不计入缺口超时
+                    await self._cond.wait()
+                    deadline = time.monotonic() + self.gap_timeout
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # 缺口：seq 在 [next_seq, seq) 的请求一直没到，跳过
+                    self.gaps_skipped += 1
+                    self._done = {s for s in self._done if s > seq}
+                    self._next_seq = seq
+                    self._running = seq
+                    return "gap_skipped"
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            if seq < self._next_seq:
+                # 等待期间被后面的请求跳过了缺口
+                self.late += 1
+                return "late"
+            self._running = seq
+            self.reordered += 1
+            return "reordered"
+
+    async def release(self, seq: int):
+        """seq 处理结束（或被放弃），唤醒等待的后续请求"""
+        async with self._cond:
+            if self._running == seq:
+                self._running = None
+            if seq >= self._next_seq:
+                self._done.add(seq)
+                self._advance()
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "next_seq": self._next_seq,
+            "running": self._running,
+            "in_order": self.in_order,
+            "reordered": self.reordered,
+            "late": self.late,
+            "gaps_skipped": self.gaps_skipped,
+        }
@@ -0,0 +1,227 @@
+"""
+prefill 媒体数据暂存区（bridge -> C++ llama-server 的文件交接）
+
+C++ /v1/stream/prefill 只接受文件路径，因此每次 prefill 都需要把音频/图片落到某个
+路径上。本模块把"写到哪里、用什么格式、何时回收"封装起来：
+
+- disk  : 旧逻辑。TEMP_DIR 下按会话/cnt 生成唯一文件名，soundfile 写 PCM_16 WAV，PNG 图片，用完删除
+- shm   : 内存文件系统（/dev/shm 或 tmpfs）下的槽位文件，循环复用（覆盖写，不反复创建/删除），
+          音频直接拼 WAV 头 + int16 数据，图片默认 BMP（无压缩）
+- memfd : Linux memfd_create 匿名内存文件，通过 /proc/<pid>/fd/<fd> 路径交给 C++ 读取
+
+配置（环境变量）：
+- PREFILL_STAGING: "auto"(默认，优先 shm，不可用时回退 disk) / "disk" / "shm" / "memfd"
+- PREFILL_IMAGE_FORMAT: "png" / "bmp"，默认 disk 使用 png，内存后端使用 bmp
+- PREFILL_SHM_DIR: 内存暂存目录的父目录（默认 /dev/shm）
+"""
+import io
+import os
+import shutil
+import struct
+import sys
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import soundfile as sf
+from PIL import Image
+
+PREFILL_STAGING = os.environ.get("PREFILL_STAGING", "auto")
+PREFILL_IMAGE_FORMAT = os.environ.get("PREFILL_IMAGE_FORMAT", "")
+PREFILL_SHM_DIR = os.environ.get("PREFILL_SHM_DIR", "/dev/shm")
+
+PREFILL_SAMPLE_RATE = 16000
+
+_IMAGE_FORMATS = {"png": "PNG", "bmp": "BMP"}
+
+
+def encode_wav_pcm16(audio_np: np.ndarray, sample_rate: int = PREFILL_SAMPLE_RATE) -> bytes:
+    """float32 单声道音频 -> PCM_16 WAV 字节（格式同 sf.write(subtype='PCM_16')，量化差异不超过 2 LSB）"""
+    pcm = np.rint(np.clip(audio_np, -1.0, 1.0) * 32767.0).astype('<i2')
+    data_size = pcm.nbytes
+    header = struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b'data', data_size,
+    )
+    return header + pcm.tobytes()
+
+
+def encode_image(image: Image.Image, image_format: str) -> bytes:
+    """PIL 图片 -> 指定格式的字节"""
+    buf = io.BytesIO()
+    image.save(buf, format=_IMAGE_FORMATS[image_format])
+    return buf.getvalue()
+
+
+class PrefillStaging:
+    """暂存区基类：disk 后端（旧逻辑，唯一文件名 + 用完删除）"""
+
+    backend = "disk"
+
+    def __init__(self, root_dir: str, image_format: str = "png"):
+        if image_format not in _IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {image_format}")
+        self.root_dir = root_dir
+        self.image_format = image_format
+        os.makedirs(root_dir, exist_ok=True)
+
+    def stage_audio(self, audio_np: np.ndarray, tag: str) -> str:
+        """写入 16kHz 音频，返回交给 C++ 的路径"""
+        path = os.path.join(self.root_dir, f"prefill_{tag}.wav")
+        audio_to_save = np.clip(audio_np, -1.0, 1.0).astype(np.float32)
+        sf.write(path, audio_to_save, PREFILL_SAMPLE_RATE, format='WAV', subtype='PCM_16')
+        return path
+
+    def stage_image(self, image: Image.Image, tag: str) -> str:
+        """写入图片，返回交给 C++ 的路径"""
+        path = os.path.join(self.root_dir, f"prefill_{tag}.{self.image_format}")
+        image.save(path, format=_IMAGE_FORMATS[self.image_format])
+        return path
+
+    def release(self, paths: List[str]):
+        """C++ 读取完毕后释放暂存文件"""
+        for path in paths:
+            if not path:
+                continue
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except Exception:
+                pass
+
+    def close(self):
+        pass
+
+
+class ShmPrefillStaging(PrefillStaging):
+    """内存文件系统后端：槽位文件循环复用
+
+    每个扩展名维护一个空闲槽位列表；并发 prefill 时槽位不够会自动扩容。
+    C++ prefill 接口返回时已读取完文件，因此调用方在 HTTP 返回后即可 release。
+    """
+
+    backend = "shm"
+
+    def __init__(self, root_dir: str, image_format: str = "bmp"):
+        super().__init__(root_dir, image_format)
+        self._init_slots()
+
+    def _init_slots(self):
+        self._lock = threading.Lock()
+        self._free: Dict[str, List[str]] = {}
+        self._slot_ext: Dict[str, str] = {}
+        self._in_use: set = set()
+
+    def _new_slot(self, ext: str) -> str:
+        return os.path.join(self.root_dir, f"slot_{len(self._slot_ext)}.{ext}")
+
+    def _acquire(self, ext: str) -> str:
+        with self._lock:
+            free = self._free.setdefault(ext, [])
+            if free:
+                path = free.pop()
+            else:
+                path = self._new_slot(ext)
+                self._slot_ext[path] = ext
+            self._in_use.add(path)
+            return path
+
+    def _write(self, path: str, data: bytes):
+        # 覆盖写同一个文件：O_TRUNC 保留 inode，避免每次创建/删除目录项
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def stage_audio(self, audio_np: np.ndarray, tag: str) -> str:
+        path = self._acquire("wav")
+        self._write(path, encode_wav_pcm16(audio_np))
+        return path
+
+    def stage_image(self, image: Image.Image, tag: str) -> str:
+        path = self._acquire(self.image_format)
+        self._write(path, encode_image(image, self.image_format))
+        return path
+
+    def release(self, paths: List[str]):
+        with self._lock:
+            for path in paths:
+                if path and path in self._in_use:
+                    self._in_use.discard(path)
+                    self._free[self._slot_ext[path]].append(path)
+
+    def close(self):
+        shutil.rmtree(self.root_dir, ignore_errors=True)
+
+
+class MemfdPrefillStaging(ShmPrefillStaging):
+    """memfd 后端：槽位是匿名内存文件，路径为 /proc/<pid>/fd/<fd>（仅 Linux）
+
+    路径没有扩展名，要求 C++ 端按文件内容识别音频/图片格式（stb_image 与 WAV 解析均如此）。
+    """
+
+    backend = "memfd"
+
+    def __init__(self, image_format: str = "bmp"):
+        if image_format not in _IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {image_format}")
+        self.image_format = image_format
+        self.root_dir = f"/proc/{os.getpid()}/fd"
+        self._init_slots()
+        self._fds: Dict[str, int] = {}
+
+    def _new_slot(self, ext: str) -> str:
+        fd = os.memfd_create(f"minicpmo_prefill_{ext}", os.MFD_CLOEXEC)
+        path = f"{self.root_dir}/{fd}"
+        self._fds[path] = fd
+        return path
+
+    def _write(self, path: str, data: bytes):
+        fd = self._fds[path]
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, data, 0)
+
+    def close(self):
+        for fd in self._fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds.clear()
+
+
+def _shm_available(parent: str) -> bool:
+    return os.path.isdir(parent) and os.access(parent, os.W_OK)
+
+
+def create_prefill_staging(temp_dir: str, port: int, backend: Optional[str] = None,
+                           image_format: Optional[str] = None) -> PrefillStaging:
+    """根据配置创建暂存区，内存后端不可用时回退到 disk
+
+    Args:
+        temp_dir: disk 后端使用的目录（即原 TEMP_DIR）
+        port: 服务端口，用于区分多实例的内存暂存目录
+        backend: "auto" / "disk" / "shm" / "memfd"，默认读取 PREFILL_STAGING
+        image_format: "png" / "bmp"，默认读取 PREFILL_IMAGE_FORMAT
+    """
+    backend = (backend or PREFILL_STAGING).lower()
+    image_format = (image_format or PREFILL_IMAGE_FORMAT).lower() or None
+
+    if backend == "memfd":
+        if sys.platform.startswith("linux") and hasattr(os, "memfd_create"):
+            return MemfdPrefillStaging(image_format or "bmp")
+        print("[PrefillStaging] 当前平台不支持 memfd，回退到 shm", flush=True)
+        backend = "shm"
+
+    if backend in ("auto", "shm"):
+        if _shm_available(PREFILL_SHM_DIR):
+            root_dir = os.path.join(PREFILL_SHM_DIR, f"minicpmo_prefill_{port}")
+            shutil.rmtree(root_dir, ignore_errors=True)
+            try:
+                return ShmPrefillStaging(root_dir, image_format or "bmp")
+            except OSError as e:
+                print(f"[PrefillStaging] 创建内存暂存目录失败，回退到 disk: {e}", flush=True)
+        elif backend == "shm":
+            print(f"[PrefillStaging] {PREFILL_SHM_DIR} 不可用，回退到 disk", flush=True)
+
+    return PrefillStaging(temp_dir, image_format or "png")
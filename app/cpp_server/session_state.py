@@ -0,0 +1,197 @@
+"""
+bridge 会话状态注册表
+
+原来 minicpmo_cpp_http_server.py 用模块级全局变量保存"当前会话"的全部状态（prefill 计数器、
+延迟一拍缓存、高刷缓存、双工 WAV/文本进度、break 标志、WAV 时序日志），一个 bridge 进程只能服务
+一个用户，任何一次 /omni/stop 都会清空这些状态。
+
+本模块把这些状态收拢到 SessionState 中，按 session_id 保存在 SessionRegistry 里：
+- 每个会话有自己的锁、计数器、工作目录和 break 标志
+- 每个会话绑定一个 C++ worker（cpp_url + output_dir）。llama-server 只有一份 omni context，
+  因此同一个 worker 同一时刻只能服务一个会话：新会话绑定时，旧会话会被打断并移除
+- 请求未携带 session_id（旧客户端）时使用最近一次初始化的会话，与原来的单会话行为一致
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from mosaic import MosaicCache
+from prefill_order import PrefillSequencer
+from tail_reader import TailReader
+
+
+class SessionState:
+    """单个会话的全部可变状态"""
+
+    def __init__(self, session_id: str, cpp_url: str, output_dir: str, work_dir: str,
+                 msg_type: int = 2, duplex_mode: bool = False,
+                 high_quality_mode: bool = False, high_fps_mode: bool = False,
+                 language: str = "zh", prefill_gap_timeout: float = 0.5):
+        self.session_id = session_id
+        # 绑定的 C++ worker
+        self.cpp_url = cpp_url
+        self.output_dir = output_dir  # C++ 写 tts_wav / llm_debug 的目录
+        self.work_dir = work_dir      # bridge 侧的会话目录（单工 round 输出等）
+
+        # 会话模式（init_sys_prompt 时确定）
+        self.msg_type = msg_type  # 1=audio, 2=video/omni
+        self.duplex_mode = duplex_mode
+        self.high_quality_mode = high_quality_mode
+        self.high_fps_mode = high_fps_mode
+        self.language = language
+
+        # 计数器 / 延迟一拍缓存（由 lock 保护）
+        self.lock = threading.Lock()
+        self.request_counter: int = 0
+        self.round_number: int = 0
+        self.pending_prefill_data: Optional[dict] = None
+
+        # 🔧 [有序prefill] 按后端 seq 串行处理 streaming_prefill（见 prefill_order.py）
+        self.prefill_sequencer = PrefillSequencer(prefill_gap_timeout)
+
+        # break 标志：为 True 时停止向前端发送数据（健康检查线程也会写入）
+        self.is_breaking: bool = False
+
+        # 🔧 [高刷模式] 子图拼接缓冲区 image_audio_id -> 2x2 马赛克（见 mosaic.py，内部加锁）
+        self.high_fps_mosaics = MosaicCache()
+        # 🔧 [高刷模式] 待处理音频 {image_audio_id: (audio_np, sr, audio_path)}
+        self.high_fps_pending_audio: Dict[int, tuple] = {}
+        self.high_fps_audio_lock = threading.Lock()
+
+        # 🔧 [双工模式] 跨 generate 调用保持的 WAV/文本进度
+        self.sent_wav_count: int = 0
+        self.llm_text_reader: Optional[TailReader] = None  # llm_debug/llm_text.txt 增量读取器
+        self.parsed_texts: list = []
+        self.text_send_idx: int = 0
+        self.sent_wav_files: set = set()
+
+        # 🔧 [持久双工流] /omni/duplex_stream 打开期间，双工 prefill 成功后向该队列投递 decode 触发
+        # （元素为 (cnt, 投递时间)），由持久流的 decode 协程逐个消费
+        self.duplex_stream_active: bool = False
+        # 当前的持久流（DuplexStream）；后端断线重连时新流接管，旧流立即停止
+        self.duplex_stream: Optional[Any] = None
+        self.duplex_decode_triggers: asyncio.Queue = asyncio.Queue()
+
+        # WAV 发送时序日志
+        self.wav_timing_log_file: Optional[Any] = None
+        self.last_wav_send_time: Optional[float] = None
+
+        self.created_at = time.time()
+
+    @property
+    def metrics_mode(self) -> str:
+        """指标的 mode 标签：high_fps / duplex / simplex"""
+        if self.high_fps_mode:
+            return "high_fps"
+        return "duplex" if self.duplex_mode else "simplex"
+
+    def round_output_dir(self) -> str:
+        """当前 round 的 bridge 侧输出目录"""
+        return os.path.join(self.work_dir, f"round_{self.round_number:04d}", "output")
+
+    def reset_duplex_progress(self):
+        """重置双工模式的 WAV/文本进度（调用方需持有 lock）"""
+        self.sent_wav_count = 0
+        self.llm_text_reader = None
+        self.parsed_texts = []
+        self.text_send_idx = 0
+        self.sent_wav_files = set()
+
+    def get_llm_text_reader(self, path: str) -> TailReader:
+        """双工模式 llm_text.txt 的增量读取器（跨 generate 调用复用，保留字节偏移）"""
+        if self.llm_text_reader is None or self.llm_text_reader.path != path:
+            self.llm_text_reader = TailReader(path)
+        return self.llm_text_reader
+
+    def reset_counters(self):
+        """重置计数器、延迟一拍缓存和双工进度"""
+        with self.lock:
+            self.request_counter = 0
+            self.round_number = 0
+            self.pending_prefill_data = None
+            self.reset_duplex_progress()
+
+    def clear_high_fps_cache(self):
+        self.high_fps_mosaics.clear()
+        with self.high_fps_audio_lock:
+            self.high_fps_pending_audio.clear()
+
+    def open_timing_log(self, path: str):
+        """首次发送 WAV 时打开时序日志"""
+        if self.wav_timing_log_file is None:
+            self.wav_timing_log_file = open(path, 'a', encoding='utf-8')
+            self.wav_timing_log_file.write(f"\n{'='*80}\n")
+            self.wav_timing_log_file.write(
+                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}] 新会话开始 (双工模式, session={self.session_id})\n"
+            )
+            self.wav_timing_log_file.write(f"{'='*80}\n")
+            self.wav_timing_log_file.flush()
+        return self.wav_timing_log_file
+
+    def close_timing_log(self, reason: str) -> bool:
+        """写入结束标记并关闭时序日志，返回是否有日志被关闭"""
+        closed = False
+        if self.wav_timing_log_file:
+            try:
+                self.wav_timing_log_file.write(f"{'-'*120}\n")
+                self.wav_timing_log_file.write(f"[{reason}] {datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}\n")
+                self.wav_timing_log_file.close()
+                closed = True
+            except Exception:
+                pass
+            self.wav_timing_log_file = None
+        self.last_wav_send_time = None
+        return closed
+
+
+class SessionRegistry:
+    """session_id -> SessionState，线程安全（FastAPI 事件循环和健康检查线程都会访问）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, SessionState] = {}
+        self._latest_id: Optional[str] = None
+
+    def register(self, state: SessionState) -> List[SessionState]:
+        """注册新会话，返回被替换的旧会话（同 session_id 或绑定同一个 worker）
+
+        被替换的会话会设置 is_breaking，使其仍在进行的 generate 停止发送数据。
+        """
+        with self._lock:
+            evicted = [
+                s for s in self._sessions.values()
+                if s.session_id == state.session_id or s.cpp_url == state.cpp_url
+            ]
+            for s in evicted:
+                s.is_breaking = True
+                del self._sessions[s.session_id]
+            self._sessions[state.session_id] = state
+            self._latest_id = state.session_id
+        return evicted
+
+    def get(self, session_id: Optional[str] = None) -> Optional[SessionState]:
+        """按 session_id 查找会话；session_id 为空时返回最近初始化的会话"""
+        with self._lock:
+            if session_id:
+                return self._sessions.get(session_id)
+            if self._latest_id is not None:
+                return self._sessions.get(self._latest_id)
+            return None
+
+    def remove(self, session_id: str) -> Optional[SessionState]:
+        with self._lock:
+            state = self._sessions.pop(session_id, None)
+            if self._latest_id == session_id:
+                self._latest_id = None
+            return state
+
+    def sessions(self) -> List[SessionState]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
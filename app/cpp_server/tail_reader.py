@@ -0,0 +1,75 @@
+"""
+增量读取追加写入的文本文件（C++ 输出的 llm_text.txt）
+
+旧逻辑每次都 readlines() 整个文件再按已解析行数切片，开销随会话长度线性增长。
+TailReader 记住已读取的字节偏移，每次只读取新追加的字节：
+- 末尾不完整的行先缓存，等换行符到达后再返回
+- 文件被截断（size < offset）或被替换（inode 变化、被删除，例如 clear_output_subfolders）时
+  自动从头开始读取
+"""
+import os
+from typing import List, Optional
+
+
+class TailReader:
+    """按字节偏移增量读取文件新增的行"""
+
+    def __init__(self, path: str, encoding: str = 'utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self.offset = 0
+        self.line_count = 0     # 已返回的完整行数
+        self.rotations = 0      # 检测到的截断/替换次数
+        self._partial = b""
+        self._inode: Optional[int] = None
+
+    def reset(self):
+        """从头开始读取"""
+        self.offset = 0
+        self.line_count = 0
+        self._partial = b""
+        self._inode = None
+
+    def read_lines(self, include_partial: bool = False) -> List[str]:
+        """返回自上次调用以来新增的行（不含换行符）
+
+        Args:
+            include_partial: 是否同时返回末尾尚未以换行结束的部分行（返回后视为已消费）
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                # 文件被删除：下次出现时从头读取
+                self.reset()
+                self.rotations += 1
+            return []
+
+        if self._inode is not None and (st.st_ino != self._inode or st.st_size < self.offset):
+            self.reset()
+            self.rotations += 1
+        self._inode = st.st_ino
+
+        data = b""
+        if st.st_size > self.offset:
+            try:
+                with open(self.path, 'rb') as f:
+                    f.seek(self.offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return []
+            self.offset += len(data)
+
+        lines = []
+        if data:
+            chunks = (self._partial + data).split(b'\n')
+            self._partial = chunks.pop()
+            lines = [self._decode(chunk) for chunk in chunks]
+            self.line_count += len(lines)
+        if include_partial and self._partial:
+            lines.append(self._decode(self._partial))
+            self._partial = b""
+        return lines
+
+    def _decode(self, raw: bytes) -> str:
+        return raw.decode(self.encoding, errors='ignore').rstrip('\r')
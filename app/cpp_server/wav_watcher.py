@@ -0,0 +1,457 @@
+"""
+C++ 输出目录事件监听（替代 streaming_generate 中的目录轮询）
+
+C++ llama-server 在 output 目录下写出：
+- tts_wav/wav_N.wav            TTS 音频分片
+- tts_wav/generation_done.flag 本轮生成结束标记（内容为最后一个 wav 的序号）
+- llm_debug/llm_text.txt       LLM 文本输出（双工模式追加写入）
+
+本模块把这些文件变化转换成事件，推送到 asyncio.Queue 中，由单工/双工两条
+generate 路径消费：
+- InotifyOutputWatcher: Linux inotify（IN_CLOSE_WRITE 时文件已写完，无需再 sleep 等待）
+- PollingOutputWatcher: 其他平台或 inotify 不可用时的轮询回退（os.scandir + 集合差分）
+
+配置（环境变量）：
+- WAV_WATCHER_BACKEND: "auto"(默认) / "inotify" / "poll"
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import re
+import struct
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# 事件类型
+EVENT_WAV = "wav"
+EVENT_TEXT = "text"
+EVENT_DONE = "done"
+
+WAV_NAME_RE = re.compile(r'^wav_(\d+)\.wav$')
+DONE_FLAG_NAME = "generation_done.flag"
+LLM_TEXT_NAME = "llm_text.txt"
+
+# 轮询模式下，文件 mtime 距今超过该值才认为写入完成（与旧逻辑读取前 sleep 10ms 对齐）
+DEFAULT_SETTLE_SECONDS = 0.01
+
+WAV_WATCHER_BACKEND = os.environ.get("WAV_WATCHER_BACKEND", "auto")
+
+
+class WatchEvent(NamedTuple):
+    """输出目录事件"""
+    kind: str         # EVENT_WAV / EVENT_TEXT / EVENT_DONE
+    name: str         # 文件名
+    path: str         # 完整路径
+    index: int        # wav 序号（非 wav 事件为 -1）
+    detected_at: float  # 检测到事件的时间戳 (time.time())
+
+
+def parse_wav_index(name: str) -> Optional[int]:
+    """从 wav_N.wav 中提取 N，不匹配时返回 None"""
+    match = WAV_NAME_RE.match(name)
+    return int(match.group(1)) if match else None
+
+
+class BaseOutputWatcher:
+    """输出目录监听器基类
+
+    子类只负责"发现文件变化"，事件分类、去重和入队都在基类完成：
+    - wav 事件：每个文件名只推送一次（skip_names 中的文件名视为已处理）
+    - text 事件：合并推送，队列里已有未消费的 text 事件时不再重复推送
+    - done 事件：每次标记文件写入都推送，由消费方读取内容
+    """
+
+    backend = "base"
+
+    def __init__(self, tts_wav_dir: str, llm_debug_dir: Optional[str] = None,
+                 skip_names: Optional[Iterable[str]] = None,
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS):
+        self.tts_wav_dir = tts_wav_dir
+        self.llm_debug_dir = llm_debug_dir
+        self.settle_seconds = settle_seconds
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._seen_wavs: Set[str] = set(skip_names or ())
+        self._text_pending = False
+        self._closed = False
+
+    async def start(self):
+        raise NotImplementedError
+
+    def close(self):
+        self._closed = True
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[WatchEvent]:
+        """等待下一个事件，超时返回 None"""
+        try:
+            if timeout is None:
+                event = await self.queue.get()
+            else:
+                event = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event.kind == EVENT_TEXT:
+            self._text_pending = False
+        return event
+
+    # ---------- 供子类调用 ----------
+    def _emit_tts_file(self, name: str, settled: bool = True) -> bool:
+        """处理 tts_wav 目录下的文件，返回是否已处理（未写完的 wav 返回 False）"""
+        if name == DONE_FLAG_NAME:
+            if settled:
+                self._put(EVENT_DONE, name, os.path.join(self.tts_wav_dir, name), -1)
+            return settled
+        idx = parse_wav_index(name)
+        if idx is None:
+            return True
+        if name in self._seen_wavs:
+            return True
+        if not settled:
+            return False
+        self._seen_wavs.add(name)
+        self._put(EVENT_WAV, name, os.path.join(self.tts_wav_dir, name), idx)
+        return True
+
+    def _emit_text(self):
+        if self.llm_debug_dir is None or self._text_pending:
+            return
+        self._text_pending = True
+        self._put(EVENT_TEXT, LLM_TEXT_NAME, os.path.join(self.llm_debug_dir, LLM_TEXT_NAME), -1)
+
+    def _put(self, kind: str, name: str, path: str, index: int):
+        if self._closed:
+            return
+        self.queue.put_nowait(WatchEvent(kind, name, path, index, time.time()))
+
+    def _is_settled(self, path: str, now: float) -> bool:
+        try:
+            return now - os.stat(path).st_mtime >= self.settle_seconds
+        except OSError:
+            return False
+
+    def _scan_tts_dir(self) -> List[str]:
+        """扫描 tts_wav 目录，按 wav 序号推送已写完的新文件，返回尚未写完的文件名"""
+        unsettled = []
+        try:
+            with os.scandir(self.tts_wav_dir) as it:
+                names = [entry.name for entry in it]
+        except OSError:
+            return unsettled
+        now = time.time()
+        wavs = []
+        has_done_flag = False
+        for name in names:
+            if name == DONE_FLAG_NAME:
+                has_done_flag = True
+                continue
+            idx = parse_wav_index(name)
+            if idx is not None and name not in self._seen_wavs:
+                wavs.append((idx, name))
+        wavs.sort()
+        for _, name in wavs:
+            if not self._emit_tts_file(name, self._is_settled(os.path.join(self.tts_wav_dir, name), now)):
+                unsettled.append(name)
+        # done 标记放在 wav 之后推送，保证消费方先看到所有已存在的 wav
+        if has_done_flag:
+            self._emit_tts_file(DONE_FLAG_NAME)
+        return unsettled
+
+
+class PollingOutputWatcher(BaseOutputWatcher):
+    """轮询回退实现：定时 scandir，只对新增/变化的文件推送事件"""
+
+    backend = "poll"
+
+    def __init__(self, tts_wav_dir: str, llm_debug_dir: Optional[str] = None,
+                 skip_names: Optional[Iterable[str]] = None,
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                 poll_interval: float = 0.01):
+        super().__init__(tts_wav_dir, llm_debug_dir, skip_names, settle_seconds)
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._done_flag_mtime: Optional[float] = None
+        self._text_stat: Optional[Tuple[int, float]] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def close(self):
+        super().close()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                self._poll_once()
+            except Exception as e:
+                print(f"[OutputWatcher] 轮询异常: {e}", flush=True)
+            await asyncio.sleep(self.poll_interval)
+
+    def _poll_once(self):
+        if self.llm_debug_dir is not None:
+            try:
+                st = os.stat(os.path.join(self.llm_debug_dir, LLM_TEXT_NAME))
+                text_stat = (st.st_size, st.st_mtime)
+                if text_stat != self._text_stat:
+                    self._text_stat = text_stat
+                    self._emit_text()
+            except OSError:
+                self._text_stat = None
+
+        if not os.path.isdir(self.tts_wav_dir):
+            return
+        now = time.time()
+        wavs = []
+        done_flag_mtime = None
+        with os.scandir(self.tts_wav_dir) as it:
+            for entry in it:
+                name = entry.name
+                if name == DONE_FLAG_NAME:
+                    try:
+                        done_flag_mtime = entry.stat().st_mtime
+                    except OSError:
+                        pass
+                    continue
+                if name in self._seen_wavs:
+                    continue
+                idx = parse_wav_index(name)
+                if idx is None:
+                    continue
+                try:
+                    settled = now - entry.stat().st_mtime >= self.settle_seconds
+                except OSError:
+                    continue
+                wavs.append((idx, name, settled))
+        wavs.sort()
+        for _, name, settled in wavs:
+            # 保持序号顺序：遇到未写完的 wav 就停下，下一轮再继续
+            if not self._emit_tts_file(name, settled):
+                break
+        if done_flag_mtime is not None and done_flag_mtime != self._done_flag_mtime:
+            if now - done_flag_mtime >= self.settle_seconds:
+                self._done_flag_mtime = done_flag_mtime
+                self._emit_tts_file(DONE_FLAG_NAME)
+
+
+# ====================== inotify ======================
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+
+_TTS_DIR_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO
+_TEXT_DIR_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_PARENT_DIR_MASK = _IN_CREATE | _IN_MOVED_TO | _IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        _libc = ctypes.CDLL(libc_name, use_errno=True)
+    return _libc
+
+
+def inotify_available() -> bool:
+    """当前平台是否支持 inotify"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        libc = _get_libc()
+        return hasattr(libc, "inotify_init1") and hasattr(libc, "inotify_add_watch")
+    except OSError:
+        return False
+
+
+class InotifyOutputWatcher(BaseOutputWatcher):
+    """Linux inotify 实现
+
+    - 目标目录存在时直接监听；不存在时（例如单工模式的 round_XXX/tts_wav 尚未创建）
+      先监听最近的已存在祖先目录，等目录创建事件到来后再逐级下移
+    - 新增监听后立即扫描一次，补上添加监听之前已经写完的文件
+    - 事件队列溢出 (IN_Q_OVERFLOW) 时全量重扫
+    """
+
+    backend = "inotify"
+
+    def __init__(self, tts_wav_dir: str, llm_debug_dir: Optional[str] = None,
+                 skip_names: Optional[Iterable[str]] = None,
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS):
+        super().__init__(tts_wav_dir, llm_debug_dir, skip_names, settle_seconds)
+        self._fd: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # wd -> 目标目录类型 ("tts" / "text")
+        self._target_wds: Dict[int, str] = {}
+        # wd -> (祖先目录路径, 等待在该目录下创建的目标目录列表)
+        self._parent_wds: Dict[int, Tuple[str, List[str]]] = {}
+
+    async def start(self):
+        libc = _get_libc()
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 失败: {os.strerror(err)}")
+        self._fd = fd
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._watch_target(self.tts_wav_dir)
+            if self.llm_debug_dir is not None:
+                self._watch_target(self.llm_debug_dir)
+            self._loop.add_reader(fd, self._on_readable)
+        except Exception:
+            os.close(fd)
+            self._fd = None
+            raise
+
+    def close(self):
+        super().close()
+        if self._fd is not None:
+            try:
+                self._loop.remove_reader(self._fd)
+            except Exception:
+                pass
+            os.close(self._fd)
+            self._fd = None
+
+    def _add_watch(self, path: str, mask: int) -> int:
+        wd = _get_libc().inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch 失败 ({path}): {os.strerror(err)}")
+        return wd
+
+    def _watch_target(self, target: str):
+        """监听目标目录；目标不存在时监听最近的祖先目录等待其创建"""
+        kind = "tts" if target == self.tts_wav_dir else "text"
+        try:
+            wd = self._add_watch(target, _TTS_DIR_MASK if kind == "tts" else _TEXT_DIR_MASK)
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+        else:
+            self._target_wds[wd] = kind
+            self._scan_target(kind)
+            return
+
+        parent = os.path.dirname(target)
+        while parent and not os.path.isdir(parent):
+            next_parent = os.path.dirname(parent)
+            if next_parent == parent:
+                break
+            parent = next_parent
+        wd = self._add_watch(parent, _PARENT_DIR_MASK)
+        _, pending = self._parent_wds.setdefault(wd, (parent, []))
+        if target not in pending:
+            pending.append(target)
+        # 添加监听与目录创建之间存在竞争，检查一次下一级目录是否已出现
+        if os.path.isdir(self._next_component(parent, target)):
+            pending.remove(target)
+            self._watch_target(target)
+
+    @staticmethod
+    def _next_component(parent: str, target: str) -> str:
+        """target 路径中位于 parent 下一级的目录"""
+        return os.path.join(parent, os.path.relpath(target, parent).split(os.sep)[0])
+
+    def _scan_target(self, kind: str):
+        if kind == "tts":
+            unsettled = self._scan_tts_dir()
+            if unsettled:
+                # 扫描时尚未写完的文件：正常情况下会收到 IN_CLOSE_WRITE；
+                # 为防止 close 发生在添加监听之前，稍后再补扫一次
+                self._loop.call_later(self.settle_seconds, self._rescan_tts)
+        elif os.path.exists(os.path.join(self.llm_debug_dir, LLM_TEXT_NAME)):
+            self._emit_text()
+
+    def _rescan_tts(self):
+        if not self._closed:
+            self._scan_tts_dir()
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f"[OutputWatcher] inotify 读取异常: {e}", flush=True)
+            return
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0").decode("utf-8", "replace")
+            offset += name_len
+            self._handle_event(wd, mask, name)
+
+    def _handle_event(self, wd: int, mask: int, name: str):
+        if mask & _IN_Q_OVERFLOW:
+            print("[OutputWatcher] inotify 队列溢出，全量重扫", flush=True)
+            for kind in set(self._target_wds.values()):
+                self._scan_target(kind)
+            return
+        if mask & _IN_IGNORED:
+            self._target_wds.pop(wd, None)
+            self._parent_wds.pop(wd, None)
+            return
+
+        kind = self._target_wds.get(wd)
+        if kind == "tts":
+            if not mask & _IN_ISDIR:
+                self._emit_tts_file(name)
+        elif kind == "text":
+            if name == LLM_TEXT_NAME:
+                self._emit_text()
+
+        parent_entry = self._parent_wds.get(wd)
+        if parent_entry and mask & _IN_ISDIR:
+            parent, pending = parent_entry
+            created = os.path.join(parent, name)
+            for target in list(pending):
+                # 新建目录位于目标路径上时，向下一级继续监听
+                if self._next_component(parent, target) == created:
+                    pending.remove(target)
+                    self._watch_target(target)
+
+
+async def open_output_watcher(tts_wav_dir: str, llm_debug_dir: Optional[str] = None,
+                              skip_names: Optional[Iterable[str]] = None,
+                              backend: Optional[str] = None,
+                              poll_interval: float = 0.01) -> BaseOutputWatcher:
+    """创建并启动输出目录监听器
+
+    Args:
+        tts_wav_dir: tts_wav 目录（可以尚不存在）
+        llm_debug_dir: llm_debug 目录，为 None 时不监听 llm_text.txt
+        skip_names: 视为已处理的 wav 文件名（不会再推送事件）
+        backend: "auto" / "inotify" / "poll"，默认读取 WAV_WATCHER_BACKEND
+        poll_interval: 轮询回退的扫描间隔（秒）
+    """
+    backend = (backend or WAV_WATCHER_BACKEND).lower()
+    if backend in ("auto", "inotify") and inotify_available():
+        watcher = InotifyOutputWatcher(tts_wav_dir, llm_debug_dir, skip_names)
+        try:
+            await watcher.start()
+            return watcher
+        except OSError as e:
+            watcher.close()
+            print(f"[OutputWatcher] inotify 不可用，回退到轮询: {e}", flush=True)
+    elif backend == "inotify":
+        print("[OutputWatcher] 当前平台不支持 inotify，回退到轮询", flush=True)
+
+    watcher = PollingOutputWatcher(tts_wav_dir, llm_debug_dir, skip_names,
+                                   poll_interval=poll_interval)
+    await watcher.start()
+    return watcher
@@ -0,0 +1,120 @@
+"""
+OmniStream 音频缓冲基准测试：deque 逐样本缓冲（旧逻辑） vs AudioRingBuffer
+
+模拟单个会话的单工主循环（不含 VAD 推理本身）：
+- LiveKit 每 10ms 一帧 48kHz int16（480 样本），主循环每 100ms 收集一次并 np.concatenate
+- VAD 窗口：1 秒缓冲区满后每个 tick 取出整窗字节 + 最后 0.2 秒补静音到 1 秒
+- prefill 缓冲：每个 tick 追加，凑满 1 秒后取出前 1 秒发送、保留余量
+
+旧逻辑：deque(maxlen=48000).extend + np.array(list(deque))；prefill 为片段列表 + np.concatenate
+新逻辑：AudioRingBuffer.extend + 连续视图；prefill 为 AudioRingBuffer.head().copy() + consume
+
+输出每会话每秒音频消耗的 CPU 时间（time.process_time）和单个 tick 的耗时分布。
+
+用法：
+    python benchmarks/bench_audio_ring_buffer.py --seconds 60
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.utils.audio_ring_buffer import AudioRingBuffer  # noqa: E402
+
+SAMPLE_RATE = 48000
+FRAME_SAMPLES = SAMPLE_RATE // 100   # LiveKit 10ms 一帧
+FRAMES_PER_TICK = 10                 # 主循环 100ms 一次
+TAIL_SECONDS = 0.2
+
+
+def make_frames(seconds: int):
+    rng = np.random.default_rng(0)
+    total = seconds * 100
+    return [rng.integers(-3000, 3000, FRAME_SAMPLES, dtype=np.int16) for _ in range(total)]
+
+
+def run_deque(frames):
+    audio_buffer = deque(maxlen=SAMPLE_RATE)
+    audio_data_buffer = []
+    buffer_duration = 0
+    tick_ms = []
+    tail_samples = int(TAIL_SECONDS * SAMPLE_RATE)
+    silence_samples = SAMPLE_RATE - tail_samples
+    for i in range(0, len(frames), FRAMES_PER_TICK):
+        t0 = time.perf_counter()
+        combined_data = np.concatenate(frames[i:i + FRAMES_PER_TICK])
+        audio_buffer.extend(combined_data)
+        if len(audio_buffer) >= SAMPLE_RATE:
+            buffer_array = np.array(list(audio_buffer))
+            buffer_array.tobytes()
+            tail_audio = np.concatenate([buffer_array[-tail_samples:], np.zeros(silence_samples, dtype=np.int16)])
+            tail_audio.tobytes()
+            buffer_duration += len(combined_data) / SAMPLE_RATE * 1000
+            audio_data_buffer.append(combined_data)
+            if buffer_duration >= 1000:
+                remaining_duration = buffer_duration - 1000
+                remaining_samples = int(remaining_duration / 1000 * SAMPLE_RATE)
+                full_audio_data = np.concatenate(audio_data_buffer)
+                if remaining_samples > 0:
+                    audio_data_buffer = [full_audio_data[-remaining_samples:]]
+                    buffer_duration = remaining_duration
+                else:
+                    audio_data_buffer = []
+                    buffer_duration = 0
+        tick_ms.append((time.perf_counter() - t0) * 1000)
+    return tick_ms
+
+
+def run_ring(frames):
+    audio_buffer = AudioRingBuffer(SAMPLE_RATE)
+    prefill_buffer = AudioRingBuffer(SAMPLE_RATE * 10)
+    tick_ms = []
+    tail_samples = int(TAIL_SECONDS * SAMPLE_RATE)
+    silence_samples = SAMPLE_RATE - tail_samples
+    for i in range(0, len(frames), FRAMES_PER_TICK):
+        t0 = time.perf_counter()
+        combined_data = np.concatenate(frames[i:i + FRAMES_PER_TICK])
+        audio_buffer.extend(combined_data)
+        if len(audio_buffer) >= SAMPLE_RATE:
+            audio_buffer.view().tobytes()
+            tail_audio = np.zeros(tail_samples + silence_samples, dtype=np.int16)
+            tail_audio[:tail_samples] = audio_buffer.tail(tail_samples)
+            tail_audio.tobytes()
+            prefill_buffer.extend(combined_data)
+            if len(prefill_buffer) >= SAMPLE_RATE:
+                prefill_buffer.head(SAMPLE_RATE).copy()
+                prefill_buffer.consume(SAMPLE_RATE)
+        tick_ms.append((time.perf_counter() - t0) * 1000)
+    return tick_ms
+
+
+def measure(name, fn, frames, seconds):
+    cpu0 = time.process_time()
+    tick_ms = fn(frames)
+    cpu_ms = (time.process_time() - cpu0) * 1000
+    per_second = cpu_ms / seconds
+    print(f"  {name:<6} CPU/会话/秒音频={per_second:8.3f}ms ({per_second / 10:6.3f}% 单核)  "
+          f"tick_mean={statistics.mean(tick_ms):7.3f}ms  tick_max={max(tick_ms):7.3f}ms", flush=True)
+    return per_second
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OmniStream 音频缓冲基准测试")
+    parser.add_argument("--seconds", type=int, default=60, help="模拟的会话音频时长（秒）")
+    args = parser.parse_args()
+
+    frames = make_frames(args.seconds)
+    print(f"{args.seconds}s 音频, {len(frames)} 帧 x {FRAME_SAMPLES} 样本, 每 {FRAMES_PER_TICK} 帧一个 tick", flush=True)
+    old = measure("deque", run_deque, frames, args.seconds)
+    new = measure("ring", run_ring, frames, args.seconds)
+    print(f"  加速比: {old / max(new, 1e-9):.1f}x", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+TTS 输出重采样对比：逐分片 resample_poly（旧逻辑） vs StreamingResampler
+
+把一段音频按 TTS 分片大小切开，逐片重采样后拼接，与整段一次性 resample_poly 的结果对比：
+- 每秒音频消耗的 CPU 时间（time.process_time）
+- 分片边界附近（±--edge 个输出样本）和其余位置的最大误差（int16 量化单位）
+- 边界处相邻样本跳变的最大值（咔哒声的来源）
+
+默认用合成的 24kHz 语音样信号（谐波 + 包络），也可以用 --wav 指定 16bit 单声道 WAV。
+需要 scipy（参考结果和旧逻辑都用 resample_poly）。
+
+用法：
+    python benchmarks/bench_streaming_resampler.py --in-rate 24000 --out-rate 48000 --chunk-ms 40,200,1000
+    python benchmarks/bench_streaming_resampler.py --in-rate 48000 --out-rate 16000 --chunk-ms 1000
+"""
+import argparse
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+from scipy.signal import resample_poly
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.utils.streaming_resampler import StreamingResampler  # noqa: E402
+
+
+def load_audio(path, sample_rate: int, seconds: float) -> np.ndarray:
+    if path:
+        with wave.open(path, "rb") as wf:
+            if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+                raise ValueError(f"{path}: 只支持 16bit 单声道 WAV")
+            if wf.getframerate() != sample_rate:
+                raise ValueError(f"{path}: 采样率 {wf.getframerate()} 与 --in-rate {sample_rate} 不一致")
+            return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    f0 = 180 + 40 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 2 * t))
+    return np.clip(voiced * envelope * 6000, -32768, 32767).astype(np.int16)
+
+
+def old_per_chunk(chunks, in_rate, out_rate):
+    out = []
+    for chunk in chunks:
+        resampled = resample_poly(chunk, out_rate, in_rate, padtype='line')
+        out.append(np.clip(resampled, -32768, 32767).astype(np.int16))
+    return np.concatenate(out)
+
+
+def streaming(chunks, in_rate, out_rate):
+    resampler = StreamingResampler(in_rate, out_rate)
+    out = [resampler.process(chunk) for chunk in chunks]
+    out.append(resampler.flush())
+    return np.concatenate(out)
+
+
+def boundary_stats(result, reference, boundaries, edge):
+    n = min(len(result), len(reference))
+    error = np.abs(result[:n].astype(np.int32) - reference[:n].astype(np.int32))
+    near = np.zeros(n, dtype=bool)
+    for b in boundaries:
+        near[max(0, b - edge):min(n, b + edge)] = True
+    jumps = [abs(int(result[b]) - int(result[b - 1])) for b in boundaries if 0 < b < len(result)]
+    ref_jumps = [abs(int(reference[b]) - int(reference[b - 1])) for b in boundaries if 0 < b < len(reference)]
+    return (int(error[near].max()) if near.any() else 0,
+            int(error[~near].max()) if (~near).any() else 0,
+            max(jumps, default=0), max(ref_jumps, default=0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐分片 resample_poly vs 流式重采样器")
+    parser.add_argument("--wav", default=None, help="16bit 单声道 WAV（采样率需等于 --in-rate），默认合成信号")
+    parser.add_argument("--seconds", type=float, default=20.0, help="合成信号时长")
+    parser.add_argument("--in-rate", type=int, default=24000, help="输入采样率（TTS 为 24000）")
+    parser.add_argument("--out-rate", type=int, default=48000, help="输出采样率（WebRTC 为 48000）")
+    parser.add_argument("--chunk-ms", default="40,200,1000", help="逗号分隔的分片时长（毫秒）")
+    parser.add_argument("--edge", type=int, default=64, help="统计边界误差的范围（输出样本数）")
+    parser.add_argument("--repeat", type=int, default=5, help="CPU 计时重复次数")
+    args = parser.parse_args()
+
+    audio = load_audio(args.wav, args.in_rate, args.seconds)
+    seconds = len(audio) / args.in_rate
+    reference = np.clip(resample_poly(audio, args.out_rate, args.in_rate), -32768, 32767).astype(np.int16)
+    print(f"{seconds:.1f}s 音频, {args.in_rate} -> {args.out_rate} Hz, 参考为整段 resample_poly", flush=True)
+    print(f"  {'分片ms':>7} {'方法':<10}{'CPU ms/s':>10}{'边界误差':>10}{'其余误差':>10}{'边界跳变':>10}{'参考跳变':>10}", flush=True)
+
+    for chunk_ms in [int(v) for v in args.chunk_ms.split(",") if v.strip()]:
+        step = args.in_rate * chunk_ms // 1000
+        chunks = [audio[i:i + step] for i in range(0, len(audio), step)]
+        # 分片边界在输出中的位置
+        boundaries = [int(np.ceil(i * args.out_rate / args.in_rate)) for i in range(step, len(audio), step)]
+        for name, fn in (("逐片poly", old_per_chunk), ("streaming", streaming)):
+            result = fn(chunks, args.in_rate, args.out_rate)
+            cpu0 = time.process_time()
+            for _ in range(args.repeat):
+                fn(chunks, args.in_rate, args.out_rate)
+            cpu_ms = (time.process_time() - cpu0) * 1000 / args.repeat / seconds
+            near, far, jump, ref_jump = boundary_stats(result, reference, boundaries, args.edge)
+            print(f"  {chunk_ms:>7} {name:<10}{cpu_ms:10.3f}{near:10d}{far:10d}{jump:10d}{ref_jump:10d}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
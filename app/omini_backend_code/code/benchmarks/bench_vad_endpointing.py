@@ -0,0 +1,443 @@
+"""
+离线 VAD 断句基准：用标注好的 WAV 语料回放 OmniStream 的单工 VAD 判决
+
+每个 WAV 按 voice_chat 配置的输入采样率（ingest_sample_rate）和 tick 回放（不 sleep，远快于实时），
+tick 与 OmniStream._stream_trigger_samples 相同：配置了 stream_trigger_ms 时固定按该时长，
+否则流式VAD为一个 VAD 窗口、整段VAD为 100ms；--sample-rate / --tick-ms 可覆盖。完全复用线上代码：
+- StreamingVad（可选 EnergyGate）给出 dur_vad_full / dur_vad_tail
+- VadDecision 给出 full_vad_result / tail_vad_result（时钟为回放时间）
+- 与 OmniStream 主循环相同：1 秒窗口未满时只送入音频；full_vad_result=False 即一次断句，
+  之后清空窗口、重置流式 VAD；tail_vad_result=False 开始抢跑，抢跑期间尾部又出现语音即抢跑失败，
+  抢跑期间出现断句即抢跑成功
+
+标注：与 WAV 同名的 .json（{"speech": [[开始秒, 结束秒], ...]}）或 Audacity 标签 .txt
+（每行「开始<TAB>结束[<TAB>标签]」）。每个标注段视为用户的一轮说话。
+
+统计：
+- 断句延迟：标注段结束到其后第一次断句的时间（p50/p90/p99/平均/最大）
+- 误断：标注段内部出现的断句（说话中途被切断）
+- 漏断：标注段结束后、下一段开始前没有断句
+- 多余断句：不对应任何标注段结束的断句
+- 抢跑：开始次数、成功率（以断句结束的比例）、成功时的平均提前量
+- 每秒音频的 CPU 时间和实时率
+
+参数扫描：--sweep threshold=0.5,0.6,0.7 dur_vad_threshold=0.1,0.2 对所有组合各跑一遍语料。
+可扫描的参数见 DEFAULT_PARAMS。需要 onnxruntime 和 Silero 模型。
+
+--legacy：另外用旧的整段VAD（每个 tick 对 1 秒窗口和补静音的尾部各跑一次 run_vad，不加能量门）
+回放同一语料，两套统计并排输出；并在整段VAD的 tick 序列上同步跑两种判决（以整段VAD的断句清空窗口），
+输出逐 tick 的 (full_vad_result, tail_vad_result) 一致率和断句一致率。
+
+用法：
+    python benchmarks/bench_vad_endpointing.py --corpus data/vad_corpus
+    python benchmarks/bench_vad_endpointing.py --corpus data/vad_corpus --legacy
+    python benchmarks/bench_vad_endpointing.py --corpus data/vad_corpus --sweep threshold=0.5,0.7 min_silence_ms=300,500
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import statistics
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_voice_chat_settings  # noqa: E402
+from voice_chat.vad import vad_utils  # noqa: E402
+from voice_chat.vad.energy_gate import EnergyGate, FLOOR_SMOOTHING_MS  # noqa: E402
+from voice_chat.vad.streaming_vad import StreamingVad  # noqa: E402
+from voice_chat.vad.vad_decision import VadDecision  # noqa: E402
+
+# 整段VAD未配置 stream_trigger_ms 时的 tick（与 OmniStream 相同）
+FULL_WINDOW_TICK_MS = 100
+
+# 默认值与线上一致：VadOptions、LoginRequest（durVadTime/durVadThreshold）、VadDecision、voice_chat 配置
+DEFAULT_PARAMS = {
+    "threshold": 0.7,
+    "min_silence_ms": 500,
+    "speech_pad_ms": 30,
+    "dur_vad_time": 0.4,
+    "dur_vad_threshold": 0.1,
+    "start_threshold": 0.4,
+    "end_threshold": 0.1,
+    "min_speech_seconds": 0.3,
+    "energy_gate": 1,
+    "gate_open_db": 9.0,
+    "gate_close_db": 4.0,
+    "gate_hangover_ms": 300,
+    "gate_floor_window_ms": 1500,
+}
+
+
+def load_labels(wav_path: str):
+    stem = os.path.splitext(wav_path)[0]
+    if os.path.isfile(stem + ".json"):
+        with open(stem + ".json", encoding="utf-8") as f:
+            return sorted((float(s), float(e)) for s, e in json.load(f)["speech"])
+    if os.path.isfile(stem + ".txt"):
+        segments = []
+        with open(stem + ".txt", encoding="utf-8") as f:
+            for line in f:
+                parts = line.strip().split("\t")
+                if len(parts) >= 2:
+                    segments.append((float(parts[0]), float(parts[1])))
+        return sorted(segments)
+    return None
+
+
+def load_wav(path: str, target_rate: int) -> np.ndarray:
+    """读取 16bit 单声道 WAV，统一到回放采样率"""
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+            raise ValueError(f"{path}: 只支持 16bit 单声道 WAV")
+        sample_rate = wf.getframerate()
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    if sample_rate != target_rate:
+        from scipy.signal import resample_poly
+        g = math.gcd(target_rate, sample_rate)
+        resampled = resample_poly(pcm.astype(np.float32), target_rate // g, sample_rate // g)
+        pcm = np.clip(resampled, -32768, 32767).astype(np.int16)
+    return pcm
+
+
+def load_corpus(corpus_dir: str, sample_rate: int):
+    corpus = []
+    for root, _, files in os.walk(corpus_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(".wav"):
+                continue
+            path = os.path.join(root, name)
+            labels = load_labels(path)
+            if labels is None:
+                print(f"  跳过（无标注）: {path}", flush=True)
+                continue
+            corpus.append((path, load_wav(path, sample_rate), labels))
+    return corpus
+
+
+def make_vad_options(params: dict) -> vad_utils.VadOptions:
+    return vad_utils.VadOptions(
+        threshold=params["threshold"],
+        min_silence_duration_ms=int(params["min_silence_ms"]),
+        speech_pad_ms=int(params["speech_pad_ms"]),
+    )
+
+
+def tick_samples_for(sample_rate: int, tick_ms: int, streaming: bool, params: dict) -> int:
+    """与 OmniStream._stream_trigger_samples 相同：配置了 tick 时固定，否则流式VAD一个窗口、整段VAD 100ms"""
+    if tick_ms > 0:
+        return sample_rate * tick_ms // 1000
+    if streaming:
+        return make_vad_options(params).window_size_samples * sample_rate // 16000
+    return sample_rate * FULL_WINDOW_TICK_MS // 1000
+
+
+class StreamingDurations:
+    """线上流式VAD：只送入新音频，整窗/尾部语音时长从概率历史得到"""
+
+    def __init__(self, params: dict, model, sample_rate: int):
+        vad_options = make_vad_options(params)
+        gate = None
+        if params["energy_gate"]:
+            window_ms = vad_options.window_size_samples / 16
+            gate = EnergyGate(open_db=params["gate_open_db"], close_db=params["gate_close_db"],
+                              hangover_frames=math.ceil(params["gate_hangover_ms"] / window_ms),
+                              floor_window_frames=math.ceil(params["gate_floor_window_ms"] / window_ms),
+                              floor_smoothing=min(1.0, window_ms / FLOOR_SMOOTHING_MS))
+        self.engine = StreamingVad(sample_rate, vad_options, model=model, gate=gate)
+        self.dur_vad_time = params["dur_vad_time"]
+
+    def feed(self, chunk: np.ndarray):
+        self.engine.feed(chunk)
+
+    def durations(self, window: np.ndarray):
+        return (self.engine.window_speech_duration(1.0),
+                self.engine.tail_speech_duration(self.dur_vad_time, 1.0))
+
+    def reset(self):
+        self.engine.reset()
+
+
+class LegacyDurations:
+    """旧的整段VAD（OmniStream._full_window_vad_durations 不加能量门）：每个 tick 对 1 秒窗口和
+    「最后 dur_vad_time 秒 + 静音」各跑一次 run_vad"""
+
+    def __init__(self, params: dict, sample_rate: int):
+        self.vad_options = make_vad_options(params)
+        self.sample_rate = sample_rate
+        self.tail_samples = int(params["dur_vad_time"] * sample_rate)
+        self.silence_samples = int((1 - params["dur_vad_time"]) * sample_rate)
+
+    def feed(self, chunk: np.ndarray):
+        pass
+
+    def durations(self, window: np.ndarray):
+        dur_vad_full, _, _ = vad_utils.run_vad(window.tobytes(), self.sample_rate, self.vad_options)
+        tail_audio = np.zeros(self.tail_samples + self.silence_samples, dtype=np.int16)
+        tail_view = window[-self.tail_samples:]
+        tail_audio[:len(tail_view)] = tail_view
+        dur_vad_tail, _, _ = vad_utils.run_vad(tail_audio.tobytes(), self.sample_rate, self.vad_options)
+        return dur_vad_full, dur_vad_tail
+
+    def reset(self):
+        pass
+
+
+class EndpointReplay:
+    """按 OmniStream 主循环回放一条音频，记录断句和抢跑事件
+
+    sources 为一个或多个语音时长来源，共用同一 tick 序列；第一个来源的断句驱动清空窗口（与线上一致），
+    其余来源只做同步对比（见 run 返回的 agreement）。
+    """
+
+    def __init__(self, params: dict, sources, sample_rate: int, tick_samples: int):
+        self.params = params
+        self.now = 0.0
+        self.sources = sources
+        self.sample_rate = sample_rate
+        self.tick_samples = tick_samples
+        self.decisions = [VadDecision(
+            dur_vad_threshold=params["dur_vad_threshold"],
+            start_threshold=params["start_threshold"],
+            end_threshold=params["end_threshold"],
+            min_speech_seconds=params["min_speech_seconds"],
+            clock=lambda: self.now,
+        ) for _ in sources]
+
+    def run(self, pcm: np.ndarray) -> dict:
+        endpoints, race_starts, race_wins, race_fails = [], [], [], []
+        race_started_at = None
+        window = np.zeros(0, dtype=np.int16)
+        ticks = agree_ticks = shadow_endpoints = 0
+        for offset in range(0, len(pcm), self.tick_samples):
+            chunk = pcm[offset:offset + self.tick_samples]
+            self.now = (offset + len(chunk)) / self.sample_rate
+            window = np.concatenate([window, chunk])[-self.sample_rate:]
+            for source in self.sources:
+                source.feed(chunk)
+            if len(window) < self.sample_rate:
+                continue
+            results = [decision.update(*source.durations(window))
+                       for source, decision in zip(self.sources, self.decisions)]
+            full_vad_result, tail_vad_result = results[0]
+            ticks += 1
+            agree_ticks += all(r == results[0] for r in results[1:])
+            if full_vad_result:
+                if not tail_vad_result and race_started_at is None:
+                    race_started_at = self.now
+                    race_starts.append(self.now)
+                elif tail_vad_result and race_started_at is not None:
+                    race_fails.append(self.now)
+                    race_started_at = None
+            else:
+                endpoints.append(self.now)
+                shadow_endpoints += all(not r[0] for r in results[1:])
+                if race_started_at is not None:
+                    race_wins.append((race_started_at, self.now))
+                    race_started_at = None
+                window = window[:0]
+                for source in self.sources:
+                    source.reset()
+        return {"endpoints": endpoints, "race_starts": race_starts,
+                "race_wins": race_wins, "race_fails": race_fails,
+                "agreement": {"ticks": ticks, "agree_ticks": agree_ticks,
+                              "endpoints": len(endpoints), "agree_endpoints": shadow_endpoints}}
+
+
+def score(events: dict, labels, duration: float) -> dict:
+    endpoints = events["endpoints"]
+    latencies, cutoffs, missed = [], 0, 0
+    matched = set()
+    for k, (start, end) in enumerate(labels):
+        next_start = labels[k + 1][0] if k + 1 < len(labels) else duration + 1.0
+        inside = [t for t in endpoints if start < t < end]
+        cutoffs += len(inside)
+        matched.update(inside)
+        after = [t for t in endpoints if end <= t < next_start]
+        if after:
+            latencies.append(after[0] - end)
+            matched.add(after[0])
+        else:
+            missed += 1
+    return {
+        "segments": len(labels),
+        "latencies": latencies,
+        "cutoffs": cutoffs,
+        "missed": missed,
+        "spurious": len([t for t in endpoints if t not in matched]),
+        "race_starts": len(events["race_starts"]),
+        "race_wins": len(events["race_wins"]),
+        "race_fails": len(events["race_fails"]),
+        "race_leads": [end - start for start, end in events["race_wins"]],
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    data = sorted(values)
+    return data[min(len(data) - 1, int(round((len(data) - 1) * pct / 100)))]
+
+
+def run_corpus(corpus, params: dict, make_sources, sample_rate: int, tick_samples: int,
+               verbose: bool = False) -> dict:
+    """make_sources(params) 返回本次回放的语音时长来源列表（每个文件重新创建）"""
+    total = {"segments": 0, "latencies": [], "cutoffs": 0, "missed": 0, "spurious": 0,
+             "race_starts": 0, "race_wins": 0, "race_fails": 0, "race_leads": [],
+             "agreement": {"ticks": 0, "agree_ticks": 0, "endpoints": 0, "agree_endpoints": 0}}
+    audio_seconds = cpu_seconds = wall_seconds = 0.0
+    for path, pcm, labels in corpus:
+        duration = len(pcm) / sample_rate
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        events = EndpointReplay(params, make_sources(params), sample_rate, tick_samples).run(pcm)
+        cpu_seconds += time.process_time() - cpu0
+        wall_seconds += time.perf_counter() - wall0
+        audio_seconds += duration
+        for key, value in events["agreement"].items():
+            total["agreement"][key] += value
+        result = score(events, labels, duration)
+        for key, value in result.items():
+            total[key] += value
+        if verbose:
+            print(f"  {os.path.basename(path)}: 段={result['segments']} 误断={result['cutoffs']} "
+                  f"漏断={result['missed']} 多余={result['spurious']} "
+                  f"延迟={[round(v, 2) for v in result['latencies']]}", flush=True)
+    total["cpu_ms_per_audio_s"] = cpu_seconds * 1000 / max(audio_seconds, 1e-9)
+    total["realtime_factor"] = wall_seconds / max(audio_seconds, 1e-9)
+    total["audio_seconds"] = audio_seconds
+    return total
+
+
+def summarize(total: dict) -> dict:
+    latencies = total["latencies"]
+    segments = max(total["segments"], 1)
+    return {
+        "segments": total["segments"],
+        "latency_p50": percentile(latencies, 50),
+        "latency_p90": percentile(latencies, 90),
+        "latency_p99": percentile(latencies, 99),
+        "latency_mean": statistics.mean(latencies) if latencies else float("nan"),
+        "latency_max": max(latencies) if latencies else float("nan"),
+        "cutoff_rate": total["cutoffs"] / segments,
+        "cutoffs": total["cutoffs"],
+        "missed": total["missed"],
+        "spurious": total["spurious"],
+        "race_starts": total["race_starts"],
+        "race_win_rate": total["race_wins"] / total["race_starts"] if total["race_starts"] else float("nan"),
+        "race_lead_mean": statistics.mean(total["race_leads"]) if total["race_leads"] else float("nan"),
+        "cpu_ms_per_audio_s": total["cpu_ms_per_audio_s"],
+        "realtime_factor": total["realtime_factor"],
+    }
+
+
+def print_summary(summary: dict):
+    print(f"  标注段 {summary['segments']}  断句延迟 p50={summary['latency_p50']:.2f}s "
+          f"p90={summary['latency_p90']:.2f}s p99={summary['latency_p99']:.2f}s "
+          f"mean={summary['latency_mean']:.2f}s max={summary['latency_max']:.2f}s", flush=True)
+    print(f"  误断 {summary['cutoffs']} ({summary['cutoff_rate'] * 100:.1f}%/段)  漏断 {summary['missed']}  "
+          f"多余断句 {summary['spurious']}", flush=True)
+    print(f"  抢跑 {summary['race_starts']} 次  成功率 {summary['race_win_rate'] * 100:.1f}%  "
+          f"平均提前 {summary['race_lead_mean']:.2f}s", flush=True)
+    print(f"  CPU/秒音频 {summary['cpu_ms_per_audio_s']:.2f}ms  实时率 {summary['realtime_factor']:.4f}", flush=True)
+
+
+def print_agreement(agreement: dict):
+    ticks = max(agreement["ticks"], 1)
+    endpoints = max(agreement["endpoints"], 1)
+    print(f"  流式 vs 整段（同一 tick 序列）: 判决一致 {agreement['agree_ticks']}/{agreement['ticks']} tick "
+          f"({agreement['agree_ticks'] / ticks * 100:.2f}%)  断句一致 {agreement['agree_endpoints']}/"
+          f"{agreement['endpoints']} ({agreement['agree_endpoints'] / endpoints * 100:.1f}%)", flush=True)
+
+
+def parse_sweep(items):
+    grid = {}
+    for item in items:
+        key, _, values = item.partition("=")
+        if key not in DEFAULT_PARAMS:
+            raise SystemExit(f"未知的扫描参数: {key}，可选 {list(DEFAULT_PARAMS)}")
+        grid[key] = [type(DEFAULT_PARAMS[key])(float(v)) for v in values.split(",") if v]
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线 VAD 断句基准")
+    parser.add_argument("--corpus", required=True, help="WAV + 标注文件所在目录（递归查找）")
+    parser.add_argument("--sweep", nargs="*", default=[], help="参数扫描，如 threshold=0.5,0.7 dur_vad_time=0.2,0.4")
+    parser.add_argument("--set", nargs="*", default=[], help="覆盖默认参数，如 energy_gate=0")
+    parser.add_argument("--json", default=None, help="把每组参数的汇总结果写入 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="输出每个文件的结果")
+    parser.add_argument("--legacy", action="store_true",
+                        help="同时回放旧的整段VAD（run_vad），并排输出统计和两者的判决一致率")
+    parser.add_argument("--sample-rate", type=int, default=None,
+                        help="回放采样率，默认取 voice_chat.ingest_sample_rate")
+    parser.add_argument("--tick-ms", type=int, default=None,
+                        help="每个 tick 的音频时长（毫秒），默认取 voice_chat.stream_trigger_ms（0 为按模式自动）")
+    args = parser.parse_args()
+
+    config = get_voice_chat_settings()
+    sample_rate = args.sample_rate or config.ingest_sample_rate
+    tick_ms = config.stream_trigger_ms if args.tick_ms is None else args.tick_ms
+
+    base_params = dict(DEFAULT_PARAMS)
+    for key, values in parse_sweep(args.set).items():
+        base_params[key] = values[0]
+    grid = parse_sweep(args.sweep)
+
+    model = vad_utils.get_vad_model()
+    if model is None:
+        print("VAD模型未加载（需要 onnxruntime 和 Silero 模型文件）", flush=True)
+        sys.exit(1)
+
+    corpus = load_corpus(args.corpus, sample_rate)
+    if not corpus:
+        print(f"{args.corpus} 中没有带标注的 WAV", flush=True)
+        sys.exit(1)
+    print(f"语料 {len(corpus)} 个文件, {sum(len(c[1]) for c in corpus) / sample_rate:.1f}s 音频 @ {sample_rate}Hz, "
+          f"tick {'自动' if tick_ms <= 0 else f'{tick_ms}ms'}", flush=True)
+
+    def streaming_sources(params):
+        return [StreamingDurations(params, model, sample_rate)]
+
+    def legacy_sources(params):
+        return [LegacyDurations(params, sample_rate)]
+
+    def lockstep_sources(params):
+        # 整段VAD在前：以旧行为的断句清空窗口，流式VAD同步给出判决用于对比
+        return [LegacyDurations(params, sample_rate), StreamingDurations(params, model, sample_rate)]
+
+    results = []
+    keys = list(grid)
+    for combo in itertools.product(*(grid[k] for k in keys)):
+        params = dict(base_params, **dict(zip(keys, combo)))
+        label = ", ".join(f"{k}={v}" for k, v in zip(keys, combo)) or "默认参数"
+        print(f"[{label}]", flush=True)
+        stream_tick = tick_samples_for(sample_rate, tick_ms, True, params)
+        summary = summarize(run_corpus(corpus, params, streaming_sources, sample_rate, stream_tick,
+                                       verbose=args.verbose))
+        print(f"  流式VAD (tick {stream_tick * 1000 / sample_rate:.0f}ms):", flush=True)
+        print_summary(summary)
+        result = {"params": params, "summary": summary}
+        if args.legacy:
+            legacy_tick = tick_samples_for(sample_rate, tick_ms, False, params)
+            legacy_summary = summarize(run_corpus(corpus, params, legacy_sources, sample_rate, legacy_tick,
+                                                  verbose=args.verbose))
+            print(f"  整段VAD (tick {legacy_tick * 1000 / sample_rate:.0f}ms):", flush=True)
+            print_summary(legacy_summary)
+            agreement = run_corpus(corpus, params, lockstep_sources, sample_rate, legacy_tick)["agreement"]
+            print_agreement(agreement)
+            result.update(legacy=legacy_summary, agreement=agreement)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
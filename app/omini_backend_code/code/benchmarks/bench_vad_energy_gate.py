@@ -0,0 +1,201 @@
+"""
+能量门离线对比：StreamingVad 不加门 vs 加 EnergyGate
+
+按 OmniStream 的方式把 WAV 以 100ms 为一个 tick 送入两个 StreamingVad 实例（Silero 模型相同），
+每个 tick 计算整窗 / 尾部语音时长并套用 vad_dual_detection 的 vad_stream_started 判决
+（> 0.4 秒开始、< 0.1 秒结束），对比：
+- vad_stream_started 的切换时刻是否完全一致
+- dur_vad_full / dur_vad_tail 的最大差值和不一致的 tick 数
+- 被能量门跳过的窗口比例、ONNX 推理次数
+- 每秒音频消耗的 CPU 时间（time.process_time，包含重采样和判决）
+
+WAV 需为 16bit 单声道，采样率为 16kHz 的整数倍（线上为 48kHz）。--noise-dbfs 可叠加白噪声，
+检验噪声底自适应。需要 onnxruntime 和 Silero 模型（与服务相同的 vad_utils.get_vad_model）。
+
+--steady-noise 只跑能量门（不需要模型）：按 16kHz 窗口喂入给定电平的稳定白噪声 / 棕噪声，
+报告门最后一次打开的时刻和学习结束后的开门比例。门必须在最小值统计窗口之后关闭，
+否则每个窗口都会送进 Silero（噪声底被宽带噪声锁死）。
+
+用法：
+    python benchmarks/bench_vad_energy_gate.py --wav a.wav b.wav --noise-dbfs -50
+    python benchmarks/bench_vad_energy_gate.py --steady-noise -55 -50 -40
+"""
+import argparse
+import math
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice_chat.vad import vad_utils  # noqa: E402
+from voice_chat.vad.energy_gate import EnergyGate, FLOOR_SMOOTHING_MS  # noqa: E402
+from voice_chat.vad.streaming_vad import StreamingVad  # noqa: E402
+
+TICK_MS = 100
+TAIL_SECONDS = 0.2
+STEADY_NOISE_SECONDS = 30.0
+
+
+class CountingModel:
+    """统计推理次数的模型包装"""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def get_initial_state(self, batch_size: int):
+        return self.model.get_initial_state(batch_size)
+
+    def __call__(self, x, state, sr: int):
+        self.calls += 1
+        return self.model(x, state, sr)
+
+
+def load_wav(path: str, noise_dbfs=None, seed: int = 0):
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+            raise ValueError(f"{path}: 只支持 16bit 单声道 WAV")
+        sample_rate = wf.getframerate()
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    if noise_dbfs is not None:
+        rng = np.random.default_rng(seed)
+        noise = rng.normal(0, 32768.0 * 10 ** (noise_dbfs / 20), len(pcm))
+        pcm = np.clip(pcm.astype(np.float64) + noise, -32768, 32767).astype(np.int16)
+    return pcm, sample_rate
+
+
+def make_gate(args, frame_ms: float) -> EnergyGate:
+    """与 OmniStream 相同的参数换算"""
+    return EnergyGate(open_db=args.open_db, close_db=args.close_db,
+                      hangover_frames=math.ceil(args.hangover_ms / frame_ms),
+                      floor_window_frames=math.ceil(args.floor_window_ms / frame_ms),
+                      floor_smoothing=min(1.0, frame_ms / FLOOR_SMOOTHING_MS))
+
+
+def steady_noise(kind: str, dbfs: float, seconds: float, sample_rate: int = 16000, seed: int = 0) -> np.ndarray:
+    """给定 RMS 电平的稳定噪声：white 为白噪声，brown 为泄漏积分的白噪声（能量集中在低频）"""
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 1.0, int(seconds * sample_rate))
+    if kind == "brown":
+        out = np.empty_like(noise)
+        acc = 0.0
+        for i, x in enumerate(noise):
+            acc = 0.999 * acc + x
+            out[i] = acc
+        noise = out - out.mean()
+    noise *= 32768.0 * 10 ** (dbfs / 20) / np.sqrt(np.mean(noise * noise))
+    return np.clip(noise, -32768, 32767).astype(np.int16)
+
+
+def run_steady_noise(args) -> bool:
+    window = vad_utils.VadOptions().window_size_samples
+    frame_ms = window / 16
+    settle = math.ceil(args.floor_window_ms / frame_ms) + math.ceil(args.hangover_ms / frame_ms)
+    all_closed = True
+    for kind in ("white", "brown"):
+        for dbfs in args.steady_noise:
+            pcm = steady_noise(kind, dbfs, STEADY_NOISE_SECONDS)
+            frames = pcm[:len(pcm) // window * window].reshape(-1, window)
+            gate = make_gate(args, frame_ms)
+            opened = gate.process(frames)
+            open_idx = np.flatnonzero(opened)
+            last_open_s = (open_idx[-1] + 1) * frame_ms / 1000 if len(open_idx) else 0.0
+            after = float(np.mean(opened[settle:])) if len(opened) > settle else 0.0
+            closed = after < 0.05
+            all_closed = all_closed and closed
+            print(f"{kind:5s} {dbfs:6.1f} dBFS: 最后开门 {last_open_s:5.2f}s, 学习后开门比例 {after * 100:5.1f}%, "
+                  f"噪声底 {gate.noise_floor_dbfs:.1f} dBFS  {'OK' if closed else '未关门'}", flush=True)
+    return all_closed
+
+
+def replay(pcm: np.ndarray, sample_rate: int, model, gate):
+    """逐 tick 回放，返回 (每 tick 的 (full, tail), 切换事件, CPU 秒数, 引擎)"""
+    engine = StreamingVad(sample_rate, model=model, gate=gate)
+    tick = sample_rate * TICK_MS // 1000
+    durations, events = [], []
+    started = False
+    cpu0 = time.process_time()
+    for i, offset in enumerate(range(0, len(pcm), tick)):
+        engine.feed(pcm[offset:offset + tick])
+        dur_full = engine.window_speech_duration(1.0)
+        dur_tail = engine.tail_speech_duration(TAIL_SECONDS, 1.0)
+        durations.append((dur_full, dur_tail))
+        if dur_full > 0.4 and not started:
+            started = True
+            events.append((i, "start"))
+        elif dur_full < 0.1 and started:
+            started = False
+            events.append((i, "end"))
+    return durations, events, time.process_time() - cpu0, engine
+
+
+def compare(path: str, args, base_model):
+    pcm, sample_rate = load_wav(path, args.noise_dbfs)
+    seconds = len(pcm) / sample_rate
+    window_ms = vad_utils.VadOptions().window_size_samples / 16
+
+    plain_model = CountingModel(base_model)
+    plain = replay(pcm, sample_rate, plain_model, None)
+    gate = make_gate(args, window_ms)
+    gated_model = CountingModel(base_model)
+    gated = replay(pcm, sample_rate, gated_model, gate)
+
+    diffs_full = [abs(a[0] - b[0]) for a, b in zip(plain[0], gated[0])]
+    diffs_tail = [abs(a[1] - b[1]) for a, b in zip(plain[0], gated[0])]
+    mismatched = sum(1 for a, b in zip(plain[0], gated[0]) if a != b)
+    engine = gated[3]
+    skipped = engine.windows_skipped / max(engine.windows_processed, 1)
+
+    print(f"{os.path.basename(path)}: {seconds:.1f}s @ {sample_rate}Hz, {len(plain[0])} ticks, "
+          f"噪声底 {gate.noise_floor_dbfs:.1f} dBFS", flush=True)
+    print(f"  切换一致: {plain[1] == gated[1]}  (无门 {len(plain[1])} 次 / 有门 {len(gated[1])} 次)", flush=True)
+    if plain[1] != gated[1]:
+        print(f"    无门: {plain[1]}", flush=True)
+        print(f"    有门: {gated[1]}", flush=True)
+    print(f"  时长不一致 tick: {mismatched}  max|Δfull|={max(diffs_full, default=0):.3f}s  "
+          f"max|Δtail|={max(diffs_tail, default=0):.3f}s", flush=True)
+    print(f"  跳过窗口: {skipped * 100:.1f}%  推理次数: {plain_model.calls} -> {gated_model.calls}", flush=True)
+    plain_cpu = plain[2] * 1000 / seconds
+    gated_cpu = gated[2] * 1000 / seconds
+    print(f"  CPU/秒音频: {plain_cpu:.2f}ms -> {gated_cpu:.2f}ms  ({plain_cpu / max(gated_cpu, 1e-9):.1f}x)", flush=True)
+    return plain[1] == gated[1], plain[2], gated[2], seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="能量门 + Silero VAD 离线准确率/CPU 对比")
+    parser.add_argument("--wav", nargs="+", default=[], help="16bit 单声道 WAV 文件")
+    parser.add_argument("--steady-noise", nargs="+", type=float, default=[],
+                        help="只跑能量门：稳定白噪声 / 棕噪声的电平列表（dBFS），检查门能否关闭")
+    parser.add_argument("--noise-dbfs", type=float, default=None, help="叠加白噪声的电平（dBFS），默认不加")
+    parser.add_argument("--open-db", type=float, default=9.0, help="开门阈值（高于噪声底的 dB 数）")
+    parser.add_argument("--close-db", type=float, default=4.0, help="保持打开阈值（高于噪声底的 dB 数）")
+    parser.add_argument("--hangover-ms", type=int, default=300, help="能量跌落后保持打开的时长（毫秒）")
+    parser.add_argument("--floor-window-ms", type=int, default=1500, help="噪声底最小值统计窗口（毫秒）")
+    args = parser.parse_args()
+    if not args.wav and not args.steady_noise:
+        parser.error("需要 --wav 或 --steady-noise")
+
+    if args.steady_noise:
+        closed = run_steady_noise(args)
+        if not args.wav:
+            sys.exit(0 if closed else 1)
+
+    base_model = vad_utils.get_vad_model()
+    if base_model is None:
+        print("VAD模型未加载（需要 onnxruntime 和 Silero 模型文件）", flush=True)
+        sys.exit(1)
+
+    results = [compare(path, args, base_model) for path in args.wav]
+    total_seconds = sum(r[3] for r in results)
+    plain_cpu = sum(r[1] for r in results) * 1000 / total_seconds
+    gated_cpu = sum(r[2] for r in results) * 1000 / total_seconds
+    print(f"汇总: {sum(r[0] for r in results)}/{len(results)} 个文件切换一致, "
+          f"CPU/秒音频 {plain_cpu:.2f}ms -> {gated_cpu:.2f}ms", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+VAD 会话池压力测试：并发推理的延迟随 session 数的变化
+
+模拟 _vad_thread_pool 的 T 个工作线程同时逐窗口调用 Silero VAD（batch_size=1，
+每个线程维护自己的 LSTM 状态），对比不同的会话配置：
+- shared：所有线程直接共用一个 InferenceSession（旧逻辑）
+- N：VadSessionPool(size=N)，借用 / 归还空闲 session
+- thread：VadSessionPool(size=0)，每个线程一个 session
+
+输出每种配置下单次推理的 p50/p95/p99/max 延迟、总吞吐（窗口/秒）和 CPU 占用。
+需要 onnxruntime 和 voice_chat/vad/silero_vad.onnx。
+
+用法：
+    python benchmarks/bench_vad_session_pool.py --threads 10 --sessions shared,1,2,4,10,thread --seconds 5
+"""
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice_chat.vad.vad_utils import SileroVADModel, VadSessionPool  # noqa: E402
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "voice_chat", "vad", "silero_vad.onnx")
+WINDOW_SIZE = 1024
+SAMPLE_RATE = 16000
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    data = sorted(values)
+    return data[min(len(data) - 1, int(round((len(data) - 1) * pct / 100)))]
+
+
+def build_model(spec: str, factory):
+    if spec == "shared":
+        return factory()
+    if spec == "thread":
+        return VadSessionPool(factory, size=0)
+    return VadSessionPool(factory, size=int(spec))
+
+
+def stress(model, threads: int, seconds: float):
+    """T 个线程并发推理 seconds 秒，返回 (全部延迟ms, 窗口数, CPU秒)"""
+    latencies = [[] for _ in range(threads)]
+    start_barrier = threading.Barrier(threads + 1)
+    stop = threading.Event()
+
+    def worker(idx: int):
+        rng = np.random.default_rng(idx)
+        windows = [rng.normal(0, 0.05, WINDOW_SIZE).astype(np.float32) for _ in range(16)]
+        state = model.get_initial_state(batch_size=1)
+        out = latencies[idx]
+        start_barrier.wait()
+        i = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            _, state = model(windows[i % len(windows)], state, SAMPLE_RATE)
+            out.append((time.perf_counter() - t0) * 1000)
+            i += 1
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    for t in workers:
+        t.start()
+    # 预热：每个线程（每个 session）先跑几次，避免把首次分配计入统计
+    start_barrier.wait()
+    time.sleep(min(0.5, seconds / 10))
+    for lat in latencies:
+        lat.clear()
+    cpu0 = time.process_time()
+    time.sleep(seconds)
+    stop.set()
+    cpu = time.process_time() - cpu0
+    for t in workers:
+        t.join()
+    merged = [v for lat in latencies for v in lat]
+    return merged, len(merged), cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VAD 会话池压力测试")
+    parser.add_argument("--threads", type=int, default=10, help="并发推理线程数（对应 vad_thread_pool_workers）")
+    parser.add_argument("--sessions", default="shared,1,2,4,10,thread",
+                        help="逗号分隔的会话配置：shared / N / thread")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每种配置的压测时长")
+    parser.add_argument("--intra-op", type=int, default=1, help="intra_op_num_threads")
+    parser.add_argument("--inter-op", type=int, default=1, help="inter_op_num_threads")
+    parser.add_argument("--graph-opt", default="all", help="图优化级别：disable/basic/extended/all")
+    parser.add_argument("--cache-dir", default=None, help="优化后模型缓存目录")
+    args = parser.parse_args()
+
+    factory = functools.partial(
+        SileroVADModel, MODEL_PATH,
+        intra_op_num_threads=args.intra_op,
+        inter_op_num_threads=args.inter_op,
+        graph_optimization_level=args.graph_opt,
+        optimized_model_dir=args.cache_dir,
+    )
+    print(f"{args.threads} 线程 x {args.seconds}s, intra_op={args.intra_op}, inter_op={args.inter_op}, "
+          f"graph_opt={args.graph_opt}, CPU 核数={os.cpu_count()}", flush=True)
+    print(f"  {'sessions':<9}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>9}  {'窗口/秒':>9}  {'CPU核':>6}", flush=True)
+    for spec in args.sessions.split(","):
+        spec = spec.strip()
+        model = build_model(spec, factory)
+        latencies, windows, cpu = stress(model, args.threads, args.seconds)
+        print(f"  {spec:<9}{percentile(latencies, 50):8.3f}{percentile(latencies, 95):8.3f}"
+              f"{percentile(latencies, 99):8.3f}{max(latencies, default=0):9.3f}  "
+              f"{windows / args.seconds:9.0f}  {cpu / args.seconds:6.2f}", flush=True)
+        del model
+
+
+if __name__ == "__main__":
+    main()
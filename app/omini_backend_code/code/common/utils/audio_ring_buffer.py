@@ -0,0 +1,98 @@
+"""
+定长 int16 音频环形缓冲区
+
+替代 OmniStream 中的两类缓冲：
+- VAD 窗口：原来是 deque(maxlen=48000)，逐样本 extend，VAD 时再 np.array(list(deque))，
+  每 100ms 把 48000 个 Python int 转成 list 再转成数组
+- prefill 缓冲：原来是 numpy 片段列表，每次凑满 1 秒都要 np.concatenate 一遍
+
+存储为 2 * capacity 的镜像数组：每个样本同时写入 i 和 i + capacity 两个位置，
+因此任意不超过 capacity 的「最旧 n 个」或「最新 n 个」样本在内存中总是连续的，
+head() / tail() 直接返回视图，不需要拼接或拷贝。写入整帧为 O(帧长)（两次 memcpy），
+超出容量时与 deque(maxlen) 一样丢弃最旧的样本。
+
+注意：视图与缓冲区共享内存，只在下一次写入前有效；需要跨越写入保留的数据（如交给后台
+prefill 任务的音频）要 copy()。
+"""
+import numpy as np
+
+
+class AudioRingBuffer:
+    """定长 int16 环形缓冲区（FIFO，溢出时丢弃最旧样本）"""
+
+    def __init__(self, capacity: int, dtype=np.int16):
+        if capacity <= 0:
+            raise ValueError(f"capacity 必须为正数: {capacity}")
+        self.capacity = capacity
+        self._buf = np.zeros(capacity * 2, dtype=dtype)
+        self._start = 0  # 最旧样本的位置（0 <= _start < capacity）
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def is_full(self) -> bool:
+        return self._size == self.capacity
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def extend(self, samples: np.ndarray):
+        """追加一整帧样本"""
+        samples = np.asarray(samples, dtype=self._buf.dtype).ravel()
+        n = len(samples)
+        if n == 0:
+            return
+        cap = self.capacity
+        if n >= cap:
+            # 整帧超过容量：只保留最后 capacity 个样本
+            self._buf[:cap] = samples[-cap:]
+            self._buf[cap:] = samples[-cap:]
+            self._start = 0
+            self._size = cap
+            return
+
+        pos = (self._start + self._size) % cap
+        end = pos + n  # pos < cap 且 n < cap，end < 2 * cap
+        self._buf[pos:end] = samples
+        # 镜像：[pos, cap) 部分写到 +cap，[cap, end) 部分写到 -cap
+        if end <= cap:
+            self._buf[pos + cap:end + cap] = samples
+        else:
+            split = cap - pos
+            self._buf[pos + cap:] = samples[:split]
+            self._buf[:end - cap] = samples[split:]
+
+        self._size += n
+        if self._size > cap:
+            self._start = (self._start + self._size - cap) % cap
+            self._size = cap
+
+    def head(self, n: int) -> np.ndarray:
+        """最旧的 n 个样本（连续视图）"""
+        n = min(n, self._size)
+        view = self._buf[self._start:self._start + n]
+        view.flags.writeable = False
+        return view
+
+    def tail(self, n: int) -> np.ndarray:
+        """最新的 n 个样本（连续视图）"""
+        n = min(n, self._size)
+        end = self._start + self._size
+        view = self._buf[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def view(self) -> np.ndarray:
+        """全部样本，从旧到新（连续视图）"""
+        return self.head(self._size)
+
+    def consume(self, n: int):
+        """丢弃最旧的 n 个样本"""
+        n = min(n, self._size)
+        self._start = (self._start + n) % self.capacity
+        self._size -= n
+        if self._size == 0:
+            self._start = 0
@@ -0,0 +1,59 @@
+"""
+模型服务 streaming_generate 二进制帧解码
+
+帧格式（小端，与模型服务 output_frames.py 一致）：
+    type:uint8 | meta_len:uint32 | payload_len:uint32 | meta JSON | payload
+
+- FRAME_AUDIO: payload 为 int16 PCM，解码为与 SSE 相同结构的字典，wav 直接是 np.ndarray
+- FRAME_EVENT: meta 即原 SSE 中的 JSON 对象（done / break / is_listen / error ...）
+"""
+import json
+import struct
+from typing import Any, Dict, List
+
+import numpy as np
+
+FRAME_CONTENT_TYPE = "application/x-minicpmo-frames"
+
+FRAME_AUDIO = 1
+FRAME_EVENT = 2
+
+FRAME_HEADER = struct.Struct('<BII')
+
+
+class FrameDecoder:
+    """增量解码：网络数据块 feed 进来，返回已完整到达的帧"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        self._buffer += data
+        frames = []
+        offset = 0
+        buffer_len = len(self._buffer)
+        while buffer_len - offset >= FRAME_HEADER.size:
+            frame_type, meta_len, payload_len = FRAME_HEADER.unpack_from(self._buffer, offset)
+            frame_end = offset + FRAME_HEADER.size + meta_len + payload_len
+            if frame_end > buffer_len:
+                break
+            meta_start = offset + FRAME_HEADER.size
+            payload_start = meta_start + meta_len
+            meta = json.loads(bytes(self._buffer[meta_start:payload_start])) if meta_len else {}
+            if frame_type == FRAME_AUDIO:
+                # 从缓冲区切出 payload 后直接构造 int16 数组，不经过 base64/字符串
+                wav = np.frombuffer(bytes(self._buffer[payload_start:frame_end]), dtype='<i2')
+                chunk_data = {"wav": wav, "sample_rate": meta.get("sample_rate", 24000)}
+                if meta.get("text"):
+                    chunk_data["text"] = meta["text"]
+                frames.append({"chunk_idx": meta.get("chunk_idx"), "chunk_data": chunk_data})
+            else:
+                frames.append(meta)
+            offset = frame_end
+        if offset:
+            del self._buffer[:offset]
+        return frames
+
+    @property
+    def pending_bytes(self) -> int:
+        return len(self._buffer)
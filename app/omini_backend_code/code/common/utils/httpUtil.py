@@ -10,6 +10,7 @@ import time
 from typing import Dict, Any, Optional, Union, List, Callable, AsyncGenerator, Generator
 from urllib.parse import urljoin, urlparse
 from enhanced_logging_config import get_enhanced_logger
+from common.utils.frame_util import FRAME_CONTENT_TYPE, FrameDecoder
 
 # 获取日志器
 logger = get_enhanced_logger('http_util')
@@ -464,9 +465,11 @@ class AsyncHTTPUtil:
                          data: Any = None,
                          json_data: Optional[Dict[str, Any]] = None,
                          headers: Optional[Dict[str, str]] = None,
-                         chunk_callback: Optional[Callable[[str], None]] = None) -> AsyncGenerator[str, None]:
-        """异步流式POST请求"""
-        async for chunk in self._stream_request('POST', url, data=data, json_data=json_data, headers=headers, chunk_callback=chunk_callback):
+                         chunk_callback: Optional[Callable[[str], None]] = None,
+                         timeout: Optional[aiohttp.ClientTimeout] = None) -> AsyncGenerator[str, None]:
+        """异步流式POST请求（timeout 为空时使用实例默认超时）"""
+        async for chunk in self._stream_request('POST', url, data=data, json_data=json_data, headers=headers,
+                                                chunk_callback=chunk_callback, timeout=timeout):
             yield chunk
     
     async def _request(self, 
@@ -533,10 +536,13 @@ class AsyncHTTPUtil:
                              data: Any = None,
                              json_data: Optional[Dict[str, Any]] = None,
                              headers: Optional[Dict[str, str]] = None,
-                             chunk_callback: Optional[Callable[[str], None]] = None) -> AsyncGenerator[str, None]:
+                             chunk_callback: Optional[Callable[[str], None]] = None,
+                             timeout: Optional[aiohttp.ClientTimeout] = None) -> AsyncGenerator[Union[str, Dict[str, Any]], None]:
         """
         发送异步流式HTTP请求（复用连接池）
         
+        响应为 SSE 时逐条产出消息字符串；响应为二进制帧（application/x-minicpmo-frames）时逐帧产出字典
+        
         Args:
             method: HTTP方法
             url: 请求URL
@@ -545,6 +551,7 @@ class AsyncHTTPUtil:
             json_data: JSON数据
             headers: 请求头
             chunk_callback: 数据块回调函数
+            timeout: 本次请求的超时（为空时使用实例默认超时；长连接流可设置 total=None 只限制 sock_read）
             
         Yields:
             流式数据块
@@ -555,6 +562,8 @@ class AsyncHTTPUtil:
         
         # 获取复用的 session
         session = await self._get_session()
+        # 不传 timeout 时沿用 session 的默认超时（aiohttp 中 timeout=None 表示不限时）
+        request_kwargs = {'timeout': timeout} if timeout is not None else {}
         
         # 重试逻辑
         last_exception = None
@@ -568,7 +577,8 @@ class AsyncHTTPUtil:
                     params=params,
                     data=data,
                     json=json_data,
-                    headers=final_headers
+                    headers=final_headers,
+                    **request_kwargs
                 ) as response:
                     
                     # 检查响应状态
@@ -578,6 +588,19 @@ class AsyncHTTPUtil:
                     
                     logger.info(f"异步流式请求开始: {method} {url} - 状态码: {response.status}")
                     
+                    # 二进制帧（服务端按 Accept 协商）：直接按长度前缀解帧，音频为 np.ndarray，逐帧产出字典
+                    if response.headers.get('Content-Type', '').startswith(FRAME_CONTENT_TYPE):
+                        decoder = FrameDecoder()
+                        async for chunk in response.content.iter_any():
+                            for frame in decoder.feed(chunk):
+                                if chunk_callback:
+                                    chunk_callback(frame)
+                                yield frame
+                        if decoder.pending_bytes:
+                            logger.warning(f"异步流式请求结束时有 {decoder.pending_bytes} 字节不完整的帧被丢弃: {url}")
+                        logger.info(f"异步流式请求完成: {method} {url}")
+                        return
+                    
                     # 流式读取数据，按 SSE 格式的 \n\n 分隔符读取完整消息
                     buffer = ""
                     async for chunk in response.content.iter_any():
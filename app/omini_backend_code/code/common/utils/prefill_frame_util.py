@@ -0,0 +1,26 @@
+"""
+模型服务 streaming_prefill 二进制请求体编码（/omni/streaming_prefill_bin）
+
+请求体格式（小端，与模型服务 prefill_frames.py 一致）：
+    meta_len:uint32 | audio_len:uint32 | image_len:uint32 | meta JSON | audio | image
+
+- meta: 与 JSON 请求相同的字段（session_id / seq / image_audio_id / round / last_chunk），另加 audio_codec、sample_rate、samples
+- audio: pcm16 为 16kHz 单声道 int16 原始 PCM；opus 为 opuslib_util.compress_audio_with_opus 的输出
+- image: 编码后的图片文件字节（JPEG）
+"""
+import json
+import struct
+from typing import Any, Dict
+
+PREFILL_CONTENT_TYPE = "application/x-minicpmo-prefill"
+
+PREFILL_HEADER = struct.Struct('<III')
+
+AUDIO_CODEC_PCM16 = "pcm16"
+AUDIO_CODEC_OPUS = "opus"
+
+
+def encode_prefill_body(meta: Dict[str, Any], audio: bytes = b"", image: bytes = b"") -> bytes:
+    """拼接二进制 prefill 请求体"""
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    return b"".join((PREFILL_HEADER.pack(len(meta_bytes), len(audio), len(image)), meta_bytes, audio, image))
@@ -0,0 +1,124 @@
+"""
+带状态的流式多相重采样器
+
+原来 TTS 输出每到一个分片就单独调用 resample_poly(wav, 48000, 24000, padtype='line')：
+- 每次调用都重新设计 FIR 滤波器
+- 每个分片的首尾都按信号边缘外推（padtype='line'），分片拼接处的滤波结果与整段重采样不同，
+  表现为分片边界的咔哒声
+- int16 输入先转 float64，输出再 clip / astype，多次整块拷贝
+
+StreamingResampler 每条音频流一个：
+- 滤波器只在构造时设计一次（与 resample_poly 相同：Kaiser 窗 beta=5.0，半长 10 * max(up, down)，
+  用 numpy 直接实现，不依赖 scipy），按相位拆成 up 组系数
+- 在分片之间保留最后 taps-1 个输入样本作为滤波器状态，分片拼接结果与整段一次性重采样一致
+- 全程 float32，int16 输入只转换一次，输出按输入类型返回
+- 输出相对输入严格对齐（零相位）；代价是每个分片末尾约 half_len / up 个输入样本的输出要等下一个分片
+  （24k->48k 为 10 个输入样本，约 0.4ms），流结束时调用 flush() 取出
+- process_async() 在分片较大时放到线程中执行，不阻塞事件循环
+
+同一实例不能并发调用（分片必须按顺序送入）。
+"""
+import asyncio
+from math import gcd
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 大于该输入样本数的分片由 process_async 放到线程中执行
+OFFLOAD_MIN_SAMPLES = 48000
+
+
+def design_lowpass(numtaps: int, cutoff: float, beta: float = 5.0) -> np.ndarray:
+    """Kaiser 窗低通 FIR（与 scipy.signal.firwin(numtaps, cutoff, window=('kaiser', beta)) 相同，cutoff 相对 Nyquist）"""
+    n = np.arange(numtaps) - (numtaps - 1) / 2
+    h = cutoff * np.sinc(cutoff * n) * np.kaiser(numtaps, beta)
+    return h / h.sum()
+
+
+class StreamingResampler:
+    """按整数比 up/down 的流式多相重采样（非线程安全，同一条流顺序调用）"""
+
+    def __init__(self, in_rate: int, out_rate: int, beta: float = 5.0,
+                 offload_min_samples: int = OFFLOAD_MIN_SAMPLES):
+        divisor = gcd(int(in_rate), int(out_rate))
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.up = self.out_rate // divisor
+        self.down = self.in_rate // divisor
+        self.offload_min_samples = offload_min_samples
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            return
+        max_rate = max(self.up, self.down)
+        # 与 resample_poly 默认参数一致
+        self.half_len = 10 * max_rate
+        h = design_lowpass(2 * self.half_len + 1, 1.0 / max_rate, beta) * self.up
+        self.taps = -(-len(h) // self.up)
+        h = np.concatenate([h, np.zeros(self.taps * self.up - len(h))])
+        # bank[phase, k] 与输入窗口（时间升序）逐点相乘：bank[phase, k] = h[phase + (taps - 1 - k) * up]
+        self._bank = np.ascontiguousarray(h.reshape(self.taps, self.up).T[:, ::-1], dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        """开始一条新的流（清空滤波器状态）"""
+        if self.passthrough:
+            return
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._samples_in = 0
+        self._samples_out = 0
+
+    def _available_outputs(self, samples_in: int) -> int:
+        # 输出 n 对应上采样序列位置 p = n * down + half_len，需要输入样本 p // up 已经到达
+        return max(0, -(-(samples_in * self.up - self.half_len) // self.down))
+
+    def _run(self, chunk: np.ndarray, total_outputs: Optional[int] = None) -> np.ndarray:
+        start_in = self._samples_in
+        x = np.empty(len(self._history) + len(chunk), dtype=np.float32)
+        x[:len(self._history)] = self._history
+        x[len(self._history):] = chunk
+        self._samples_in += len(chunk)
+        end_out = self._available_outputs(self._samples_in) if total_outputs is None else total_outputs
+        count = max(0, end_out - self._samples_out)
+        out = np.empty(count, dtype=np.float32)
+        windows = sliding_window_view(x, self.taps)
+        # 输出 n 与 n + up 的相位相同、窗口起点相差 down，按 n mod up 分组后每组是 windows 的等步长视图
+        for r in range(min(self.up, count)):
+            position = (self._samples_out + r) * self.down + self.half_len
+            # 窗口在 x 中的起点（x[0] 对应输入下标 start_in - (taps - 1)）
+            start = position // self.up - start_in
+            group = len(range(r, count, self.up))
+            out[r::self.up] = windows[start:start + (group - 1) * self.down + 1:self.down] @ self._bank[position % self.up]
+        self._samples_out = end_out
+        self._history = x[len(x) - (self.taps - 1):].copy()
+        return out
+
+    @staticmethod
+    def _cast(out: np.ndarray, dtype) -> np.ndarray:
+        if dtype == np.int16:
+            return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+        return out
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """送入一个分片，返回已经可以输出的样本（int16 输入返回 int16，其余返回 float32）"""
+        if self.passthrough:
+            return chunk
+        dtype = chunk.dtype
+        if chunk.ndim > 1:
+            chunk = chunk.mean(axis=1, dtype=np.float32)
+        return self._cast(self._run(chunk), dtype)
+
+    async def process_async(self, chunk: np.ndarray) -> np.ndarray:
+        """同 process，分片较大时放到线程中执行"""
+        if self.passthrough or len(chunk) < self.offload_min_samples:
+            return self.process(chunk)
+        return await asyncio.to_thread(self.process, chunk)
+
+    def flush(self, dtype=np.int16) -> np.ndarray:
+        """流结束：输出剩余样本（总输出数与 resample_poly 相同），并重置状态"""
+        if self.passthrough:
+            return np.zeros(0, dtype=dtype)
+        total = -(-self._samples_in * self.up // self.down)
+        tail = self._run(np.zeros(self.taps, dtype=np.float32), total_outputs=total)
+        self.reset()
+        return self._cast(tail, np.dtype(dtype))
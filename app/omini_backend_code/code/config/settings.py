@@ -126,12 +126,69 @@ class VoiceChatSettings(BaseSettings):
     """语音聊天配置"""
     enable_voice_interruption: bool = Field(default=False, description="是否启用语音打断功能")
     voice_interruption_threshold: float = Field(default=0.85, description="语音打断阈值（0-1）")
+    ingest_sample_rate: int = Field(default=16000, description="用户音频输入采样率（LiveKit 订阅时重采样到该值，16000 或 48000）")
+    output_sample_rate: int = Field(default=0, description="LiveKit 输出音频（TTS 播放）采样率：0 为按模型服务上报的 TTS 采样率协商（失败回退 48000），也可固定为 16000/24000/48000")
+    ingest_buffer_seconds: float = Field(default=5.0, description="每个会话音频输入缓冲区容量（秒），溢出时丢弃最旧音频")
+    ingest_batch_ms: int = Field(default=20, description="音频输入缓冲区最少攒多少毫秒才唤醒 OmniStream")
+    playout_buffer_seconds: float = Field(default=30.0, description="每个会话 TTS 播放缓冲区容量（秒），满时 TTS 输出等待播放")
+    playout_min_delay_ms: int = Field(default=40, description="播放缓冲区最小目标延迟（毫秒）")
+    playout_initial_delay_ms: int = Field(default=200, description="播放缓冲区初始目标延迟（毫秒），收集到足够抖动样本前使用")
+    playout_max_delay_ms: int = Field(default=1000, description="播放缓冲区最大目标延迟（毫秒），超过该时长没有新音频视为一段输出结束")
+    duplex_persistent_stream: bool = Field(default=True, description="双工模式每个会话只打开一条 /omni/duplex_stream 持久输出流（prefill 后由模型服务自动 decode），模型服务不支持时回退为每次 prefill 后调用 streaming_generate")
+    prefill_transport: str = Field(default="pcm16", description="prefill 发往模型服务的格式：json（base64 WAV/JPEG）/ pcm16（二进制原始PCM）/ opus（二进制Opus）")
+    prefill_queue_size: int = Field(default=32, description="每个会话 prefill 流水线的队列长度（音频满时等待，图片满时丢弃最旧图片）")
+    prefill_max_inflight: int = Field(default=2, description="每个会话同时发往 bridge 的 prefill 请求数（bridge 按 seq 串行处理）")
+    prefill_coalesce_images: bool = Field(default=True, description="同一组还没发出的旧图片是否被新图片替换（高刷模式不合并）")
+    stream_trigger_ms: int = Field(default=0, description="OmniStream 每轮至少攒多少毫秒音频再处理（0 为按模式自动：流式VAD一个窗口/双工补满1秒；100 接近旧的固定tick）")
+    streaming_vad: bool = Field(default=True, description="是否使用流式VAD（每个tick只处理新音频，关闭则每次对1秒窗口整段VAD）")
+    vad_thread_pool_workers: int = Field(default=10, description="VAD检测线程池大小（启用批量推理时也是单批最大并发会话数）")
+    vad_batching: bool = Field(default=True, description="流式VAD是否跨会话合并为批量ONNX推理")
+    vad_batch_max_size: int = Field(default=64, description="批量VAD单批最大窗口数")
+    vad_batch_max_wait_ms: float = Field(default=5.0, description="批量VAD第一个窗口最长等待时间（毫秒）")
+    vad_session_pool_size: int = Field(default=0, description="VAD推理会话池大小（0 表示每个推理线程一个ORT session）")
+    vad_intra_op_threads: int = Field(default=1, description="每个VAD ORT session的 intra_op_num_threads")
+    vad_inter_op_threads: int = Field(default=1, description="每个VAD ORT session的 inter_op_num_threads")
+    vad_graph_optimization_level: str = Field(default="all", description="VAD ORT 图优化级别：disable/basic/extended/all")
+    vad_optimized_model_dir: str = Field(default="", description="VAD优化后模型的缓存目录（为空不缓存）")
+    vad_energy_gate: bool = Field(default=True, description="是否在Silero VAD前加能量/过零率门限（明显静音时跳过推理）")
+    vad_gate_open_db: float = Field(default=9.0, description="能量门开门阈值（高于自适应噪声底的dB数）")
+    vad_gate_close_db: float = Field(default=4.0, description="能量门保持打开的阈值（高于噪声底的dB数，迟滞下限）")
+    vad_gate_hangover_ms: int = Field(default=300, description="能量跌落后能量门继续保持打开的时长（毫秒）")
+    vad_gate_floor_window_ms: int = Field(default=1500, description="能量门噪声底最小值统计窗口（毫秒），稳定噪声在该时长内被并入噪声底")
 
     model_config = SettingsConfigDict(
         env_prefix="VOICE_CHAT_",
         case_sensitive=False
     )
 
+    @field_validator("prefill_transport")
+    @classmethod
+    def validate_prefill_transport(cls, v: str) -> str:
+        """验证 prefill 传输格式"""
+        valid_transports = ["json", "pcm16", "opus"]
+        v = v.lower()
+        if v not in valid_transports:
+            raise ValueError(f"Invalid prefill_transport: {v}. Must be one of {valid_transports}")
+        return v
+
+    @field_validator("ingest_sample_rate")
+    @classmethod
+    def validate_ingest_sample_rate(cls, v: int) -> int:
+        """验证输入采样率（流式VAD要求 16kHz 的整数倍）"""
+        valid_rates = [16000, 48000]
+        if v not in valid_rates:
+            raise ValueError(f"Invalid ingest_sample_rate: {v}. Must be one of {valid_rates}")
+        return v
+
+    @field_validator("output_sample_rate")
+    @classmethod
+    def validate_output_sample_rate(cls, v: int) -> int:
+        """验证输出采样率（0 为协商）"""
+        valid_rates = [0, 16000, 24000, 48000]
+        if v not in valid_rates:
+            raise ValueError(f"Invalid output_sample_rate: {v}. Must be one of {valid_rates}")
+        return v
+
 
 class Settings(BaseSettings):
     """
@@ -10,6 +10,11 @@ import uvicorn
 import os
 
 from voice_chat.vad.vad_preloader import preload_vad_model
+from voice_chat.vad.vad_batcher import get_vad_batcher_stats, shutdown_vad_batcher
+from voice_chat.vad.vad_utils import get_vad_pool_stats
+from voice_chat.audio_ingest import get_ingest_stats
+from voice_chat.playout_buffer import get_playout_stats
+from voice_chat.prefill_pipeline import get_prefill_stats
 
 # 加载环境变量（可选，新配置系统会自动处理环境变量）
 # load_dotenv()
@@ -103,6 +108,9 @@ async def lifespan(app: FastAPI):
     
     # 注意：现在使用 asyncio.to_thread()，无需显式关闭线程池
     
+    # 停止批量VAD处理线程
+    shutdown_vad_batcher()
+    
     try:
         # 关闭Redis服务
         await close_redis_client()
@@ -178,6 +186,43 @@ async def redis_health_check():
         "service": "minicpmo-backend"
     }
 
+@app.get("/health/vad")
+async def vad_health_check():
+    """VAD 批量推理统计（批大小分布、排队等待和推理耗时）和推理会话池状态"""
+    return {
+        "status": "healthy",
+        "vad_batcher": get_vad_batcher_stats(),
+        "vad_session_pool": get_vad_pool_stats(),
+        "service": "minicpmo-backend"
+    }
+
+@app.get("/health/ingest")
+async def ingest_health_check():
+    """各会话音频输入缓冲区统计（积压、溢出丢弃和消费滞后）"""
+    return {
+        "status": "healthy",
+        "sessions": get_ingest_stats(),
+        "service": "minicpmo-backend"
+    }
+
+@app.get("/health/playout")
+async def playout_health_check():
+    """各会话 TTS 播放缓冲区统计（自适应目标延迟、到达抖动、欠载/溢出和打断清空）"""
+    return {
+        "status": "healthy",
+        "sessions": get_playout_stats(),
+        "service": "minicpmo-backend"
+    }
+
+@app.get("/health/prefill")
+async def prefill_health_check():
+    """各会话 prefill 流水线统计（队列深度、在途请求数、出队滞后和合并/丢弃的图片数）"""
+    return {
+        "status": "healthy",
+        "sessions": get_prefill_stats(),
+        "service": "minicpmo-backend"
+    }
+
 @app.get("/download/test")
 async def download_test_file():
     """下载测试文件 test.txt"""
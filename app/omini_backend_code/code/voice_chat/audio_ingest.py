@@ -0,0 +1,163 @@
+"""
+LiveKit 音频输入 -> OmniStream 的批量交接缓冲区
+
+原来 LiveKitRoom.input_audio 每个 10ms WebRTC 帧 await 一次 audio_input_queue.put
+（每用户每秒 100 次），队列 maxsize=1000，消费者卡住时生产协程会阻塞在 put 上，
+帧在队列里排队变旧。
+
+AudioIngestBuffer 每个会话一个，在同一事件循环内单生产者 / 单消费者使用：
+- push()：同步写入预分配的 AudioRingBuffer，不 await、不阻塞生产协程
+- 溢出策略：丢弃最旧的样本（与 AudioRingBuffer 一致），累计丢弃样本数和溢出次数
+- 消费者 wait(min_samples) 登记本轮需要的样本数；生产者攒够 max(min_samples, batch_samples)
+  后才 set 一次事件唤醒消费者，而不是每帧唤醒
+- drain() 一次取走全部音频，记录消费滞后（最早一帧到达到被取走的时间）
+
+stats() 输出每个会话的积压、丢弃和滞后分位数；get_ingest_stats() 汇总所有活跃会话（/health/ingest）。
+"""
+import asyncio
+import time
+import weakref
+from collections import deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from common.utils.audio_ring_buffer import AudioRingBuffer
+from enhanced_logging_config import get_enhanced_logger
+
+logger = get_enhanced_logger('audio_ingest')
+
+# 用于计算滞后分位数的最近样本数
+LAG_SAMPLES = 1024
+
+# 活跃会话的输入缓冲区（会话结束、对象回收后自动移除）
+_active_buffers: "weakref.WeakValueDictionary[str, AudioIngestBuffer]" = weakref.WeakValueDictionary()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    data = sorted(values)
+    return data[min(len(data) - 1, int(round((len(data) - 1) * pct / 100)))]
+
+
+class AudioIngestBuffer:
+    """单个会话的音频输入缓冲区（非线程安全，只在事件循环线程中使用）"""
+
+    def __init__(self, session_id: str, sample_rate: int, capacity_seconds: float = 5.0,
+                 batch_ms: int = 20):
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self.batch_samples = max(1, sample_rate * batch_ms // 1000)
+        self._ring = AudioRingBuffer(max(1, int(sample_rate * capacity_seconds)))
+        self._event = asyncio.Event()
+        self._wanted = self.batch_samples
+        self._first_pending_timestamp: Optional[float] = None
+        self._newest_timestamp: Optional[float] = None
+        # 统计
+        self.frames_in = 0
+        self.samples_in = 0
+        self.samples_dropped = 0
+        self.overflow_events = 0
+        self.wakeups = 0
+        self.drains = 0
+        self.samples_drained = 0
+        self.max_fill = 0
+        self._lag_ms: deque = deque(maxlen=LAG_SAMPLES)
+        _active_buffers[session_id] = self
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def push(self, samples: np.ndarray, timestamp: Optional[float] = None):
+        """写入一帧 int16 音频（生产者调用，不阻塞）"""
+        n = len(samples)
+        if n == 0:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        overflow = len(self._ring) + n - self._ring.capacity
+        if overflow > 0:
+            # 溢出：丢弃最旧的样本
+            self.samples_dropped += min(overflow, len(self._ring) + n)
+            self.overflow_events += 1
+            if self.overflow_events == 1 or self.overflow_events % 100 == 0:
+                logger.warning(f"音频输入缓冲区溢出，丢弃最旧音频: session_id={self.session_id}, "
+                               f"累计丢弃 {self.samples_dropped / self.sample_rate * 1000:.0f}ms, "
+                               f"溢出次数 {self.overflow_events}")
+        self._ring.extend(samples)
+        self.frames_in += 1
+        self.samples_in += n
+        if self._first_pending_timestamp is None:
+            self._first_pending_timestamp = timestamp
+        self._newest_timestamp = timestamp
+        fill = len(self._ring)
+        if fill > self.max_fill:
+            self.max_fill = fill
+        if fill >= self._wanted and not self._event.is_set():
+            self.wakeups += 1
+            self._event.set()
+
+    async def wait(self, min_samples: int, timeout: float) -> bool:
+        """等待至少 min_samples 个样本（不少于一个批次）；超时返回 False"""
+        self._wanted = max(min_samples, self.batch_samples)
+        if len(self._ring) >= self._wanted:
+            return True
+        self._event.clear()
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return len(self._ring) >= self._wanted
+
+    def drain(self) -> Tuple[Optional[np.ndarray], Optional[float]]:
+        """取走全部积压音频，返回 (音频, 最新一帧的接收时间)；没有数据时返回 (None, None)"""
+        if len(self._ring) == 0:
+            return None, None
+        audio = self._ring.view().copy()
+        newest_timestamp = self._newest_timestamp
+        if self._first_pending_timestamp is not None:
+            self._lag_ms.append((time.time() - self._first_pending_timestamp) * 1000)
+        self._ring.clear()
+        self._event.clear()
+        self._first_pending_timestamp = None
+        self.drains += 1
+        self.samples_drained += len(audio)
+        return audio, newest_timestamp
+
+    def clear(self):
+        """丢弃积压音频（单工断句后清理）"""
+        self._ring.clear()
+        self._event.clear()
+        self._first_pending_timestamp = None
+
+    def close(self):
+        _active_buffers.pop(self.session_id, None)
+
+    def stats(self) -> dict:
+        lag_ms = list(self._lag_ms)
+        to_ms = 1000 / self.sample_rate
+        return {
+            "session_id": self.session_id,
+            "sample_rate": self.sample_rate,
+            "capacity_ms": round(self._ring.capacity * to_ms),
+            "batch_ms": round(self.batch_samples * to_ms),
+            "pending_ms": round(len(self._ring) * to_ms),
+            "max_fill_ms": round(self.max_fill * to_ms),
+            "frames_in": self.frames_in,
+            "dropped_ms": round(self.samples_dropped * to_ms),
+            "overflow_events": self.overflow_events,
+            "wakeups": self.wakeups,
+            "drains": self.drains,
+            "avg_drain_ms": round(self.samples_drained * to_ms / self.drains, 1) if self.drains else 0.0,
+            "lag_ms": {
+                "p50": round(_percentile(lag_ms, 50), 1),
+                "p99": round(_percentile(lag_ms, 99), 1),
+                "max": round(max(lag_ms), 1) if lag_ms else 0.0,
+            },
+        }
+
+
+def get_ingest_stats() -> List[dict]:
+    """所有活跃会话的输入缓冲区统计"""
+    return [buffer.stats() for buffer in list(_active_buffers.values())]
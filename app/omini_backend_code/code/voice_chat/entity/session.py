@@ -35,6 +35,17 @@ class SharedSessionState:
             # 重置图片数量
             self.image_number = 0
     
+    def claim_image_audio_id(self, advance: bool) -> int:
+        """
+        领取当前图片和音频片对应的id，advance=True（音频）时领取后立即 +1 并重置图片数量
+        同步方法、中间没有 await，prefill 流水线在入队的同一步调用，保证 id 顺序与入队顺序一致
+        """
+        image_audio_id = self.current_image_audio_id
+        if advance:
+            self.current_image_audio_id += 1
+            self.image_number = 0
+        return image_audio_id
+
     async def is_max_image_number(self) -> bool:
         """是否达到最大图片数量（协程安全）"""
         async with self._lock:
@@ -13,10 +13,12 @@ from enhanced_logging_config import get_enhanced_logger, set_request_trace
 from services.inference_service_manager import InferenceService, InferenceServiceManager, ServiceStatus, get_service_manager
 
 # 导入配置系统
-from config import get_livekit_settings
+from config import get_livekit_settings, get_voice_chat_settings
 from voice_chat.entity.token import LoginRequest
 from voice_chat.model_call import MiniCpmModel
 from voice_chat.entity.session import SharedSessionState
+from voice_chat.audio_ingest import AudioIngestBuffer
+from voice_chat.playout_buffer import PlayoutBuffer
 
 # 获取日志器
 logger = get_enhanced_logger('voice_chat')
@@ -24,8 +26,8 @@ logger = get_enhanced_logger('voice_chat')
 
 class LiveKitRoom:
     def __init__(self, liveKit_token: str, request: LoginRequest,
-    audio_input_queue: asyncio.Queue, 
-    audio_output_queue: asyncio.Queue,
+    audio_ingest: AudioIngestBuffer, 
+    audio_playout: PlayoutBuffer,
     inference_service: InferenceService,
     inference_service_manager: InferenceServiceManager,
     model_cpm:MiniCpmModel,
@@ -45,12 +47,15 @@ class LiveKitRoom:
         self.active_tasks = []
         self.tasks = set()
 
-        # 接收liveKit中的文本、图片和音频流的队列
-        self.audio_input_queue = audio_input_queue
-        self.audio_output_queue = audio_output_queue
+        # 接收liveKit中的文本、图片和音频流的队列（音频直接写入会话的输入缓冲区）
+        self.audio_ingest = audio_ingest
+        self.audio_playout = audio_playout
         self.start_audio_trace = False
 
-        self.WEBRTC_SAMPLE_RATE = 48000
+        # 🔧 [输出采样率协商] 输出音轨按会话协商的采样率创建（通常为 TTS 的 24kHz，由 WebRTC/Opus 处理重采样）
+        self.WEBRTC_SAMPLE_RATE = model_cpm.output_sample_rate
+        # 🔧 [16k输入] 订阅用户音频时由 LiveKit 直接重采样到 ingest_sample_rate 单声道
+        self.INPUT_SAMPLE_RATE = get_voice_chat_settings().ingest_sample_rate
         self.NUM_CHANNELS = 1
 
         # 协程间共享的会话状态
@@ -146,7 +151,8 @@ class LiveKitRoom:
 
             if track.kind == rtc.TrackKind.KIND_AUDIO:
                 logger.info("subscribed to track: " + track.name)
-                audio_stream = rtc.AudioStream(track)
+                audio_stream = rtc.AudioStream(
+                    track, sample_rate=self.INPUT_SAMPLE_RATE, num_channels=self.NUM_CHANNELS)
                 task1 = asyncio.create_task(self.input_audio(audio_stream))
                 self.tasks.add(task1)
                 task1.add_done_callback(lambda t: self.tasks.discard(t))
@@ -268,7 +274,8 @@ class LiveKitRoom:
                 # 转换为PIL Image格式
                 pil_image = Image.fromarray(cv2.cvtColor(arr, cv2.COLOR_BGR2RGB))
 
-                asyncio.create_task(self.model_cpm.model_prefill(session_id=self.session_id, image_data=pil_image))                
+                # 🔧 [有序prefill] 图片进入会话的 prefill 流水线（同组未发出的旧图片会被替换）
+                await self.model_cpm.model_prefill(session_id=self.session_id, image_data=pil_image)
                 # 计算距上次处理的间隔时间
                 interval = current_time - self.last_image_process_time
                 # 更新上次处理时间
@@ -390,13 +397,14 @@ class LiveKitRoom:
         return False
 
     async def send_silence_audio(self):
-        silence_samples = int(self.WEBRTC_SAMPLE_RATE * 1)  # 48000个样本
+        silence_samples = int(self.WEBRTC_SAMPLE_RATE * 1)  # 1秒样本
         silence_audio = np.zeros(silence_samples, dtype=np.int16)  # 静音数据
         # 将1秒静音数据分块放入队列
         silence_chunks = self.process_audio_chunk(
             silence_audio, self.WEBRTC_SAMPLE_RATE, self.WEBRTC_SAMPLE_RATE, self.WEBRTC_SAMPLE_RATE//10)
         for chunk in silence_chunks:
-            await self.audio_output_queue.put(chunk)
+            await self.audio_playout.put(chunk)
+        self.audio_playout.mark_end()
     
 
     def process_audio_chunk(self, audio_data, input_rate, output_rate, chunk_size):
@@ -437,13 +445,9 @@ class LiveKitRoom:
                 self.last_audio_timestamp = current_time
                 continue
 
-            audio_data = frame_event.frame.data.tobytes()
-            audio_array = np.frombuffer(audio_data, dtype=np.int16)
-
-            # 添加时间戳信息（通过元组包装）
-            timestamped_audio = (audio_array, current_time,
-                                 current_connection_id)
-            await self.audio_input_queue.put(timestamped_audio)
+            # 🔧 [批量输入] 帧数据直接拷入预分配的输入缓冲区，不再每帧 await queue.put
+            audio_array = np.frombuffer(frame_event.frame.data, dtype=np.int16)
+            self.audio_ingest.push(audio_array, current_time)
 
             frame_count += 1
             if frame_count % 1000 == 0:  # 每1000帧打印一次状态
@@ -1,26 +1,40 @@
 
 
 import asyncio
+import aiohttp
 import base64
 from datetime import datetime
 import json
 import numpy as np
-from typing import Dict, Any, Optional, Union, Generator
+from typing import AsyncGenerator, Dict, Any, Optional, Union, Generator
+from urllib.parse import quote
 from common.enums.model_type import ModelType
 from common.utils.httpUtil import get_async_http_util, HTTPUtilError
+from common.utils.frame_util import FRAME_CONTENT_TYPE
+from common.utils.prefill_frame_util import AUDIO_CODEC_OPUS, PREFILL_CONTENT_TYPE, encode_prefill_body
+from common.utils.streaming_resampler import StreamingResampler
+from config.settings import get_voice_chat_settings
 from enhanced_logging_config import get_enhanced_logger
 from services.inference_service_manager import InferenceService, get_service_manager
 from voice_chat.entity.session import SharedSessionState
 from voice_chat.entity.token import LoginRequest
+from voice_chat.playout_buffer import PlayoutBuffer
+from voice_chat.prefill_pipeline import PrefillItem, PrefillPipeline
 
 # 获取日志器
 logger = get_enhanced_logger('model_call')
+
+# 🔧 [持久双工流] 与 bridge 的空闲心跳间隔一致（DUPLEX_STREAM_HEARTBEAT_SECONDS）；
+# 持久流不设总超时，连续 3 个心跳周期收不到任何数据才视为断开
+DUPLEX_STREAM_HEARTBEAT_SECONDS = 5.0
     
 class MiniCpmModel ():
    WEBRTC_SAMPLE_RATE = 48000
+   # 🔧 [输出采样率协商] LiveKit AudioSource 可直接使用的采样率（Opus 原生支持，WebRTC 内部完成重采样）
+   SUPPORTED_OUTPUT_SAMPLE_RATES = (16000, 24000, 48000)
    
    def __init__(self, inference_service: InferenceService, request: LoginRequest, 
-   text_output_queue: asyncio.Queue, audio_output_queue: asyncio.Queue, 
+   text_output_queue: asyncio.Queue, audio_playout: PlayoutBuffer, 
    first_tts: asyncio.Event, shared_state: SharedSessionState, model_generating_flag: asyncio.Event):
      self.request = request
      self.model_type = ModelType.get_model_name(model_type=request.modelType)
@@ -30,7 +44,7 @@ class MiniCpmModel ():
      self.http_util = get_async_http_util(max_retries=3)
      # 模型是否正在输出
      self.text_output_queue = text_output_queue
-     self.audio_output_queue = audio_output_queue
+     self.audio_playout = audio_playout
      self.play_end_event = asyncio.Event()
      self.first_tts = first_tts
      self.inference_service = inference_service
@@ -38,6 +52,23 @@ class MiniCpmModel ():
      self.play_end_event.set()
      self.shared_state = shared_state
      self.model_generating_flag = model_generating_flag
+     voice_chat_config = get_voice_chat_settings()
+     # 🔧 [16k输入] 用户音频采样率与 OmniStream 一致，16kHz 时 prefill 编码不再重采样
+     self.input_sample_rate = voice_chat_config.ingest_sample_rate
+     # 🔧 [流式重采样] 48kHz 输入时 prefill 音频经带状态的重采样器转为 16kHz
+     self.prefill_resampler = (StreamingResampler(self.input_sample_rate, 16000)
+        if self.input_sample_rate != 16000 else None)
+     # 🔧 [有序prefill] 音频/图片 prefill 经会话流水线按顺序发送（带 seq），不再各自 create_task
+     # 🔧 [二进制prefill] json / pcm16 / opus，后两者走 /omni/streaming_prefill_bin
+     self.prefill_transport = voice_chat_config.prefill_transport
+     # 🔧 [输出采样率协商] 0 为按模型服务上报的 TTS 采样率协商，由 negotiate_output_sample_rate() 确定
+     self.configured_output_sample_rate = voice_chat_config.output_sample_rate
+     self.output_sample_rate = self.configured_output_sample_rate or self.WEBRTC_SAMPLE_RATE
+     self.prefill_pipeline = PrefillPipeline(
+        request.sessionId, shared_state, self._send_prefill,
+        queue_size=voice_chat_config.prefill_queue_size,
+        max_inflight=voice_chat_config.prefill_max_inflight,
+        coalesce_images=voice_chat_config.prefill_coalesce_images)
 
    async def model_init(self):
         try:
@@ -46,6 +77,8 @@ class MiniCpmModel ():
                 "highImage": self.request.highImage,
                 "timbreId": self.request.timbreId,
                 "timbreBase64": self.request.base64String,
+                # 与 prefill/generate/break/stop 使用同一个 session_id，模型服务按会话隔离状态
+                "session_id": self.request.sessionId,
                 **self.request.modelConfig.model_dump()
             }
             if self.request.language is not None:
@@ -58,6 +91,10 @@ class MiniCpmModel ():
             logger.info(f"模型初始化请求req:{data}, 返回结果: {response}")
             if response['success']:
                 logger.info(f"模型初始化成功: {response['status_code']}")
+                tts_sample_rate = response['data'].get('tts_sample_rate') if isinstance(response['data'], dict) else None
+                if tts_sample_rate and tts_sample_rate != self.output_sample_rate:
+                    # 输出音轨已按协商结果创建，TTS 分片会在 OmniStream 中重采样到 output_sample_rate
+                    logger.warning(f"TTS 采样率 {tts_sample_rate}Hz 与输出采样率 {self.output_sample_rate}Hz 不一致，将在后端重采样")
                 await self.text_output_queue.put("<state><model_init_success>")
                 return response['data']
             else:
@@ -75,23 +112,133 @@ class MiniCpmModel ():
             raise HTTPUtilError(f"模型初始化失败: {str(e)}")
 
 
+   async def negotiate_output_sample_rate(self) -> int:
+        """
+        确定本会话 LiveKit 输出音频的采样率（创建 AudioSource 之前调用）
+
+        配置为 0 时查询模型服务 /health 上报的 tts_sample_rate，与 TTS 采样率一致时
+        TTS 音频不经重采样直接送入 WebRTC；查询失败或采样率不支持时回退 48kHz（旧行为）
+        """
+        if self.configured_output_sample_rate:
+            self.output_sample_rate = self.configured_output_sample_rate
+            return self.output_sample_rate
+        try:
+            response = await self.http_util.get(url=f"{self.api_base_url}/health")
+            data = response.get('data') if response['success'] else None
+            tts_sample_rate = data.get('tts_sample_rate') if isinstance(data, dict) else None
+        except Exception as e:
+            logger.warning(f"查询模型服务 TTS 采样率失败，输出回退 {self.WEBRTC_SAMPLE_RATE}Hz: {e}")
+            tts_sample_rate = None
+        if tts_sample_rate in self.SUPPORTED_OUTPUT_SAMPLE_RATES:
+            self.output_sample_rate = int(tts_sample_rate)
+        else:
+            if tts_sample_rate is not None:
+                logger.warning(f"模型服务上报的 TTS 采样率 {tts_sample_rate} 不受支持，输出回退 {self.WEBRTC_SAMPLE_RATE}Hz")
+            self.output_sample_rate = self.WEBRTC_SAMPLE_RATE
+        logger.info(f"会话 {self.request.sessionId} 输出采样率: {self.output_sample_rate}Hz (TTS 上报: {tts_sample_rate})")
+        return self.output_sample_rate
+
    async def model_prefill(self, session_id: str, audio_data: Optional[np.ndarray] = None,
-        image_data: Optional[Union[np.ndarray, bytes]] = None, last_chunk: bool = False) -> Dict[str, Any]:
+        image_data: Optional[Union[np.ndarray, bytes]] = None, last_chunk: bool = False) -> None:
+        """
+        prefill 入队（按调用顺序发送）：音频队列满时等待，图片不等待
+        """
         roundId = await self.shared_state.get_round()
-        image_audio_id = await self.shared_state.get_current_image_audio_id()
         # 模型如果是单工并且正在输出，则直接返回
         if self.model_type == ModelType.SIMPLEX and not self.play_end_event.is_set():
             logger.info(f"模型和前端正在输出,忽略prefill")
-            return {"success": True, "data": {"message": "prefill success"}}        
+            return
+        if audio_data is not None and len(audio_data) > 0:
+            await self.prefill_pipeline.submit_audio(audio_data, roundId, last_chunk=last_chunk)
+        elif image_data is not None:
+            await self.prefill_pipeline.submit_image(image_data, roundId)
+
+   async def _send_prefill(self, item: PrefillItem) -> Dict[str, Any]:
+        """prefill 流水线的发送回调：编码并请求 bridge"""
+        audio = item.audio
+        if audio is not None and self.prefill_resampler is not None:
+            audio = self._resample_prefill_audio(audio, item.last_chunk)
+        if self.prefill_transport != "json":
+            return await self._send_prefill_binary(item, audio)
+        return await self._send_prefill_json(item, audio)
+
+   def _resample_prefill_audio(self, audio: np.ndarray, last_chunk: bool) -> np.ndarray:
+        """
+        🔧 [流式重采样] 48kHz 输入转换为 16kHz：流水线按 seq 顺序编码，滤波器状态跨 prefill 分片保持，
+        分片边界与整段重采样一致；last_chunk 时取出尾部样本并开始新的一段
+        """
+        audio_16k = self.prefill_resampler.process(audio)
+        if last_chunk:
+            audio_16k = np.concatenate([audio_16k, self.prefill_resampler.flush(dtype=audio_16k.dtype)])
+        return audio_16k
+
+   async def _send_prefill_json(self, item: PrefillItem, audio: Optional[np.ndarray]) -> Dict[str, Any]:
+        """JSON prefill：音频为 base64 WAV，图片为 base64 JPEG"""
         # 编码为 base64
         audio_content = None
-        if audio_data is not None and len(audio_data) > 0:
-            audio_content = self._encode_audio_to_base64(audio_data, input_sample_rate=self.WEBRTC_SAMPLE_RATE, output_sample_rate=16000)
+        if audio is not None:
+            audio_content = self._encode_audio_to_base64(audio, input_sample_rate=16000, output_sample_rate=16000)
         image_content = None
-        if image_data is not None:
-            image_content = self._encode_image_to_base64(image_data, image_format="jpeg")
-        return await self.streaming_prefill(session_id=session_id, audio_data=audio_content, image_data=image_content, 
-        roundId=roundId, image_audio_id=image_audio_id, last_chunk=last_chunk)
+        if item.image is not None:
+            image_content = self._encode_image_to_base64(item.image, image_format="jpeg")
+        return await self.streaming_prefill(session_id=self.request.sessionId, audio_data=audio_content, image_data=image_content,
+        roundId=item.round_id, image_audio_id=item.image_audio_id, last_chunk=item.last_chunk, seq=item.seq)
+
+   async def _send_prefill_binary(self, item: PrefillItem, audio: Optional[np.ndarray]) -> Dict[str, Any]:
+        """二进制 prefill：音频为 16kHz int16 PCM 或 Opus，图片为 JPEG 字节，不做 base64"""
+        meta = {
+            "session_id": self.request.sessionId,
+            "image_audio_id": item.image_audio_id,
+            "round": item.round_id,
+            "last_chunk": item.last_chunk,
+            "seq": item.seq
+        }
+        audio_bytes = b""
+        if audio is not None:
+            if self.prefill_transport == AUDIO_CODEC_OPUS:
+                # opuslib 依赖系统 libopus，只在启用 Opus 传输时导入
+                from common.utils.opuslib_util import compress_audio_with_opus
+                audio_bytes = compress_audio_with_opus(audio, sample_rate=16000)
+            else:
+                audio_bytes = self._encode_audio_pcm16(audio, input_sample_rate=16000).tobytes()
+            meta.update({"audio_codec": self.prefill_transport, "sample_rate": 16000, "samples": len(audio)})
+        image_bytes = b""
+        if item.image is not None:
+            image_bytes = self._encode_image_bytes(item.image, image_format="jpeg")
+        body = encode_prefill_body(meta, audio_bytes, image_bytes)
+        try:
+            response = await self.http_util.post(
+                url=f"{self.api_base_url}/omni/streaming_prefill_bin",
+                data=body,
+                headers={'Content-Type': PREFILL_CONTENT_TYPE}
+            )
+        except Exception as e:
+            logger.error(f"Omni 二进制prefill请求异常: {str(e)}")
+            raise HTTPUtilError(f"请求异常: {str(e)}")
+        if self._binary_prefill_unsupported(response):
+            # 旧版本模型服务没有二进制接口：本会话改回 JSON 并重发这一条
+            logger.warning(f"模型服务不支持二进制prefill（HTTP {response['status_code']}），回退到 JSON")
+            self.prefill_transport = "json"
+            return await self._send_prefill_json(item, audio)
+        logger.info(f"Omni 二进制prefill请求返回结果: {response}, 请求体 {len(body)} 字节")
+        if not response['success']:
+            raise HTTPUtilError(f"API请求失败: HTTP {response['status_code']}")
+        return response['data']
+
+   @staticmethod
+   def _binary_prefill_unsupported(response: Dict[str, Any]) -> bool:
+        """
+        模型服务是否没有 /omni/streaming_prefill_bin：405/415，或路由不存在的 404（FastAPI 默认 detail 为 "Not Found"）
+        会话不存在/已被替换时 bridge 也返回 404，但 detail 是具体原因，不能据此回退 JSON
+        """
+        status_code = response['status_code']
+        if status_code in (405, 415):
+            return True
+        if status_code != 404:
+            return False
+        data = response.get('data')
+        detail = data.get('detail') if isinstance(data, dict) else data
+        return detail == "Not Found"
 
    async def streaming_prefill(
          self,
@@ -100,7 +247,8 @@ class MiniCpmModel ():
          image_data: str,
          roundId: int,
          image_audio_id: int,
-         last_chunk: bool = False) -> Dict[str, Any]:
+         last_chunk: bool = False,
+         seq: Optional[int] = None) -> Dict[str, Any]:
        """
        Omni流式输入接口
        """
@@ -112,7 +260,9 @@ class MiniCpmModel ():
                "image": image_data,
                "image_audio_id": image_audio_id,
                "round": roundId,
-               "last_chunk": last_chunk
+               "last_chunk": last_chunk,
+               # 🔧 [有序prefill] bridge 按 seq 串行处理同一会话的 prefill
+               "seq": seq
            }
            
            # 构建API URL
@@ -135,9 +285,6 @@ class MiniCpmModel ():
        except Exception as e:
            logger.error(f"Omni prefill请求异常: {str(e)}")
            raise HTTPUtilError(f"请求异常: {str(e)}")
-       finally:
-           if audio_data is not None:
-               await self.shared_state.increment_image_audio_id()
 
    async def streaming_generate(
          self,
@@ -181,10 +328,11 @@ class MiniCpmModel ():
           send_first_chunk = False
           # 流式请求
           await self.shared_state.increment_round()
+          # 优先请求二进制帧输出（音频不经 base64），旧版模型服务忽略该 Accept 继续返回 SSE
           async for chunk in self.http_util.stream_post(
               url=api_url,
               json_data=request_data,
-              headers={'Content-Type': 'application/json'}
+              headers={'Content-Type': 'application/json', 'Accept': f'{FRAME_CONTENT_TYPE}, text/event-stream'}
           ):
             # 解析流式数据
             if not send_first_chunk:
@@ -202,6 +350,64 @@ class MiniCpmModel ():
           logger.info("streaming_generate 模型输出完成")
           self.model_generating_flag.clear()
 
+   async def supports_duplex_stream(self) -> bool:
+        """
+        🔧 [持久双工流] 模型服务是否提供 /omni/duplex_stream（/health 上报 duplex_stream），旧版本返回 False
+        """
+        try:
+            response = await self.http_util.get(url=f"{self.api_base_url}/health")
+            data = response.get('data') if response['success'] else None
+            return bool(data.get('duplex_stream')) if isinstance(data, dict) else False
+        except Exception as e:
+            logger.warning(f"查询模型服务是否支持持久双工流失败: {e}")
+            return False
+
+   async def duplex_stream(self, session_id: str) -> AsyncGenerator[Dict[str, Any], None]:
+      """
+      🔧 [持久双工流] 会话级双工输出流（/omni/duplex_stream），整个会话只请求一次
+
+      每次 prefill 之后的 decode 由模型服务自动触发，不再每秒发起一次 streaming_generate。
+      产出与 streaming_generate 相同的 chunk_data，以及 {'duplex': 'cycle_start' / 'cycle_end' / 'break' / ...}
+      状态事件；流结束（会话停止或被替换）时产出 {'type': 'done'}。
+
+      Args:
+          session_id: 会话ID
+      """
+      request_data = {"session_id": session_id}
+      api_url = f"{self.api_base_url}/omni/duplex_stream"
+      # 共享 session 的默认总超时（120s）会切断会话级长连接，这里只限制读空闲时间，由 bridge 心跳保活
+      stream_timeout = aiohttp.ClientTimeout(total=None, sock_read=3 * DUPLEX_STREAM_HEARTBEAT_SECONDS)
+      logger.info(f"打开持久双工流: {api_url}, 请求参数: {request_data}")
+      try:
+          async for chunk in self.http_util.stream_post(
+              url=api_url,
+              json_data=request_data,
+              headers={'Content-Type': 'application/json', 'Accept': f'{FRAME_CONTENT_TYPE}, text/event-stream'},
+              timeout=stream_timeout
+          ):
+            parsed_data = self._parse_stream_chunk(chunk)
+            if not parsed_data:
+                continue
+            state = parsed_data.get('duplex')
+            if state == 'cycle_start':
+                # 与每次 streaming_generate 开始时相同：允许打断、标记正在输出
+                self.model_generating_flag.set()
+                self.play_end_event.clear()
+                self.first_tts.set()
+                await self.shared_state.increment_round()
+                await self.text_output_queue.put(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')} - <state><generate_first_chunk>")
+            elif state == 'break':
+                self.model_generating_flag.clear()
+            # cycle_end 不清除 model_generating_flag：上一次 decode 的 TTS 音频可能还在写出，仍需可打断
+            yield parsed_data
+      except Exception as e:
+          error_msg = str(e) if str(e) else repr(e)
+          logger.error(f"持久双工流异常: {type(e).__name__}: {error_msg}")
+          raise HTTPUtilError(f"请求异常: {type(e).__name__}: {error_msg}")
+      finally:
+          logger.info("持久双工流结束")
+          self.model_generating_flag.clear()
+
    async def streaming_break(self, session_id: str, text: str = ""):
         try:
             data = None
@@ -209,16 +415,16 @@ class MiniCpmModel ():
                 logger.info(f"模型和前端已经输出结束,忽略break")                
             else:
                 response = await self.http_util.post(
-                    url=f"{self.break_url}/omni/break",
+                    url=self._break_port_url("/omni/break", session_id),
                     headers={'Content-Type': 'application/json'}
                     )
                 # 回到模型聆听中
                 logger.info(f"模型打断成功, 回到模型聆听中, response={response}")
                 data = response['data']
                 self.play_end_event.set()
-            # 清空audio_output_queue
-            while not self.audio_output_queue.empty():
-                self.audio_output_queue.get_nowait()
+            # 🔧 [播放缓冲] 立即清空待播放的 TTS 音频（Mini_Server 同时清空 AudioSource 队列）
+            dropped = self.audio_playout.flush()
+            logger.info(f"打断清空播放缓冲区: {dropped * 1000 // self.audio_playout.sample_rate}ms")
             await self.text_output_queue.put("<state><session_break>")
             return data
         except Exception as e:
@@ -232,7 +438,7 @@ class MiniCpmModel ():
    async def streaming_stop(self, session_id: str):
         try:
             response = await self.http_util.post(
-                url=f"{self.break_url}/omni/stop",
+                url=self._break_port_url("/omni/stop", session_id),
                 headers={'Content-Type': 'application/json'}
             )
             logger.info(f"Omni stop请求返回结果: {response}")
@@ -246,6 +452,11 @@ class MiniCpmModel ():
             logger.error(f"Omni stop请求异常: {str(e)}")
             raise HTTPUtilError(f"请求异常: {str(e)}")
             
+   def _break_port_url(self, path: str, session_id: Optional[str]) -> str:
+        """break/stop 走模型服务的独立线程端口，session_id 通过查询参数传递，只作用于本会话"""
+        url = f"{self.break_url}{path}"
+        return f"{url}?session_id={quote(session_id)}" if session_id else url
+
    async def play_end(self):
         self.play_end_event.set()
         # 问题回答结束，重置vad检测的标志位
@@ -258,7 +469,7 @@ class MiniCpmModel ():
        
        Args:
            audio_data: 音频numpy数组（输入采样率为 input_sample_rate）
-           input_sample_rate: 输入音频采样率，默认48kHz
+           input_sample_rate: 输入音频采样率，默认48kHz（与输出一致时不重采样）
            output_sample_rate: 输出音频采样率，默认16kHz
        
        Returns:
@@ -269,21 +480,25 @@ class MiniCpmModel ():
             import soundfile as sf
             import io
 
-            # 转换为 float32 并归一化到 [-1.0, 1.0]
-            if audio_data.dtype == np.int16:
-                # int16 范围是 [-32768, 32767]，需要归一化
-                audio_data = audio_data.astype(np.float32) / 32768.0
-            elif audio_data.dtype == np.int32:
-                audio_data = audio_data.astype(np.float32) / 2147483648.0
+            if audio_data.dtype == np.int16 and input_sample_rate == output_sample_rate:
+                # 🔧 [16k输入] 采样率已一致的 int16 音频直接写入 PCM_16，不经过浮点转换
+                pass
             else:
-                audio_data = audio_data.astype(np.float32)
-            
-            # 重采样：从 input_sample_rate 转换到 output_sample_rate
-            if input_sample_rate != output_sample_rate:
-                audio_data = resample_poly(audio_data, output_sample_rate, input_sample_rate)
-            
-            # 裁剪到 [-1.0, 1.0] 范围（防止重采样后溢出）
-            audio_data = np.clip(audio_data, -1.0, 1.0)
+                # 转换为 float32 并归一化到 [-1.0, 1.0]
+                if audio_data.dtype == np.int16:
+                    # int16 范围是 [-32768, 32767]，需要归一化
+                    audio_data = audio_data.astype(np.float32) / 32768.0
+                elif audio_data.dtype == np.int32:
+                    audio_data = audio_data.astype(np.float32) / 2147483648.0
+                else:
+                    audio_data = audio_data.astype(np.float32)
+                
+                # 重采样：从 input_sample_rate 转换到 output_sample_rate
+                if input_sample_rate != output_sample_rate:
+                    audio_data = resample_poly(audio_data, output_sample_rate, input_sample_rate)
+                
+                # 裁剪到 [-1.0, 1.0] 范围（防止重采样后溢出）
+                audio_data = np.clip(audio_data, -1.0, 1.0)
             
             # 写入 WAV 格式
             wav_buffer = io.BytesIO()
@@ -297,6 +512,25 @@ class MiniCpmModel ():
            logger.error(f"音频编码失败: {str(e)}")
            raise HTTPUtilError(f"音频编码失败: {str(e)}")
 
+   def _encode_audio_pcm16(self, audio_data: np.ndarray, input_sample_rate: int = 48000, output_sample_rate: int = 16000) -> np.ndarray:
+       """
+       将音频数据转换为 output_sample_rate 的 int16 PCM（二进制 prefill 使用，不写 WAV）
+       """
+       if audio_data.dtype == np.int16 and input_sample_rate == output_sample_rate:
+           # 🔧 [16k输入] 采样率已一致的 int16 音频直接发送
+           return audio_data.astype('<i2', copy=False)
+       from scipy.signal import resample_poly
+
+       if audio_data.dtype == np.int16:
+           audio_data = audio_data.astype(np.float32) / 32768.0
+       elif audio_data.dtype == np.int32:
+           audio_data = audio_data.astype(np.float32) / 2147483648.0
+       else:
+           audio_data = audio_data.astype(np.float32)
+       if input_sample_rate != output_sample_rate:
+           audio_data = resample_poly(audio_data, output_sample_rate, input_sample_rate)
+       return np.clip(audio_data * 32767, -32768, 32767).astype('<i2')
+
    def _encode_image_to_base64(self, image_data, image_format: str = "jpeg") -> str:
        """
        将图片数据编码为base64格式
@@ -308,6 +542,19 @@ class MiniCpmModel ():
        Returns:
            base64编码的图片数据URL
        """
+       return base64.b64encode(self._encode_image_bytes(image_data, image_format)).decode('utf-8')
+
+   def _encode_image_bytes(self, image_data, image_format: str = "jpeg") -> bytes:
+       """
+       将图片数据编码为图片文件字节
+       
+       Args:
+           image_data: 图片数据（numpy数组、字节或PIL Image对象）
+           image_format: 图片格式，默认jpeg
+       
+       Returns:
+           编码后的图片字节
+       """
        try:
            import io
            from PIL import Image
@@ -358,11 +605,7 @@ class MiniCpmModel ():
            else:
                raise ValueError(f"不支持的图片数据类型: {type(image_data)}")
            
-           # 编码为base64
-           image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-           
-           # 返回data URL格式
-           return image_base64
+           return image_bytes
            
        except Exception as e:
            logger.error(f"图片编码失败: {str(e)}")
@@ -373,7 +616,7 @@ class MiniCpmModel ():
        解析流式数据块
        
        Args:
-           chunk: 数据块，可以是字符串或字典
+           chunk: 数据块，SSE 消息字符串或二进制帧解码后的字典
        
        Returns:
            解析后的数据字典，其中 base64 编码的音频数据会被解码为 numpy 数组
@@ -381,8 +624,10 @@ class MiniCpmModel ():
        try:
            data = None
            
-           # 如果已经是字典，直接使用
+           # 如果已经是字典（二进制帧），直接使用，音频已经是 numpy 数组
            if isinstance(chunk, dict):
+               if chunk.get('done'):
+                   return {'type': 'done'}
                data = chunk
            else:
                # 移除可能的前缀
@@ -7,12 +7,22 @@ from scipy.signal import resample_poly
 from services.inference_service_manager import InferenceService, get_service_manager
 from voice_chat.entity.token import LoginRequest
 from voice_chat.entity.session import SharedSessionState
+from voice_chat.audio_ingest import AudioIngestBuffer
+from voice_chat.playout_buffer import PlayoutBuffer
 from voice_chat.vad import vad_utils
+from voice_chat.vad.energy_gate import EnergyGate, FLOOR_SMOOTHING_MS
+from voice_chat.vad.streaming_vad import StreamingVad
+from voice_chat.vad.vad_decision import VadDecision
+from voice_chat.vad.vad_batcher import get_vad_batcher
+import math
 import time
+from typing import Optional
 
 from enhanced_logging_config import get_enhanced_logger, set_request_trace
 from voice_chat.model_call import MiniCpmModel
 from common.enums.model_type import ModelType
+from common.utils.audio_ring_buffer import AudioRingBuffer
+from common.utils.streaming_resampler import StreamingResampler
 from concurrent.futures import ThreadPoolExecutor
 from config.settings import get_voice_chat_settings
 
@@ -21,19 +31,22 @@ logger = get_enhanced_logger('voice_chat')
 
 # VAD 检测专用线程池（独立于全局线程池，避免被其他长时间任务阻塞）
 # 增加worker数量以支持更多并发用户（每个用户并发VAD检测）
-_vad_thread_pool = ThreadPoolExecutor(max_workers=10, thread_name_prefix="VAD")
+_vad_thread_pool = ThreadPoolExecutor(
+    max_workers=get_voice_chat_settings().vad_thread_pool_workers, thread_name_prefix="VAD")
 
 
 class OmniStream:
     def __init__(self, inference_service: InferenceService, request: LoginRequest, 
-    audio_input_queue: asyncio.Queue,
-    audio_output_queue: asyncio.Queue,
+    audio_ingest: AudioIngestBuffer,
+    audio_playout: PlayoutBuffer,
     text_output_queue: asyncio.Queue,
     stop_event:asyncio.Event,
     model_cpm:MiniCpmModel,
     shared_state: SharedSessionState):
-        self.audio_input_queue = audio_input_queue
-        self.audio_output_queue = audio_output_queue
+        # 🔧 [批量输入] LiveKit 音频直接写入会话的输入缓冲区，攒够一批才唤醒主循环
+        self.audio_ingest = audio_ingest
+        # 🔧 [播放缓冲] TTS 音频写入会话的自适应播放缓冲区（替代 audio_output_queue 和双工固定 1 秒延迟）
+        self.audio_playout = audio_playout
         self.text_output_queue = text_output_queue
         self.inference_service = inference_service
         self.model_cpm = model_cpm
@@ -44,94 +57,155 @@ class OmniStream:
         self.session_type = request.sessionType
         # vad
         self.vad_options = vad_utils.VadOptions()
-        self.vad_stream_started = False
-        self.vad_time = time.time()
         self.dur_vad_time = request.durVadTime
         self.dur_vad_threshold = request.durVadThreshold
         self.vad_race = request.vadRace
-        # 准备抢跑的标识，第二次小于0.1才返回可以抢跑
-        self.vad_race_prepare = False
+        # 说话开始/结束和抢跑判决（状态机见 vad_decision.VadDecision，离线基准复用同一份逻辑）
+        self.vad_decision = VadDecision(dur_vad_threshold=self.dur_vad_threshold)
         self.vad_race_flag = asyncio.Event()
         self.vad_race_audio_queue = asyncio.Queue()
         self.vad_race_text_queue = asyncio.Queue()
         self.vad_race_task = None  # 跟踪当前抢跑任务
 
-        # 双工延迟时间 延缓双工的卡顿
-        self.duplex_delay_time_flag = False
+        # 从配置文件中读取语音打断相关配置
+        voice_chat_config = get_voice_chat_settings()
 
         # 音频配置
-        self.WEBRTC_SAMPLE_RATE = 48000
-        self.WEBRTC_CHUNK_SIZE = self.WEBRTC_SAMPLE_RATE//10
-        self.BUFFER_SIZE = self.WEBRTC_SAMPLE_RATE
+        # WEBRTC_SAMPLE_RATE 是 LiveKit 输出（TTS 播放）的采样率；
+        # 🔧 [输出采样率协商] 与会话协商结果一致（通常等于 TTS 的 24kHz，此时 TTS 音频不再重采样）
+        # 🔧 [16k输入] INPUT_SAMPLE_RATE 是用户音频的采样率（LiveKit AudioStream 按它重采样），
+        # VAD 窗口、prefill 缓冲区和发给模型的音频都使用它，16kHz 时全链路不再重采样
+        self.WEBRTC_SAMPLE_RATE = model_cpm.output_sample_rate
+        self.STREAM_IDLE_CHECK_SECONDS = 0.5
+        # 单工 generate 前最多等待已入队 prefill 发送完成的时间
+        self.PREFILL_FLUSH_TIMEOUT_SECONDS = 2.0
+        # TTS 输出重采样器（首个 TTS 分片到达时按其采样率创建）
+        self.tts_resampler: Optional[StreamingResampler] = None
+        self.INPUT_SAMPLE_RATE = voice_chat_config.ingest_sample_rate
+        self.WEBRTC_CHUNK_SIZE = self.INPUT_SAMPLE_RATE//10
+        self.BUFFER_SIZE = self.INPUT_SAMPLE_RATE
+        # prefill 缓冲区容量：正常不超过 1 秒 + 一个采集批次，事件循环卡顿时留足余量
+        self.PREFILL_BUFFER_SIZE = self.INPUT_SAMPLE_RATE * 10
         
         # 协程间共享的会话状态
         self.shared_state = shared_state
         
-        # 从配置文件中读取语音打断相关配置
-        voice_chat_config = get_voice_chat_settings()
         self.enable_voice_interruption = voice_chat_config.enable_voice_interruption
         self.voice_interruption_threshold = voice_chat_config.voice_interruption_threshold
 
-    async def _collect_audio_data(self) -> np.ndarray:
+        # 🔧 [流式VAD] 每个会话一个增量 VAD 引擎，只处理每个 tick 新到达的音频
+        # 🔧 [批量VAD] 启用时各会话的窗口经全局批处理器合并为一次 ONNX 推理
+        # 🔧 [能量门] Silero 前的能量/过零率门限：流式VAD按 16kHz 窗口判断，整段VAD按 10ms 帧判断
+        self.streaming_vad = voice_chat_config.streaming_vad
+        self.vad_engine = None
+        self.vad_gate = None
+        self._gate_closed_samples = 0  # 整段VAD：末尾连续门关闭的样本数
+        if voice_chat_config.vad_energy_gate:
+            gate_frame_ms = (self.vad_options.window_size_samples / 16 if self.streaming_vad else 10)
+            self.vad_gate = EnergyGate(
+                open_db=voice_chat_config.vad_gate_open_db,
+                close_db=voice_chat_config.vad_gate_close_db,
+                hangover_frames=math.ceil(voice_chat_config.vad_gate_hangover_ms / gate_frame_ms),
+                floor_window_frames=math.ceil(voice_chat_config.vad_gate_floor_window_ms / gate_frame_ms),
+                floor_smoothing=min(1.0, gate_frame_ms / FLOOR_SMOOTHING_MS),
+            )
+        if self.streaming_vad:
+            vad_model = get_vad_batcher() if voice_chat_config.vad_batching else None
+            self.vad_engine = StreamingVad(self.INPUT_SAMPLE_RATE, self.vad_options,
+                                           model=vad_model, gate=self.vad_gate)
+
+        # 🔧 [事件驱动] 主循环按攒够的音频量触发，而不是固定 100ms tick
+        self.stream_trigger_ms = voice_chat_config.stream_trigger_ms
+        # 🔧 [持久双工流] 双工会话只打开一条输出流，不再每次 prefill 后新建 generate 请求和任务
+        self.duplex_persistent_stream = voice_chat_config.duplex_persistent_stream
+        self.duplex_stream_task: Optional[asyncio.Task] = None
+        self.DUPLEX_STREAM_RETRY_SECONDS = 0.5
+        self.DUPLEX_STREAM_MAX_RETRY_SECONDS = 5.0
+        # 断句延迟探针：最后一个语音帧的接收时间，以及每次 <vad_end> 的延迟
+        self._last_speech_timestamp = None
+        self._last_tail_speech = 0.0
+        self._vad_end_latencies = deque(maxlen=256)
+
+    @property
+    def vad_stream_started(self) -> bool:
+        return self.vad_decision.stream_started
+
+    @vad_stream_started.setter
+    def vad_stream_started(self, value: bool):
+        self.vad_decision.stream_started = value
+
+    @property
+    def vad_time(self) -> float:
+        return self.vad_decision.speech_start_time
+
+    @vad_time.setter
+    def vad_time(self, value: float):
+        self.vad_decision.speech_start_time = value
+
+    async def _collect_audio_data(self, min_samples: int):
         """
-        收集音频输入队列中的所有可用数据
+        🔧 [事件驱动] 等待输入缓冲区攒够 min_samples 个样本后一次取走全部积压音频
+        
+        没有新音频时一直等待（每 STREAM_IDLE_CHECK_SECONDS 检查一次 stop_event），
+        不再固定每 100ms 轮询一次。
         
         Returns:
-            combined_audio_data: np.ndarray
+            tuple: (audio_data, newest_timestamp)
+                - audio_data: int16 音频，没有数据时为 None
+                - newest_timestamp: 最新一帧的接收时间（time.time()），没有数据时为 None
         """
-        collected_data = []
-        # 使用 get_nowait() 避免阻塞，循环收集所有可用数据
-        while True:
-            try:
-                audio_data = self.audio_input_queue.get_nowait()
-                if audio_data is None:
-                    break
-                # 处理带时间戳的音频数据
-                if isinstance(audio_data, tuple) and len(audio_data) == 3:
-                    audio_array, _, _ = audio_data
-                    collected_data.append(audio_array)
-                    
-            except asyncio.QueueEmpty:
-                # 队列为空，正常退出循环
-                break
-            except Exception as e:
-                logger.error(f"收集音频数据错误: {str(e)}")
+        while not self.stop_event.is_set():
+            if await self.audio_ingest.wait(min_samples, timeout=self.STREAM_IDLE_CHECK_SECONDS):
                 break
-        
-        return collected_data
+        return self.audio_ingest.drain()
 
-    async def _process_audio_batch(self, audio_data_buffer, buffer_duration, target_duration):
+    def _stream_trigger_samples(self, prefill_buffer: AudioRingBuffer, target_samples: int) -> int:
         """
-        预填音频批次数据
-        
-        Returns:
-            tuple: (updated_audio_data_buffer, updated_buffer_duration)
+        本轮至少需要攒多少样本再处理
+        - 配置了 stream_trigger_ms 时固定按该时长（100 即旧的 100ms tick 节奏）
+        - 单工 + 流式VAD：一个 VAD 窗口（16kHz 下 1024 样本 = 64ms），每次处理都有新的语音概率
+        - 单工 + 整段VAD：100ms（每次都要对 1 秒窗口跑 run_vad，不宜更频繁）
+        - 双工：恰好补满 1 秒 prefill 缓冲区所需的样本数
         """
-        # 计算需要保留的数据量
-        logger.info(f"process_audio_batch buffer_duration: {buffer_duration}, target_duration: {target_duration}")
-        remaining_duration = buffer_duration - target_duration
-        remaining_samples = int((remaining_duration / 1000) * self.WEBRTC_SAMPLE_RATE)
+        if self.stream_trigger_ms > 0:
+            return self.INPUT_SAMPLE_RATE * self.stream_trigger_ms // 1000
+        if self.model_cpm.model_type == ModelType.DUPLEX:
+            return max(target_samples - len(prefill_buffer), 1)
+        if self.vad_engine is not None:
+            return self.vad_options.window_size_samples * self.INPUT_SAMPLE_RATE // 16000
+        return self.INPUT_SAMPLE_RATE // 10
 
-        # 合并所有缓冲的音频数据
-        full_audio_data = np.concatenate(audio_data_buffer)
+    def _record_vad_end_latency(self, source: str):
+        """
+        断句延迟探针：记录最后一个语音帧到达到发出 <vad_end> 的耗时
+        """
+        if self._last_speech_timestamp is None:
+            return
+        latency_ms = (time.time() - self._last_speech_timestamp) * 1000
+        self._last_speech_timestamp = None
+        self._vad_end_latencies.append(latency_ms)
+        logger.info(f"断句延迟({source}): 最后语音帧 -> <vad_end> {latency_ms:.0f}ms")
 
-        try:
-            # 分割数据，保留超过1000ms的部分
-            if remaining_samples > 0:
-                # 发送前1000ms的数据
-                await self.model_prefill(full_audio_data[:-remaining_samples])
-                # 保留剩余数据
-                updated_audio_data_buffer = [full_audio_data[-remaining_samples:]]
-                updated_buffer_duration = remaining_duration
-            else:
-                # 如果刚好是1000ms，发送全部数据
-                await self.model_prefill(full_audio_data)
-                updated_audio_data_buffer = []
-                updated_buffer_duration = 0
-            return updated_audio_data_buffer, updated_buffer_duration
-        finally:
-            # 清理内存
-            del full_audio_data
+    def _log_vad_end_latency_summary(self):
+        if not self._vad_end_latencies:
+            return
+        data = sorted(self._vad_end_latencies)
+        p50 = data[len(data) // 2]
+        p90 = data[min(len(data) - 1, int(len(data) * 0.9))]
+        logger.info(f"会话断句延迟统计: count={len(data)}, p50={p50:.0f}ms, p90={p90:.0f}ms, max={data[-1]:.0f}ms")
+
+    def _buffer_duration_ms(self, buffer: AudioRingBuffer) -> float:
+        return len(buffer) / self.INPUT_SAMPLE_RATE * 1000
+
+    async def _process_audio_batch(self, prefill_buffer: AudioRingBuffer, target_samples: int):
+        """
+        预填音频批次数据：发送缓冲区中最早的 target_samples 个样本，保留超出的部分
+        """
+        logger.info(f"process_audio_batch buffer_duration: {self._buffer_duration_ms(prefill_buffer)}, "
+                    f"target_duration: {target_samples / self.INPUT_SAMPLE_RATE * 1000}")
+        # prefill 在后台任务中执行，缓冲区之后会被覆盖，这里必须拷贝
+        await self.model_prefill(prefill_buffer.head(target_samples).copy())
+        prefill_buffer.consume(target_samples)
 
     async def _handle_model_generate(self) -> None:
         """
@@ -142,9 +216,14 @@ class OmniStream:
             return
         if self.model_cpm.model_type == ModelType.SIMPLEX:
             await self.text_output_queue.put("<state><vad_end>")
+            self._record_vad_end_latency("generate")
             await self.text_output_queue.put(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')} - <state><vad_end>")
             self.vad_stream_started = False
-        current_time = time.time()
+            # 🔧 [有序prefill] 单工 generate 前等待尾巴音频等已入队的 prefill 发送完成
+            await self.model_cpm.prefill_pipeline.join(timeout=self.PREFILL_FLUSH_TIMEOUT_SECONDS)
+            # 新的一轮回复从干净的重采样器状态开始
+            if self.tts_resampler is not None:
+                self.tts_resampler.reset()
         try:
             round_id = await self.shared_state.get_round()
             generator = self.model_cpm.streaming_generate(
@@ -165,46 +244,99 @@ class OmniStream:
                 # 解析流式数据中的音频内容
                 chunk_data = chunk.get('chunk_data')
                 if chunk_data:
-                    # 获取音频数据和采样率
-                    wav_data = chunk_data.get('wav')
-                    tts_sample_rate = chunk_data.get('sample_rate', 24000)
-
-                    audio_data = None
-                    if wav_data is not None:
-                        # 重采样到 WebRTC 采样率
-                        resampled_data = resample_poly(
-                            wav_data,
-                            self.WEBRTC_SAMPLE_RATE, 
-                            tts_sample_rate, 
-                            padtype='line'
-                        )
-                        
-                        # wav_data 已经是 int16 格式，重采样后需要 clip 到有效范围
-                        audio_data = np.clip(resampled_data, -32768, 32767).astype(np.int16)
-                        # 将音频数据放入队列
-                        if self.model_cpm.model_type == ModelType.DUPLEX and not self.duplex_delay_time_flag:
-                            self.duplex_delay_time_flag = True
-                            await asyncio.sleep(1-(time.time() - current_time))
-                        await self.audio_output_queue.put(audio_data)
-                    # 处理文本内容
-                    text_content = chunk_data.get('text')
-                    if text_content is not None:
-                        await self.text_output_queue.put(text_content)
+                    await self._handle_generate_chunk(chunk_data)
+            if self.model_cpm.model_type == ModelType.SIMPLEX and self.tts_resampler is not None:
+                # 单工一轮回复结束：取出重采样器中剩余的尾部样本（双工的下一次 generate 接着当前流）
+                tail = self.tts_resampler.flush()
+                if len(tail) > 0:
+                    await self.audio_playout.put(tail)
         except Exception as e:
             logger.error(f"模型生成错误: {str(e)}")
         finally:
+            if self.model_cpm.model_type == ModelType.SIMPLEX:
+                # 单工一轮回复结束：不足一帧的尾巴立即补零播出
+                self.audio_playout.mark_end()
             await self.text_output_queue.put("<state><generate_end>")
 
-    def _clear_audio_queues(self) -> None:
+    async def _handle_generate_chunk(self, chunk_data: dict) -> None:
         """
-        清理音频队列和缓冲区
+        处理一个生成分片：音频重采样后写入播放缓冲区，文本写入文本队列
         """
-        # 清空音频输入队列
-        while not self.audio_input_queue.empty():
+        # 获取音频数据和采样率
+        wav_data = chunk_data.get('wav')
+        tts_sample_rate = chunk_data.get('sample_rate', 24000)
+        if wav_data is not None:
+            # 🔧 [流式重采样] 重采样到 WebRTC 采样率，滤波器状态跨 TTS 分片保持，分片边界不再有咔哒声
+            # 🔧 [输出采样率协商] 输出音轨按 TTS 采样率创建时重采样器为直通，不做任何计算
+            resampler = self._tts_resampler_for(tts_sample_rate)
+            audio_data = await resampler.process_async(np.asarray(wav_data, dtype=np.int16))
+            # 写入播放缓冲区（按到达抖动自适应预缓冲，不再固定延迟）
+            await self.audio_playout.put(audio_data)
+        # 处理文本内容
+        text_content = chunk_data.get('text')
+        if text_content is not None:
+            await self.text_output_queue.put(text_content)
+
+    def _ensure_duplex_stream(self) -> None:
+        """
+        🔧 [持久双工流] 首批 prefill 之后打开会话级输出流（只打开一次）
+        """
+        if self.duplex_stream_task is None:
+            self.duplex_stream_task = asyncio.create_task(self._duplex_stream_loop())
+
+    async def _duplex_stream_loop(self) -> None:
+        """
+        🔧 [持久双工流] 双工会话的常驻输出任务
+
+        整个会话只打开一次 /omni/duplex_stream，prefill 之后的 decode 由模型服务自动触发，
+        替代每次 prefill 后 create_task(_handle_model_generate())；连接断开后按退避重连。
+        模型服务不支持时回退为每次 prefill 后调用 streaming_generate。
+        """
+        if not await self.model_cpm.supports_duplex_stream():
+            logger.info("模型服务不支持持久双工流，回退为每次 prefill 后调用 streaming_generate")
+            self.duplex_persistent_stream = False
+            # 触发探测的那批（以及探测期间到达的）prefill 还没有 decode，补一次 generate
+            if not self.stop_event.is_set():
+                asyncio.create_task(self._handle_model_generate())
+            return
+        retry_delay = self.DUPLEX_STREAM_RETRY_SECONDS
+        while not self.stop_event.is_set():
             try:
-                self.audio_input_queue.get_nowait()
-            except asyncio.QueueEmpty:
+                async for chunk in self.model_cpm.duplex_stream(session_id=self.session_id):
+                    retry_delay = self.DUPLEX_STREAM_RETRY_SECONDS
+                    if chunk.get('type') == 'done':
+                        break
+                    state = chunk.get('duplex')
+                    if state == 'cycle_start':
+                        # 每次 decode 后进行续命服务锁定（与 streaming_generate 相同）
+                        service_manager = await get_service_manager()
+                        await service_manager.renew_service_lock(self.inference_service.locked_by, self.inference_service.service_id)
+                        await self.text_output_queue.put("<state><generate_start>")
+                    elif state in ('cycle_end', 'cycle_error', 'break'):
+                        await self.text_output_queue.put("<state><generate_end>")
+                    chunk_data = chunk.get('chunk_data')
+                    if chunk_data:
+                        await self._handle_generate_chunk(chunk_data)
+            except Exception as e:
+                logger.error(f"持久双工流错误: {str(e)}")
+            if self.stop_event.is_set():
                 break
+            logger.info(f"持久双工流断开，{retry_delay:.1f}s 后重连")
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, self.DUPLEX_STREAM_MAX_RETRY_SECONDS)
+
+    def _tts_resampler_for(self, tts_sample_rate: int) -> StreamingResampler:
+        """TTS 输出 -> WebRTC 采样率的流式重采样器（会话内复用，TTS 采样率变化时重建）"""
+        if self.tts_resampler is None or self.tts_resampler.in_rate != tts_sample_rate:
+            self.tts_resampler = StreamingResampler(tts_sample_rate, self.WEBRTC_SAMPLE_RATE)
+        return self.tts_resampler
+
+    def _clear_audio_queues(self) -> None:
+        """
+        清理音频队列和缓冲区
+        """
+        # 清空音频输入缓冲区
+        self.audio_ingest.clear()
     
     async def _async_stream_detail(self, audio_buffer):
         """
@@ -219,26 +351,31 @@ class OmniStream:
         
         # 任务管理集合
         # 使用实例变量来管理任务，确保回调函数能正确访问
-        audio_data_buffer = []
-        buffer_duration = 0
-        target_duration = 1000  # 目标缓冲区时长（毫秒）
+        # 🔧 [环形缓冲] prefill 缓冲区：整帧写入，凑满 1 秒后取连续视图发送
+        prefill_buffer = AudioRingBuffer(self.PREFILL_BUFFER_SIZE)
+        target_samples = self.INPUT_SAMPLE_RATE  # 目标缓冲区时长 1000ms 对应的样本数
         while not self.stop_event.is_set():
             try:
-                start_time = time.time()
-                
-                # 1. 收集音频数据
-                collected_data = await self._collect_audio_data()
-                if collected_data:
+                # 1. 收集音频数据（攒够本轮所需的样本数即处理）
+                combined_data, newest_timestamp = await self._collect_audio_data(
+                    self._stream_trigger_samples(prefill_buffer, target_samples))
+                if combined_data is not None:
                     # 2. 处理音频缓冲区
-                    combined_data = np.concatenate(collected_data)
                     audio_buffer.extend(combined_data)
+                    if (self.vad_engine is not None and self.model_cpm.model_type == ModelType.SIMPLEX
+                            and len(audio_buffer) < self.BUFFER_SIZE):
+                        # 🔧 [流式VAD] 1秒窗口未满时也把新音频送入 VAD，保持 LSTM 状态和概率历史连续
+                        await asyncio.get_event_loop().run_in_executor(
+                            _vad_thread_pool, self.vad_engine.feed, combined_data)
                     if len(audio_buffer) >= self.BUFFER_SIZE:
                         if self.model_cpm.model_type == ModelType.SIMPLEX:
                             # SIMPLEX模式：需要VAD检测
                             # 使用专用 VAD 线程池执行检测，避免被其他长时间任务阻塞
                             loop = asyncio.get_event_loop()
                             full_vad_result, tail_vad_result, dur_vad_full = await loop.run_in_executor(
-                                _vad_thread_pool, self.vad_dual_detection, audio_buffer)
+                                _vad_thread_pool, self.vad_dual_detection, audio_buffer, combined_data)
+                            if self._batch_has_speech():
+                                self._last_speech_timestamp = newest_timestamp
                             # 如果检测到有语音活动,但是模型正在输出,强制打断模型
                             # 从配置文件中读取配置来判断是否需要语音打断
                             if (self.enable_voice_interruption and 
@@ -248,14 +385,11 @@ class OmniStream:
                                 asyncio.create_task(self.model_cpm.streaming_break(session_id=self.session_id, text=f"说话打断"))
                             # SIMPLEX模式：需要VAD检测
                             if full_vad_result:
-                                # 计算当前数据块的时长（毫秒）
-                                chunk_duration = (len(combined_data) / self.WEBRTC_SAMPLE_RATE) * 1000
-                                buffer_duration += chunk_duration
-                                audio_data_buffer.append(combined_data)
+                                prefill_buffer.extend(combined_data)
 
                                 # 当缓冲区达到目标时长时，处理数据
-                                if buffer_duration >= target_duration:
-                                    audio_data_buffer, buffer_duration = await self._process_audio_batch(audio_data_buffer, buffer_duration, target_duration)
+                                if len(prefill_buffer) >= target_samples:
+                                    await self._process_audio_batch(prefill_buffer, target_samples)
                                 if self.vad_race:
                                     # 抢跑模式
                                     if not tail_vad_result:
@@ -280,7 +414,7 @@ class OmniStream:
                                         try:
                                             audio_data = self.vad_race_audio_queue.get_nowait()
                                             if audio_data:
-                                                await self.audio_input_queue.put(audio_data)
+                                                self.audio_ingest.push(audio_data)
                                         except asyncio.QueueEmpty:
                                             break
                                         try:
@@ -291,44 +425,42 @@ class OmniStream:
                                             break
                                     self.vad_race_flag.clear()
                                 else:
-                                    # 判断剩下的audio_data_buffer是否大于0.1s,如果大于0.1s,则使用静音拼接生成1s的音频发送给模型
-                                    if buffer_duration > 50 and len(audio_data_buffer) > 0:
+                                    # 判断剩下的prefill_buffer是否大于0.1s,如果大于0.1s,则使用静音拼接生成1s的音频发送给模型
+                                    if self._buffer_duration_ms(prefill_buffer) > 50:
                                         # 发送尾巴音频数据
-                                        existing_audio = np.concatenate(audio_data_buffer)
-                                        await self.model_prefill(existing_audio, last_chunk=True)
+                                        await self.model_prefill(prefill_buffer.view().copy(), last_chunk=True)
                                     asyncio.create_task(self._handle_model_generate())
                                 # 单工输出之后清理之前的缓冲区数据
                                 audio_buffer.clear()
-                                buffer_duration = 0
-                                audio_data_buffer = []
+                                prefill_buffer.clear()
+                                if self.vad_engine is not None:
+                                    self.vad_engine.reset()
                                 self._clear_audio_queues()
                         elif self.model_cpm.model_type == ModelType.DUPLEX:
                             # DUPLEX模式：不需要VAD检测，直接处理音频数据
-                            # 计算当前数据块的时长（毫秒）
-                            chunk_duration = (len(combined_data) / self.WEBRTC_SAMPLE_RATE) * 1000
-                            buffer_duration += chunk_duration
-                            audio_data_buffer.append(combined_data)
+                            prefill_buffer.extend(combined_data)
 
                             # 当缓冲区达到目标时长时，处理数据
-                            if buffer_duration >= target_duration:
-                                audio_data_buffer, buffer_duration = await self._process_audio_batch(audio_data_buffer, buffer_duration, target_duration)
-                                # 双工模式：尝试获取用户输入的文本数据，模型返回的数据
-                                asyncio.create_task(self._handle_model_generate())
-                else:
-                    # 没有音频数据时，短暂休眠
-                    logger.debug("未收集到音频数据，继续等待...")
-                    await asyncio.sleep(0.1)
-
-                # 4. 控制循环频率（使用异步 sleep，不阻塞事件循环）
-                elapsed = time.time() - start_time
-                sleep_time = max(0, 0.1 - elapsed)
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
+                            if len(prefill_buffer) >= target_samples:
+                                await self._process_audio_batch(prefill_buffer, target_samples)
+                                if self.duplex_persistent_stream:
+                                    # 🔧 [持久双工流] decode 由模型服务在 prefill 后自动触发，输出从会话级流中读取
+                                    self._ensure_duplex_stream()
+                                else:
+                                    # 双工模式：尝试获取用户输入的文本数据，模型返回的数据
+                                    asyncio.create_task(self._handle_model_generate())
 
             except Exception as e:
                 logger.error(f"音频处理错误: {str(e)}")
                 continue
+        self._log_vad_end_latency_summary()
+        logger.info(f"音频输入统计: {self.audio_ingest.stats()}")
+        self.audio_ingest.close()
+        logger.info(f"prefill 流水线统计: {self.model_cpm.prefill_pipeline.stats()}")
+        await self.model_cpm.prefill_pipeline.close()
         await self.model_cpm.streaming_stop(session_id=self.session_id)
+        if self.duplex_stream_task is not None:
+            self.duplex_stream_task.cancel()
         logger.info(f"omniStream结束")
 
 
@@ -336,26 +468,25 @@ class OmniStream:
         """
         模型预填
         """
-        # 异步调用 streaming_prefill，使用 create_task 在后台运行
+        # 🔧 [有序prefill] 入队后由会话的 prefill 流水线按顺序发送，队列满时在这里等待
         try:
-            asyncio.create_task(self.model_cpm.model_prefill(self.session_id, audio_data=audio_data, last_chunk=last_chunk))
+            await self.model_cpm.model_prefill(self.session_id, audio_data=audio_data, last_chunk=last_chunk)
         except Exception as e:
             logger.error(f"调用 model_prefill 失败: {e}")
 
 
 
-    def vad(self, audio_buffer: deque):
+    def vad(self, audio_buffer: AudioRingBuffer):
         """
         音频vad检测
         """
         start_time = time.time()
         
-        # 数据转换阶段
-        buffer_array = np.array(list(audio_buffer))
-        buffer_bytes = buffer_array.tobytes()
+        # 数据转换阶段（环形缓冲区直接给出连续视图）
+        buffer_bytes = audio_buffer.view().tobytes()
         # VAD 处理阶段（最耗时）
         dur_vad, _, _ = vad_utils.run_vad(
-            buffer_bytes, self.WEBRTC_SAMPLE_RATE, self.vad_options)
+            buffer_bytes, self.INPUT_SAMPLE_RATE, self.vad_options)
         
         # 总耗时
         total_time = time.time() - start_time
@@ -375,7 +506,94 @@ class OmniStream:
                     return False
         return True
 
-    def vad_dual_detection(self, audio_buffer):
+    def _streaming_vad_durations(self, new_audio: np.ndarray):
+        """
+        流式VAD：只送入新音频，整窗/尾部语音时长都从概率历史得到
+
+        Returns:
+            tuple: (dur_vad_full, dur_vad_tail)
+        """
+        try:
+            self.vad_engine.feed(new_audio)
+            dur_vad_full = self.vad_engine.window_speech_duration(1.0)
+            dur_vad_tail = self.vad_engine.tail_speech_duration(self.dur_vad_time, 1.0)
+            return dur_vad_full, dur_vad_tail
+        except Exception as e:
+            # 与 run_vad 出错时一致，返回 -1
+            logger.error(f"流式VAD检测错误: {str(e)}")
+            return -1, -1
+
+    def _update_gate_closed_samples(self, new_audio: np.ndarray) -> int:
+        """
+        整段VAD的能量门：按 10ms 帧判断新音频，返回缓冲区末尾连续门关闭的样本数
+        """
+        frame = self.INPUT_SAMPLE_RATE // 100
+        n_frames = len(new_audio) // frame
+        lengths, masks = [], []
+        if n_frames:
+            masks.append(self.vad_gate.process(new_audio[:n_frames * frame].reshape(n_frames, frame)))
+            lengths.extend([frame] * n_frames)
+        if len(new_audio) % frame:
+            masks.append(self.vad_gate.process(new_audio[n_frames * frame:]))
+            lengths.append(len(new_audio) % frame)
+        gate_open = np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+        open_idx = np.flatnonzero(gate_open)
+        if len(open_idx) == 0:
+            self._gate_closed_samples += len(new_audio)
+        else:
+            self._gate_closed_samples = int(sum(lengths[open_idx[-1] + 1:]))
+        return self._gate_closed_samples
+
+    def _full_window_vad_durations(self, audio_buffer: AudioRingBuffer, new_audio: np.ndarray):
+        """
+        整段VAD：对1秒窗口和「最后0.2秒 + 静音」各跑一次 run_vad
+        能量门判定对应区间全部静音时直接按无语音（0 秒）处理，不调用 Silero
+
+        Returns:
+            tuple: (dur_vad_full, dur_vad_tail)
+        """
+        tail_samples = int(self.dur_vad_time * self.INPUT_SAMPLE_RATE)  # 如 0.2秒 * 16000Hz = 3200个样本
+        closed_samples = -1
+        if self.vad_gate is not None:
+            closed_samples = self._update_gate_closed_samples(new_audio)
+
+        # 数据转换阶段（环形缓冲区直接给出连续视图）
+        buffer_array = audio_buffer.view()
+        buffer_bytes = buffer_array.tobytes()
+        
+        # 1. 完整1秒音频的VAD检测
+        if closed_samples >= len(buffer_array):
+            dur_vad_full = 0.0
+        else:
+            dur_vad_full, _, _ = vad_utils.run_vad(
+                buffer_bytes, self.INPUT_SAMPLE_RATE, self.vad_options)
+        if closed_samples >= tail_samples:
+            return dur_vad_full, 0.0
+        
+        # 2. 提取最后0.秒音频
+        # 计算最后0.秒对应的样本数
+        # 再补充剩下的空白音频
+        silence_samples = int((1- self.dur_vad_time) * self.INPUT_SAMPLE_RATE)  # 如 0.8秒 * 16000Hz = 12800个样本
+        tail_audio = np.zeros(tail_samples + silence_samples, dtype=np.int16)  # 尾部音频 + 静音数据
+        tail_view = audio_buffer.tail(tail_samples)  # 取最后 tail_samples 个样本
+        tail_audio[:len(tail_view)] = tail_view
+        tail_bytes = tail_audio.tobytes()
+        
+        # 3. 最后0.2秒音频的VAD检测
+        dur_vad_tail, _, _ = vad_utils.run_vad(
+            tail_bytes, self.INPUT_SAMPLE_RATE, self.vad_options)
+        return dur_vad_full, dur_vad_tail
+
+    def _batch_has_speech(self) -> bool:
+        """
+        本批音频末尾是否仍有语音（断句延迟探针用）
+        流式VAD看最新窗口的语音概率；整段VAD退化为看尾部检测是否有语音
+        """
+        if self.vad_engine is not None:
+            return self.vad_engine.latest_prob >= self.vad_options.threshold
+        return self._last_tail_speech > 0
+
+    def vad_dual_detection(self, audio_buffer: AudioRingBuffer, new_audio: np.ndarray):
         """
         双重VAD检测方法
         1. 对1秒音频进行完整VAD检测
@@ -383,6 +601,7 @@ class OmniStream:
         
         Args:
             audio_buffer: 1秒音频缓冲区
+            new_audio: 本次 tick 新到达的音频（流式VAD只处理这部分）
             
         Returns:
             tuple: (full_vad_result, tail_vad_result)
@@ -396,27 +615,11 @@ class OmniStream:
         )
         start_time = time.time()
         
-        # 数据转换阶段
-        buffer_array = np.array(list(audio_buffer))
-        buffer_bytes = buffer_array.tobytes()
-        
-        # 1. 完整1秒音频的VAD检测
-        dur_vad_full, _, _ = vad_utils.run_vad(
-            buffer_bytes, self.WEBRTC_SAMPLE_RATE, self.vad_options)
-        
-        # 2. 提取最后0.秒音频
-        # 计算最后0.秒对应的样本数
-        tail_samples = int(self.dur_vad_time * self.WEBRTC_SAMPLE_RATE)  # 0.2秒 * 48000Hz = 9600个样本
-        tail_audio = buffer_array[-tail_samples:]  # 取最后9600个样本
-        # 再补充剩下的空白音频
-        silence_samples = int((1- self.dur_vad_time) * self.WEBRTC_SAMPLE_RATE)  # 0.8秒 * 48000Hz = 38400个样本
-        silence_audio = np.zeros(silence_samples, dtype=np.int16)  # 静音数据
-        tail_audio = np.concatenate([tail_audio, silence_audio])
-        tail_bytes = tail_audio.tobytes()
-        
-        # 3. 最后0.2秒音频的VAD检测
-        dur_vad_tail, _, _ = vad_utils.run_vad(
-            tail_bytes, self.WEBRTC_SAMPLE_RATE, self.vad_options)
+        if self.vad_engine is not None:
+            dur_vad_full, dur_vad_tail = self._streaming_vad_durations(new_audio)
+        else:
+            dur_vad_full, dur_vad_tail = self._full_window_vad_durations(audio_buffer, new_audio)
+        self._last_tail_speech = dur_vad_tail
         
         # 总耗时
         total_time = time.time() - start_time
@@ -426,28 +629,8 @@ class OmniStream:
             logger.info(f"双重VAD处理耗时过长: {total_time*1000:.2f}ms")
         
         # 4. 判断逻辑
-        # 完整1秒音频的VAD检测结果
-        full_vad_result = True
-        if dur_vad_full > 0.4:
-            if self.vad_stream_started == False:
-                self.vad_time = time.time()
-                self.vad_stream_started = True
-        elif dur_vad_full < 0.1:
-            if self.vad_stream_started:
-                self.vad_stream_started = False
-                if (time.time() - self.vad_time >= 0.3):
-                    full_vad_result = False
+        full_vad_result, tail_vad_result = self.vad_decision.update(dur_vad_full, dur_vad_tail)
         logger.info(f"dur_vad_full: {dur_vad_full}, dur_vad_tail: {dur_vad_tail}")
-        # 最后0.2秒音频的VAD检测结果
-        tail_vad_result = True
-        if self.vad_stream_started:
-            #这里连续两次小于0.1才返回可以抢跑,减小误判几率
-            if dur_vad_tail < self.dur_vad_threshold:
-                if self.vad_race_prepare:
-                    tail_vad_result = False
-                    self.vad_race_prepare = False
-                else:
-                    self.vad_race_prepare = True
         
         return full_vad_result, tail_vad_result, dur_vad_full
     
@@ -459,6 +642,7 @@ class OmniStream:
         try:
             logger.info(f"抢跑模型预解码启动")
             await self.text_output_queue.put(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')} - <state><vad_end>")
+            self._record_vad_end_latency("race")
             # if self.vad_race_flag.is_set():
             #     logger.info(f"抢跑模型预解码已启动,忽略本次抢跑")
             #     return
@@ -0,0 +1,294 @@
+"""
+TTS 音频 -> LiveKit 输出的自适应播放缓冲区（jitter buffer）
+
+原来 OmniStream 把重采样后的 TTS 分片放进 audio_output_queue（asyncio.Queue），
+Mini_Server.output_audio 每取一个分片就和上次剩下的 remaining_audio 做一次 np.concatenate，
+再按帧反复切片；队列 200ms 取不到数据且模型不再生成时才把尾巴补零发出。双工模式为了
+避免卡顿，首个分片前固定 sleep(1 - 已耗时)，不论网络和模型实际抖动多大都多等约 1 秒。
+
+PlayoutBuffer 每个会话一个，在同一事件循环内单生产者 / 单消费者使用：
+- 存储为预分配的 AudioRingBuffer，生产者 put() 直接写入，消费者 read_frame() 把一帧
+  拷贝进 LiveKit AudioFrame 的内存，不再拼接和切片
+- 一段输出（一轮回复 / 双工的连续输出）开始时先预缓冲：攒够目标延迟，或首个样本到达后
+  已等待目标延迟，才开始按帧播放
+- 目标延迟按分片到达的抖动自适应：每个分片相对上一个分片「应当到达」的时间
+  （上一分片到达时间 + 上一分片时长）晚到多少毫秒，取最近窗口的 p95 再加一帧，
+  限制在 [min_delay_ms, max_delay_ms]；统计窗口在会话内跨轮保留
+- 播放中缓冲区不足一帧：记一次欠载（underrun），目标延迟额外增加一档（随后续分片逐渐衰减），
+  重新预缓冲
+- 缓冲区满时生产者等待空间（与原来的有界队列一致，不丢音频），记一次溢出（overrun）和等待时长
+- 一段输出结束（单工 mark_end()，或超过 max_delay_ms 没有新分片）时，不足一帧的尾巴补零播出
+- 打断时 flush() 立即清空缓冲区并唤醒两端，消费者据 flush_generation 同时清空 AudioSource 的队列
+
+stats() 输出每个会话的目标延迟、抖动分位数和欠载/溢出/打断计数；get_playout_stats() 汇总所有
+活跃会话（/health/playout）。
+"""
+import asyncio
+import time
+import weakref
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+
+from common.utils.audio_ring_buffer import AudioRingBuffer
+from enhanced_logging_config import get_enhanced_logger
+
+logger = get_enhanced_logger('playout_buffer')
+
+# 用于估计抖动的最近分片数
+JITTER_WINDOW = 64
+# 少于该分片数时使用初始目标延迟
+JITTER_MIN_SAMPLES = 4
+# 欠载后目标延迟的额外增量（帧数），以及每个正常到达的分片对增量的衰减系数
+UNDERRUN_BOOST_FRAMES = 2
+UNDERRUN_BOOST_DECAY = 0.95
+
+# 活跃会话的播放缓冲区（会话结束、对象回收后自动移除）
+_active_buffers: "weakref.WeakValueDictionary[str, PlayoutBuffer]" = weakref.WeakValueDictionary()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    data = sorted(values)
+    return data[min(len(data) - 1, int(round((len(data) - 1) * pct / 100)))]
+
+
+class PlayoutBuffer:
+    """单个会话的 TTS 播放缓冲区（非线程安全，只在事件循环线程中使用）"""
+
+    def __init__(self, session_id: str, sample_rate: int, capacity_seconds: float = 30.0,
+                 frame_ms: int = 20, min_delay_ms: int = 40, initial_delay_ms: int = 200,
+                 max_delay_ms: int = 1000):
+        self.session_id = session_id
+        self.capacity_seconds = capacity_seconds
+        self.frame_ms = frame_ms
+        self.min_delay_ms = min_delay_ms
+        self.initial_delay_ms = initial_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self._data_event = asyncio.Event()
+        self._space_event = asyncio.Event()
+        self._space_event.set()
+        self._late_ms: deque = deque(maxlen=JITTER_WINDOW)
+        self._underrun_boost_ms = 0.0
+        self.target_delay_ms = float(initial_delay_ms)
+        # 打断计数，消费者据此判断是否需要清空 AudioSource 的队列
+        self.flush_generation = 0
+        # 统计
+        self.chunks_in = 0
+        self.samples_in = 0
+        self.frames_out = 0
+        self.padded_frames = 0
+        self.streams = 0
+        self.underruns = 0
+        self.overruns = 0
+        self.overrun_wait_ms = 0.0
+        self.samples_flushed = 0
+        self.max_fill = 0
+        self.set_sample_rate(sample_rate)
+        _active_buffers[session_id] = self
+
+    def set_sample_rate(self, sample_rate: int):
+        """设置输出采样率（会话协商输出采样率后、开始播放前调用），重新分配缓冲区"""
+        if getattr(self, "sample_rate", None) == sample_rate:
+            return
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * self.frame_ms // 1000
+        self._ring = AudioRingBuffer(max(self.frame_samples, int(sample_rate * self.capacity_seconds)))
+        self._reset_stream()
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def _reset_stream(self):
+        self._playing = False
+        self._ended = False
+        self._buffering_since: Optional[float] = None
+        self._last_arrival: Optional[float] = None
+        self._last_duration_ms = 0.0
+
+    # ---------------- 生产者 ----------------
+
+    async def put(self, samples: np.ndarray):
+        """写入一个 int16 分片；缓冲区满时等待空间，等待期间发生打断则丢弃剩余部分"""
+        samples = np.asarray(samples, dtype=np.int16).ravel()
+        n = len(samples)
+        if n == 0:
+            return
+        self._observe_arrival(time.monotonic(), n)
+        generation = self.flush_generation
+        offset = 0
+        blocked = False
+        while offset < n:
+            space = self._ring.capacity - len(self._ring)
+            if space == 0:
+                if not blocked:
+                    blocked = True
+                    self.overruns += 1
+                    if self.overruns == 1 or self.overruns % 100 == 0:
+                        logger.warning(f"播放缓冲区已满，TTS 输出等待播放: session_id={self.session_id}, "
+                                       f"溢出次数 {self.overruns}")
+                wait_start = time.monotonic()
+                self._space_event.clear()
+                await self._space_event.wait()
+                self.overrun_wait_ms += (time.monotonic() - wait_start) * 1000
+                if self.flush_generation != generation:
+                    return
+                continue
+            take = min(space, n - offset)
+            self._ring.extend(samples[offset:offset + take])
+            offset += take
+            self.max_fill = max(self.max_fill, len(self._ring))
+            self._data_event.set()
+        self.chunks_in += 1
+        self.samples_in += n
+
+    def _observe_arrival(self, now: float, samples: int):
+        """记录分片到达时间，更新抖动估计和目标延迟"""
+        if self._last_arrival is None:
+            # 新的一段输出（首次 / 上一段结束 / 打断后）：与上一段之间的间隔不计入抖动
+            if len(self._ring) == 0:
+                self._playing = False
+                self._buffering_since = None
+            self._ended = False
+            self.streams += 1
+        else:
+            late = (now - self._last_arrival) * 1000 - self._last_duration_ms
+            self._late_ms.append(min(max(0.0, late), float(self.max_delay_ms)))
+            self._underrun_boost_ms *= UNDERRUN_BOOST_DECAY
+        self._last_arrival = now
+        self._last_duration_ms = samples * 1000 / self.sample_rate
+        self._update_target()
+
+    def _update_target(self):
+        if len(self._late_ms) >= JITTER_MIN_SAMPLES:
+            base = _percentile(list(self._late_ms), 95) + self.frame_ms
+        else:
+            base = self.initial_delay_ms
+        self.target_delay_ms = min(float(self.max_delay_ms),
+                                   max(float(self.min_delay_ms), base + self._underrun_boost_ms))
+
+    def mark_end(self):
+        """一段输出结束（单工一轮回复结束）：剩余不足一帧的音频补零播出，不再等待"""
+        self._ended = True
+        self._last_arrival = None
+        self._data_event.set()
+
+    def flush(self) -> int:
+        """打断：立即丢弃全部待播放音频，返回丢弃的样本数"""
+        dropped = len(self._ring)
+        self._ring.clear()
+        self._reset_stream()
+        self.flush_generation += 1
+        self.samples_flushed += dropped
+        # 唤醒等待空间的生产者（丢弃其剩余部分）和等待数据的消费者
+        self._space_event.set()
+        self._data_event.set()
+        return dropped
+
+    # ---------------- 消费者 ----------------
+
+    def _wait_seconds(self, now: float) -> Optional[float]:
+        """可以取出一帧时返回 None，否则返回最多还需等待的秒数"""
+        fill = len(self._ring)
+        frame = self.frame_samples
+        if (not self._ended and self._last_arrival is not None
+                and now - self._last_arrival >= self.max_delay_ms / 1000):
+            # 超过最大延迟没有新分片（双工输出停顿），按一段输出结束处理
+            self._ended = True
+            self._last_arrival = None
+        if self._playing:
+            if fill >= frame or (fill > 0 and self._ended):
+                return None
+            if fill == 0 and self._ended:
+                self._playing = False
+                self._buffering_since = None
+                return float("inf")
+            # 播放中不足一帧：欠载，加大目标延迟后重新预缓冲
+            self.underruns += 1
+            self._underrun_boost_ms = min(float(self.max_delay_ms),
+                                          self._underrun_boost_ms + UNDERRUN_BOOST_FRAMES * self.frame_ms)
+            self._update_target()
+            self._playing = False
+            self._buffering_since = now
+            if self.underruns == 1 or self.underruns % 50 == 0:
+                logger.info(f"播放缓冲区欠载: session_id={self.session_id}, 累计 {self.underruns} 次, "
+                            f"目标延迟调整为 {self.target_delay_ms:.0f}ms")
+        if fill == 0:
+            return float("inf")
+        if self._buffering_since is None:
+            self._buffering_since = now
+        if self._ended or fill >= self.target_delay_ms * self.sample_rate / 1000:
+            self._playing = True
+            return None
+        remaining = self.target_delay_ms / 1000 - (now - self._buffering_since)
+        if remaining <= 0 and fill >= frame:
+            self._playing = True
+            return None
+        # 预缓冲未满：等到目标延迟，或等到本段输出结束（超过最大延迟没有新分片）
+        idle_deadline = self._last_arrival + self.max_delay_ms / 1000 - now if self._last_arrival else float("inf")
+        return max(0.001, min(remaining if remaining > 0 else float("inf"), idle_deadline))
+
+    async def read_frame(self, out: np.ndarray, timeout: float) -> bool:
+        """等待下一帧写入 out（frame_samples 个 int16），timeout 秒内没有可播放的音频时返回 False"""
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            wait = self._wait_seconds(now)
+            if wait is None:
+                self._pop_frame(out)
+                return True
+            wait = min(wait, deadline - now)
+            if wait <= 0:
+                return False
+            self._data_event.clear()
+            try:
+                await asyncio.wait_for(self._data_event.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _pop_frame(self, out: np.ndarray):
+        n = min(self.frame_samples, len(self._ring))
+        out[:n] = self._ring.head(n)
+        if n < self.frame_samples:
+            # 一段输出的尾巴不足一帧，补零
+            out[n:] = 0
+            self.padded_frames += 1
+        self._ring.consume(n)
+        self.frames_out += 1
+        self._space_event.set()
+
+    def close(self):
+        _active_buffers.pop(self.session_id, None)
+
+    def stats(self) -> dict:
+        late_ms = list(self._late_ms)
+        to_ms = 1000 / self.sample_rate
+        return {
+            "session_id": self.session_id,
+            "sample_rate": self.sample_rate,
+            "capacity_ms": round(self._ring.capacity * to_ms),
+            "pending_ms": round(len(self._ring) * to_ms),
+            "max_fill_ms": round(self.max_fill * to_ms),
+            "target_delay_ms": round(self.target_delay_ms, 1),
+            "jitter_ms": {
+                "p50": round(_percentile(late_ms, 50), 1),
+                "p95": round(_percentile(late_ms, 95), 1),
+                "max": round(max(late_ms), 1) if late_ms else 0.0,
+            },
+            "chunks_in": self.chunks_in,
+            "frames_out": self.frames_out,
+            "padded_frames": self.padded_frames,
+            "streams": self.streams,
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "overrun_wait_ms": round(self.overrun_wait_ms, 1),
+            "flushes": self.flush_generation,
+            "flushed_ms": round(self.samples_flushed * to_ms),
+        }
+
+
+def get_playout_stats() -> List[dict]:
+    """所有活跃会话的播放缓冲区统计"""
+    return [buffer.stats() for buffer in list(_active_buffers.values())]
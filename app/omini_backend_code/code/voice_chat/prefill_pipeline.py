@@ -0,0 +1,228 @@
+"""
+每个会话的有序 prefill 流水线
+
+原来 OmniStream.model_prefill 和 LiveKitRoom.input_image 每次都 asyncio.create_task 一个
+MiniCpmModel.model_prefill，没有上限也没有顺序：
+- 负载高时音频 / 图片 prefill 到达 bridge 的顺序和产生顺序不一致
+- 任务无限堆积
+- image_audio_id 在请求返回后才 +1，并发请求读到的 id 互相竞争，图片和音频配错组
+
+PrefillPipeline 每个会话一个，在事件循环线程中使用：
+- submit 时同步领取 image_audio_id（音频领取后立即 +1），入队顺序即配对顺序
+- 有界队列：音频满时等待（背压到 OmniStream，音频由输入缓冲区暂存），图片满时丢弃最旧的排队图片
+- 同一组（image_audio_id 相同）还没发出的旧图片直接被新图片替换（高刷模式每组多帧，不合并）
+- max_inflight 个发送协程按队列顺序出队，出队时分配单调递增的 seq，bridge 按 seq 串行处理，
+  max_inflight > 1 时下一条请求的编码 / 传输 / 解码与上一条的 prefill 重叠
+- stats() 输出队列深度、出队滞后（入队到发出）和请求耗时分位数；get_prefill_stats() 汇总所有活跃会话（/health/prefill）
+"""
+import asyncio
+import time
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional
+
+import numpy as np
+
+from enhanced_logging_config import get_enhanced_logger
+from voice_chat.entity.session import SharedSessionState
+
+logger = get_enhanced_logger('prefill_pipeline')
+
+# 用于计算分位数的最近样本数
+LAG_SAMPLES = 1024
+
+# 活跃会话的 prefill 流水线（会话结束、对象回收后自动移除）
+_active_pipelines: "weakref.WeakValueDictionary[str, PrefillPipeline]" = weakref.WeakValueDictionary()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    data = sorted(values)
+    return data[min(len(data) - 1, int(round((len(data) - 1) * pct / 100)))]
+
+
+class PrefillItem:
+    """一条待发送的 prefill（audio / image 二选一）"""
+    __slots__ = ("audio", "image", "last_chunk", "image_audio_id", "round_id", "enqueue_time", "seq")
+
+    def __init__(self, audio: Optional[np.ndarray], image: Any, last_chunk: bool,
+                 image_audio_id: int, round_id: int):
+        self.audio = audio
+        self.image = image
+        self.last_chunk = last_chunk
+        self.image_audio_id = image_audio_id
+        self.round_id = round_id
+        self.enqueue_time = time.time()
+        self.seq: Optional[int] = None
+
+    @property
+    def kind(self) -> str:
+        return "audio" if self.audio is not None else "image"
+
+
+class PrefillPipeline:
+    """单个会话的有序 prefill 队列（非线程安全，只在事件循环线程中使用）"""
+
+    def __init__(self, session_id: str, shared_state: SharedSessionState,
+                 send: Callable[[PrefillItem], Awaitable[Any]],
+                 queue_size: int = 32, max_inflight: int = 2, coalesce_images: bool = True):
+        self.session_id = session_id
+        self.shared_state = shared_state
+        self.send = send
+        self.queue_size = max(1, queue_size)
+        self.max_inflight = max(1, max_inflight)
+        # 高刷模式每组 5 帧是有意发送的，不合并
+        self.coalesce_images = coalesce_images and not shared_state.highRefresh
+        self._queue: deque = deque()
+        self._cond = asyncio.Condition()
+        self._workers: List[asyncio.Task] = []
+        self._next_seq = 1
+        self._inflight = 0
+        self._closed = False
+        # 统计
+        self.submitted = 0
+        self.dispatched = 0
+        self.failed = 0
+        self.images_coalesced = 0
+        self.images_dropped = 0
+        self.backpressure_waits = 0
+        self.max_depth = 0
+        self._lag_ms: deque = deque(maxlen=LAG_SAMPLES)
+        self._send_ms: deque = deque(maxlen=LAG_SAMPLES)
+        _active_pipelines[session_id] = self
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def _ensure_workers(self):
+        if not self._workers and not self._closed:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_inflight)]
+
+    def _enqueue(self, item: PrefillItem):
+        self._queue.append(item)
+        self.submitted += 1
+        if len(self._queue) > self.max_depth:
+            self.max_depth = len(self._queue)
+        self._cond.notify_all()
+
+    async def submit_audio(self, audio: np.ndarray, round_id: int, last_chunk: bool = False):
+        """音频入队：队列满时等待空位，入队时领取 image_audio_id 并 +1"""
+        self._ensure_workers()
+        async with self._cond:
+            if len(self._queue) >= self.queue_size:
+                self.backpressure_waits += 1
+                await self._cond.wait_for(lambda: len(self._queue) < self.queue_size or self._closed)
+            if self._closed:
+                return
+            # 领取 id 与入队之间没有 await，入队顺序即 image_audio_id 顺序
+            image_audio_id = self.shared_state.claim_image_audio_id(advance=True)
+            self._enqueue(PrefillItem(audio, None, last_chunk, image_audio_id, round_id))
+
+    async def submit_image(self, image: Any, round_id: int):
+        """图片入队：同组未发出的旧图片被替换；队列满时丢弃最旧的排队图片"""
+        self._ensure_workers()
+        async with self._cond:
+            if self._closed:
+                return
+            image_audio_id = self.shared_state.claim_image_audio_id(advance=False)
+            if self.coalesce_images:
+                for queued in reversed(self._queue):
+                    if queued.image_audio_id != image_audio_id:
+                        break
+                    if queued.audio is None:
+                        queued.image = image
+                        queued.enqueue_time = time.time()
+                        self.images_coalesced += 1
+                        return
+            if len(self._queue) >= self.queue_size:
+                stale = next((queued for queued in self._queue if queued.audio is None), None)
+                self.images_dropped += 1
+                if stale is None:
+                    logger.warning(f"prefill 队列已满且全部为音频，丢弃新图片: session_id={self.session_id}")
+                    return
+                self._queue.remove(stale)
+            self._enqueue(PrefillItem(None, image, False, image_audio_id, round_id))
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._queue or self._closed)
+                if self._closed and not self._queue:
+                    return
+                # 出队与分配 seq 之间没有 await，seq 顺序即队列顺序
+                item = self._queue.popleft()
+                item.seq = self._next_seq
+                self._next_seq += 1
+                self._inflight += 1
+                self._cond.notify_all()
+            start = time.time()
+            self._lag_ms.append((start - item.enqueue_time) * 1000)
+            try:
+                await self.send(item)
+                self.dispatched += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"prefill 发送失败: session_id={self.session_id}, seq={item.seq}, "
+                             f"kind={item.kind}, image_audio_id={item.image_audio_id}, error={e}")
+            finally:
+                self._send_ms.append((time.time() - start) * 1000)
+                async with self._cond:
+                    self._inflight -= 1
+                    self._cond.notify_all()
+
+    async def join(self, timeout: float) -> bool:
+        """等待已入队的 prefill 全部发送完成（generate 之前调用）；超时返回 False"""
+        async with self._cond:
+            try:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: not self._queue and self._inflight == 0), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"等待 prefill 发送完成超时: session_id={self.session_id}, "
+                               f"排队 {len(self._queue)}, 发送中 {self._inflight}")
+                return False
+        return True
+
+    async def close(self):
+        """停止发送协程，丢弃未发出的 prefill"""
+        async with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        _active_pipelines.pop(self.session_id, None)
+
+    def stats(self) -> dict:
+        lag_ms = list(self._lag_ms)
+        send_ms = list(self._send_ms)
+        return {
+            "session_id": self.session_id,
+            "queue_size": self.queue_size,
+            "max_inflight": self.max_inflight,
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "inflight": self._inflight,
+            "next_seq": self._next_seq,
+            "submitted": self.submitted,
+            "dispatched": self.dispatched,
+            "failed": self.failed,
+            "images_coalesced": self.images_coalesced,
+            "images_dropped": self.images_dropped,
+            "backpressure_waits": self.backpressure_waits,
+            "dispatch_lag_ms": {
+                "p50": round(_percentile(lag_ms, 50), 1),
+                "p99": round(_percentile(lag_ms, 99), 1),
+                "max": round(max(lag_ms), 1) if lag_ms else 0.0,
+            },
+            "send_ms": {
+                "p50": round(_percentile(send_ms, 50), 1),
+                "p99": round(_percentile(send_ms, 99), 1),
+            },
+        }
+
+
+def get_prefill_stats() -> List[dict]:
+    """所有活跃会话的 prefill 流水线统计"""
+    return [pipeline.stats() for pipeline in list(_active_pipelines.values())]
@@ -6,18 +6,21 @@ import time
 import uuid
 import numpy as np
 import cv2
-from collections import deque
 from livekit import rtc
 from signal import SIGINT, SIGTERM
 
 from scipy.signal import resample_poly
+from common.utils.audio_ring_buffer import AudioRingBuffer
+from config.settings import get_voice_chat_settings
 from enhanced_logging_config import get_enhanced_logger, set_request_trace
 from services.inference_service_manager import InferenceService, InferenceServiceManager
+from voice_chat.audio_ingest import AudioIngestBuffer
 from voice_chat.entity.session import SharedSessionState
 from voice_chat.entity.token import LoginRequest
 from voice_chat.livekit_room import LiveKitRoom
 from voice_chat.model_call import MiniCpmModel
 from voice_chat.omni_stream import OmniStream
+from voice_chat.playout_buffer import PlayoutBuffer
 
 # 获取日志器
 logger = get_enhanced_logger('voice_chat')
@@ -25,22 +28,23 @@ logger = get_enhanced_logger('voice_chat')
 
 class Mini_Server:
     def __init__(self, stop_event: asyncio.Event, liveKitRoom: LiveKitRoom, 
-    audio_output_queue: asyncio.Queue, text_output_queue: asyncio.Queue, 
+    audio_playout: PlayoutBuffer, text_output_queue: asyncio.Queue, 
     first_tts: asyncio.Event):
         self.liveKitRoom = liveKitRoom
         self.stop_event = stop_event
 
         # 音频配置
-        self.WEBRTC_SAMPLE_RATE = 48000
+        # 🔧 [输出采样率协商] 与 LiveKit 输出音轨（AudioSource）的采样率一致，每帧 20ms
+        self.WEBRTC_SAMPLE_RATE = audio_playout.sample_rate
         self.NUM_CHANNELS = 1
-        self.UPDATE_SIZE = self.WEBRTC_SAMPLE_RATE//50
+        self.UPDATE_SIZE = audio_playout.frame_samples
 
-        self.audio_output_queue = audio_output_queue
+        self.audio_playout = audio_playout
         self.text_output_queue = text_output_queue
         self.first_tts = first_tts
 
-    async def server(self, source: rtc.AudioSource, model_generating_flag: asyncio.Event) -> None:
-        asyncio.create_task(self.output_audio(source, model_generating_flag))
+    async def server(self, source: rtc.AudioSource) -> None:
+        asyncio.create_task(self.output_audio(source))
         asyncio.create_task(self.text_put_detail())
 
     async def text_put_detail(self):
@@ -61,7 +65,7 @@ class Mini_Server:
                 await asyncio.sleep(0.01)
                 continue
 
-    async def output_audio(self, source: rtc.AudioSource, model_generating_flag: asyncio.Event):
+    async def output_audio(self, source: rtc.AudioSource):
         try:
             logger.info(f"开始监听输出音频队列")
             audio_frame = rtc.AudioFrame.create(
@@ -69,75 +73,36 @@ class Mini_Server:
             audio_data = np.frombuffer(audio_frame.data, dtype=np.int16)
 
             frame_count = 0
-            # 维护剩余音频缓冲区，用于拼接不足0.1s的音频片段
-            remaining_audio = None
+            flush_generation = self.audio_playout.flush_generation
 
             while not self.stop_event.is_set():
                 try:
-                    # 策略1：如果有剩余音频且足够发送，先发送剩余音频
-                    if remaining_audio is not None and len(remaining_audio) >= self.UPDATE_SIZE:
-                        chunk_to_send = remaining_audio[:self.UPDATE_SIZE]
-                        np.copyto(audio_data, chunk_to_send)
-                        await source.capture_frame(audio_frame)
-                        
-                        frame_count += 1
-                        remaining_audio = remaining_audio[self.UPDATE_SIZE:]
-                        if len(remaining_audio) == 0:
-                            remaining_audio = None
-                        continue  # 继续下一次循环，不阻塞等待
-                    
-                    # 策略2：尝试从队列获取新数据（带超时的阻塞等待）
-                    try:
-                        chunk_data = await asyncio.wait_for(
-                            self.audio_output_queue.get(), 
-                            timeout=0.2  # 200ms超时，定期检查状态
-                        )
-                        
-                        # 标记首次音频开始
-                        if self.first_tts.is_set():
-                            self.text_output_queue.put_nowait("<state><audio_start>")
-                        
-                        # 拼接新数据与剩余音频
-                        if remaining_audio is not None:
-                            combined_audio = np.concatenate([remaining_audio, chunk_data])
-                        else:
-                            combined_audio = chunk_data
-                        
-                        # 循环发送所有完整的音频片段
-                        while len(combined_audio) >= self.UPDATE_SIZE:
-                            chunk_to_send = combined_audio[:self.UPDATE_SIZE]
-                            np.copyto(audio_data, chunk_to_send)
-                            await source.capture_frame(audio_frame)
-                            
-                            if self.first_tts.is_set():
-                                self.text_output_queue.put_nowait(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')} - 发送首响音频成功")
-                                self.first_tts.clear()
-                            
-                            frame_count += 1
-                            combined_audio = combined_audio[self.UPDATE_SIZE:]
-                        
-                        # 保存剩余的不足一个片段的音频
-                        remaining_audio = combined_audio if len(combined_audio) > 0 else None
-                        
-                    except asyncio.TimeoutError:
-                        # 策略3：超时无新数据，如果模型不再生成，发送剩余音频（即使不足UPDATE_SIZE）
-                        if remaining_audio is not None and not model_generating_flag.is_set():
-                            # 用零填充到UPDATE_SIZE
-                            padded_audio = np.zeros(self.UPDATE_SIZE, dtype=np.int16)
-                            padded_audio[:len(remaining_audio)] = remaining_audio
-                            np.copyto(audio_data, padded_audio)
-                            await source.capture_frame(audio_frame)
-                            frame_count += 1
-                            remaining_audio = None
-                            logger.debug(f"发送填充后的剩余音频")
-                        # 短暂让出CPU
-                        await asyncio.sleep(0)
-                        
+                    # 🔧 [播放缓冲] 播放缓冲区按自适应目标延迟预缓冲后逐帧写入 audio_frame，
+                    # 欠载时重新预缓冲，一段输出结束时不足一帧的尾巴补零（200ms 超时定期检查 stop_event）
+                    has_frame = await self.audio_playout.read_frame(audio_data, timeout=0.2)
+                    if self.audio_playout.flush_generation != flush_generation:
+                        # 打断：同时丢弃 AudioSource 内部已排队的音频
+                        flush_generation = self.audio_playout.flush_generation
+                        source.clear_queue()
+                    if not has_frame:
+                        continue
+
+                    # 标记首次音频开始
+                    if self.first_tts.is_set():
+                        self.text_output_queue.put_nowait("<state><audio_start>")
+                    await source.capture_frame(audio_frame)
+                    if self.first_tts.is_set():
+                        self.text_output_queue.put_nowait(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')} - 发送首响音频成功")
+                        self.first_tts.clear()
+                    frame_count += 1
+
                 except Exception as e:
                     logger.error(f"处理音频输出错误: {e}")
                     await asyncio.sleep(0.01)
                     
             logger.info(f"结束监听输出音频队列，共发送 {frame_count} 帧")
+            logger.info(f"播放缓冲区统计: {self.audio_playout.stats()}")
+            self.audio_playout.close()
         except Exception as e:
             logger.error(f"output_audio error: {str(e)}")
 
@@ -152,8 +117,19 @@ async def room_start_monitor(session_id: str, liveKitToken: str, request: LoginR
     try:
         logger.info(f"启动监听服务 - 房间ID: {session_id}, LiveKitToken: {liveKitToken}, request: {request}, 推理服务: {inference_service.service_id}")
         # 初始化监听和输出队列 - 使用异步队列替代同步队列
-        audio_input_queue = asyncio.Queue(maxsize=1000)  # 添加maxsize防止内存无限增长
-        audio_output_queue = asyncio.Queue(maxsize=1000)
+        # 🔧 [批量输入] 音频输入改为预分配的会话缓冲区（溢出丢弃最旧音频），攒够一批才唤醒 OmniStream
+        voice_chat_config = get_voice_chat_settings()
+        audio_ingest = AudioIngestBuffer(
+            session_id, voice_chat_config.ingest_sample_rate,
+            capacity_seconds=voice_chat_config.ingest_buffer_seconds,
+            batch_ms=voice_chat_config.ingest_batch_ms)
+        # 🔧 [播放缓冲] TTS 输出改为预分配的自适应播放缓冲区，输出采样率协商后按协商结果分配
+        audio_playout = PlayoutBuffer(
+            session_id, voice_chat_config.output_sample_rate or MiniCpmModel.WEBRTC_SAMPLE_RATE,
+            capacity_seconds=voice_chat_config.playout_buffer_seconds,
+            min_delay_ms=voice_chat_config.playout_min_delay_ms,
+            initial_delay_ms=voice_chat_config.playout_initial_delay_ms,
+            max_delay_ms=voice_chat_config.playout_max_delay_ms)
         text_output_queue = asyncio.Queue(maxsize=200)
 
         # 使用异步Event替代threading.Event
@@ -165,19 +141,21 @@ async def room_start_monitor(session_id: str, liveKitToken: str, request: LoginR
         shared_state = SharedSessionState(highRefresh=request.highRefresh)
         
         model_cpm = MiniCpmModel(inference_service=inference_service, request=request, 
-            text_output_queue=text_output_queue, audio_output_queue=audio_output_queue, 
+            text_output_queue=text_output_queue, audio_playout=audio_playout, 
             first_tts=first_tts, shared_state=shared_state,
             model_generating_flag=model_generating_flag)
+        # 🔧 [输出采样率协商] 创建输出音轨前确定采样率（默认跟随模型服务的 TTS 采样率，失败回退 48kHz）
+        audio_playout.set_sample_rate(await model_cpm.negotiate_output_sample_rate())
         # 启动omniStream服务
-        omni_stream = OmniStream(inference_service=inference_service, request=request, audio_input_queue=audio_input_queue, audio_output_queue=audio_output_queue, 
+        omni_stream = OmniStream(inference_service=inference_service, request=request, audio_ingest=audio_ingest, audio_playout=audio_playout, 
             text_output_queue=text_output_queue, stop_event=stop_event, model_cpm=model_cpm, shared_state=shared_state)
 
-        # 创建音频缓冲区并启动异步流处理
-        audio_buffer = deque(maxlen=omni_stream.BUFFER_SIZE)
+        # 创建音频缓冲区并启动异步流处理（定长 int16 环形缓冲区，VAD 直接取连续视图）
+        audio_buffer = AudioRingBuffer(omni_stream.BUFFER_SIZE)
         asyncio.create_task(omni_stream._async_stream_detail(audio_buffer))
         # 初始化房间的监听
         liveKit_room = LiveKitRoom(liveKit_token=liveKitToken, request=request, 
-        audio_input_queue=audio_input_queue, audio_output_queue=audio_output_queue, inference_service=inference_service, 
+        audio_ingest=audio_ingest, audio_playout=audio_playout, inference_service=inference_service, 
         inference_service_manager=inference_service_manager, model_cpm=model_cpm, stop_event=stop_event, 
         shared_state=shared_state)
         source = await liveKit_room.init_room_listener()
@@ -188,12 +166,12 @@ async def room_start_monitor(session_id: str, liveKitToken: str, request: LoginR
         mini_server = Mini_Server(
             stop_event=stop_event,
             liveKitRoom=liveKit_room,
-            audio_output_queue=audio_output_queue,
+            audio_playout=audio_playout,
             text_output_queue=text_output_queue,
             first_tts=first_tts)
         
         # 启动模型服务逻辑（非阻塞）
-        await mini_server.server(source, model_generating_flag)
+        await mini_server.server(source)
         logger.info("模型服务已启动，函数即将返回")
         
     except Exception as e:
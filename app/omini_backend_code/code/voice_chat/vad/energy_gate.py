@@ -0,0 +1,154 @@
+"""
+Silero VAD 前置的能量 / 过零率门限
+
+会话大部分时间是静音或稳定的背景噪声，但每个 VAD 窗口仍然要跑一次 ONNX 推理。
+EnergyGate 对每帧音频做向量化的 RMS 能量和过零率计算，只有「可能有语音」的帧才交给 Silero：
+
+- 自适应噪声底：门关闭时用非对称 EMA 跟踪背景能量（下降快、上升慢）；
+  门打开时也用最小值统计（最近 floor_window_frames 帧平滑能量的最小值）抬高噪声底。
+  只在门关闭时学习会被宽带噪声锁死：白噪声过零率高，初始噪声底 -60 dBFS 时 -55 dBFS 的噪声
+  就满足「高于噪声底 close_db 且过零率高」而开门，之后门一直开着、噪声底永远学不到。
+  语音在 1.5 秒内总有音节间隙，窗口最小值接近背景能量；稳定的风扇声、空调声、白噪声
+  会在一个窗口内被并入噪声底，门随之关闭。取最小值前先对功率做短时平滑（再加 floor_bias_db），
+  否则逐帧能量的起伏会让最小值明显低于平均电平，噪声仍然频繁越过 close_db
+- 能量和过零率按帧去掉直流分量后计算：棕噪声、直流偏置的能量集中在次声频段，
+  不去直流时逐帧能量随漂移大幅起伏，过零率也被压低，噪声底跟不住
+- 开门：能量高于噪声底 open_db，或高于噪声底 close_db 且过零率高（清辅音起始能量低但过零多）
+- 迟滞：开门后能量不低于噪声底 close_db 就保持打开，跌落后再保持 hangover 帧才关门，
+  让 Silero 的概率在门关闭前自然衰减到 neg_threshold 以下
+- 低于 silence_dbfs 的帧（数字静音）不会开门
+
+门关闭的帧按「无语音」处理（概率记 0）。speech_timestamps_from_probs 对低于 neg_threshold 的
+概率一视同仁，只要门只在 Silero 本来也判为静音的位置关闭，语音段判决、进而 vad_stream_started
+的切换就与不加门时相同；benchmarks/bench_vad_energy_gate.py 用真实录音验证这一点。
+"""
+from collections import deque
+from typing import Tuple
+
+import numpy as np
+
+# int16 满幅
+INT16_FULL_SCALE = 32768.0
+# 最小值统计前功率平滑的时间常数（毫秒），按帧长换算为 floor_smoothing = 帧长 / FLOOR_SMOOTHING_MS
+FLOOR_SMOOTHING_MS = 150.0
+
+
+def frame_features(frames: np.ndarray, full_scale: float = INT16_FULL_SCALE) -> Tuple[np.ndarray, np.ndarray]:
+    """逐帧 RMS 能量（dBFS）和过零率（每样本过零次数，0-1）
+
+    Args:
+      frames: (n_frames, frame_len) 的音频帧，int16 或 float
+      full_scale: 满幅值（int16 为 32768，[-1, 1] 浮点为 1.0）
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    if frames.ndim == 1:
+        frames = frames[np.newaxis, :]
+    # 去掉每帧的直流分量：次声/低频漂移（棕噪声、直流偏置）不计入能量，也不会压低过零率
+    frames = frames - frames.mean(axis=1, keepdims=True)
+    scaled = frames / full_scale
+    rms = np.sqrt(np.mean(scaled * scaled, axis=1))
+    rms_db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(frames.shape[1] - 1, 1)
+    return rms_db, zcr
+
+
+class EnergyGate:
+    """带自适应噪声底和迟滞的能量/过零率门限（每个会话一个实例，非线程安全）"""
+
+    def __init__(self, open_db: float = 9.0, close_db: float = 4.0, hangover_frames: int = 5,
+                 zcr_threshold: float = 0.25, silence_dbfs: float = -65.0,
+                 initial_floor_dbfs: float = -60.0, max_floor_dbfs: float = -30.0,
+                 floor_rise: float = 0.02, floor_fall: float = 0.3, floor_window_frames: int = 47,
+                 floor_smoothing: float = 0.2, floor_bias_db: float = 2.0):
+        if close_db > open_db:
+            raise ValueError(f"close_db 不能大于 open_db: {close_db} > {open_db}")
+        self.open_db = open_db
+        self.close_db = close_db
+        self.hangover_frames = hangover_frames
+        self.zcr_threshold = zcr_threshold
+        self.silence_dbfs = silence_dbfs
+        self.initial_floor_dbfs = initial_floor_dbfs
+        self.max_floor_dbfs = max_floor_dbfs
+        self.floor_rise = floor_rise
+        self.floor_fall = floor_fall
+        # 最小值统计窗口（帧数，默认约 1.5 秒 × 32ms 帧）；攒够 1/4 窗口后开始使用，
+        # 会话开头的稳定噪声几百毫秒内就能被学到。floor_smoothing 为功率平滑的 EMA 系数
+        self.floor_window_frames = max(1, floor_window_frames)
+        self.floor_min_frames = max(1, self.floor_window_frames // 4)
+        self.floor_smoothing = floor_smoothing
+        self.floor_bias_db = floor_bias_db
+        self.reset()
+
+    def reset(self):
+        self.noise_floor_dbfs = self.initial_floor_dbfs
+        self.is_open = False
+        self._hangover = 0
+        self.frames_total = 0
+        self.frames_open = 0
+        # 单调递增队列 (帧序号, 能量)，队首为窗口内最小能量
+        self._window_min = deque()
+        self._frame_index = 0
+        self._smoothed_power = None
+
+    def _recent_min(self, rms_db: float) -> float:
+        """加入当前帧后，最近 floor_window_frames 帧平滑能量（dBFS）的最小值"""
+        power = 10.0 ** (rms_db / 10.0)
+        if self._smoothed_power is None:
+            self._smoothed_power = power
+        else:
+            self._smoothed_power += self.floor_smoothing * (power - self._smoothed_power)
+        rms_db = 10.0 * np.log10(self._smoothed_power)
+        window = self._window_min
+        while window and window[-1][1] >= rms_db:
+            window.pop()
+        window.append((self._frame_index, rms_db))
+        while window[0][0] <= self._frame_index - self.floor_window_frames:
+            window.popleft()
+        self._frame_index += 1
+        return window[0][1]
+
+    def _step(self, rms_db: float, zcr: float) -> bool:
+        floor = self.noise_floor_dbfs
+        if rms_db < self.silence_dbfs:
+            active = False
+        elif self.is_open:
+            active = rms_db >= floor + self.close_db
+        else:
+            active = (rms_db >= floor + self.open_db
+                      or (rms_db >= floor + self.close_db and zcr >= self.zcr_threshold))
+
+        if active:
+            self.is_open = True
+            self._hangover = self.hangover_frames
+        elif self.is_open:
+            if self._hangover > 0:
+                self._hangover -= 1
+            else:
+                self.is_open = False
+
+        # 门关闭时 EMA 学习；低于噪声底时快速跟随，避免被一次性噪声抬高
+        level = max(rms_db, self.silence_dbfs)
+        if not self.is_open:
+            rate = self.floor_fall if rms_db < floor else self.floor_rise
+            floor += rate * (level - floor)
+        # 开关门都做最小值统计：窗口内一直没有低于噪声底的帧，说明噪声底低估了背景（稳定噪声）
+        recent_min = self._recent_min(level)
+        if self._frame_index >= self.floor_min_frames and recent_min > floor:
+            floor = recent_min + self.floor_bias_db
+        self.noise_floor_dbfs = min(floor, self.max_floor_dbfs)
+        return self.is_open
+
+    def process(self, frames: np.ndarray, full_scale: float = INT16_FULL_SCALE) -> np.ndarray:
+        """逐帧判决，返回每帧门是否打开的布尔数组"""
+        rms_db, zcr = frame_features(frames, full_scale)
+        result = np.empty(len(rms_db), dtype=bool)
+        for i in range(len(rms_db)):
+            result[i] = self._step(float(rms_db[i]), float(zcr[i]))
+        self.frames_total += len(result)
+        self.frames_open += int(np.count_nonzero(result))
+        return result
+
+    @property
+    def open_ratio(self) -> float:
+        return self.frames_open / self.frames_total if self.frames_total else 0.0
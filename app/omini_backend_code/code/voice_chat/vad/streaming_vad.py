@@ -0,0 +1,193 @@
+"""
+流式 Silero VAD：每个 tick 只处理新到达的音频
+
+旧逻辑每 100ms 对整个 1 秒窗口调用一次 run_vad：librosa 把 48kHz 重采样到 16kHz，
+从 get_initial_state 开始跑约 16 个 ONNX 窗口；尾部检测再拼一个「最后 0.2 秒 + 0.8 秒静音」
+的 1 秒缓冲区重跑一遍。相邻两个 tick 的窗口有 90% 重叠，绝大部分计算是重复的。
+
+StreamingVad 每个会话一个实例，保存：
+- 流式 3:1 抽取器（FIR 低通 + 抽取，保留滤波器尾部和抽取相位，48kHz -> 16kHz）
+- Silero LSTM 状态 (h, c)，跨 tick 连续
+- 不足一个窗口的 16kHz 余量
+- 最近若干窗口的语音概率历史
+
+feed() 只对新音频做抽取和推理；整窗/尾部两种判决都由概率历史经
+vad_utils.speech_timestamps_from_probs 得到，沿用同一套 VadOptions 规则：
+- window_speech_duration(1.0): 最近 1 秒的窗口概率，等价于对 1 秒窗口 run_vad
+- tail_speech_duration(0.2, 1.0): 最近 0.2 秒的窗口概率 + 0.8 秒静音（概率按 0 计），
+  等价于旧逻辑的「尾部音频补静音」
+
+与整窗 VAD 的差异：LSTM 状态不再每个窗口清零（上下文更完整）；最近不足一个 VAD 窗口
+（window_size_samples=1024 时不超过 64ms）的音频要等下一个 tick 凑满后才参与判决。
+
+可选的能量门（energy_gate.EnergyGate）在每个 16kHz 窗口推理前做判断：门关闭的窗口不跑 ONNX，
+概率记 0，LSTM 状态保持不变；门重新打开时先补跑最近 preroll_windows 个被跳过的窗口
+（覆盖历史里对应的 0）预热 LSTM 状态，再处理当前窗口。
+"""
+import math
+from collections import deque
+from contextlib import nullcontext
+from typing import Optional
+
+import numpy as np
+
+from voice_chat.vad import vad_utils
+from voice_chat.vad.energy_gate import EnergyGate
+
+VAD_SAMPLE_RATE = 16000
+
+
+def design_lowpass(numtaps: int, cutoff: float) -> np.ndarray:
+    """Hamming 窗 sinc 低通 FIR（cutoff 为相对输入采样率的归一化频率，0-0.5）"""
+    n = np.arange(numtaps) - (numtaps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(numtaps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class StreamingDecimator:
+    """整数倍流式抽取器（factor=1 时直通）
+
+    连续调用 process() 的输出与对拼接后的整段音频一次性滤波抽取的结果相同。
+    """
+
+    def __init__(self, factor: int, numtaps: int = 63):
+        if factor < 1:
+            raise ValueError(f"抽取倍数必须 >= 1: {factor}")
+        self.factor = factor
+        self.numtaps = numtaps
+        # 截止频率取新奈奎斯特频率的 90%，留出过渡带
+        self.taps = design_lowpass(numtaps, 0.45 / factor) if factor > 1 else None
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros(self.numtaps - 1, dtype=np.float32)
+        self._phase = 0  # 下一个输出样本在新输入中的偏移
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.factor == 1:
+            return samples
+        extended = np.concatenate([self._history, samples])
+        self._history = extended[-(self.numtaps - 1):]
+        if self._phase >= len(samples):
+            self._phase -= len(samples)
+            return np.zeros(0, dtype=np.float32)
+        # 输出第 j 个样本对应 extended[j : j + numtaps]，只计算需要保留的那些
+        windows = np.lib.stride_tricks.sliding_window_view(extended, self.numtaps)[self._phase::self.factor]
+        out = windows @ self.taps[::-1]
+        consumed = self._phase + len(out) * self.factor
+        self._phase = consumed - len(samples)
+        return out.astype(np.float32, copy=False)
+
+
+class StreamingVad:
+    """单个会话的增量 VAD 引擎（非线程安全，同一会话的调用需串行）"""
+
+    def __init__(self, input_sample_rate: int = 48000,
+                 vad_options: Optional[vad_utils.VadOptions] = None,
+                 history_seconds: float = 1.0, model=None,
+                 gate: Optional[EnergyGate] = None, preroll_windows: int = 3):
+        if input_sample_rate % VAD_SAMPLE_RATE != 0:
+            raise ValueError(f"流式 VAD 只支持 16kHz 整数倍的输入采样率: {input_sample_rate}")
+        self.input_sample_rate = input_sample_rate
+        self.vad_options = vad_options or vad_utils.VadOptions()
+        self.window_size = self.vad_options.window_size_samples
+        self.decimator = StreamingDecimator(input_sample_rate // VAD_SAMPLE_RATE)
+        self._model = model
+        self.gate = gate
+        self._skipped: deque = deque(maxlen=max(preroll_windows, 0))
+        max_windows = math.ceil(history_seconds * VAD_SAMPLE_RATE / self.window_size) + 1
+        self._probs: deque = deque(maxlen=max_windows)
+        self.reset()
+
+    def _get_model(self):
+        if self._model is None:
+            self._model = vad_utils.get_vad_model()
+            if self._model is None:
+                raise RuntimeError("VAD模型未加载")
+        return self._model
+
+    def reset(self):
+        """清空状态（新一轮对话开始时调用，对应旧逻辑清空 1 秒缓冲区）"""
+        self.decimator.reset()
+        self._state = None
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._probs.clear()
+        self._skipped.clear()
+        self.windows_processed = 0
+        self.windows_skipped = 0
+
+    def feed(self, pcm: np.ndarray) -> int:
+        """送入新到达的 int16 音频（input_sample_rate），返回新完成的窗口数（含能量门跳过的窗口）"""
+        audio = np.asarray(pcm, dtype=np.float32) / 32768.0
+        audio = self.decimator.process(audio)
+        if len(self._pending):
+            audio = np.concatenate([self._pending, audio])
+        n_windows = len(audio) // self.window_size
+        if n_windows:
+            windows = audio[:n_windows * self.window_size].reshape(n_windows, self.window_size)
+            gate_open = self.gate.process(windows, full_scale=1.0) if self.gate is not None else None
+            # 🔧 [批量VAD] 有窗口要推理时向批处理器登记，批处理线程据此知道还有多少会话会提交
+            submitter = None
+            if gate_open is None or gate_open.any():
+                submitter = getattr(self._model, "active_submitter", None)
+            with (submitter() if submitter is not None else nullcontext()):
+                for i in range(n_windows):
+                    if gate_open is not None and not gate_open[i]:
+                        # 🔧 [能量门] 明显静音：不推理，按无语音记录，留作开门时的预热音频
+                        self._probs.append(0.0)
+                        if self._skipped.maxlen:
+                            self._skipped.append(windows[i])
+                        self.windows_skipped += 1
+                        continue
+                    if self._skipped:
+                        self._preroll()
+                    self._probs.append(self._infer(windows[i]))
+            self.windows_processed += n_windows
+        self._pending = audio[n_windows * self.window_size:]
+        return n_windows
+
+    def _infer(self, chunk: np.ndarray) -> float:
+        model = self._get_model()
+        if self._state is None:
+            self._state = model.get_initial_state(batch_size=1)
+        speech_prob, self._state = model(chunk, self._state, VAD_SAMPLE_RATE)
+        return float(np.asarray(speech_prob).reshape(-1)[0])
+
+    def _preroll(self):
+        """门重新打开：补跑紧挨着的几个被跳过窗口，用真实概率覆盖历史里的 0"""
+        skipped = list(self._skipped)
+        self._skipped.clear()
+        offset = len(skipped)
+        for j, chunk in enumerate(skipped):
+            prob = self._infer(chunk)
+            idx = j - offset
+            if -idx <= len(self._probs):
+                self._probs[idx] = prob
+
+    @property
+    def latest_prob(self) -> float:
+        """最近一个窗口的语音概率（尚无窗口时为 0）"""
+        return self._probs[-1] if self._probs else 0.0
+
+    def _window_count(self, seconds: float) -> int:
+        return math.ceil(seconds * VAD_SAMPLE_RATE / self.window_size)
+
+    def window_speech_duration(self, seconds: float = 1.0) -> float:
+        """最近 seconds 秒音频中的语音时长（秒）"""
+        n = min(self._window_count(seconds), len(self._probs))
+        if n == 0:
+            return 0.0
+        probs = list(self._probs)[-n:]
+        audio_length = min(int(seconds * VAD_SAMPLE_RATE), n * self.window_size)
+        return vad_utils.speech_duration_from_probs(probs, audio_length, self.vad_options)
+
+    def tail_speech_duration(self, tail_seconds: float, total_seconds: float = 1.0) -> float:
+        """最近 tail_seconds 秒音频后补静音到 total_seconds 秒时的语音时长（秒）"""
+        n_tail = min(self._window_count(tail_seconds), len(self._probs))
+        if n_tail == 0:
+            return 0.0
+        n_total = max(self._window_count(total_seconds), n_tail)
+        probs = list(self._probs)[-n_tail:] + [0.0] * (n_total - n_tail)
+        audio_length = max(int(total_seconds * VAD_SAMPLE_RATE), n_tail * self.window_size)
+        return vad_utils.speech_duration_from_probs(probs, audio_length, self.vad_options)
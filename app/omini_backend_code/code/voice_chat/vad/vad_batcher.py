@@ -0,0 +1,294 @@
+"""
+跨会话批量 VAD 推理
+
+每个 OmniStream 会话在 _vad_thread_pool 的工作线程里逐窗口调用 SileroVADModel（batch_size=1），
+所有线程共享一个 intra_op_num_threads=1 的 InferenceSession。并发用户多时，耗时主要是每次
+session.run 的固定开销，而不是计算本身。
+
+VadBatcher 实现与 SileroVADModel 相同的接口（get_initial_state / __call__），可以直接作为
+StreamingVad 的 model 使用：
+- 各会话线程调用 __call__ 时把 (窗口, LSTM 状态) 放入待处理队列，然后等待 Future
+- 后台批处理线程每次取出最多 max_batch_size 个请求（第一个请求最多等待 max_wait_ms），
+  把窗口堆叠为 (B, window)、状态拼接为 (2, B, 64)，执行一次 ONNX 推理，再按行分发回各个 Future
+- 调用方用 active_submitter() 标记一次 feed 的窗口提交过程：所有活跃调用方都已提交时立即推理，
+  不再空等 max_wait_ms（会话数远小于 max_batch_size 时批次永远攒不满）；
+  只有一个活跃调用方且没有排队窗口时，在调用线程里直接推理，不经过批处理线程
+- 记录批大小分布、排队等待和推理耗时，stats() 输出（/health/vad）
+
+同一会话的窗口之间有 LSTM 依赖，必须串行，因此一个批次内每个会话最多一个窗口；
+批大小上限实际由并发调用的线程数决定（见 voice_chat.vad_thread_pool_workers）。
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+
+from enhanced_logging_config import get_enhanced_logger
+from voice_chat.vad import vad_utils
+
+logger = get_enhanced_logger('vad_batcher')
+
+# 批大小分布的分桶上界
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+# 用于计算延迟分位数的最近样本数
+LATENCY_SAMPLES = 4096
+
+
+class _PendingWindow:
+    __slots__ = ("x", "h", "c", "sr", "future", "enqueued_at")
+
+    def __init__(self, x: np.ndarray, h: np.ndarray, c: np.ndarray, sr: int):
+        self.x = x
+        self.h = h
+        self.c = c
+        self.sr = sr
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    data = sorted(values)
+    return data[min(len(data) - 1, int(round((len(data) - 1) * pct / 100)))]
+
+
+class VadBatcher:
+    """把多个会话的 VAD 窗口合并成一次批量推理"""
+
+    def __init__(self, model=None, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size 必须 >= 1: {max_batch_size}")
+        self._model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._cond = threading.Condition()
+        self._pending: deque = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        # 正在提交窗口的调用方数 / 其中正在直接推理的数量
+        self._active = 0
+        self._direct = 0
+        # 统计
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.windows = 0
+        self.direct_runs = 0
+        self.errors = 0
+        self.max_batch_seen = 0
+        self._batch_hist = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._wait_ms: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._run_ms: deque = deque(maxlen=LATENCY_SAMPLES)
+
+    def _get_model(self):
+        if self._model is None:
+            self._model = vad_utils.get_vad_model()
+            if self._model is None:
+                raise RuntimeError("VAD模型未加载")
+        return self._model
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="VADBatcher", daemon=True)
+                    self._thread.start()
+
+    # ---------------- 模型接口（与 SileroVADModel 一致） ----------------
+    def get_initial_state(self, batch_size: int):
+        return self._get_model().get_initial_state(batch_size)
+
+    def __call__(self, x, state, sr: int):
+        """提交一个窗口并阻塞等待批量推理结果，返回 (speech_prob, (h, c))"""
+        with self._cond:
+            direct = self._active <= 1 and not self._pending and not self._closed
+            if direct:
+                self._direct += 1
+                self._cond.notify()
+        if not direct:
+            return self.submit(x, state, sr).result()
+        # 🔧 [批量VAD] 只有一个窗口待推理：不经过批处理线程，省去排队和线程切换
+        try:
+            h, c = state
+            item = _PendingWindow(np.asarray(x, dtype=np.float32).reshape(-1), h, c, sr)
+            self._run_batch([item])
+            with self._stats_lock:
+                self.direct_runs += 1
+            return item.future.result()
+        finally:
+            with self._cond:
+                self._direct -= 1
+
+    @contextmanager
+    def active_submitter(self):
+        """标记调用方即将逐个提交窗口（一次 feed），批处理线程据此判断是否还有窗口会到达"""
+        with self._cond:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify()
+
+    def submit(self, x, state, sr: int) -> Future:
+        if self._closed:
+            raise RuntimeError("VadBatcher 已关闭")
+        self._get_model()
+        self._ensure_thread()
+        x = np.asarray(x, dtype=np.float32).reshape(-1)
+        h, c = state
+        item = _PendingWindow(x, h, c, sr)
+        with self._cond:
+            self._pending.append(item)
+            self._cond.notify()
+        return item.future
+
+    # ---------------- 批处理线程 ----------------
+    def _batch_target(self) -> int:
+        """本批次最多等到的窗口数：没有调用方登记时为 max_batch_size，否则为未在直接推理的活跃调用方数"""
+        if not self._active:
+            return self.max_batch_size
+        return min(self.max_batch_size, max(1, self._active - self._direct))
+
+    def _take_batch(self) -> List[_PendingWindow]:
+        """等待并取出一个批次：所有活跃调用方都已提交、攒满 max_batch_size 或第一个请求等待超过 max_wait_ms"""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if self._closed and not self._pending:
+                return []
+            deadline = self._pending[0].enqueued_at + self.max_wait_ms / 1000.0
+            while len(self._pending) < self._batch_target() and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            # 同一批次的窗口长度和采样率必须一致，遇到不一致的留到下一批
+            first = self._pending[0]
+            batch = []
+            while self._pending and len(batch) < self.max_batch_size:
+                item = self._pending[0]
+                if item.sr != first.sr or len(item.x) != len(first.x):
+                    break
+                batch.append(self._pending.popleft())
+            return batch
+
+    def _run_batch(self, batch: List[_PendingWindow]):
+        started = time.perf_counter()
+        try:
+            x = np.stack([item.x for item in batch])
+            h = np.concatenate([item.h for item in batch], axis=1)
+            c = np.concatenate([item.c for item in batch], axis=1)
+            out, (h_out, c_out) = self._get_model()(x, (h, c), batch[0].sr)
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            logger.error(f"批量VAD推理失败 (batch={len(batch)}): {e}")
+            for item in batch:
+                item.future.set_exception(e)
+            return
+        finished = time.perf_counter()
+
+        out = np.asarray(out)
+        for i, item in enumerate(batch):
+            item.future.set_result((
+                out[i:i + 1],
+                (h_out[:, i:i + 1].copy(), c_out[:, i:i + 1].copy()),
+            ))
+        self._record(batch, started, finished)
+
+    def _record(self, batch: List[_PendingWindow], started: float, finished: float):
+        n = len(batch)
+        bucket = len(BATCH_SIZE_BUCKETS)
+        for i, bound in enumerate(BATCH_SIZE_BUCKETS):
+            if n <= bound:
+                bucket = i
+                break
+        run_ms = (finished - started) * 1000
+        with self._stats_lock:
+            self.batches += 1
+            self.windows += n
+            self.max_batch_seen = max(self.max_batch_seen, n)
+            self._batch_hist[bucket] += 1
+            self._run_ms.append(run_ms)
+            self._wait_ms.extend((started - item.enqueued_at) * 1000 for item in batch)
+
+    def _loop(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._closed:
+                    return
+                continue
+            self._run_batch(batch)
+
+    # ---------------- 统计 / 关闭 ----------------
+    def stats(self) -> dict:
+        with self._stats_lock:
+            wait_ms = list(self._wait_ms)
+            run_ms = list(self._run_ms)
+            labels = [f"<={b}" for b in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "pending": len(self._pending),
+                "active_submitters": self._active,
+                "batches": self.batches,
+                "direct_runs": self.direct_runs,
+                "windows": self.windows,
+                "errors": self.errors,
+                "avg_batch_size": round(self.windows / self.batches, 2) if self.batches else 0.0,
+                "max_batch_seen": self.max_batch_seen,
+                "batch_size_hist": dict(zip(labels, self._batch_hist)),
+                "wait_ms": {"p50": round(_percentile(wait_ms, 50), 3), "p99": round(_percentile(wait_ms, 99), 3)},
+                "run_ms": {"p50": round(_percentile(run_ms, 50), 3), "p99": round(_percentile(run_ms, 99), 3)},
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        pending: List[_PendingWindow] = []
+        with self._cond:
+            while self._pending:
+                pending.append(self._pending.popleft())
+        for item in pending:
+            item.future.set_exception(RuntimeError("VadBatcher 已关闭"))
+
+
+_batcher: Optional[VadBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_vad_batcher() -> VadBatcher:
+    """全局 VAD 批处理器（参数来自 voice_chat 配置）"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                from config.settings import get_voice_chat_settings
+                config = get_voice_chat_settings()
+                _batcher = VadBatcher(
+                    max_batch_size=config.vad_batch_max_size,
+                    max_wait_ms=config.vad_batch_max_wait_ms,
+                )
+                logger.info(f"VAD批处理器已创建: max_batch_size={config.vad_batch_max_size}, "
+                            f"max_wait_ms={config.vad_batch_max_wait_ms}")
+    return _batcher
+
+
+def get_vad_batcher_stats() -> Optional[dict]:
+    """批处理器统计（未创建时返回 None）"""
+    return _batcher.stats() if _batcher is not None else None
+
+
+def shutdown_vad_batcher():
+    global _batcher
+    if _batcher is not None:
+        _batcher.close()
+        _batcher = None
@@ -0,0 +1,66 @@
+"""
+单工 VAD 判决状态机
+
+OmniStream.vad_dual_detection 每个 tick 得到两个语音时长：
+- dur_vad_full：最近 1 秒窗口里的语音时长
+- dur_vad_tail：最近 dur_vad_time 秒补静音后的语音时长
+
+VadDecision 把这两个时长变成 OmniStream 主循环使用的两个判决：
+- full_vad_result=False：一段说话结束（已开始说话且说话时长 >= min_speech_seconds，
+  整窗语音时长跌到 end_threshold 以下），主循环据此开始生成回复
+- tail_vad_result=False：尾部连续两次（两次 tick，不要求相邻）低于 dur_vad_threshold，
+  抢跑模式据此提前开始生成
+
+判决逻辑从 OmniStream 中原样提取出来，时钟可注入，
+离线基准（benchmarks/bench_vad_endpointing.py）用回放时间驱动同一份代码。
+"""
+import time
+from typing import Callable, Tuple
+
+
+class VadDecision:
+    """单工 VAD 说话开始/结束与抢跑判决（每个会话一个实例）"""
+
+    def __init__(self, dur_vad_threshold: float = 0.1, start_threshold: float = 0.4,
+                 end_threshold: float = 0.1, min_speech_seconds: float = 0.3,
+                 clock: Callable[[], float] = time.time):
+        self.dur_vad_threshold = dur_vad_threshold
+        self.start_threshold = start_threshold
+        self.end_threshold = end_threshold
+        self.min_speech_seconds = min_speech_seconds
+        self.clock = clock
+        self.stream_started = False
+        self.speech_start_time = clock()
+        self.race_prepare = False
+
+    def update(self, dur_vad_full: float, dur_vad_tail: float) -> Tuple[bool, bool]:
+        """
+        根据本 tick 的语音时长更新状态
+
+        Returns:
+            tuple: (full_vad_result, tail_vad_result)
+        """
+        # 完整1秒音频的VAD检测结果
+        full_vad_result = True
+        if dur_vad_full > self.start_threshold:
+            if not self.stream_started:
+                self.speech_start_time = self.clock()
+                self.stream_started = True
+        elif dur_vad_full < self.end_threshold:
+            if self.stream_started:
+                self.stream_started = False
+                if self.clock() - self.speech_start_time >= self.min_speech_seconds:
+                    full_vad_result = False
+
+        # 最后 dur_vad_time 秒音频的VAD检测结果
+        tail_vad_result = True
+        if self.stream_started:
+            # 这里两次小于阈值才返回可以抢跑，减小误判几率
+            if dur_vad_tail < self.dur_vad_threshold:
+                if self.race_prepare:
+                    tail_vad_result = False
+                    self.race_prepare = False
+                else:
+                    self.race_prepare = True
+
+        return full_vad_result, tail_vad_result
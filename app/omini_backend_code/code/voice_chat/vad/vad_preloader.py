@@ -77,9 +77,11 @@ class VADPreloader:
             logger.info("开始VAD模型预热测试...")
             warmup_start = time.time()
             
-            # 生成测试音频数据
-            test_audio = np.random.randn(48000).astype(np.float32)  # 1秒测试音频
-            vad_utils.run_vad(test_audio.tobytes(), 48000)
+            # 生成测试音频数据（采样率与线上输入一致，16kHz 时不经过重采样）
+            from config.settings import get_voice_chat_settings
+            sample_rate = get_voice_chat_settings().ingest_sample_rate
+            test_audio = np.random.randn(sample_rate).astype(np.float32)  # 1秒测试音频
+            vad_utils.run_vad(test_audio.tobytes(), sample_rate)
             
             self._warmup_time = time.time() - warmup_start
             logger.info(f"VAD模型预热测试完成，耗时: {self._warmup_time*1000:.2f}ms")
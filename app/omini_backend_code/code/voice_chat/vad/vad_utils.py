@@ -2,11 +2,13 @@ import functools
 import numpy as np
 import librosa
 import os
+import queue
+import threading
 import time
 import traceback
 import warnings
 
-from typing import List, NamedTuple, Optional
+from typing import List, NamedTuple, Optional, Sequence
 
 
 class VadOptions(NamedTuple):
@@ -45,8 +47,18 @@ class VadOptions(NamedTuple):
     speech_pad_ms: int = 30  # gw: 600 # rep 400
 
 
+# graph_optimization_level 配置值 -> onnxruntime.GraphOptimizationLevel 成员名
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
 class SileroVADModel:
-    def __init__(self, path):
+    def __init__(self, path, intra_op_num_threads: int = 1, inter_op_num_threads: int = 1,
+                 graph_optimization_level: str = "all", optimized_model_dir: Optional[str] = None):
         try:
             import onnxruntime
         except ImportError as e:
@@ -54,13 +66,33 @@ class SileroVADModel:
                 "Applying the VAD filter requires the onnxruntime package"
             ) from e
 
+        if graph_optimization_level not in GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"未知的 graph_optimization_level: {graph_optimization_level}，"
+                             f"可选 {list(GRAPH_OPTIMIZATION_LEVELS)}")
+
         opts = onnxruntime.SessionOptions()
-        opts.inter_op_num_threads = 1
-        opts.intra_op_num_threads = 1
+        opts.inter_op_num_threads = inter_op_num_threads
+        opts.intra_op_num_threads = intra_op_num_threads
         opts.log_severity_level = 4
+        opts.graph_optimization_level = getattr(
+            onnxruntime.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[graph_optimization_level])
+
+        # 优化后模型的磁盘缓存：首个 session 优化后写入，之后的 session 直接加载、跳过图优化
+        # 文件名带优化级别，修改级别不会误用旧缓存；"all" 级别的结果与本机硬件相关，不要跨机器复用
+        model_path = path
+        if optimized_model_dir and graph_optimization_level != "disable":
+            name = os.path.splitext(os.path.basename(path))[0]
+            cache_path = os.path.join(optimized_model_dir, f"{name}.{graph_optimization_level}.onnx")
+            if os.path.isfile(cache_path):
+                model_path = cache_path
+                opts.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+            else:
+                os.makedirs(optimized_model_dir, exist_ok=True)
+                opts.optimized_model_filepath = cache_path
+        self.model_path = model_path
 
         self.session = onnxruntime.InferenceSession(
-            path,
+            model_path,
             providers=["CPUExecutionProvider"],
             sess_options=opts,
         )
@@ -96,6 +128,75 @@ class SileroVADModel:
         return out, state
 
 
+class VadSessionPool:
+    """
+    VAD 推理会话池（接口与 SileroVADModel 一致）
+
+    onnxruntime 的 InferenceSession 虽然可以多线程共享，但 _vad_thread_pool 的多个线程同时 run
+    同一个 session 会在 ORT 内部竞争。会话池让并发调用分散到多个 session：
+    - size=0：每个调用线程第一次推理时创建自己的 session（线程本地，无锁）
+    - size>0：预先创建 size 个 session，调用时借用一个空闲 session，用完归还
+
+    LSTM 状态 (h, c) 由调用方传入，session 本身无状态，同一会话的相邻窗口落到不同 session 上不影响结果。
+    """
+
+    def __init__(self, factory, size: int = 0):
+        if size < 0:
+            raise ValueError(f"size 必须 >= 0: {size}")
+        self._factory = factory
+        self.size = size
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.sessions_created = 0
+        self.acquire_waits = 0
+        # 先同步创建一个 session：尽早暴露加载错误，也让优化模型缓存在并发创建前写好
+        first = self._create()
+        if size > 0:
+            self._idle: "queue.Queue" = queue.Queue()
+            self._idle.put(first)
+            for _ in range(size - 1):
+                self._idle.put(self._create())
+        else:
+            self._local.model = first
+
+    def _create(self) -> SileroVADModel:
+        model = self._factory()
+        with self._lock:
+            self.sessions_created += 1
+        return model
+
+    def get_initial_state(self, batch_size: int):
+        h = np.zeros((2, batch_size, 64), dtype=np.float32)
+        c = np.zeros((2, batch_size, 64), dtype=np.float32)
+        return h, c
+
+    def __call__(self, x, state, sr: int):
+        if self.size == 0:
+            model = getattr(self._local, "model", None)
+            if model is None:
+                model = self._local.model = self._create()
+            return model(x, state, sr)
+
+        try:
+            model = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.acquire_waits += 1
+            model = self._idle.get()
+        try:
+            return model(x, state, sr)
+        finally:
+            self._idle.put(model)
+
+    def stats(self) -> dict:
+        return {
+            "mode": "per_thread" if self.size == 0 else "fixed",
+            "size": self.size,
+            "sessions_created": self.sessions_created,
+            "acquire_waits": self.acquire_waits,
+        }
+
+
 class VADModelSingleton:
     """
     VAD模型单例类
@@ -118,9 +219,21 @@ class VADModelSingleton:
     def _load_model(self):
         """加载VAD模型"""
         try:
+            from config.settings import get_voice_chat_settings
+            config = get_voice_chat_settings()
             path = os.path.join(os.path.dirname(__file__), "silero_vad.onnx")
-            self._model = SileroVADModel(path)
-            print(f"VAD模型单例已初始化: {path}")
+            factory = functools.partial(
+                SileroVADModel, path,
+                intra_op_num_threads=config.vad_intra_op_threads,
+                inter_op_num_threads=config.vad_inter_op_threads,
+                graph_optimization_level=config.vad_graph_optimization_level,
+                optimized_model_dir=config.vad_optimized_model_dir or None,
+            )
+            # 🔧 [VAD会话池] 多线程并发推理分散到多个 ORT session
+            self._model = VadSessionPool(factory, size=config.vad_session_pool_size)
+            print(f"VAD模型单例已初始化: {path}, 会话池={self._model.stats()}, "
+                  f"intra_op={config.vad_intra_op_threads}, inter_op={config.vad_inter_op_threads}, "
+                  f"graph_opt={config.vad_graph_optimization_level}")
         except Exception as e:
             print(f"VAD模型加载失败: {e}")
             self._model = None
@@ -157,6 +270,12 @@ def get_vad_model():
     return _vad_singleton.get_model()
 
 
+def get_vad_pool_stats() -> Optional[dict]:
+    """VAD 会话池统计（模型未加载时返回 None）"""
+    model = _vad_singleton._model
+    return model.stats() if isinstance(model, VadSessionPool) else None
+
+
 def get_vad_singleton():
     """获取VAD模型单例实例"""
     return _vad_singleton
@@ -180,12 +299,7 @@ def get_speech_timestamps(
     if vad_options is None:
         vad_options = VadOptions(**kwargs)
 
-    threshold = vad_options.threshold
-    min_speech_duration_ms = vad_options.min_speech_duration_ms
-    max_speech_duration_s = vad_options.max_speech_duration_s
-    min_silence_duration_ms = vad_options.min_silence_duration_ms
     window_size_samples = vad_options.window_size_samples
-    speech_pad_ms = vad_options.speech_pad_ms
 
     if window_size_samples not in [512, 1024, 1536]:
         warnings.warn(
@@ -194,19 +308,6 @@ def get_speech_timestamps(
         )
 
     sampling_rate = 16000
-    min_speech_samples = sampling_rate * \
-        min_speech_duration_ms / 1000  # 如果间隔区间没这个长度就不会添加
-    speech_pad_samples = sampling_rate * speech_pad_ms / 1000
-    max_speech_samples = (
-        sampling_rate * max_speech_duration_s
-        - window_size_samples
-        - 2 * speech_pad_samples
-    )
-    min_silence_samples = sampling_rate * min_silence_duration_ms / \
-        1000  # 在每个silent需要等 min_silence_duration_ms 后才结束，
-    min_silence_samples_at_max_speech = sampling_rate * \
-        98 / 1000  # 0.098s # need to adjust？
-
     audio_length_samples = len(audio)
 
     # import pdb
@@ -225,6 +326,48 @@ def get_speech_timestamps(
         speech_prob, state = model(chunk, state, sampling_rate)
         speech_probs.append(speech_prob)
 
+    return speech_timestamps_from_probs(speech_probs, audio_length_samples, vad_options)
+
+
+def speech_timestamps_from_probs(
+    speech_probs: Sequence[float],
+    audio_length_samples: int,
+    vad_options: VadOptions,
+) -> List[dict]:
+    """根据逐窗口的语音概率切分语音段（get_speech_timestamps 的判决部分）
+
+    第 i 个概率对应 16kHz 音频中 [i * window_size_samples, (i + 1) * window_size_samples) 的窗口。
+    流式 VAD（streaming_vad.StreamingVad）用保存的概率历史调用本函数，判决规则与整段 VAD 完全一致。
+
+    Args:
+      speech_probs: 每个窗口的语音概率。
+      audio_length_samples: 音频长度（16kHz 样本数）。
+      vad_options: VAD 参数。
+
+    Returns:
+      List of dicts containing begin and end samples of each speech chunk.
+    """
+    threshold = vad_options.threshold
+    min_speech_duration_ms = vad_options.min_speech_duration_ms
+    max_speech_duration_s = vad_options.max_speech_duration_s
+    min_silence_duration_ms = vad_options.min_silence_duration_ms
+    window_size_samples = vad_options.window_size_samples
+    speech_pad_ms = vad_options.speech_pad_ms
+
+    sampling_rate = 16000
+    min_speech_samples = sampling_rate * \
+        min_speech_duration_ms / 1000  # 如果间隔区间没这个长度就不会添加
+    speech_pad_samples = sampling_rate * speech_pad_ms / 1000
+    max_speech_samples = (
+        sampling_rate * max_speech_duration_s
+        - window_size_samples
+        - 2 * speech_pad_samples
+    )
+    min_silence_samples = sampling_rate * min_silence_duration_ms / \
+        1000  # 在每个silent需要等 min_silence_duration_ms 后才结束，
+    min_silence_samples_at_max_speech = sampling_rate * \
+        98 / 1000  # 0.098s # need to adjust？
+
     triggered = False
     speeches = []
     current_speech = {}
@@ -327,6 +470,16 @@ def get_speech_timestamps(
     return speeches
 
 
+def speech_duration_from_probs(
+    speech_probs: Sequence[float],
+    audio_length_samples: int,
+    vad_options: VadOptions,
+) -> float:
+    """语音总时长（秒），与 run_vad 返回的 duration_after_vad 计算方式相同"""
+    speeches = speech_timestamps_from_probs(speech_probs, audio_length_samples, vad_options)
+    return sum(speech["end"] - speech["start"] for speech in speeches) / 16000
+
+
 def collect_chunks(audio: np.ndarray, chunks: List[dict]) -> np.ndarray:
     """Collects and concatenates audio chunks."""
     if not chunks: